@@ -0,0 +1,153 @@
+"""
+Cancellation Token - Abort Panggilan Provider yang Sedang Berjalan
+==================================================================
+Polling `request.is_disconnected()` di checkpoint hanya menghentikan pipeline
+SETELAH panggilan yang sedang jalan (rerank, Pinecone, generasi LLM) selesai —
+dan kita tetap membayar tokennya.
+
+CancellationToken dipicu oleh:
+- client disconnect (watch_disconnect, atau grace period resume di stream_replay)
+- pesan baru di session yang sama (RequestRegistry di backend/services)
+- tombol Stop (RequestRegistry.cancel_session)
+
+cancel() langsung membatalkan task yang terikat (bind) ke token. Karena
+provider dipanggil lewat client async (httpx), CancelledError di titik await
+menutup koneksi HTTP yang sedang berjalan — tidak menunggu checkpoint berikut.
+
+Token juga bisa dipanggil sebagai `cancellation_check` (async callable → bool)
+sehingga kompatibel dengan parameter yang sudah ada di ChatService/RAG.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CancellationStats:
+    cancelled: int = 0
+    superseded: int = 0
+    disconnected: int = 0
+    user_stopped: int = 0
+    tokens_saved: int = 0
+    ms_saved: int = 0
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+cancellation_stats = CancellationStats()
+_stats_lock = threading.Lock()
+
+
+def record_savings(tokens: int, ms: int, stage: str = "") -> None:
+    """Catat estimasi token & waktu yang TIDAK jadi dibayar karena cancel."""
+    tokens, ms = max(0, int(tokens)), max(0, int(ms))
+    with _stats_lock:
+        cancellation_stats.tokens_saved += tokens
+        cancellation_stats.ms_saved += ms
+    logger.info(f"💰 Cancel savings @ {stage or '-'}: ~{tokens} tokens, ~{ms}ms")
+
+
+class CancellationToken:
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.request_id = uuid.uuid4().hex
+        self.reason: Optional[str] = None
+        self.created_at = time.monotonic()
+        self._event = asyncio.Event()
+        self._flag = threading.Event()  # dibaca dari worker thread (HRService)
+        self._tasks: Set[asyncio.Task] = set()
+        self._watchers: Set[asyncio.Task] = set()
+
+    # ── State ──────────────────────────────────────────────────────────
+    @property
+    def cancelled(self) -> bool:
+        return self._flag.is_set()
+
+    def is_cancelled(self) -> bool:
+        """Versi sync — aman dipanggil dari thread (asyncio.to_thread)."""
+        return self._flag.is_set()
+
+    async def __call__(self) -> bool:
+        # Kompatibel dengan parameter `cancellation_check` lama
+        return self._flag.is_set()
+
+    async def wait(self) -> None:
+        await self._event.wait()
+
+    def raise_if_cancelled(self) -> None:
+        if self._flag.is_set():
+            raise asyncio.CancelledError()
+
+    # ── Binding ────────────────────────────────────────────────────────
+    def bind(self, task: Optional[asyncio.Task] = None) -> "CancellationToken":
+        """Ikat task (default: task saat ini). cancel() akan membatalkannya."""
+        task = task or asyncio.current_task()
+        if task is not None:
+            if self._flag.is_set():
+                task.cancel()
+            else:
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        return self
+
+    def watch_disconnect(self, request, interval: float = 0.5) -> "CancellationToken":
+        """Background poller: client disconnect → cancel("client_disconnected")."""
+        async def _watch():
+            try:
+                while not self._flag.is_set():
+                    if await request.is_disconnected():
+                        self.cancel("client_disconnected")
+                        return
+                    await asyncio.sleep(interval)
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                logger.debug(f"Disconnect watcher error: {e}")
+
+        self.add_watcher(asyncio.create_task(_watch()))
+        return self
+
+    def add_watcher(self, watcher: asyncio.Task) -> None:
+        """Task pemantau milik token — ikut dihentikan saat close()."""
+        self._watchers.add(watcher)
+        watcher.add_done_callback(self._watchers.discard)
+
+    # ── Cancel ─────────────────────────────────────────────────────────
+    def cancel(self, reason: str = "cancelled") -> bool:
+        if self._flag.is_set():
+            return False
+        self.reason = reason
+        self._flag.set()
+        self._event.set()
+        with _stats_lock:
+            cancellation_stats.cancelled += 1
+            if reason == "superseded":
+                cancellation_stats.superseded += 1
+            elif reason == "client_disconnected":
+                cancellation_stats.disconnected += 1
+            elif reason == "user_stopped":
+                cancellation_stats.user_stopped += 1
+        current = None
+        try:
+            current = asyncio.current_task()
+        except RuntimeError:
+            pass
+        for task in list(self._tasks):
+            if task is not current and not task.done():
+                task.cancel()
+        logger.warning(f"🛑 Token {self.label or '-'} cancelled ({reason}) — {len(self._tasks)} task dibatalkan")
+        return True
+
+    def close(self) -> None:
+        """Lepas watcher & binding setelah request selesai normal."""
+        for watcher in list(self._watchers):
+            watcher.cancel()
+        self._tasks.clear()
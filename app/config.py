@@ -26,6 +26,57 @@ SUPABASE_DB_PASSWORD = os.getenv("SUPABASE_DB_PASSWORD")
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 SUPABASE_CONNECTION_STRING = os.getenv("SUPABASE_CONNECTION_STRING")
 
+# 🏊 Pool koneksi PostgreSQL HR (psycopg2 ThreadedConnectionPool, per worker)
+HR_DB_POOL_MIN = int(os.getenv("HR_DB_POOL_MIN", 1))
+HR_DB_POOL_MAX = int(os.getenv("HR_DB_POOL_MAX", 8))
+HR_DB_POOL_WAIT_TIMEOUT = float(os.getenv("HR_DB_POOL_WAIT_TIMEOUT", 10))
+HR_DB_STATEMENT_TIMEOUT_MS = int(os.getenv("HR_DB_STATEMENT_TIMEOUT_MS", 30000))
+# Koneksi idle lebih lama dari ini di-ping (SELECT 1) sebelum dipinjamkan
+HR_DB_HEALTHCHECK_IDLE_SECONDS = float(os.getenv("HR_DB_HEALTHCHECK_IDLE_SECONDS", 30))
+# Hasil query HR: named cursor (server-side) diambil per batch; event table_rows ke client per batch
+HR_DB_FETCH_BATCH = int(os.getenv("HR_DB_FETCH_BATCH", 250))
+HR_STREAM_ROWS_BATCH = int(os.getenv("HR_STREAM_ROWS_BATCH", 250))
+# 🧬 Snapshot schema hr: fingerprint katalog dicek tiap N detik, rebuild di background hanya saat berubah
+SCHEMA_FINGERPRINT_INTERVAL = float(os.getenv("SCHEMA_FINGERPRINT_INTERVAL", 30))
+SCHEMA_SNAPSHOT_TTL = int(os.getenv("SCHEMA_SNAPSHOT_TTL", 86400))
+# ✂️ Pruning schema di prompt NL→SQL (BM25 + embedding): hanya tabel/kolom relevan yang ditulis lengkap
+SCHEMA_PRUNING_ENABLED = os.getenv("SCHEMA_PRUNING_ENABLED", "true").lower() == "true"
+SCHEMA_PRUNING_MIN_COLUMNS = int(os.getenv("SCHEMA_PRUNING_MIN_COLUMNS", 60))   # schema lebih kecil → kirim utuh
+SCHEMA_PRUNING_MAX_TABLES = int(os.getenv("SCHEMA_PRUNING_MAX_TABLES", 4))
+SCHEMA_PRUNING_MAX_COLUMNS = int(os.getenv("SCHEMA_PRUNING_MAX_COLUMNS", 15))   # per tabel, di luar join key
+SCHEMA_PRUNING_EMBEDDINGS = os.getenv("SCHEMA_PRUNING_EMBEDDINGS", "true").lower() == "true"
+# Kamus nilai kategori: mention di pertanyaan → nilai persis di database
+VALUE_INDEX_ENABLED = os.getenv("VALUE_INDEX_ENABLED", "true").lower() == "true"
+VALUE_INDEX_MAX_VALUES = int(os.getenv("VALUE_INDEX_MAX_VALUES", 500))       # kolom teks dengan distinct <= ini diindeks
+VALUE_INDEX_FUZZY_CUTOFF = float(os.getenv("VALUE_INDEX_FUZZY_CUTOFF", 0.82))
+# 🗃️ Cache NL→SQL (exact + semantic) per structure_version schema hr, dibagi lewat Redis
+SQL_CACHE_ENABLED = os.getenv("SQL_CACHE_ENABLED", "true").lower() == "true"
+SQL_CACHE_TTL = int(os.getenv("SQL_CACHE_TTL", 604800))                      # 7 hari
+SQL_CACHE_SIMILARITY = float(os.getenv("SQL_CACHE_SIMILARITY", 0.95))         # ambang cosine level semantic
+SQL_CACHE_MAX_ENTRIES = int(os.getenv("SQL_CACHE_MAX_ENTRIES", 500))          # vektor semantic per versi schema
+SQL_CACHE_EMBED_DIMENSIONS = int(os.getenv("SQL_CACHE_EMBED_DIMENSIONS", 256))  # 0 = dimensi default model
+# 🧩 Template SQL tanpa LLM untuk pertanyaan HR umum (headcount, top-N, persentase, pensiun)
+SQL_TEMPLATES_ENABLED = os.getenv("SQL_TEMPLATES_ENABLED", "true").lower() == "true"
+SQL_TEMPLATE_TABLE = os.getenv("SQL_TEMPLATE_TABLE", "")                         # kosong = deteksi tabel karyawan otomatis
+SQL_TEMPLATE_RETIREMENT_AGE = int(os.getenv("SQL_TEMPLATE_RETIREMENT_AGE", 0))  # >0: tanggal lahir + usia ini kalau tidak ada kolom tanggal pensiun
+# 💬 Penjelasan SQL dibuat saat panel Transparansi Query dibuka (bukan sebelum data dikirim)
+SQL_EXPLANATION_LAZY = os.getenv("SQL_EXPLANATION_LAZY", "true").lower() == "true"
+SQL_EXPLANATION_TTL = int(os.getenv("SQL_EXPLANATION_TTL", 2592000))              # 30 hari, key = hash SQL
+SQL_EXPLANATION_RATE_LIMIT = os.getenv("SQL_EXPLANATION_RATE_LIMIT", "30/minute")  # panggilan LLM per NIK/IP; lewat batas = penjelasan statis
+# ♻️ Cache hasil query HR (invalid saat counter modifikasi tabel hr / watermark ingestion berubah)
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", 86400))
+RESULT_CACHE_MAX_ROWS = int(os.getenv("RESULT_CACHE_MAX_ROWS", 1000))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", 262144))   # setelah gzip
+# 🛡️ Cost guard: EXPLAIN dulu untuk SQL dari LLM/cache; plan kemahalan di-LIMIT ulang atau ditolak
+COST_GUARD_ENABLED = os.getenv("COST_GUARD_ENABLED", "true").lower() == "true"
+COST_GUARD_MAX_COST = float(os.getenv("COST_GUARD_MAX_COST", 500000))            # total cost planner (unit cost PostgreSQL)
+COST_GUARD_MAX_ROWS = float(os.getenv("COST_GUARD_MAX_ROWS", 2000000))           # estimasi baris terbesar di node plan (di luar LIMIT)
+COST_GUARD_REWRITE = os.getenv("COST_GUARD_REWRITE", "true").lower() == "true"  # coba bungkus dengan LIMIT sebelum menolak
+COST_GUARD_EXPLAIN_TIMEOUT_MS = int(os.getenv("COST_GUARD_EXPLAIN_TIMEOUT_MS", 2000))
+COST_GUARD_STATEMENT_TIMEOUT_MS = int(os.getenv("COST_GUARD_STATEMENT_TIMEOUT_MS", 10000))  # statement_timeout query yang lolos
+COST_GUARD_SLOW_MS = float(os.getenv("COST_GUARD_SLOW_MS", 3000))               # ≥ ini dicatat ke hr_slow_queries
+
 # ======================================================
 # OPTIONAL EXTERNAL SERVICES
 # ======================================================
@@ -37,6 +88,10 @@ PINECONE_INDEX = os.getenv("PINECONE_INDEX")
 UPSTASH_REDIS_URL = os.getenv("UPSTASH_REDIS_URL")
 UPSTASH_REDIS_TOKEN = os.getenv("UPSTASH_REDIS_TOKEN")
 
+# 📡 Redis TCP (pub/sub lintas worker) — Upstash REST tidak bisa SUBSCRIBE.
+# Bisa pakai endpoint TCP Upstash (rediss://default:<token>@<host>:6379) atau Redis self-hosted.
+REDIS_URL = os.getenv("REDIS_URL")
+
 # Cohere Reranker
 COHERE_API_KEY = os.getenv("COHERE_API_KEY")
 COHERE_MODEL = os.getenv("COHERE_MODEL", "rerank-multilingual-v3.0")
@@ -131,6 +186,28 @@ RAG_FALLBACK_MAX_CHARS = int(os.getenv("RAG_FALLBACK_MAX_CHARS", 500))
 MAX_HISTORY_LENGTH = int(os.getenv("MAX_HISTORY_LENGTH", 8))
 SESSION_CLEANUP_DAYS = int(os.getenv("SESSION_CLEANUP_DAYS", 30))
 
+# 💾 Write-behind persistence: pesan chat di-batch ke Supabase tiap N ms (bukan per pesan)
+PERSIST_FLUSH_MS = float(os.getenv("PERSIST_FLUSH_MS", 200))
+PERSIST_BATCH_MAX = int(os.getenv("PERSIST_BATCH_MAX", 500))
+# Kalau Supabase down, batch disimpan ke spool JSONL lokal dan di-retry berkala (detik)
+PERSIST_SPOOL_DIR = os.getenv("PERSIST_SPOOL_DIR", os.path.join(os.getenv("PROJECT_ROOT", os.getcwd()), ".spool"))
+PERSIST_RETRY_SECONDS = float(os.getenv("PERSIST_RETRY_SECONDS", 30))
+
+# 🗂️ Cache metadata session (Redis, lintas worker) + near-cache per proses
+SESSION_META_TTL = int(os.getenv("SESSION_META_TTL", 3600))
+SESSION_LIST_TTL = int(os.getenv("SESSION_LIST_TTL", 60))
+# Versi daftar session di-cache lokal selama N detik = batas staleness lintas worker
+SESSION_VERSION_NEAR_TTL = float(os.getenv("SESSION_VERSION_NEAR_TTL", 2))
+
+# 👤 User context SINTA: near-cache TTL-LRU per worker + negative cache session tak dikenal
+USER_CTX_CACHE_MAX = int(os.getenv("USER_CTX_CACHE_MAX", 5000))
+USER_CTX_CACHE_TTL = int(os.getenv("USER_CTX_CACHE_TTL", 1800))
+USER_CTX_NEGATIVE_TTL = int(os.getenv("USER_CTX_NEGATIVE_TTL", 30))
+
+# 📦 Artifact HR analytics (tabel/chart) — disimpan terpisah dari pesan, di-fetch saat dibuka
+ARTIFACT_REDIS_TTL = int(os.getenv("ARTIFACT_REDIS_TTL", 86400))
+ARTIFACT_NEAR_CACHE_MAX = int(os.getenv("ARTIFACT_NEAR_CACHE_MAX", 200))
+
 SPEECH_LANGUAGE_DEFAULT = os.getenv("SPEECH_LANGUAGE_DEFAULT", "id")
 TTS_PRIMARY_ENGINE = os.getenv("TTS_PRIMARY_ENGINE", "elevenlabs")
 TTS_FALLBACK_ENGINE = os.getenv("TTS_FALLBACK_ENGINE", "openai")
@@ -156,11 +233,38 @@ API_TIMEOUT_DEFAULT = int(os.getenv("API_TIMEOUT_DEFAULT", 60))
 API_TIMEOUT_CALL_MODE = int(os.getenv("API_TIMEOUT_CALL_MODE", 15))
 API_TIMEOUT_TTS = int(os.getenv("API_TIMEOUT_TTS", 8))
 
+# ⏳ Latency budget per request (deadline propagation) — harus < gunicorn timeout (120s)
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", 50))
+REQUEST_DEADLINE_CALL_MODE = float(os.getenv("REQUEST_DEADLINE_CALL_MODE", API_TIMEOUT_CALL_MODE))
+# Sisa budget minimum (detik) agar sebuah tahap tetap dijalankan penuh; di bawahnya → degrade
+DEADLINE_MIN_MULTI_QUERY = float(os.getenv("DEADLINE_MIN_MULTI_QUERY", 30))
+DEADLINE_MIN_RERANK = float(os.getenv("DEADLINE_MIN_RERANK", 18))
+DEADLINE_MIN_FULL_TOP_K = float(os.getenv("DEADLINE_MIN_FULL_TOP_K", 22))
+DEADLINE_MIN_FX_FETCH = float(os.getenv("DEADLINE_MIN_FX_FETCH", 15))
+DEADLINE_MIN_SQL_EXPLANATION = float(os.getenv("DEADLINE_MIN_SQL_EXPLANATION", 15))
+DEADLINE_DEGRADED_TOP_K = int(os.getenv("DEADLINE_DEGRADED_TOP_K", 4))
+
 CALL_MODE_TEMPERATURE = 0.0
 CHAT_MODE_TEMPERATURE = 0.1
 CALL_MODE_MAX_TOKENS = 150
 CHAT_MODE_MAX_TOKENS = 2000
 
+# ======================================================
+# STREAMING & MULTI-WORKER COORDINATION
+# ======================================================
+# Single-flight: gabungkan pertanyaan SOP identik yang sedang diproses
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+SINGLE_FLIGHT_LEADER_TTL = int(os.getenv("SINGLE_FLIGHT_LEADER_TTL", 120))
+SINGLE_FLIGHT_FOLLOW_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_FOLLOW_TIMEOUT", 20))
+# SSE writer: gabungkan token ke satu frame per jendela waktu / ukuran
+SSE_COALESCE_MS = float(os.getenv("SSE_COALESCE_MS", 30))
+SSE_COALESCE_MAX_CHARS = int(os.getenv("SSE_COALESCE_MAX_CHARS", 512))
+SSE_BINARY_ENABLED = os.getenv("SSE_BINARY_ENABLED", "true").lower() == "true"
+# Resume stream (Last-Event-ID): buffer event per request + grace period setelah client putus
+STREAM_REPLAY_TTL = int(os.getenv("STREAM_REPLAY_TTL", 120))
+STREAM_RESUME_GRACE = float(os.getenv("STREAM_RESUME_GRACE", 15))
+STREAM_REPLAY_FLUSH_MS = float(os.getenv("STREAM_REPLAY_FLUSH_MS", 100))
+
 # ======================================================
 # FEATURE FLAGS & ENV
 # ======================================================
@@ -200,6 +304,8 @@ if not LANGFUSE_SECRET_KEY or not LANGFUSE_PUBLIC_KEY:
     print("⚠️ Langfuse not configured - observability/tracing will be disabled")
 if not UPSTASH_REDIS_URL or not UPSTASH_REDIS_TOKEN:
     print("⚠️ Upstash Redis not configured - chat history caching will use Supabase fallback")
+if not REDIS_URL:
+    print("⚠️ REDIS_URL not configured - cross-worker pub/sub disabled (single-flight & cancel stay per-worker)")
 if not SUPABASE_DB_PASSWORD and not SUPABASE_CONNECTION_STRING:
     print("⚠️ Supabase database not configured - HR CSV ingestion will be unavailable\n   Set SUPABASE_DB_PASSWORD or SUPABASE_CONNECTION_STRING")
 
@@ -0,0 +1,84 @@
+"""
+Request Deadline - Latency Budget End-to-End
+============================================
+Timeout per komponen (ChatOpenAI 30s x retry, OpenAIEmbeddings 20s x 3 retry,
+gunicorn 120s) tidak saling tahu. Satu Deadline dibuat per request di
+backend/api/chat.py lalu diteruskan ke ChatService → RAG engine / HRService.
+
+Setiap tahap bertanya "budget masih cukup?" lewat allows(). Kalau tidak,
+tahap tersebut degrade (skip multi-query, skip Cohere, pakai kurs cache,
+kecilkan top-k, skip penjelasan SQL) dan degradasinya dicatat agar terlihat
+di log akhir request.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Deadline:
+    """Budget waktu satu request. Thread-safe (HRService jalan di to_thread)."""
+
+    def __init__(self, budget_seconds: float, label: str = "request"):
+        self.label = label
+        self.budget_seconds = float(budget_seconds)
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + self.budget_seconds
+        self.degradations: List[str] = []
+        self._lock = threading.Lock()
+
+    # ── Waktu ──────────────────────────────────────────────────────────
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed_ms(self) -> int:
+        return int((time.monotonic() - self.started_at) * 1000)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout_for(self, cap: float, floor: float = 1.0) -> float:
+        """Timeout untuk satu panggilan provider: min(cap, sisa budget), minimal `floor`."""
+        return max(floor, min(cap, self.remaining()))
+
+    # ── Degradasi ──────────────────────────────────────────────────────
+    def allows(self, stage: str, min_remaining: float) -> bool:
+        """
+        True kalau sisa budget >= min_remaining. Kalau tidak, catat degradasi
+        `stage` (sekali saja) dan return False — pemanggil menjalankan jalur murah.
+        """
+        left = self.remaining()
+        if left >= min_remaining:
+            return True
+        self.degrade(stage, f"sisa {left:.1f}s < {min_remaining:.1f}s")
+        return False
+
+    def degrade(self, stage: str, reason: str = "") -> None:
+        with self._lock:
+            if stage in self.degradations:
+                return
+            self.degradations.append(stage)
+        logger.warning(f"⏳ [DEADLINE] {self.label}: degrade '{stage}' ({reason}) @ {self.elapsed_ms()}ms")
+
+    def summary(self) -> Dict:
+        return {
+            "budget_s": self.budget_seconds,
+            "elapsed_ms": self.elapsed_ms(),
+            "remaining_s": round(self.remaining(), 2),
+            "degradations": list(self.degradations),
+        }
+
+    def log_summary(self) -> None:
+        if self.degradations:
+            logger.warning(f"⏳ [DEADLINE] {self.label} selesai {self.elapsed_ms()}ms | degradasi: {', '.join(self.degradations)}")
+        else:
+            logger.info(f"⏱️ [DEADLINE] {self.label} selesai {self.elapsed_ms()}ms (budget {self.budget_seconds:.0f}s, tanpa degradasi)")
+
+
+def budget_allows(deadline: Optional[Deadline], stage: str, min_remaining: float) -> bool:
+    """Helper untuk parameter opsional: tanpa deadline = selalu boleh."""
+    return deadline is None or deadline.allows(stage, min_remaining)
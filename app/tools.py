@@ -45,7 +45,7 @@ class StructuredResponse:
 
 # 1. SOP RAG Engine
 try:
-    from engines.sop.rag_engine import answer_question
+    from engines.sop.rag_engine import answer_question, answer_question_stream
     logger.info("✅ SOP RAG engine imported successfully")
     USE_SOP_ENGINE = True
 except Exception as e:
@@ -138,13 +138,14 @@ async def search_sop(
     question: str,
     session_id: str = "default",
     cancellation_check: Optional[Callable] = None,
+    deadline=None,
 ) -> str:
     """Search SOP documents via the RAG engine with full observability."""
     try:
         logger.info(f"📖 Executing SOP search for: {question[:50]}...")
         if USE_SOP_ENGINE:
             result = await answer_question(
-                question, session_id, cancellation_check
+                question, session_id, cancellation_check, deadline=deadline
             )
             logger.info(f"✅ SOP search completed ({len(result)} chars)")
             return result
@@ -156,7 +157,48 @@ async def search_sop(
         return f"<h3>❌ Error Pencarian SOP</h3><p>Terjadi kesalahan: {str(e)}</p>"
 
 
-async def query_hr_database(question: str, user_role: str = "HR", session_id: str = "default") -> Union[str, StructuredResponse]:
+async def search_sop_stream(
+    question: str,
+    session_id: str = "default",
+    cancellation_check: Optional[Callable] = None,
+    deadline=None,
+    out_context: Optional[dict] = None,
+):
+    """Streaming version of search_sop: yields text chunks from the RAG engine as they arrive."""
+    if not USE_SOP_ENGINE:
+        logger.error("❌ SOP engine not available")
+        yield "<h3>❌ Sistem Tidak Tersedia</h3><p>Sistem pencarian SOP sedang dalam pemeliharaan.</p>"
+        return
+    logger.info(f"📖 Executing SOP stream for: {question[:50]}...")
+    total = 0
+    try:
+        async for chunk in answer_question_stream(
+            question, session_id, cancellation_check, out_context=out_context, deadline=deadline
+        ):
+            total += len(chunk)
+            yield chunk
+        logger.info(f"✅ SOP stream completed ({total} chars)")
+    except Exception as e:
+        # Diteruskan ke caller (ChatService._stream_route_a) yang memperlakukannya sebagai
+        # "tidak ditemukan" — HTML error tidak boleh ikut tersimpan sebagai jawaban
+        logger.error(f"❌ SOP stream error: {e}", exc_info=True)
+        raise
+
+
+COST_REJECTED_MESSAGE = (
+    "⚠️ **Query Terlalu Berat**\n\n"
+    "Pertanyaan ini membutuhkan pemindaian data yang terlalu besar. "
+    "Persempit pertanyaannya — misalnya sebutkan unit, periode, atau batasi ke 10 teratas."
+)
+
+
+async def query_hr_database(
+    question: str,
+    user_role: str = "HR",
+    session_id: str = "default",
+    deadline=None,
+    cancellation_check: Optional[Callable] = None,
+) -> Union[str, StructuredResponse]:
     """
     ⚡ FIXED: Made Async to prevent blocking the event loop while querying Supabase
     """
@@ -166,14 +208,43 @@ async def query_hr_database(question: str, user_role: str = "HR", session_id: st
         if not USE_HR_ENGINE:
             return "❌ **HR Analytics Tidak Tersedia**\n\nSistem tidak tersedia. Hubungi administrator."
         
+        # 🗃️ SQL tervalidasi dari pertanyaan yang sama/serupa → skip generate_sql + penjelasan
+        cached_sql = None
+        try:
+            from engines.hr.query.sql_cache import sql_cache
+            cached_sql = await sql_cache.lookup(
+                question, embed_client=hr_service.llm, timeout=deadline.timeout_for(3) if deadline else 3
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ SQL cache lookup gagal: {e}")
+
         # ⚡ Membungkus proses query DB yang blocking ke dalam thread
         response = await asyncio.to_thread(
             hr_service.process_hr_query,
             question=question, 
             user_role=user_role, 
-            session_id=session_id
+            session_id=session_id,
+            deadline=deadline,
+            # CancellationToken punya is_cancelled() sync yang aman dibaca dari thread
+            should_cancel=getattr(cancellation_check, "is_cancelled", None),
+            cached_sql=cached_sql,
         )
+
+        if response.sql_cache_entry and response.has_data():
+            try:
+                await sql_cache.store(question, **response.sql_cache_entry)
+            except Exception as e:
+                logger.warning(f"⚠️ SQL cache store gagal: {e}")
         
+        if response.cost_rejected:
+            logger.warning(f"🛡️ HR query ditolak cost guard ({response.sql_source}): {response.errors}")
+            if cached_sql is not None and (response.sql_source or "").startswith("cache:"):
+                try:
+                    await sql_cache.evict(cached_sql)
+                except Exception as e:
+                    logger.warning(f"⚠️ SQL cache evict gagal: {e}")
+            return COST_REJECTED_MESSAGE
+
         if response.has_errors():
             logger.warning(f"⚠️ HR query failed: {response.errors}")
             return "⚠️ **Data Tidak Tersedia**\n\nInformasi tidak tersedia atau Anda tidak memiliki otorisasi."
@@ -185,6 +256,13 @@ async def query_hr_database(question: str, user_role: str = "HR", session_id: st
             
             sql_q = query_data.get('sql_query')
             sql_exp = query_data.get('sql_explanation')
+            if sql_q and not sql_exp:
+                # Penjelasan ditunda (SQL_EXPLANATION_LAZY) — SQL yang sama sudah pernah dijelaskan → kirim inline
+                try:
+                    from engines.hr.query.sql_explainer import sql_explainer
+                    sql_exp = await sql_explainer.attach_cached(sql_q)
+                except Exception as e:
+                    logger.warning(f"⚠️ SQL explanation cache gagal: {e}")
             
             result_parts = []
             if columns and rows:
@@ -221,6 +299,7 @@ async def query_hr_database(question: str, user_role: str = "HR", session_id: st
                 "total_rows": len(rows), 
                 "source": "hr_database"
             }
+            if query_data.get('column_types'): structured_payload["column_types"] = query_data['column_types']
             if sql_q: structured_payload["sql_query"] = sql_q
             if sql_exp: structured_payload["sql_explanation"] = sql_exp
             
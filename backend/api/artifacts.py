@@ -0,0 +1,84 @@
+"""
+DENAI Artifact API Routes
+Lazy-fetch payload HR analytics (tabel/chart) yang direferensikan pesan history,
+plus penjelasan SQL on-demand untuk panel Transparansi Query.
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+
+from backend.api.deps import get_auth_nik
+from backend.services.session_cache import session_cache
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get("/artifacts/{turn_id}")
+async def get_artifact(
+    turn_id: str,
+    request: Request,
+    auth_nik: Optional[str] = Depends(get_auth_nik),
+):
+    """Payload analytics satu turn. Blob gzip dikirim apa adanya (tanpa dekompresi)
+    kalau client menerima gzip; konten immutable → bisa di-cache browser."""
+    from memory.artifact_store import artifact_store
+
+    record = await artifact_store.get(turn_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    if not await session_cache.can_access(record["session_id"], auth_nik):
+        raise HTTPException(status_code=403, detail="Access denied: artifact belongs to another user")
+
+    etag = f'"{record["hash"]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=86400, immutable", "Vary": "Accept-Encoding"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    if "gzip" in request.headers.get("accept-encoding", "").lower():
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=record["gz"], media_type="application/json", headers=headers)
+    return Response(content=gzip.decompress(record["gz"]), media_type="application/json", headers=headers)
+
+
+@router.get("/artifacts/{turn_id}/sql-explanation")
+async def get_sql_explanation(
+    turn_id: str,
+    request: Request,
+    auth_nik: Optional[str] = Depends(get_auth_nik),
+):
+    """Penjelasan SQL satu turn, dibuat saat panel Transparansi Query dibuka
+    (SQL_EXPLANATION_LAZY). SQL & pertanyaan diambil dari artifact turn tersebut;
+    hasil di-cache per hash SQL sehingga query yang sama tidak dijelaskan dua kali.
+    Cache miss (panggilan LLM berbayar) dibatasi per NIK/IP — lewat batas, penjelasan statis."""
+    from memory.artifact_store import artifact_store
+    from engines.hr.query.sql_explainer import sql_explainer, sql_hash
+
+    record = await artifact_store.get(turn_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    if not await session_cache.can_access(record["session_id"], auth_nik):
+        raise HTTPException(status_code=403, detail="Access denied: artifact belongs to another user")
+
+    payload = await asyncio.to_thread(lambda: json.loads(gzip.decompress(record["gz"])))
+    sql = payload.get("sql_query") or ""
+    if not sql:
+        raise HTTPException(status_code=404, detail="Turn has no SQL query")
+    if payload.get("sql_explanation"):
+        return {"turn_id": turn_id, "sql_hash": sql_hash(sql), "sql_explanation": payload["sql_explanation"]}
+
+    from app.tools import hr_service, USE_HR_ENGINE
+    if not USE_HR_ENGINE:
+        raise HTTPException(status_code=503, detail="HR engine unavailable")
+    rate_key = f"nik:{auth_nik}" if auth_nik else f"ip:{request.client.host if request.client else 'unknown'}"
+    explanation = await sql_explainer.explain(sql, payload.get("query") or "", hr_service.sql_generator,
+                                              rate_key=rate_key)
+    if not explanation:
+        raise HTTPException(status_code=503, detail="SQL explanation unavailable, try again later")
+    return {"turn_id": turn_id, "sql_hash": sql_hash(sql), "sql_explanation": explanation}
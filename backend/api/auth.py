@@ -11,7 +11,7 @@ from fastapi import APIRouter
 from pydantic import BaseModel
 from typing import Optional
 
-from backend.services.user_context import set_user_context, determine_role_from_unit
+from backend.services.user_context import set_user_context_async, determine_role_from_unit
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -93,7 +93,7 @@ async def auth_from_sinta(req: SintaAuthRequest):
     session_id = str(uuid.uuid4())
 
     # Simpan ke store
-    set_user_context(session_id, {
+    await set_user_context_async(session_id, {
         "nama": nama,
         "first_name": first_name,
         "nik": nik,
@@ -6,8 +6,6 @@ Integration with existing chat_service.py and memory system
 import logging
 import uuid
 import io
-import json
-import urllib.parse
 import asyncio
 from fastapi import APIRouter, BackgroundTasks, Request, UploadFile, File
 from fastapi.responses import StreamingResponse, JSONResponse
@@ -21,25 +19,34 @@ from backend.services.stt_service import STTService
 from backend.services.evaluator import evaluate_interaction_background
 from backend.utils.text_utils import clean_text_for_tts
 from backend.limiter import limiter
+from app.deadline import Deadline
+from app.cancellation import CancellationToken
+from backend.services.request_registry import request_registry
+from backend.utils.sse import SSEWriter, SSE_HEADERS, wants_cbor, sse_stats_dict
+from backend.services.stream_replay import stream_hub, parse_event_id
+from app.config import REQUEST_DEADLINE_SECONDS, REQUEST_DEADLINE_CALL_MODE
 
 from memory.memory_hybrid import (
     get_hybrid_history, 
-    save_hybrid_message, 
+    save_hybrid_turn,
     setup_hybrid_session,
     MEMORY_AVAILABLE,
     REDIS_AVAILABLE
 )
+from memory.artifact_store import artifact_store
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Satu turn chat penuh (LLM + RAG/DB) — dipakai juga per pesan "question" di /ws/chat
+ASK_STREAM_RATE_LIMIT = "15/minute"
+
 # Initialize services
 chat_service = ChatService()
 tts_service = TTSService()
 stt_service = STTService()
 
-# Track active requests for cancellation
-active_requests = {}
+# Request aktif per session (CancellationToken) ada di backend.services.request_registry
 
 class StoppedRequest(BaseModel):
     last_query: str
@@ -61,21 +68,14 @@ async def ask_question(
     """
     Enhanced endpoint with proper cancellation handling.
     """
+    token = None
     try:
         req.session_id = req.session_id or str(uuid.uuid4())
         user_role = req.user_role or "Employee"
         logger.info(f"🔍 Question: {req.question[:50]}...")
 
-        # Cancel previous request for this session
-        if req.session_id in active_requests:
-            old_task = active_requests[req.session_id]
-            if not old_task.done():
-                logger.warning(f"🛑 Cancelling previous request for session {req.session_id}")
-                old_task.cancel()
-                try:
-                    await old_task
-                except asyncio.CancelledError:
-                    logger.info(f"✅ Previous request cancelled successfully")
+        # Token baru untuk session ini — request lama di session yang sama otomatis dibatalkan
+        token = await request_registry.start(req.session_id, label=f"ask:{req.session_id[:8]}")
 
         # Create new task with cancellation support
         task = asyncio.create_task(
@@ -83,11 +83,12 @@ async def ask_question(
                 question=req.question,
                 session_id=req.session_id,
                 user_role=user_role,
-                request=request
+                request=request,
+                token=token,
             )
         )
-
-        active_requests[req.session_id] = task
+        # Disconnect / pesan baru → task di-cancel di titik await manapun (bukan hanya checkpoint)
+        token.bind(task).watch_disconnect(request)
 
         try:
             result = await task
@@ -134,8 +135,8 @@ async def ask_question(
         )
 
     finally:
-        if req.session_id and req.session_id in active_requests:
-            del active_requests[req.session_id]
+        if token is not None:
+            request_registry.finish(req.session_id, token)
 
 
 @router.post("/feedback")
@@ -169,7 +170,8 @@ async def process_question_with_cancellation(
     question: str,
     session_id: str,
     user_role: str,
-    request: Request
+    request: Request,
+    token: Optional[CancellationToken] = None,
 ) -> dict:
     """
     Core processing logic with DELAYED DB INSERTION.
@@ -186,6 +188,9 @@ async def process_question_with_cancellation(
     _lf_attr_cm = None  # propagate_attributes context manager
     _lf_span = None
 
+    # ⏳ Satu budget waktu untuk seluruh pipeline request ini
+    deadline = Deadline(REQUEST_DEADLINE_SECONDS, label=f"ask:{session_id[:8]}")
+
     try:
         from app.langfuse_client import langfuse, LANGFUSE_ENABLED  # type: ignore
         if LANGFUSE_ENABLED and langfuse:
@@ -233,7 +238,8 @@ async def process_question_with_cancellation(
             session_id=session_id,
             history=history,
             mode="chat",
-            cancellation_check=lambda: request.is_disconnected(),
+            cancellation_check=token or (lambda: request.is_disconnected()),
+            deadline=deadline,
         )
 
         # Replace SOP "not found" code with a friendly message
@@ -260,20 +266,15 @@ async def process_question_with_cancellation(
             raise asyncio.CancelledError()
 
         # 🔥 JIKA SUKSES & TIDAK DIBATALKAN, BARU KITA SAVE KEDUANYA!
-        await save_hybrid_message(session_id, "user", question)
-
+        text_to_save = None
         if result.get("answer"):
             text_to_save = result["answer"]
 
             if result.get("data"):
-                try:
-                    json_str = json.dumps(result["data"])
-                    safe_json = urllib.parse.quote(json_str)
-                    text_to_save += f'\n\n<span class="denai-hidden-payload" data-payload="{safe_json}" style="display:none;"></span>'
-                except Exception as e:
-                    logger.error(f"❌ JSON parse error: {e}")
+                # Payload tabel disimpan sebagai artifact terpisah; pesan hanya membawa referensinya
+                text_to_save += "\n\n" + await artifact_store.put(session_id, result["data"], result.get("turn_id", ""))
 
-            await save_hybrid_message(session_id, "assistant", text_to_save)
+        await save_hybrid_turn(session_id, question, text_to_save)
 
         if "session_id" not in result:
             result["session_id"] = session_id
@@ -281,6 +282,7 @@ async def process_question_with_cancellation(
         return result
 
     finally:
+        deadline.log_summary()
         # Tutup kedua context manager (urutan terbalik dari __enter__)
         if _lf_attr_cm is not None:
             try:
@@ -311,387 +313,460 @@ def _quick_topic_classify(text: str) -> str:
     return ""
 
 
-@router.post("/ask/stream")
-@limiter.limit("15/minute")
-async def ask_question_stream(
-    request: Request,
+def _parse_source_chunks(ctx_str: str) -> list:
+    """Ubah context RAG (<dokumen ...>) jadi list source chunk untuk DocPanel frontend."""
+    source_chunks = []
+    if not ctx_str:
+        return source_chunks
+    import re as _re
+    for _m in _re.finditer(
+        r'<dokumen id="(\d+)" file="([^"]*)" bab="([^"]*)">\n?(.*?)\n?</dokumen>',
+        ctx_str, _re.DOTALL
+    ):
+        source_chunks.append({
+            "id":   int(_m.group(1)),
+            "file": _m.group(2).strip(),
+            "bab":  _m.group(3).strip(),
+            "text": _m.group(4).strip(),
+        })
+    return source_chunks
+
+
+async def stream_chat_events(
     req: QuestionRequest,
-    background_tasks: BackgroundTasks,
+    user_role: str,
+    token: CancellationToken,
+    background_tasks,
 ):
     """
-    SSE streaming endpoint for SOP queries.
-    Emits: {"type":"token","content":"..."} per chunk
-           {"type":"done","session_id":"...","authorized":true} on completion
-           {"type":"error","message":"..."} on failure
-    Non-SOP intents (greeting/casual/HR analytics) are returned as a single "done" event.
+    Pipeline chat sebagai generator event dict — transport-agnostic.
+    Dipakai /ask/stream (SSE, lewat stream_hub) dan /ws/chat (WebSocket).
+    `background_tasks` cukup punya add_task(fn, **kwargs).
     """
-    req.session_id = req.session_id or str(uuid.uuid4())
-    user_role = req.user_role or "Employee"
+    # ── Buat Langfuse root trace PERTAMA, sebelum apapun ────────────────
+    # Ini memastikan intent classification & semua sub-proses otomatis nested
+    _lf_obs_cm = None
+    _lf_attr_cm = None
+    _lf_span = None
+    # ⏳ Budget waktu end-to-end untuk stream ini (diteruskan ke ChatService / RAG / HR)
+    deadline = Deadline(REQUEST_DEADLINE_SECONDS, label=f"stream:{req.session_id[:8]}")
+    # 🛑 Token terikat ke task producer: pesan baru / Stop → cancel seketika,
+    # client putus → cancel setelah grace period kalau tidak di-resume (stream_hub)
+    token.bind()
+    try:
+        from app.langfuse_client import langfuse, LANGFUSE_ENABLED  # type: ignore
+        if LANGFUSE_ENABLED and langfuse:
+            _lf_obs_cm = langfuse.start_as_current_observation(
+                name="chat_interaction",
+                input={"question": req.question, "user_role": user_role},
+            )
+            _lf_span = _lf_obs_cm.__enter__()
+            from langfuse import propagate_attributes as _lf_propagate_attributes
+            _lf_attr_cm = _lf_propagate_attributes(
+                trace_name="denai_chat",
+                user_id=str(user_role),
+                session_id=str(req.session_id),
+                tags=[],
+            )
+            _lf_attr_cm.__enter__()
+    except Exception:
+        pass
 
-    async def generate():
-        # ── Buat Langfuse root trace PERTAMA, sebelum apapun ────────────────
-        # Ini memastikan intent classification & semua sub-proses otomatis nested
-        _lf_obs_cm = None
-        _lf_attr_cm = None
-        _lf_span = None
-        try:
-            from app.langfuse_client import langfuse, LANGFUSE_ENABLED  # type: ignore
-            if LANGFUSE_ENABLED and langfuse:
-                _lf_obs_cm = langfuse.start_as_current_observation(
-                    name="chat_interaction",
-                    input={"question": req.question, "user_role": user_role},
-                )
-                _lf_span = _lf_obs_cm.__enter__()
-                from langfuse import propagate_attributes as _lf_propagate_attributes
-                _lf_attr_cm = _lf_propagate_attributes(
-                    trace_name="denai_chat",
-                    user_id=str(user_role),
-                    session_id=str(req.session_id),
-                    tags=[],
+    try:
+        history = await get_hybrid_history(req.session_id, limit=4)
+        # Buang seluruh exchange greeting (user message + [GREETING_CARD])
+        # agar LLM kontekstualisasi tidak salah tebak dari pesan "halo"
+        _clean_history = []
+        for _h in history:
+            if _h.get("message") == "[GREETING_CARD]":
+                # Buang juga pesan user yang tepat sebelumnya (pasangan greeting)
+                if _clean_history and _clean_history[-1].get("role") in ("user", "human"):
+                    _clean_history.pop()
+                continue
+            _clean_history.append(_h)
+        history = _clean_history
+        # Load user context dari SINTA (jika ada), override role jika perlu
+        from backend.services.user_context import get_user_context_async as _get_user_ctx, set_user_context_async as _set_user_ctx
+        _user_ctx = await _get_user_ctx(req.session_id)
+
+        # Kalau session store kosong (sesi lama / akses langsung) tapi frontend kirim context, pakai itu
+        if _user_ctx is None and req.user_context:
+            _user_ctx = req.user_context
+            await _set_user_ctx(req.session_id, req.user_context)  # cache untuk query berikutnya
+            logger.info(f"♻️ User context di-restore dari payload | session={req.session_id[:8]}...")
+
+        # Setup session — sertakan NIK agar sesi tercatat milik user ini di Supabase
+        _nik = (_user_ctx or {}).get("nik") or (req.user_context or {}).get("nik", "") if isinstance(req.user_context, dict) else ""
+        await setup_hybrid_session(req.session_id, req.question, nik=_nik)
+
+        _effective_role = user_role  # variable baru agar tidak trigger UnboundLocalError
+        if _user_ctx and _effective_role.lower() in ['employee', 'karyawan']:
+            _effective_role = _user_ctx.get("role", _effective_role)
+
+        # Intent classification — only for greeting/casual_chat detection
+        from backend.services.chat_service import (
+            classify_intent_unified,
+            GREETING_RESPONSE,
+            CASUAL_CHAT_RESPONSE,
+            columnar_table,
+        )
+        intent = await classify_intent_unified(req.question, history)
+
+        is_hr_user = _effective_role.lower() in ['hr', 'admin', 'manager', 'hc']
+
+        # Handle greeting / casual_chat — return template directly, skip RAG entirely
+        if intent in ("greeting", "casual_chat"):
+            answer = GREETING_RESPONSE if intent == "greeting" else CASUAL_CHAT_RESPONSE
+            if _lf_span:
+                try:
+                    _lf_span.update(output={"answer": answer[:500]})
+                except Exception:
+                    pass
+            # Simpan marker khusus agar history loading bisa re-render greeting card
+            _db_answer = "[GREETING_CARD]" if intent == "greeting" else answer
+            await save_hybrid_turn(req.session_id, req.question, _db_answer)
+            trace_id = None
+            if _lf_span:
+                try:
+                    trace_id = _lf_span.trace_id
+                except Exception:
+                    pass
+            yield {'type': 'done', 'answer': answer, 'message_type': intent, 'session_id': req.session_id, 'authorized': True, 'trace_id': trace_id}
+            return
+
+        # ── HR user: always A+B parallel ────────────────────────────────
+        if is_hr_user:
+            routing = None
+            try:
+                routing = await chat_service.run_ab_parallel_for_stream(
+                    question=req.question,
+                    user_role=_effective_role,
+                    session_id=req.session_id,
+                    history=history,
+                    mode="chat",
+                    cancellation_check=token,
+                    deadline=deadline,
                 )
-                _lf_attr_cm.__enter__()
-        except Exception:
-            pass
+            except Exception as _rt_err:
+                logger.warning(f"⚠️ HR routing failed, fallback: {_rt_err}")
 
-        try:
-            history = await get_hybrid_history(req.session_id, limit=4)
-            # Buang seluruh exchange greeting (user message + [GREETING_CARD])
-            # agar LLM kontekstualisasi tidak salah tebak dari pesan "halo"
-            _clean_history = []
-            for _h in history:
-                if _h.get("message") == "[GREETING_CARD]":
-                    # Buang juga pesan user yang tepat sebelumnya (pasangan greeting)
-                    if _clean_history and _clean_history[-1].get("role") in ("user", "human"):
-                        _clean_history.pop()
-                    continue
-                _clean_history.append(_h)
-            history = _clean_history
-            # Load user context dari SINTA (jika ada), override role jika perlu
-            from backend.services.user_context import get_user_context as _get_user_ctx, set_user_context as _set_user_ctx
-            _user_ctx = _get_user_ctx(req.session_id)
-
-            # Kalau session store kosong (sesi lama / akses langsung) tapi frontend kirim context, pakai itu
-            if _user_ctx is None and req.user_context:
-                _user_ctx = req.user_context
-                _set_user_ctx(req.session_id, req.user_context)  # cache untuk query berikutnya
-                logger.info(f"♻️ User context di-restore dari payload | session={req.session_id[:8]}...")
-
-            # Setup session — sertakan NIK agar sesi tercatat milik user ini di Supabase
-            _nik = (_user_ctx or {}).get("nik") or (req.user_context or {}).get("nik", "") if isinstance(req.user_context, dict) else ""
-            await setup_hybrid_session(req.session_id, req.question, nik=_nik)
-
-            _effective_role = user_role  # variable baru agar tidak trigger UnboundLocalError
-            if _user_ctx and _effective_role.lower() in ['employee', 'karyawan']:
-                _effective_role = _user_ctx.get("role", _effective_role)
-
-            # Intent classification — only for greeting/casual_chat detection
-            from backend.services.chat_service import (
-                classify_intent_unified,
-                GREETING_RESPONSE,
-                CASUAL_CHAT_RESPONSE,
-            )
-            intent = await classify_intent_unified(req.question, history)
+            _NOT_FOUND_CODE = "[DATA_TIDAK_DITEMUKAN_DI_SOP]"
+            _FRIENDLY_MSG = "Maaf, informasi mengenai topik yang Anda tanyakan belum tersedia dalam dokumen SOP dan kebijakan perusahaan yang ada saat ini. Silakan hubungi tim HR untuk informasi lebih lanjut."
 
-            is_hr_user = _effective_role.lower() in ['hr', 'admin', 'manager', 'hc']
+            if routing and routing.get("mode") == "ab":
+                if _lf_span:
+                    try: _lf_span.update(tags=["skd", "data_hr"])
+                    except Exception: pass
+                full_response = ""
+                async for chunk in chat_service._synthesize_results_stream(
+                    question=routing["standalone_question"],
+                    answer_a=routing["answer_a"],
+                    answer_b=routing["answer_b_content"],
+                ):
+                    full_response += chunk
+                    yield {'type': 'token', 'content': chunk}
 
-            # Handle greeting / casual_chat — return template directly, skip RAG entirely
-            if intent in ("greeting", "casual_chat"):
-                answer = GREETING_RESPONSE if intent == "greeting" else CASUAL_CHAT_RESPONSE
                 if _lf_span:
-                    try:
-                        _lf_span.update(output={"answer": answer[:500]})
-                    except Exception:
-                        pass
-                await save_hybrid_message(req.session_id, "user", req.question)
-                # Simpan marker khusus agar history loading bisa re-render greeting card
-                _db_answer = "[GREETING_CARD]" if intent == "greeting" else answer
-                await save_hybrid_message(req.session_id, "assistant", _db_answer)
+                    try: _lf_span.update(output={"answer": full_response[:500]})
+                    except Exception: pass
+                _ab_base = routing.get("result_base") or {}
+                _ab_data = _ab_base.get("data") or {}
+                _ab_payload = {
+                    "columns": _ab_data.get("columns", []),
+                    "rows": _ab_data.get("rows", []),
+                    "sql_query": _ab_base.get("sql_query", ""),
+                    "sql_explanation": _ab_base.get("sql_explanation", ""),
+                    "query": routing.get("standalone_question", req.question),
+                    "turn_id": _ab_base.get("turn_id", ""),
+                    "visualization_available": _ab_base.get("visualization_available", False),
+                    "chart_hints": _ab_base.get("chart_hints") or [],
+                }
+                _ab_marker = await artifact_store.put(req.session_id, _ab_payload, _ab_base.get("turn_id", ""))
+                await save_hybrid_turn(req.session_id, req.question, full_response + _ab_marker)
                 trace_id = None
                 if _lf_span:
+                    try: trace_id = _lf_span.trace_id
+                    except Exception: pass
+                if trace_id:
+                    background_tasks.add_task(evaluate_interaction_background, trace_id=trace_id, question=req.question, context=routing["eval_ctx"], answer=full_response)
+                result_base = routing["result_base"]
+                result_base["answer"] = full_response
+                # HC topic tracking (ab = SOP + analytics — classify dari standalone_question)
+                _hc_topic = _quick_topic_classify(routing.get("standalone_question", req.question))
+                if _hc_topic:
                     try:
-                        trace_id = _lf_span.trace_id
-                    except Exception:
-                        pass
-                yield f"data: {json.dumps({'type': 'done', 'answer': answer, 'message_type': intent, 'session_id': req.session_id, 'authorized': True, 'trace_id': trace_id})}\n\n"
+                        from memory.memory_hybrid import redis_client, REDIS_AVAILABLE
+                        if REDIS_AVAILABLE and redis_client:
+                            await redis_client.zincrby("denai:topic_freq:hc", 1, _hc_topic)
+                    except Exception: pass
+                yield {'type': 'done', 'session_id': req.session_id, 'authorized': True, 'trace_id': trace_id, 'message_type': result_base.get('message_type'), 'data': columnar_table(result_base.get('data')), 'turn_id': result_base.get('turn_id'), 'conversation_id': result_base.get('conversation_id'), 'visualization_available': result_base.get('visualization_available', False), 'chart_hints': result_base.get('chart_hints'), 'sql_query': result_base.get('sql_query'), 'sql_explanation': result_base.get('sql_explanation')}
                 return
 
-            # ── HR user: always A+B parallel ────────────────────────────────
-            if is_hr_user:
-                routing = None
-                try:
-                    routing = await chat_service.run_ab_parallel_for_stream(
-                        question=req.question,
-                        user_role=_effective_role,
-                        session_id=req.session_id,
-                        history=history,
-                        mode="chat",
-                        cancellation_check=lambda: request.is_disconnected(),
-                    )
-                except Exception as _rt_err:
-                    logger.warning(f"⚠️ HR routing failed, fallback: {_rt_err}")
-
-                _NOT_FOUND_CODE = "[DATA_TIDAK_DITEMUKAN_DI_SOP]"
-                _FRIENDLY_MSG = "Maaf, informasi mengenai topik yang Anda tanyakan belum tersedia dalam dokumen SOP dan kebijakan perusahaan yang ada saat ini. Silakan hubungi tim HR untuk informasi lebih lanjut."
-
-                if routing and routing.get("mode") == "ab":
-                    if _lf_span:
-                        try: _lf_span.update(tags=["skd", "data_hr"])
-                        except Exception: pass
-                    full_response = ""
-                    async for chunk in chat_service._synthesize_results_stream(
-                        question=routing["standalone_question"],
-                        answer_a=routing["answer_a"],
-                        answer_b=routing["answer_b_content"],
-                    ):
-                        full_response += chunk
-                        yield f"data: {json.dumps({'type': 'token', 'content': chunk})}\n\n"
-
-                    if _lf_span:
-                        try: _lf_span.update(output={"answer": full_response[:500]})
-                        except Exception: pass
-                    await save_hybrid_message(req.session_id, "user", req.question)
-                    _ab_base = routing.get("result_base") or {}
-                    _ab_data = _ab_base.get("data") or {}
-                    _ab_payload_json = json.dumps({
-                        "columns": _ab_data.get("columns", []),
-                        "rows": _ab_data.get("rows", []),
-                        "sql_query": _ab_base.get("sql_query", ""),
-                        "sql_explanation": _ab_base.get("sql_explanation", ""),
-                        "query": routing.get("standalone_question", req.question),
-                        "turn_id": _ab_base.get("turn_id", ""),
-                        "visualization_available": _ab_base.get("visualization_available", False),
-                        "chart_hints": _ab_base.get("chart_hints") or [],
-                    })
-                    _ab_hidden_span = f'<span class="denai-hidden-payload" data-payload="{urllib.parse.quote(_ab_payload_json)}" style="display:none"></span>'
-                    await save_hybrid_message(req.session_id, "assistant", full_response + _ab_hidden_span)
-                    trace_id = None
-                    if _lf_span:
-                        try: trace_id = _lf_span.trace_id
-                        except Exception: pass
-                    if trace_id:
-                        background_tasks.add_task(evaluate_interaction_background, trace_id=trace_id, question=req.question, context=routing["eval_ctx"], answer=full_response)
-                    result_base = routing["result_base"]
-                    result_base["answer"] = full_response
-                    # HC topic tracking (ab = SOP + analytics — classify dari standalone_question)
-                    _hc_topic = _quick_topic_classify(routing.get("standalone_question", req.question))
-                    if _hc_topic:
-                        try:
-                            from memory.memory_hybrid import redis_client, REDIS_AVAILABLE
-                            if REDIS_AVAILABLE and redis_client:
-                                await redis_client.zincrby("denai:topic_freq:hc", 1, _hc_topic)
-                        except Exception: pass
-                    yield f"data: {json.dumps({'type': 'done', 'session_id': req.session_id, 'authorized': True, 'trace_id': trace_id, 'message_type': result_base.get('message_type'), 'data': result_base.get('data'), 'turn_id': result_base.get('turn_id'), 'conversation_id': result_base.get('conversation_id'), 'visualization_available': result_base.get('visualization_available', False), 'chart_hints': result_base.get('chart_hints'), 'sql_query': result_base.get('sql_query'), 'sql_explanation': result_base.get('sql_explanation')})}\n\n"
-                    return
-
-                elif routing and routing.get("mode") == "a_only":
-                    result = routing["result_a"]
-                    answer = result.get("answer", "")
-                    if _NOT_FOUND_CODE in answer:
-                        answer = _FRIENDLY_MSG
-                    if _lf_span:
-                        try: _lf_span.update(tags=["skd"], output={"answer": answer[:500]})
-                        except Exception: pass
-                    await save_hybrid_message(req.session_id, "user", req.question)
-                    await save_hybrid_message(req.session_id, "assistant", answer)
-                    trace_id = None
-                    if _lf_span:
-                        try: trace_id = _lf_span.trace_id
-                        except Exception: pass
-                    # HC topic tracking (a_only = SOP only)
-                    _hc_topic = _quick_topic_classify(routing.get("standalone_question", req.question))
-                    if _hc_topic:
-                        try:
-                            from memory.memory_hybrid import redis_client, REDIS_AVAILABLE
-                            if REDIS_AVAILABLE and redis_client:
-                                await redis_client.zincrby("denai:topic_freq:hc", 1, _hc_topic)
-                        except Exception: pass
-                    # Stream answer in chunks agar ada efek typing (RAG sudah selesai duluan)
-                    import asyncio as _asyncio
-                    for i in range(0, len(answer), 12):
-                        yield f"data: {json.dumps({'type': 'token', 'content': answer[i:i+12]})}\n\n"
-                        await _asyncio.sleep(0.008)
-                    yield f"data: {json.dumps({'type': 'done', 'session_id': req.session_id, 'authorized': True, 'trace_id': trace_id})}\n\n"
-                    return
-
-                elif routing and routing.get("mode") == "b_only":
-                    result = routing["result_b"]
-                    answer = result.get("answer", "")
-                    if _lf_span:
-                        try:
-                            _lf_span.update(tags=["data_hr"], output={"answer": answer[:500]})
-                            result["trace_id"] = _lf_span.trace_id
-                        except Exception: pass
-                    await save_hybrid_message(req.session_id, "user", req.question)
-                    _b_data = result.get("data") or {}
-                    _b_payload_json = json.dumps({
-                        "columns": _b_data.get("columns", []), "rows": _b_data.get("rows", []),
-                        "sql_query": result.get("sql_query", ""), "sql_explanation": result.get("sql_explanation", ""),
-                        "query": routing.get("query_for_b", answer), "turn_id": result.get("turn_id", ""),
-                        "visualization_available": result.get("visualization_available", False),
-                        "chart_hints": result.get("chart_hints") or [],
-                    })
-                    _b_hidden_span = f'<span class="denai-hidden-payload" data-payload="{urllib.parse.quote(_b_payload_json)}" style="display:none"></span>'
-                    await save_hybrid_message(req.session_id, "assistant", answer + _b_hidden_span)
-                    b_trace_id = result.get("trace_id")
-                    if b_trace_id:
-                        background_tasks.add_task(evaluate_interaction_background, trace_id=b_trace_id, question=req.question, context=answer, answer=answer)
-                    # HC topic tracking (b_only = analytics — classify dari pertanyaan)
-                    _hc_topic = _quick_topic_classify(routing.get("query_for_b", req.question))
-                    if _hc_topic:
-                        try:
-                            from memory.memory_hybrid import redis_client, REDIS_AVAILABLE
-                            if REDIS_AVAILABLE and redis_client:
-                                await redis_client.zincrby("denai:topic_freq:hc", 1, _hc_topic)
-                        except Exception: pass
-                    # Stream teks jawaban dulu, baru kirim done dengan data analytics
-                    import asyncio as _asyncio
-                    for i in range(0, len(answer), 12):
-                        yield f"data: {json.dumps({'type': 'token', 'content': answer[i:i+12]})}\n\n"
-                        await _asyncio.sleep(0.008)
-                    yield f"data: {json.dumps({'type': 'done', 'session_id': req.session_id, 'authorized': True, 'message_type': result.get('message_type'), 'data': result.get('data'), 'trace_id': result.get('trace_id'), 'turn_id': result.get('turn_id'), 'conversation_id': result.get('conversation_id'), 'visualization_available': result.get('visualization_available', False), 'chart_hints': result.get('chart_hints'), 'sql_query': result.get('sql_query'), 'sql_explanation': result.get('sql_explanation')})}\n\n"
-                    return
-
-                else:
-                    # routing is None — both A and B failed for HR user
-                    logger.warning("⚠️ HR A+B both failed — returning not-found")
-                    await save_hybrid_message(req.session_id, "user", req.question)
-                    await save_hybrid_message(req.session_id, "assistant", _FRIENDLY_MSG)
-                    if _lf_span:
-                        try: _lf_span.update(output={"answer": "not_found"})
-                        except Exception: pass
-                    yield f"data: {json.dumps({'type': 'done', 'answer': _FRIENDLY_MSG, 'session_id': req.session_id, 'authorized': True})}\n\n"
-                    return
-
-            # ── Employee: Route A only (SOP stream) ─────────────────────────
-            # SOP (intent A): stream dari RAG engine
-            if _lf_span:
-                try: _lf_span.update(tags=["skd"])
-                except Exception: pass
-            from engines.sop.rag_engine import answer_question_stream as rag_stream
-
-            # Contextualize question with history before streaming to RAG
-            sop_question = await chat_service._smart_contextualize(req.question, history)
-
-            # Inject band + lokasi untuk karyawan agar jawaban UPD/tunjangan akurat
-            if _user_ctx:
-                _ctx_parts = []
-                _fn = _user_ctx.get("first_name") or _user_ctx.get("nama", "")
-                _bd = _user_ctx.get("band_angka", "")
-                _lk = _user_ctx.get("lokasi", "")
-                if _fn: _ctx_parts.append(f"Nama: {_fn}")
-                # Hanya inject band jika valid angka positif — "0"/"-"/kosong → skip
-                if _bd and str(_bd).strip().isdigit() and int(_bd) > 0:
-                    _ctx_parts.append(f"Band: {_bd}")
-                if _lk: _ctx_parts.append(f"Lokasi saat ini: {_lk}")
-                if _ctx_parts:
-                    sop_question = f"[{', '.join(_ctx_parts)}] {sop_question}"
-
-            full_response = ""
-            rag_out = {}   # will be populated with {"context": context_str} by rag_stream
-            _NOT_FOUND_CODE = "[DATA_TIDAK_DITEMUKAN_DI_SOP]"
-            _FRIENDLY_MSG = "Informasi Tidak Ditemukan|Maaf, informasi mengenai topik yang Anda tanyakan belum tersedia dalam dokumen SOP dan kebijakan perusahaan kami saat ini. Silakan hubungi tim HR untuk mendapatkan bantuan lebih lanjut."
-            _sentinel_detected = False
-            async for chunk in rag_stream(
-                sop_question, req.session_id,
-                lambda: request.is_disconnected(),
-                out_context=rag_out,
-            ):
-                full_response += chunk
-                # As soon as sentinel appears, stop forwarding tokens to client
-                if not _sentinel_detected and _NOT_FOUND_CODE in full_response:
-                    _sentinel_detected = True
-                    # Clear any partial sentinel text already sent to client
-                    yield f"data: {json.dumps({'type': 'stream_clear'})}\n\n"
-                if not _sentinel_detected:
-                    yield f"data: {json.dumps({'type': 'token', 'content': chunk})}\n\n"
-
-            if _NOT_FOUND_CODE in full_response:
-                full_response = _FRIENDLY_MSG
+            elif routing and routing.get("mode") == "a_only":
+                # Real streaming dari RAG — token diteruskan begitu keluar dari LLM
+                answer = ""
+                _sentinel_detected = False
+                async for event in routing["stream"]:
+                    answer += event.get("content", "")
+                    if not _sentinel_detected and _NOT_FOUND_CODE in answer:
+                        _sentinel_detected = True
+                        yield {'type': 'stream_clear'}
+                    if not _sentinel_detected:
+                        yield event
+                if _NOT_FOUND_CODE in answer:
+                    answer = _FRIENDLY_MSG
+                if _lf_span:
+                    try: _lf_span.update(tags=["skd"], output={"answer": answer[:500]})
+                    except Exception: pass
+                await save_hybrid_turn(req.session_id, req.question, answer)
+                trace_id = None
+                if _lf_span:
+                    try: trace_id = _lf_span.trace_id
+                    except Exception: pass
+                # HC topic tracking (a_only = SOP only)
+                _hc_topic = _quick_topic_classify(routing.get("standalone_question", req.question))
+                if _hc_topic:
+                    try:
+                        from memory.memory_hybrid import redis_client, REDIS_AVAILABLE
+                        if REDIS_AVAILABLE and redis_client:
+                            await redis_client.zincrby("denai:topic_freq:hc", 1, _hc_topic)
+                    except Exception: pass
+                _a_done: dict = {'type': 'done', 'session_id': req.session_id, 'authorized': True, 'trace_id': trace_id}
+                if _sentinel_detected:
+                    _a_done['answer'] = _FRIENDLY_MSG
+                _a_chunks = _parse_source_chunks((routing.get("rag_out") or {}).get("context", ""))
+                if _a_chunks:
+                    _a_done['source_chunks'] = _a_chunks
+                yield _a_done
+                return
 
-            if _lf_span:
-                try:
-                    _lf_span.update(output={"answer": full_response[:500]})
-                except Exception:
-                    pass
+            elif routing and routing.get("mode") == "b_only":
+                result = routing["result_b"]
+                # Metadata tabel dulu, rows per batch (table_rows), lalu narasi — done tanpa rows
+                answer = ""
+                async for event in routing["stream"]:
+                    answer += event.get("content", "") if event.get("type") == "token" else ""
+                    yield event
+                if _lf_span:
+                    try:
+                        _lf_span.update(tags=["data_hr"], output={"answer": answer[:500]})
+                        result["trace_id"] = _lf_span.trace_id
+                    except Exception: pass
+                _b_data = result.get("data") or {}
+                _b_payload = {
+                    "columns": _b_data.get("columns", []), "rows": _b_data.get("rows", []),
+                    "sql_query": result.get("sql_query", ""), "sql_explanation": result.get("sql_explanation", ""),
+                    "query": routing.get("query_for_b", answer), "turn_id": result.get("turn_id", ""),
+                    "visualization_available": result.get("visualization_available", False),
+                    "chart_hints": result.get("chart_hints") or [],
+                }
+                _b_marker = await artifact_store.put(req.session_id, _b_payload, result.get("turn_id", ""))
+                await save_hybrid_turn(req.session_id, req.question, answer + _b_marker)
+                b_trace_id = result.get("trace_id")
+                if b_trace_id:
+                    background_tasks.add_task(evaluate_interaction_background, trace_id=b_trace_id, question=req.question, context=answer, answer=answer)
+                # HC topic tracking (b_only = analytics — classify dari pertanyaan)
+                _hc_topic = _quick_topic_classify(routing.get("query_for_b", req.question))
+                if _hc_topic:
+                    try:
+                        from memory.memory_hybrid import redis_client, REDIS_AVAILABLE
+                        if REDIS_AVAILABLE and redis_client:
+                            await redis_client.zincrby("denai:topic_freq:hc", 1, _hc_topic)
+                    except Exception: pass
+                yield {'type': 'done', 'session_id': req.session_id, 'authorized': True, 'message_type': result.get('message_type'), 'data': columnar_table(result.get('data'), rows_streamed=True), 'trace_id': result.get('trace_id'), 'turn_id': result.get('turn_id'), 'conversation_id': result.get('conversation_id'), 'visualization_available': result.get('visualization_available', False), 'chart_hints': result.get('chart_hints'), 'sql_query': result.get('sql_query'), 'sql_explanation': result.get('sql_explanation')}
+                return
 
-            await save_hybrid_message(req.session_id, "user", req.question)
-            await save_hybrid_message(req.session_id, "assistant", full_response)
+            else:
+                # routing is None — both A and B failed for HR user
+                logger.warning("⚠️ HR A+B both failed — returning not-found")
+                await save_hybrid_turn(req.session_id, req.question, _FRIENDLY_MSG)
+                if _lf_span:
+                    try: _lf_span.update(output={"answer": "not_found"})
+                    except Exception: pass
+                yield {'type': 'done', 'answer': _FRIENDLY_MSG, 'session_id': req.session_id, 'authorized': True}
+                return
 
-            trace_id = None
-            if _lf_span:
-                try: trace_id = _lf_span.trace_id
-                except Exception: pass
+        # ── Employee: Route A only (SOP stream) ─────────────────────────
+        # SOP (intent A): stream dari RAG engine
+        if _lf_span:
+            try: _lf_span.update(tags=["skd"])
+            except Exception: pass
+        from engines.sop.rag_engine import answer_question_stream as rag_stream
+
+        # Contextualize question with history before streaming to RAG
+        sop_question = await chat_service._smart_contextualize(req.question, history)
+
+        # Inject band + lokasi untuk karyawan agar jawaban UPD/tunjangan akurat.
+        # Nama TIDAK di-inject: band + lokasi adalah satu-satunya slot personalisasi
+        # yang mengubah isi jawaban, sehingga pertanyaan identik bisa di-coalesce.
+        _flight_question = sop_question
+        _bd_slot, _lk_slot = "", ""
+        if _user_ctx:
+            _ctx_parts = []
+            _bd = _user_ctx.get("band_angka", "")
+            _lk = _user_ctx.get("lokasi", "")
+            # Hanya inject band jika valid angka positif — "0"/"-"/kosong → skip
+            if _bd and str(_bd).strip().isdigit() and int(_bd) > 0:
+                _ctx_parts.append(f"Band: {_bd}")
+                _bd_slot = str(_bd).strip()
+            if _lk:
+                _ctx_parts.append(f"Lokasi saat ini: {_lk}")
+                _lk_slot = _lk
+            if _ctx_parts:
+                sop_question = f"[{', '.join(_ctx_parts)}] {sop_question}"
+
+        full_response = ""
+        rag_out = {}   # will be populated with {"context": context_str} by rag_stream
+        _NOT_FOUND_CODE = "[DATA_TIDAK_DITEMUKAN_DI_SOP]"
+        _FRIENDLY_MSG = "Informasi Tidak Ditemukan|Maaf, informasi mengenai topik yang Anda tanyakan belum tersedia dalam dokumen SOP dan kebijakan perusahaan kami saat ini. Silakan hubungi tim HR untuk mendapatkan bantuan lebih lanjut."
+        _sentinel_detected = False
+        # Single-flight: request identik (pertanyaan kanonik + band + lokasi) menempel
+        # ke pipeline leader. Disconnect klien ini hanya melepas subscriber-nya.
+        from backend.services.single_flight import sop_single_flight, make_flight_key
+        _flight_key = make_flight_key(_flight_question, band=_bd_slot, lokasi=_lk_slot)
+
+        def _sop_producer(_ctx, _cancel_check):
+            return rag_stream(sop_question, req.session_id, _cancel_check, out_context=_ctx, deadline=deadline)
+
+        async for chunk in sop_single_flight.stream(_flight_key, _sop_producer, out_context=rag_out, cancellation_check=token):
+            full_response += chunk
+            # As soon as sentinel appears, stop forwarding tokens to client
+            if not _sentinel_detected and _NOT_FOUND_CODE in full_response:
+                _sentinel_detected = True
+                # Clear any partial sentinel text already sent to client
+                yield {'type': 'stream_clear'}
+            if not _sentinel_detected:
+                yield {'type': 'token', 'content': chunk}
+
+        if _NOT_FOUND_CODE in full_response:
+            full_response = _FRIENDLY_MSG
 
-            if trace_id:
-                background_tasks.add_task(
-                    evaluate_interaction_background,
-                    trace_id=trace_id,
-                    question=req.question,
-                    context=rag_out.get("context", full_response),  # actual RAG chunks
-                    answer=full_response,
-                )
+        if _lf_span:
+            try:
+                _lf_span.update(output={"answer": full_response[:500]})
+            except Exception:
+                pass
 
-            # Parse RAG chunks dan sertakan di done payload
-            source_chunks = []
-            _ctx_str = rag_out.get("context", "")
-            if _ctx_str:
-                import re as _re
-                for _m in _re.finditer(
-                    r'<dokumen id="(\d+)" file="([^"]*)" bab="([^"]*)">\n?(.*?)\n?</dokumen>',
-                    _ctx_str, _re.DOTALL
-                ):
-                    source_chunks.append({
-                        "id":   int(_m.group(1)),
-                        "file": _m.group(2).strip(),
-                        "bab":  _m.group(3).strip(),
-                        "text": _m.group(4).strip(),
-                    })
-
-            done_payload: dict = {'type': 'done', 'session_id': req.session_id, 'authorized': True, 'trace_id': trace_id}
-            if _sentinel_detected:
-                done_payload['answer'] = _FRIENDLY_MSG
-            if source_chunks:
-                done_payload['source_chunks'] = source_chunks
-
-            # Simpan frekuensi topic ke Redis (untuk greeting suggestions — bucket employee)
-            _sop_topic = rag_out.get("sop_topic", "")
-            if _sop_topic and _sop_topic not in ("general", ""):
-                try:
-                    from memory.memory_hybrid import redis_client, REDIS_AVAILABLE
-                    if REDIS_AVAILABLE and redis_client:
-                        await redis_client.zincrby("denai:topic_freq:employee", 1, _sop_topic)
-                except Exception as _te:
-                    logger.debug(f"Topic freq save skipped: {_te}")
+        await save_hybrid_turn(req.session_id, req.question, full_response)
 
-            yield f"data: {json.dumps(done_payload)}\n\n"
+        trace_id = None
+        if _lf_span:
+            try: trace_id = _lf_span.trace_id
+            except Exception: pass
 
-        except asyncio.CancelledError:
-            yield f"data: {json.dumps({'type': 'cancelled'})}\n\n"
-        except Exception as e:
-            logger.error(f"❌ Stream endpoint error: {e}", exc_info=True)
-            # Deteksi rate limit OpenAI secara spesifik
-            _is_rate_limit = (
-                "rate_limit" in str(e).lower() or
-                "429" in str(e) or
-                type(e).__name__ == "RateLimitError"
+        if trace_id:
+            background_tasks.add_task(
+                evaluate_interaction_background,
+                trace_id=trace_id,
+                question=req.question,
+                context=rag_out.get("context", full_response),  # actual RAG chunks
+                answer=full_response,
             )
-            if _is_rate_limit:
-                yield f"data: {json.dumps({'type': 'error', 'error_code': 'rate_limit', 'message': 'rate_limit'})}\n\n"
-            else:
-                yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
-        finally:
-            # Tutup Langfuse context managers (urutan terbalik)
-            if _lf_attr_cm is not None:
-                try: _lf_attr_cm.__exit__(None, None, None)
-                except Exception: pass
-            if _lf_obs_cm is not None:
-                try: _lf_obs_cm.__exit__(None, None, None)
-                except Exception: pass
 
+        # Parse RAG chunks dan sertakan di done payload
+        source_chunks = _parse_source_chunks(rag_out.get("context", ""))
+
+        done_payload: dict = {'type': 'done', 'session_id': req.session_id, 'authorized': True, 'trace_id': trace_id}
+        if _sentinel_detected:
+            done_payload['answer'] = _FRIENDLY_MSG
+        if source_chunks:
+            done_payload['source_chunks'] = source_chunks
+
+        # Simpan frekuensi topic ke Redis (untuk greeting suggestions — bucket employee)
+        _sop_topic = rag_out.get("sop_topic", "")
+        if _sop_topic and _sop_topic not in ("general", ""):
+            try:
+                from memory.memory_hybrid import redis_client, REDIS_AVAILABLE
+                if REDIS_AVAILABLE and redis_client:
+                    await redis_client.zincrby("denai:topic_freq:employee", 1, _sop_topic)
+            except Exception as _te:
+                logger.debug(f"Topic freq save skipped: {_te}")
+
+        yield done_payload
+
+    except asyncio.CancelledError:
+        yield {'type': 'cancelled'}
+    except Exception as e:
+        logger.error(f"❌ Stream endpoint error: {e}", exc_info=True)
+        # Deteksi rate limit OpenAI secara spesifik
+        _is_rate_limit = (
+            "rate_limit" in str(e).lower() or
+            "429" in str(e) or
+            type(e).__name__ == "RateLimitError"
+        )
+        if _is_rate_limit:
+            yield {'type': 'error', 'error_code': 'rate_limit', 'message': 'rate_limit'}
+        else:
+            yield {'type': 'error', 'message': str(e)}
+    finally:
+        deadline.log_summary()
+        request_registry.finish(req.session_id, token)
+        # Tutup Langfuse context managers (urutan terbalik)
+        if _lf_attr_cm is not None:
+            try: _lf_attr_cm.__exit__(None, None, None)
+            except Exception: pass
+        if _lf_obs_cm is not None:
+            try: _lf_obs_cm.__exit__(None, None, None)
+            except Exception: pass
+
+
+@router.post("/ask/stream")
+@limiter.limit(ASK_STREAM_RATE_LIMIT)
+async def ask_question_stream(
+    request: Request,
+    req: QuestionRequest,
+    background_tasks: BackgroundTasks,
+):
+    """
+    SSE streaming endpoint for SOP queries.
+    Emits: {"type":"token","content":"..."} per chunk
+           {"type":"done","session_id":"...","authorized":true} on completion
+           {"type":"error","message":"..."} on failure
+    Non-SOP intents (greeting/casual/HR analytics) are returned as a single "done" event.
+    """
+    req.session_id = req.session_id or str(uuid.uuid4())
+    user_role = req.user_role or "Employee"
+
+    token = await request_registry.start(req.session_id, label=f"stream:{req.session_id[:8]}")
+    stream_id = token.request_id
+    # Pipeline jalan sebagai producer terpisah; koneksi ini hanya subscriber buffer
+    # sehingga reconnect (Last-Event-ID) bisa replay + lanjut live tanpa hitung ulang
+    stream_hub.start(
+        stream_id,
+        stream_chat_events(req, user_role, token, background_tasks),
+        on_orphan=lambda: token.cancel("client_disconnected"),
+    )
+
+    # Token di-coalesce per frame; encoding JSON (orjson) atau CBOR kalau diminta frontend
+    writer = SSEWriter(binary=wants_cbor(request), label=f"stream:{req.session_id[:8]}")
     return StreamingResponse(
-        generate(),
-        media_type="text/event-stream",
-        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        writer.stream(stream_hub.subscribe(stream_id)),
+        media_type=writer.media_type,
+        headers={**SSE_HEADERS, "X-Stream-Id": stream_id},
+    )
+
+
+@router.get("/ask/stream/resume")
+@limiter.limit("30/minute")
+async def resume_question_stream(request: Request, last_event_id: Optional[str] = None):
+    """
+    Lanjutkan stream /ask/stream yang terputus. Header `Last-Event-ID`
+    (atau query `last_event_id`) berisi id event terakhir yang diterima client:
+    event setelahnya di-replay dari buffer lalu stream berlanjut live —
+    dari worker mana pun (buffer di-mirror ke Redis).
+    """
+    parsed = parse_event_id(request.headers.get("Last-Event-ID") or last_event_id)
+    if parsed is None:
+        return JSONResponse(status_code=400, content={"error": "invalid_last_event_id"})
+    stream_id, after_seq = parsed
+    if not await stream_hub.exists(stream_id):
+        return JSONResponse(status_code=404, content={"error": "stream_expired"})
+    logger.info(f"🔁 Resume stream {stream_id[:8]} setelah event #{after_seq}")
+    writer = SSEWriter(binary=wants_cbor(request), label=f"resume:{stream_id[:8]}")
+    return StreamingResponse(
+        writer.stream(stream_hub.subscribe(stream_id, after_seq=after_seq)),
+        media_type=writer.media_type,
+        headers={**SSE_HEADERS, "X-Stream-Id": stream_id},
     )
 
 
@@ -728,16 +803,16 @@ async def call_mode_natural(
             user_role=user_role or "Employee",
             session_id=session_id,
             history=history,
-            mode="call"
+            mode="call",
+            deadline=Deadline(REQUEST_DEADLINE_CALL_MODE, label=f"call:{session_id[:8]}"),
         )
         
         if await request.is_disconnected():
             raise asyncio.CancelledError()
         
         # Delayed insertion untuk call mode juga (✅ FIX: Use await)
-        await save_hybrid_message(session_id, "user", transcript)
         answer = result.get("answer", "Maaf, tidak bisa memproses permintaan.")
-        await save_hybrid_message(session_id, "assistant", answer)
+        await save_hybrid_turn(session_id, transcript, answer)
         
         return await _generate_call_audio_response(answer, session_id)
         
@@ -782,15 +857,123 @@ async def chat_system_status():
         "status": "active",
         "supabase_memory_available": MEMORY_AVAILABLE,
         "redis_memory_available": REDIS_AVAILABLE,
-        "cancellation_support": True
+        "cancellation_support": True,
+        "cancellation": _cancellation_status(),
+        "single_flight": _single_flight_status(),
+        "sse": sse_stats_dict(),
+        "resumable_streams": stream_hub.active_streams(),
+        "persistence": _persistence_status(),
+        "redis_ops": _redis_ops_status(),
+        "session_cache": _session_cache_status(),
+        "user_context": _user_context_status(),
+        "artifacts": _artifact_status(),
+        "hr_db_pool": _hr_db_pool_status(),
+        "hr_schema": _hr_schema_status(),
+        "schema_pruning": _schema_pruning_status(),
+        "value_index": _value_index_status(),
+        "hr_service": _hr_service_metrics(),
+        "hr_table_stream": _table_stream_status(),
+    }
+
+
+def _table_stream_status() -> dict:
+    try:
+        from backend.services.chat_service import table_wire_stats
+        return table_wire_stats.status()
+    except Exception:
+        return {}
+
+
+def _schema_pruning_status() -> dict:
+    try:
+        from engines.hr.query.schema_retriever import schema_retriever
+        return schema_retriever.status()
+    except Exception:
+        return {}
+
+
+def _value_index_status() -> dict:
+    try:
+        from engines.hr.query.value_index import value_index
+        return value_index.status()
+    except Exception:
+        return {}
+
+
+def _hr_service_metrics() -> dict:
+    try:
+        from app.tools import hr_service
+        return hr_service.get_metrics() if hr_service is not None else {}
+    except Exception:
+        return {}
+
+
+def _hr_schema_status() -> dict:
+    try:
+        from engines.hr.database.schema_snapshot import schema_snapshot
+        return schema_snapshot.status()
+    except Exception:
+        return {}
+
+
+def _hr_db_pool_status() -> list:
+    try:
+        from engines.hr.database.db_manager import pool_stats
+        return pool_stats()
+    except Exception:
+        return []
+
+
+def _artifact_status() -> dict:
+    from memory.artifact_store import artifact_store
+    return artifact_store.status()
+
+
+def _user_context_status() -> dict:
+    from backend.services.user_context import user_context_stats
+    return user_context_stats()
+
+
+def _session_cache_status() -> dict:
+    from backend.services.session_cache import session_cache
+    return session_cache.status()
+
+
+def _redis_ops_status() -> dict:
+    from memory.redis_pipeline import redis_op_stats
+    return redis_op_stats()
+
+
+def _persistence_status() -> dict:
+    try:
+        from memory.persistence_queue import persistence_queue
+        return persistence_queue.status()
+    except Exception:
+        return {"running": False}
+
+
+def _cancellation_status() -> dict:
+    from app.cancellation import cancellation_stats
+    return cancellation_stats.to_dict()
+
+
+def _single_flight_status() -> dict:
+    from dataclasses import asdict
+    from backend.services.single_flight import sop_single_flight
+    from backend.services.redis_bus import PUBSUB_AVAILABLE
+    return {
+        "cross_worker": PUBSUB_AVAILABLE,
+        "active_flights": sop_single_flight.active_flights(),
+        **asdict(sop_single_flight.stats),
     }
 
 
 @router.get("/debug/active-requests")
 async def debug_active_requests():
+    active = request_registry.active_sessions()
     return {
-        "active_sessions": list(active_requests.keys()),
-        "count": len(active_requests)
+        "active_sessions": active,
+        "count": len(active)
     }
 
 
@@ -802,4 +985,6 @@ async def save_stopped_state(session_id: str, req: StoppedRequest):
     Kita hanya merespons status sukses untuk menyenangkan Frontend.
     """
     logger.info(f"📝 User membatalkan request. DB dibiarkan bersih (No Trace).")
+    # Stop eksplisit: batalkan pipeline seketika (tanpa menunggu grace period resume)
+    await request_registry.cancel_session(session_id, reason="user_stopped")
     return {"status": "success", "message": "Ignored in DB by design"}
\ No newline at end of file
@@ -19,8 +19,8 @@ async def get_auth_nik(x_auth_session: Optional[str] = Header(None)) -> Optional
     if not x_auth_session:
         return None  # dev mode: tidak ada header → tidak ada filter
 
-    from backend.services.user_context import get_user_context
-    ctx = get_user_context(x_auth_session)
+    from backend.services.user_context import get_user_context_async
+    ctx = await get_user_context_async(x_auth_session)
     if not ctx:
         # Session ada tapi context sudah expired di server (Redis TTL habis)
         # Kembalikan "" bukan raise 401 agar tidak lock-out user yang server-nya restart
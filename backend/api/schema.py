@@ -24,11 +24,10 @@ async def get_database_schema() -> Dict[str, Any]:
     This is used by frontend Database Schema Explorer UI
     """
     try:
-        # Import schema reader
-        from engines.hr.database.schema_reader import SchemaReader
+        # Snapshot bersama (tidak memblok event loop; introspeksi hanya di thread kalau belum ada)
+        from engines.hr.database.schema_snapshot import schema_snapshot
         
-        schema_reader = SchemaReader()
-        schema = schema_reader.get_schema(refresh_cache=False)
+        schema = await schema_snapshot.get_schema_async()
         
         # Format response for frontend consumption
         response = {
@@ -82,10 +81,14 @@ async def refresh_database_schema() -> Dict[str, Any]:
     Force refresh the schema cache and return updated schema
     """
     try:
-        from engines.hr.database.schema_reader import SchemaReader
+        from engines.hr.database.schema_snapshot import schema_snapshot
 
-        schema_reader = SchemaReader()
-        schema = schema_reader.get_schema(refresh_cache=True)
+        # Rebuild paksa (di thread) + publish ke Redis untuk worker lain
+        schema = await schema_snapshot.refresh(force=True)
+
+        # Dipanggil setelah ingestion data → hasil query ter-cache di semua worker langsung invalid
+        from engines.hr.query.result_cache import bump_ingestion_watermark
+        await bump_ingestion_watermark()
 
         response = {
             "success": True,
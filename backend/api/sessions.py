@@ -5,11 +5,11 @@ Session and conversation history management
 
 import logging
 import asyncio
-import time
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from typing import List, Optional
 
 from backend.api.deps import get_auth_nik
+from backend.services.session_cache import session_cache
 
 logger = logging.getLogger(__name__)
 
@@ -19,8 +19,8 @@ from backend.models.requests import SessionResponse, SessionInfo, MessageInfo
 # Import session management functions
 try:
     from memory.memory_supabase import (
-        get_sessions, get_recent_history, toggle_pin_session,
-        delete_session_and_messages, get_session_owner
+        get_sessions, get_sessions_page, get_recent_history, toggle_pin_session,
+        delete_session_and_messages
     )
     MEMORY_AVAILABLE = True
 except ImportError:
@@ -29,42 +29,47 @@ except ImportError:
 
     # Fallback dummy functions
     def get_sessions(nik=None): return []
+    def get_sessions_page(nik=None, limit=30, cursor=None): return [], None
     def get_recent_history(session_id: str, limit: int = 50): return []
     def toggle_pin_session(session_id: str): return False
     def delete_session_and_messages(session_id: str): pass
-    def get_session_owner(session_id: str): return ""
 
 router = APIRouter()
 
-# Cache for list_sessions: per-NIK agar user berbeda tidak saling cache
-_sessions_cache: dict = {}          # key: nik (str) → {"data": [...], "ts": float}
-_SESSIONS_CACHE_TTL = 10            # detik
+# Cache daftar session (halaman pertama) & metadata ada di backend.services.session_cache —
+# di-share lewat Redis dengan version counter per NIK, jadi invalidasi sampai ke semua worker.
 
 def _invalidate_sessions_cache(nik: str = None):
-    """Invalidate cache untuk NIK tertentu, atau semua kalau nik=None."""
-    if nik and nik in _sessions_cache:
-        _sessions_cache[nik]["ts"] = 0.0
-    else:
-        for v in _sessions_cache.values():
-            v["ts"] = 0.0
+    """Bump versi daftar session untuk NIK tertentu, atau semua user kalau nik=None."""
+    session_cache.invalidate_list_nowait(nik)
 
 
 @router.get("/", response_model=List[SessionInfo])
-async def list_sessions(auth_nik: Optional[str] = Depends(get_auth_nik)):
-    """Get list of conversation sessions — difilter per user (NIK)."""
+async def list_sessions(
+    response: Response,
+    limit: int = Query(30, ge=1, le=100),
+    cursor: Optional[str] = None,
+    auth_nik: Optional[str] = Depends(get_auth_nik),
+):
+    """Get list of conversation sessions — difilter per user (NIK).
+    Keyset pagination: halaman berikutnya = ?cursor=<header X-Next-Cursor>."""
     try:
         if not MEMORY_AVAILABLE:
             raise HTTPException(status_code=503, detail="Session management system not available")
 
-        cache_key = auth_nik if auth_nik is not None else "__all__"
-        now = time.monotonic()
-        entry = _sessions_cache.get(cache_key)
-        if entry and entry["data"] is not None and (now - entry["ts"]) < _SESSIONS_CACHE_TTL:
-            return entry["data"]
-
-        sessions = await asyncio.to_thread(get_sessions, auth_nik)
-        _sessions_cache[cache_key] = {"data": sessions, "ts": now}
-        logger.info(f"📋 Retrieved {len(sessions)} sessions (nik={auth_nik or 'all'})")
+        cached = await session_cache.get_list(auth_nik, limit) if not cursor else None
+        if cached is not None:
+            sessions, next_cursor = cached
+            if next_cursor:
+                response.headers["X-Next-Cursor"] = next_cursor
+            return sessions
+
+        sessions, next_cursor = await asyncio.to_thread(get_sessions_page, auth_nik, limit, cursor)
+        if not cursor:
+            await session_cache.set_list(auth_nik, limit, sessions, next_cursor)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        logger.info(f"📋 Retrieved {len(sessions)} sessions (nik={auth_nik or 'all'}{', paged' if cursor else ''})")
         return sessions
 
     except HTTPException: raise
@@ -83,11 +88,9 @@ async def get_session_history(
     try:
         limit = min(limit, 200)
 
-        # Validasi kepemilikan: hanya jika NIK tersedia di kedua sisi
-        if auth_nik:
-            owner = await asyncio.to_thread(get_session_owner, session_id)
-            if owner and owner != auth_nik:
-                raise HTTPException(status_code=403, detail="Access denied: session belongs to another user")
+        # Validasi kepemilikan: hanya jika NIK tersedia di kedua sisi (biasanya lookup memori)
+        if not await session_cache.can_access(session_id, auth_nik):
+            raise HTTPException(status_code=403, detail="Access denied: session belongs to another user")
 
         from memory.memory_hybrid import get_hybrid_history
         history = await get_hybrid_history(session_id, limit=limit)
@@ -110,13 +113,12 @@ async def toggle_session_pin(
         if not MEMORY_AVAILABLE:
             raise HTTPException(status_code=503, detail="Session management system not available")
 
-        if auth_nik:
-            owner = await asyncio.to_thread(get_session_owner, session_id)
-            if owner and owner != auth_nik:
-                raise HTTPException(status_code=403, detail="Access denied")
+        if not await session_cache.can_access(session_id, auth_nik):
+            raise HTTPException(status_code=403, detail="Access denied")
 
         pinned = await asyncio.to_thread(toggle_pin_session, session_id)
-        _invalidate_sessions_cache(auth_nik)
+        await session_cache.update_meta(session_id, pinned=pinned)
+        await session_cache.invalidate_list(auth_nik)
         logger.info(f"📌 Session {session_id[:8]}... pinned={pinned}")
         return SessionResponse(
             success=True,
@@ -138,13 +140,17 @@ async def delete_session(session_id: str, auth_nik: Optional[str] = Depends(get_
         if not MEMORY_AVAILABLE:
             raise HTTPException(status_code=503, detail="Session management system not available")
 
-        if auth_nik:
-            owner = await asyncio.to_thread(get_session_owner, session_id)
-            if owner and owner != auth_nik:
-                raise HTTPException(status_code=403, detail="Access denied")
+        if not await session_cache.can_access(session_id, auth_nik):
+            raise HTTPException(status_code=403, detail="Access denied")
 
+        try:
+            from memory.persistence_queue import persistence_queue
+            persistence_queue.discard_session(session_id)
+        except Exception:
+            pass
         await asyncio.to_thread(delete_session_and_messages, session_id)
-        _invalidate_sessions_cache(auth_nik)
+        await session_cache.drop(session_id)
+        await session_cache.invalidate_list(auth_nik)
         logger.info(f"🗑️ Session deleted: {session_id[:8]}...")
         return SessionResponse(
             success=True,
@@ -0,0 +1,241 @@
+"""
+DENAI WebSocket Chat
+====================
+/ws/chat — satu koneksi persisten per tab browser untuk banyak turn sekaligus.
+Tidak ada TLS handshake / header / auth per pertanyaan, dan Stop menjadi pesan
+eksplisit yang membatalkan pipeline seketika (tidak menunggu disconnect).
+
+Pipeline sama persis dengan /ask/stream (stream_chat_events di chat.py),
+termasuk coalescing token dari SSEWriter.
+
+Protokol (JSON text frame):
+  client → server
+    {"type": "question", "turn_id": "...", "question": "...", "session_id": "...",
+     "user_role": "...", "user_context": {...}}
+    {"type": "cancel",   "turn_id": "..."}
+    {"type": "feedback", "trace_id": "...", "score": 1, "comment": "..."}
+    {"type": "ping"}
+  server → client
+    event pipeline + "turn_id": token / table_meta / table_rows / stream_clear / done / error / cancelled
+    {"type": "feedback_ack", ...}, {"type": "pong"}, {"type": "ws_error", "message": "..."}
+
+Auth SINTA dibaca SEKALI saat connect lewat query `?auth=<session_id SINTA>`
+(browser tidak bisa set header di WebSocket); user_context-nya dipakai untuk
+turn yang tidak mengirim user_context sendiri.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import uuid
+from typing import Any, Dict, Optional, Set
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from limits import parse as parse_rate
+from pydantic import ValidationError
+
+from app.cancellation import CancellationToken
+from backend.api.chat import stream_chat_events, submit_feedback, FeedbackRequest, ASK_STREAM_RATE_LIMIT
+from backend.limiter import limiter
+from backend.models.requests import QuestionRequest
+from backend.services.request_registry import request_registry
+from backend.utils.sse import SSEWriter, dumps_json
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+MAX_CONCURRENT_TURNS = 4
+# Limit yang sama dengan /ask/stream, per NIK (auth SINTA) atau IP — storage limiter yang sama
+_TURN_RATE = parse_rate(ASK_STREAM_RATE_LIMIT)
+
+
+class _WSFrameWriter(SSEWriter):
+    """Coalescing sama dengan SSE; frame = teks JSON yang diberi turn_id."""
+
+    def __init__(self, turn_id: str, label: str = ""):
+        super().__init__(binary=False, label=label)
+        self.turn_id = turn_id
+
+    def encode(self, event: Dict[str, Any], event_id: Optional[str] = None) -> str:
+        frame = dumps_json({**event, "turn_id": self.turn_id})
+        self.frames += 1
+        self.bytes += len(frame)
+        return frame
+
+
+class _TaskScheduler:
+    """Pengganti BackgroundTasks — di WebSocket tidak ada response HTTP yang 'selesai'."""
+
+    def __init__(self):
+        # Referensi task background (persistensi pasca-turn) — tanpa ini task bisa di-GC di tengah jalan
+        self._tasks: Set[asyncio.Task] = set()
+
+    def add_task(self, fn, *args, **kwargs) -> None:
+        if asyncio.iscoroutinefunction(fn):
+            task = asyncio.create_task(fn(*args, **kwargs))
+            self._tasks.add(task)
+            task.add_done_callback(self._task_done)
+        else:
+            asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"⚠️ WS background task gagal: {task.exception()}")
+
+
+class _Connection:
+    def __init__(self, websocket: WebSocket, user_context: Optional[Dict[str, Any]]):
+        self.ws = websocket
+        self.user_context = user_context
+        self.turns: Dict[str, CancellationToken] = {}
+        self.tasks: Dict[str, asyncio.Task] = {}
+        # Stop sebelum token turn terdaftar → dicatat, run_turn membatalkan begitu token ada
+        self.cancelled_early: Dict[str, str] = {}
+        self.scheduler = _TaskScheduler()
+        self._send_lock = asyncio.Lock()
+
+    @property
+    def rate_key(self) -> str:
+        nik = (self.user_context or {}).get("nik")
+        if nik:
+            return f"nik:{nik}"
+        client = self.ws.client
+        return f"ip:{client.host if client else 'unknown'}"
+
+    def allow_turn(self) -> bool:
+        try:
+            return limiter.limiter.hit(_TURN_RATE, "ws_chat_question", self.rate_key)
+        except Exception as e:
+            logger.debug(f"WS rate limit storage gagal (turn diizinkan): {e}")
+            return True
+
+    async def send(self, payload) -> None:
+        text = payload if isinstance(payload, str) else dumps_json(payload)
+        async with self._send_lock:
+            await self.ws.send_text(text)
+
+    async def run_turn(self, turn_id: str, req: QuestionRequest) -> None:
+        user_role = req.user_role or "Employee"
+        token = None
+        try:
+            token = await request_registry.start(req.session_id, label=f"ws:{req.session_id[:8]}")
+            self.turns[turn_id] = token
+            if turn_id in self.cancelled_early:
+                token.cancel(self.cancelled_early[turn_id])
+                await self.send({"type": "cancelled", "turn_id": turn_id})
+                return
+            writer = _WSFrameWriter(turn_id, label=f"ws:{req.session_id[:8]}")
+            async for frame in writer.stream(stream_chat_events(req, user_role, token, self.scheduler)):
+                await self.send(frame)
+        except (WebSocketDisconnect, RuntimeError):
+            if token is not None:
+                token.cancel("client_disconnected")
+        except Exception as e:
+            logger.error(f"❌ WS turn {turn_id[:8]} error: {e}", exc_info=True)
+            try:
+                await self.send({"type": "error", "message": str(e), "turn_id": turn_id})
+            except Exception:
+                pass
+        finally:
+            self.turns.pop(turn_id, None)
+            self.tasks.pop(turn_id, None)
+            self.cancelled_early.pop(turn_id, None)
+            # Pipeline yang tidak sempat mulai tidak menjalankan finally-nya (registry.finish)
+            if token is not None and request_registry.get(req.session_id) is token:
+                request_registry.finish(req.session_id, token)
+
+    def cancel(self, turn_id: str, reason: str = "user_stopped") -> bool:
+        token = self.turns.get(turn_id)
+        if token is not None:
+            return token.cancel(reason)
+        task = self.tasks.get(turn_id)
+        if task is not None and not task.done():
+            # Token belum terdaftar (task belum mulai / registry.start masih jalan) —
+            # jangan task.cancel() di tengah registry.start (token bisa tertinggal terdaftar)
+            self.cancelled_early[turn_id] = reason
+            return True
+        return False
+
+    def cancel_all(self, reason: str) -> None:
+        for turn_id in list(self.tasks):
+            self.cancel(turn_id, reason)
+
+
+async def _handle_message(conn: _Connection, msg: Dict[str, Any]) -> None:
+    mtype = msg.get("type")
+
+    if mtype == "question":
+        turn_id = str(msg.get("turn_id") or uuid.uuid4().hex)
+        if turn_id in conn.tasks:
+            await conn.send({"type": "ws_error", "turn_id": turn_id, "message": "turn_id sudah dipakai"})
+            return
+        if len(conn.tasks) >= MAX_CONCURRENT_TURNS:
+            await conn.send({"type": "ws_error", "turn_id": turn_id, "error_code": "rate_limit", "message": "Terlalu banyak pertanyaan aktif"})
+            return
+        if not conn.allow_turn():
+            await conn.send({"type": "ws_error", "turn_id": turn_id, "error_code": "rate_limit", "message": "Rate Limit: Terlalu banyak permintaan."})
+            return
+        try:
+            req = QuestionRequest(**{k: v for k, v in msg.items() if k not in ("type", "turn_id")})
+        except ValidationError as e:
+            await conn.send({"type": "ws_error", "turn_id": turn_id, "message": f"payload tidak valid: {e.errors()[:1]}"})
+            return
+        req.session_id = req.session_id or str(uuid.uuid4())
+        if req.user_context is None and conn.user_context:
+            req.user_context = conn.user_context
+        conn.tasks[turn_id] = asyncio.create_task(conn.run_turn(turn_id, req))
+
+    elif mtype == "cancel":
+        turn_id = str(msg.get("turn_id") or "")
+        if conn.cancel(turn_id):
+            logger.info(f"🛑 WS cancel turn {turn_id[:8]}")
+
+    elif mtype == "feedback":
+        try:
+            result = await submit_feedback(FeedbackRequest(**{k: v for k, v in msg.items() if k != "type"}))
+        except ValidationError as e:
+            result = {"status": "error", "message": f"payload tidak valid: {e.errors()[:1]}"}
+        await conn.send({"type": "feedback_ack", "trace_id": msg.get("trace_id"), **result})
+
+    elif mtype == "ping":
+        await conn.send({"type": "pong"})
+
+    else:
+        await conn.send({"type": "ws_error", "message": f"tipe pesan tidak dikenal: {mtype}"})
+
+
+@router.websocket("/ws/chat")
+async def chat_websocket(websocket: WebSocket, auth: Optional[str] = None):
+    await websocket.accept()
+
+    user_context = None
+    if auth:
+        try:
+            from backend.services.user_context import get_user_context_async
+            user_context = await get_user_context_async(auth)
+        except Exception as e:
+            logger.warning(f"⚠️ WS auth context gagal dimuat: {e}")
+
+    conn = _Connection(websocket, user_context)
+    logger.info(f"🔌 WS chat connected (auth={'yes' if user_context else 'no'})")
+    try:
+        while True:
+            raw = await websocket.receive_text()
+            try:
+                msg = json.loads(raw)
+            except ValueError:
+                msg = None
+            if not isinstance(msg, dict):
+                await conn.send({"type": "ws_error", "message": "pesan harus JSON object"})
+                continue
+            await _handle_message(conn, msg)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.warning(f"⚠️ WS chat connection error: {e}")
+    finally:
+        # Tab ditutup / koneksi putus → semua turn aktif dibatalkan
+        conn.cancel_all("client_disconnected")
+        logger.info(f"🔌 WS chat disconnected ({len(conn.tasks)} turn dibatalkan)")
@@ -46,6 +46,8 @@ from backend.api.schema import router as schema_router  # ✅ NEW: Schema Explor
 from backend.api.auth import router as auth_router      # ✅ NEW: SINTA Integration
 from backend.api.docs import router as docs_router      # PDF serving
 from backend.api.topics import router as topics_router  # Topic frequency
+from backend.api.ws_chat import router as ws_chat_router  # WebSocket chat (/ws/chat)
+from backend.api.artifacts import router as artifacts_router  # Artifact analytics (/artifacts/{turn_id})
 
 # ✅ FIX KUNCI: Import Recommender untuk melayani Endpoint Katalog Chart!
 from engines.hr.visualization.viz_recommender import UniversalVizRecommender
@@ -82,7 +84,9 @@ app.add_middleware(
     allow_origins=CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["Content-Type", "Authorization", "Accept", "X-Requested-With", "X-Auth-Session"],
+    allow_headers=["Content-Type", "Authorization", "Accept", "X-Requested-With", "X-Auth-Session",
+                   "X-Stream-Encoding", "Last-Event-ID"],
+    expose_headers=["X-Stream-Id", "X-Next-Cursor"],
 )
 
 # ✅ CLEAN ARCHITECTURE ROUTING
@@ -94,6 +98,8 @@ app.include_router(schema_router)                        # Schema Explorer route
 app.include_router(auth_router, prefix="", tags=["Auth"])  # SINTA Integration (/auth/sinta)
 app.include_router(docs_router, prefix="", tags=["Docs"])   # PDF serving (/api/docs/open)
 app.include_router(topics_router, prefix="", tags=["Topics"])  # Topic frequency (/api/topics/popular)
+app.include_router(ws_chat_router, prefix="", tags=["Chat"])   # WebSocket chat (/ws/chat)
+app.include_router(artifacts_router, prefix="", tags=["Chat"])  # Lazy-fetch tabel/chart history
 
 # ==============================================================================
 # 🎯 ENDPOINT VISUALISASI KEMBALI DIBUKA (Hanya untuk Katalog)
@@ -134,12 +140,44 @@ async def startup_event():
     logger.info(f"✅ ElevenLabs TTS: {'CONFIGURED' if ELEVENLABS_API_KEY else 'NOT CONFIGURED'}")
     logger.info("🎯 Architecture: API → ChatService → Universal Analytics")
     logger.info("📋 Schema Explorer: ENABLED (/api/schema/)")
+    # 📡 Listener cancel lintas worker (pesan baru di session yang sama → batalkan request lama)
+    from backend.services.request_registry import request_registry
+    request_registry.start_listener()
+    # 💾 Write-behind queue pesan chat → Supabase (bulk insert + spool retry)
+    try:
+        from memory.persistence_queue import persistence_queue
+        persistence_queue.start()
+    except Exception as e:
+        logger.warning(f"⚠️ Persistence queue tidak aktif: {e}")
+    # 🧬 Snapshot schema hr: rebuild di background hanya saat fingerprint katalog berubah
+    try:
+        from engines.hr.database.schema_snapshot import schema_snapshot
+        schema_snapshot.start()
+    except Exception as e:
+        logger.warning(f"⚠️ Schema snapshot tidak aktif: {e}")
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Application shutdown event"""
     logger.info("👋 DENAI API Shutting down...")
+    from backend.services.request_registry import request_registry
+    await request_registry.stop_listener()
+    try:
+        from memory.persistence_queue import persistence_queue
+        await persistence_queue.stop()
+    except Exception as e:
+        logger.warning(f"⚠️ Persistence queue gagal di-drain: {e}")
+    try:
+        from engines.hr.database.schema_snapshot import schema_snapshot
+        await schema_snapshot.stop()
+    except Exception:
+        pass
+    try:
+        from engines.hr.database.db_manager import close_pools
+        close_pools()
+    except Exception as e:
+        logger.warning(f"⚠️ HR DB pool gagal ditutup: {e}")
 
 
 # ✅ FIX: Mengembalikan endpoint alias untuk Frontend lama
@@ -151,13 +189,10 @@ async def get_history_alias(
 ):
     """Alias endpoint — Redis first, then Supabase. Validasi kepemilikan jika NIK tersedia."""
     from memory.memory_hybrid import get_hybrid_history
-    from backend.api.sessions import get_session_owner
-    import asyncio as _asyncio
-    if auth_nik:
-        owner = await _asyncio.to_thread(get_session_owner, session_id)
-        if owner and owner != auth_nik:
-            from fastapi import HTTPException as _HTTPEx
-            raise _HTTPEx(status_code=403, detail="Access denied: session belongs to another user")
+    from backend.services.session_cache import session_cache
+    if not await session_cache.can_access(session_id, auth_nik):
+        from fastapi import HTTPException as _HTTPEx
+        raise _HTTPEx(status_code=403, detail="Access denied: session belongs to another user")
     return await get_hybrid_history(session_id, limit=min(limit, 200))
 
 
@@ -11,6 +11,7 @@ import logging
 import asyncio
 import json
 import time
+import uuid
 import os
 import sys
 from typing import Optional, List, Dict, Any, Literal, Union, Callable
@@ -37,12 +38,16 @@ from app.config import (
     API_TIMEOUT_DEFAULT, API_TIMEOUT_CALL_MODE,
     CALL_MODE_TEMPERATURE, CHAT_MODE_TEMPERATURE,
     CALL_MODE_MAX_TOKENS, CHAT_MODE_MAX_TOKENS,
-    INTENT_CLASSIFIER_MODEL, INTENT_CLASSIFIER_TEMPERATURE, INTENT_CLASSIFIER_MAX_TOKENS
+    INTENT_CLASSIFIER_MODEL, INTENT_CLASSIFIER_TEMPERATURE, INTENT_CLASSIFIER_MAX_TOKENS,
+    HR_STREAM_ROWS_BATCH
 )
 
 logger = logging.getLogger(__name__)
 client = OpenAI(api_key=OPENAI_API_KEY)
 
+# Sentinel RAG "tidak ditemukan di SOP" — caller /ask/stream menggantinya dengan pesan ramah
+SOP_NOT_FOUND_CODE = "[DATA_TIDAK_DITEMUKAN_DI_SOP]"
+
 # =====================================
 # DYNAMIC TOOLS ROUTING
 # =====================================
@@ -64,12 +69,15 @@ def build_analytics_response(
     *, domain: str, text: str, columns: List[str], rows: List[List[Any]],
     session_id: str, turn_id: Optional[str] = None, visualization_available: bool = True,
     chart_hints: Optional[Dict[str, Any]] = None, sql_query: Optional[str] = None,
-    sql_explanation: Optional[str] = None
+    sql_explanation: Optional[str] = None, column_types: Optional[List[str]] = None
 ) -> Dict[str, Any]:
-    turn_id = turn_id or f"{session_id}-{int(time.time())}"
+    # uuid, bukan detik: dua turn analytics dalam detik yang sama tidak boleh berbagi artifact
+    turn_id = turn_id or f"{session_id}-{uuid.uuid4().hex[:12]}"
+    data = {"columns": columns, "rows": rows}
+    if column_types: data["column_types"] = column_types
     response = {
         "message_type": "analytics_result", "domain": domain, "text": text,
-        "data": {"columns": columns, "rows": rows},
+        "data": data,
         "visualization_available": visualization_available,
         "conversation_id": session_id, "turn_id": turn_id
     }
@@ -78,6 +86,104 @@ def build_analytics_response(
     if sql_explanation: response["sql_explanation"] = sql_explanation
     return response
 
+# =====================================
+# TABEL ANALYTICS DI STREAM (FORMAT KOLOM)
+# =====================================
+# Event SSE/WS membawa tabel per kolom: nama kolom tidak diulang di setiap baris.
+# Rows di-stream sebagai event "table_rows" (HR_STREAM_ROWS_BATCH baris per event),
+# frontend menyusun ulang list dict sebelum render. /ask dan artifact tetap format rows.
+class _TableWireStats:
+    def __init__(self):
+        self.tables = 0
+        self.rows = 0
+        self.columnar_bytes = 0
+        self.row_bytes = 0
+        self.encode_ms = 0.0
+
+    def record(self, rows: int, columnar_bytes: int, row_bytes: int, encode_ms: float) -> None:
+        self.tables += 1
+        self.rows += rows
+        self.columnar_bytes += columnar_bytes
+        self.row_bytes += row_bytes
+        self.encode_ms += encode_ms
+
+    def status(self) -> Dict[str, Any]:
+        n = self.tables
+        return {
+            "tables": n,
+            "stream_batch": HR_STREAM_ROWS_BATCH,
+            "avg_rows": round(self.rows / n, 1) if n else 0,
+            "avg_columnar_kb": round(self.columnar_bytes / n / 1024, 2) if n else 0,
+            "avg_row_format_kb": round(self.row_bytes / n / 1024, 2) if n else 0,
+            "bytes_saved_ratio": round(1 - self.columnar_bytes / self.row_bytes, 3) if self.row_bytes else 0.0,
+            "avg_encode_ms": round(self.encode_ms / n, 2) if n else 0,
+        }
+
+
+table_wire_stats = _TableWireStats()
+_WIRE_STATS_SAMPLE = 50
+
+
+def _row_keys(columns: List[str], rows: List[Any]) -> List[str]:
+    """Key dict baris bisa beda dari nama kolom tampilan (mis. 'Undefined' → 'category')."""
+    if rows and isinstance(rows[0], dict):
+        keys = list(rows[0].keys())
+        if len(keys) == len(columns):
+            return keys
+    return list(columns)
+
+
+def _column_slices(rows: List[Any], keys: List[str], start: int = 0, stop: Optional[int] = None) -> List[List[Any]]:
+    chunk = rows[start:stop]
+    if chunk and isinstance(chunk[0], dict):
+        return [[row.get(k) for row in chunk] for k in keys]
+    return [list(col) for col in zip(*chunk)] if chunk else [[] for _ in keys]
+
+
+def columnar_table(data: Optional[Dict[str, Any]], rows_streamed: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    data {'columns','rows',...} → {'encoding':'columnar','columns','column_data',...} untuk event done.
+    rows_streamed=True: rows sudah dikirim lewat table_rows, done cukup membawa metadata.
+    """
+    if not data or "rows" not in data:
+        return data
+    from backend.utils.sse import dumps_json
+    started = time.perf_counter()
+    columns = data.get("columns") or []
+    rows = data.get("rows") or []
+    keys = _row_keys(columns, rows)
+    wire = {k: v for k, v in data.items() if k != "rows"}
+    wire.update({"encoding": "columnar", "total_rows": len(rows)})
+    if keys != list(columns):
+        wire["row_keys"] = keys
+    if rows_streamed:
+        wire["rows_streamed"] = True
+    else:
+        wire["column_data"] = _column_slices(rows, keys)
+    encode_ms = (time.perf_counter() - started) * 1000
+    try:
+        # Ukuran untuk /status diestimasi dari sampel — encode penuh di sini hanya untuk statistik
+        sample = rows[:_WIRE_STATS_SAMPLE]
+        scale = len(rows) / len(sample) if sample else 0
+        columnar_bytes = int(len(dumps_json(_column_slices(sample, keys))) * scale)
+        row_bytes = int(len(dumps_json(sample)) * scale)
+        table_wire_stats.record(len(rows), columnar_bytes, row_bytes, encode_ms)
+        logger.debug(f"📦 Tabel {len(rows)} baris: columnar ~{columnar_bytes}B vs rows ~{row_bytes}B ({encode_ms:.1f}ms)")
+    except Exception:
+        pass
+    return wire
+
+
+def table_row_events(data: Optional[Dict[str, Any]]):
+    """Event table_rows per HR_STREAM_ROWS_BATCH baris (nilai per kolom + offset baris pertama)."""
+    columns = (data or {}).get("columns") or []
+    rows = (data or {}).get("rows") or []
+    keys = _row_keys(columns, rows)
+    batch = max(1, HR_STREAM_ROWS_BATCH)
+    for start in range(0, len(rows), batch):
+        yield {"type": "table_rows", "offset": start, "column_data": _column_slices(rows, keys, start, start + batch)}
+
+
 def generate_chart_hints(domain: str, columns: List[str], rows: List[List[Any]]) -> Optional[Dict[str, Any]]:
     if not columns or not rows or len(columns) < 2: return None
     if domain == "hr" and any("band" in col.lower() for col in columns):
@@ -302,11 +408,13 @@ Pertanyaan Mandiri:"""
         answer = str(result.get("answer", "")).lower()
         
         failure_keywords = [
-            "[data_tidak_ditemukan_di_sop]",
+            SOP_NOT_FOUND_CODE.lower(),
             "data tidak tersedia",
             "no data found",
             "maaf, terjadi gangguan",
             "maaf, terjadi kesalahan",
+            "error pencarian sop",
+            "terjadi kesalahan sistem",
             "tidak ditemukan",
             "failed to generate sql",
             "window function over clause",
@@ -395,6 +503,7 @@ Balas HANYA dengan JSON valid:
         self, intent: str, question: str, user_role: str, session_id: str,
         history: List[Dict[str, Any]], mode: str, cancellation_check: Optional[Callable],
         user_ctx: Optional[Dict[str, Any]] = None,
+        deadline=None,
     ) -> Dict[str, Any]:
 
         if intent == "B" and user_role.lower() not in ['hr', 'admin', 'manager', 'hc']:
@@ -417,6 +526,7 @@ Balas HANYA dengan JSON valid:
             result = await self._execute_tool(
                 tool_call, session_id, user_role, question, mode,
                 cancellation_check=cancellation_check,
+                deadline=deadline,
             )
             
             if isinstance(result, dict) and result.get("data"):
@@ -471,12 +581,13 @@ Balas HANYA dengan JSON valid:
         history: List[Dict[str, Any]] = None,
         mode: str = "chat",
         cancellation_check: Optional[Callable] = None,
+        deadline=None,
     ) -> Dict[str, Any]:
         try:
             # Load user context dari SINTA (jika ada)
             try:
-                from backend.services.user_context import get_user_context
-                user_ctx = get_user_context(session_id)
+                from backend.services.user_context import get_user_context_async
+                user_ctx = await get_user_context_async(session_id)
                 # Jika ada context dari SINTA, pakai role dari sana
                 if user_ctx and not user_role or user_role.lower() == "employee":
                     user_role = user_ctx.get("role", user_role)
@@ -559,6 +670,7 @@ Balas HANYA dengan JSON valid:
                         intent="A", question=query_for_a, user_role=user_role,
                         session_id=session_id, history=history, mode=mode,
                         cancellation_check=cancellation_check, user_ctx=user_ctx,
+                        deadline=deadline,
                     )
 
             async def _run_route_b():
@@ -567,6 +679,7 @@ Balas HANYA dengan JSON valid:
                         intent="B", question=query_for_b, user_role=user_role,
                         session_id=session_id, history=history, mode=mode,
                         cancellation_check=cancellation_check, user_ctx=user_ctx,
+                        deadline=deadline,
                     )
 
             active_tasks: Dict[str, asyncio.Task] = {}
@@ -679,11 +792,17 @@ Balas HANYA dengan JSON valid:
         history: List[Dict[str, Any]] = None,
         mode: str = "chat",
         cancellation_check: Optional[Callable] = None,
+        deadline=None,
     ) -> Optional[Dict[str, Any]]:
         """
         If this is an A+B (merge) query, runs both routes in parallel and returns
         pre-synthesis data so the caller can stream the synthesis step.
-        Returns None for non-A+B queries (caller falls back to process_question).
+        Returns None if both routes failed (caller shows not-found).
+
+        a_only / b_only return an async generator under "stream" that yields SSE
+        event dicts ({"type": "token"} / {"type": "table_meta"}) — route A streams
+        straight from answer_question_stream so TTFT matches the employee path.
+        Route A context (RAG chunks, sop_topic) lands in routing["rag_out"].
 
         OPTIMIZED: Calls search_sop and query_hr_database directly — skips the
         _run_completion LLM call inside _execute_intent_flow (which was a no-op:
@@ -693,8 +812,8 @@ Balas HANYA dengan JSON valid:
 
         # Load user context (band, lokasi) untuk inject ke query
         try:
-            from backend.services.user_context import get_user_context as _get_uctx
-            _user_ctx = _get_uctx(session_id)
+            from backend.services.user_context import get_user_context_async as _get_uctx
+            _user_ctx = await _get_uctx(session_id)
         except Exception:
             _user_ctx = None
 
@@ -720,23 +839,15 @@ Balas HANYA dengan JSON valid:
                 logger.info(f"📍 Injected user context into query: {', '.join(_ctx_parts)}")
 
         if not is_hr_user:
-            # Non-HR: run A only — if A fails, caller will show "Akses Terbatas"
-            from app.tools import search_sop as _search_sop
+            # Non-HR: run A only, streamed — "not found" is detected by the caller mid-stream
             logger.info(f"⚡ [STREAM A-only] Non-HR user, route A only: {standalone_question[:60]}")
-            with langfuse_observation("route_a_rag", input={"query": standalone_question}):
-                try:
-                    sop_answer = await _search_sop(
-                        question=standalone_question,
-                        session_id=session_id,
-                        cancellation_check=cancellation_check,
-                    )
-                    result_a = {"answer": sop_answer, "authorized": True}
-                except Exception as e:
-                    result_a = {"error": str(e), "answer": "maaf, terjadi kesalahan", "authorized": True}
-
-            if self._is_failure(result_a):
-                return None  # A failed → caller shows "Akses Terbatas" for B-only content
-            return {"mode": "a_only", "result_a": result_a, "standalone_question": standalone_question}
+            rag_out: Dict[str, Any] = {}
+            return {
+                "mode": "a_only",
+                "stream": self._stream_route_a(standalone_question, session_id, cancellation_check, deadline, rag_out),
+                "rag_out": rag_out,
+                "standalone_question": standalone_question,
+            }
 
         # HR users: use orchestrator to decompose query — A gets policy question, B gets pure data question
         decomposed = await self._decompose_query(standalone_question)
@@ -769,6 +880,7 @@ Balas HANYA dengan JSON valid:
                     chart_hints=generate_chart_hints("hr", cols, rows) if viz else None,
                     sql_query=raw.sql_query,
                     sql_explanation=raw.sql_explanation,
+                    column_types=sd.get("column_types"),
                 )
                 result["answer"] = title
                 return result
@@ -780,16 +892,29 @@ Balas HANYA dengan JSON valid:
                     question=query_for_a,
                     session_id=session_id,
                     cancellation_check=cancellation_check,
+                    deadline=deadline,
                 )
                 return {"answer": sop_answer, "authorized": True}
 
         async def _run_route_b_parallel():
             with langfuse_observation("route_b_database", input={"query": query_for_b}):
                 raw = await query_hr_database(
-                    question=query_for_b, user_role=user_role, session_id=session_id
+                    question=query_for_b, user_role=user_role, session_id=session_id,
+                    deadline=deadline, cancellation_check=cancellation_check,
                 )
                 return _process_b_result(raw, query_for_b)
 
+        # A saja → stream langsung dari RAG, tanpa menunggu jawaban lengkap
+        if run_a and not run_b:
+            logger.info(f"⚡ [STREAM A-only] Orchestrator: policy only, streaming route A")
+            rag_out = {}
+            return {
+                "mode": "a_only",
+                "stream": self._stream_route_a(query_for_a, session_id, cancellation_check, deadline, rag_out),
+                "rag_out": rag_out,
+                "standalone_question": standalone_question,
+            }
+
         logger.info(f"⚡ [STREAM A+B] Direct tool calls: A={query_for_a[:40]} | B={query_for_b[:40]}")
 
         tasks = []
@@ -820,12 +945,23 @@ Balas HANYA dengan JSON valid:
         # If only B failed → return A result as SOP-only (don't discard valid SOP answer)
         if not a_failed and b_failed:
             logger.info("⚡ [STREAM A+B] B failed but A succeeded — returning a_only result")
-            return {"mode": "a_only", "result_a": result_a}
+            answer_a = str(result_a.get("answer", ""))
+            return {
+                "mode": "a_only",
+                "stream": self._replay_tokens(answer_a),
+                "rag_out": {},
+                "standalone_question": standalone_question,
+            }
 
         # If only A failed → return B result as b_only
         if a_failed and not b_failed:
             logger.info("⚡ [STREAM A+B] A failed but B succeeded — returning b_only result")
-            return {"mode": "b_only", "result_b": result_b, "query_for_b": query_for_b}
+            return {
+                "mode": "b_only",
+                "result_b": result_b,
+                "stream": self._stream_route_b(result_b, query_for_b),
+                "query_for_b": query_for_b,
+            }
 
         b_content = str(result_b.get("answer", ""))
         if result_b.get("message_type") == "analytics_result" and "data" in result_b:
@@ -846,6 +982,58 @@ Balas HANYA dengan JSON valid:
             "result_base": result_b if b_has_analytics else result_a,
         }
 
+    async def _stream_route_a(
+        self,
+        query: str,
+        session_id: str,
+        cancellation_check: Optional[Callable],
+        deadline,
+        rag_out: Dict[str, Any],
+    ):
+        """Async generator: token events dari RAG engine (real streaming, tanpa simulasi typing)."""
+        from app.tools import search_sop_stream
+        with langfuse_observation("route_a_rag", input={"query": query}):
+            try:
+                async for chunk in search_sop_stream(
+                    question=query,
+                    session_id=session_id,
+                    cancellation_check=cancellation_check,
+                    deadline=deadline,
+                    out_context=rag_out,
+                ):
+                    yield {"type": "token", "content": chunk}
+            except Exception as e:
+                # Sama seperti jalur non-stream: route A gagal = tidak ditemukan. Sentinel ini
+                # memicu stream_clear + pesan ramah di caller (token parsial ikut dibersihkan).
+                logger.warning(f"⚠️ [STREAM A] Route A gagal, diperlakukan sebagai not-found: {e}")
+                yield {"type": "token", "content": SOP_NOT_FOUND_CODE}
+
+    async def _stream_route_b(self, result_b: Dict[str, Any], query_for_b: str):
+        """
+        Async generator untuk route analytics: metadata tabel dulu (frontend bisa
+        menyiapkan layout tabel), rows per batch (event table_rows, format kolom),
+        lalu narasi. Event done hanya membawa metadata tabel (rows_streamed).
+        """
+        data = result_b.get("data") or {}
+        if result_b.get("message_type") == "analytics_result":
+            yield {
+                "type": "table_meta",
+                "columns": data.get("columns", []),
+                "column_types": data.get("column_types"),
+                "total_rows": len(data.get("rows") or []),
+                "query": query_for_b,
+                "visualization_available": result_b.get("visualization_available", False),
+            }
+            for event in table_row_events(data):
+                yield event
+        async for event in self._replay_tokens(str(result_b.get("answer", ""))):
+            yield event
+
+    async def _replay_tokens(self, text: str):
+        """Jawaban yang sudah selesai dikirim apa adanya — tidak ada delay artifisial."""
+        if text:
+            yield {"type": "token", "content": text}
+
     async def _synthesize_results_stream(
         self,
         question: str,
@@ -1000,6 +1188,7 @@ Balas HANYA dengan JSON valid:
         original_question: str,
         mode: str = "chat",
         cancellation_check: Optional[Callable] = None,
+        deadline=None,
     ) -> Union[str, Dict[str, Any]]:
         if not self.tools_available: return "Maaf, tools tidak tersedia."
 
@@ -1024,6 +1213,9 @@ Balas HANYA dengan JSON valid:
             if cancellation_check and "cancellation_check" in tool_function.__code__.co_varnames:
                 function_args["cancellation_check"] = cancellation_check
                 logger.info(f"🔥 Threading cancellation check to {function_name}")
+
+            if deadline is not None and "deadline" in tool_function.__code__.co_varnames:
+                function_args["deadline"] = deadline
             
             tool_result = await tool_function(**function_args) if asyncio.iscoroutinefunction(tool_function) else tool_function(**function_args)
             
@@ -1050,7 +1242,8 @@ Balas HANYA dengan JSON valid:
                         domain=domain, text=brief_text, columns=columns, rows=rows,
                         session_id=session_id, visualization_available=viz_available, chart_hints=chart_hints,
                         sql_query=getattr(tool_result, 'sql_query', None),
-                        sql_explanation=getattr(tool_result, 'sql_explanation', None)
+                        sql_explanation=getattr(tool_result, 'sql_explanation', None),
+                        column_types=structured_data.get("column_types"),
                     )
                     result["answer"] = brief_text
                     return result
@@ -0,0 +1,188 @@
+"""
+Redis Bus - Pub/Sub & Event Log Lintas Worker
+==============================================
+Upstash REST client (memory_hybrid) tidak mendukung SUBSCRIBE, jadi fitur
+lintas worker (single-flight, cancel channel, replay stream) memakai koneksi
+TCP redis-py (`redis.asyncio`) ke REDIS_URL.
+
+Kalau REDIS_URL tidak di-set / redis-py tidak terpasang, PUBSUB_AVAILABLE=False
+dan semua pemanggil jatuh ke mode in-process (per worker) tanpa error.
+"""
+
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from app.config import REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+_client = None
+PUBSUB_AVAILABLE = False
+
+try:
+    import redis.asyncio as _aioredis  # redis>=5 (requirements.txt)
+
+    if REDIS_URL:
+        _client = _aioredis.from_url(REDIS_URL, decode_responses=True)
+        PUBSUB_AVAILABLE = True
+        logger.info("⚡ Redis pub/sub bus ready (REDIS_URL)")
+except Exception as e:
+    _client = None
+    PUBSUB_AVAILABLE = False
+    logger.warning(f"⚠️ Redis pub/sub belum aktif, fallback in-process. Error: {e}")
+
+
+def get_bus_client():
+    """Client redis.asyncio untuk pub/sub, atau None kalau tidak tersedia."""
+    return _client if PUBSUB_AVAILABLE else None
+
+
+async def publish(channel: str, payload: Dict[str, Any]) -> bool:
+    """Publish JSON payload. Return False kalau bus tidak tersedia / gagal."""
+    client = get_bus_client()
+    if client is None:
+        return False
+    try:
+        await client.publish(channel, json.dumps(payload, ensure_ascii=False))
+        return True
+    except Exception as e:
+        logger.warning(f"⚠️ Redis publish gagal ({channel}): {e}")
+        return False
+
+
+@asynccontextmanager
+async def subscription(*channels: str):
+    """
+    Context manager pub/sub. Yield objek PubSub (atau None kalau bus tidak ada).
+    Selalu unsubscribe + tutup koneksi saat keluar, termasuk saat CancelledError.
+    """
+    client = get_bus_client()
+    if client is None:
+        yield None
+        return
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(*channels)
+    try:
+        yield pubsub
+    finally:
+        try:
+            await pubsub.unsubscribe(*channels)
+            await pubsub.aclose()
+        except Exception:
+            pass
+
+
+async def next_message(pubsub, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+    """Ambil satu pesan (sudah di-decode JSON) atau None kalau timeout."""
+    try:
+        msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+    except Exception as e:
+        logger.debug(f"Redis pubsub read error: {e}")
+        await asyncio.sleep(timeout)
+        return None
+    if not msg or msg.get("type") != "message":
+        return None
+    try:
+        return json.loads(msg["data"])
+    except Exception:
+        return None
+
+
+class EventLog:
+    """
+    Log event append-only untuk satu stream, dibaca ulang lintas worker.
+
+    - append(): RPUSH ke list (backlog untuk pembaca yang telat gabung) lalu
+      PUBLISH {seq, event} ke channel live.
+    - follow(): subscribe DULU, baru LRANGE backlog, lalu lanjut dari pub/sub.
+      Urutan ini menjamin tidak ada event yang hilang di celah antara keduanya;
+      event duplikat dibuang berdasarkan seq, celah seq diisi ulang via LRANGE.
+    - close(): tandai akhir stream (event EOF) agar follower berhenti.
+    """
+
+    EOF = "__eof__"
+
+    def __init__(self, name: str, ttl: int = 120):
+        self.name = name
+        self.ttl = ttl
+        self.list_key = f"denai:evlog:{name}"
+        self.channel = f"denai:evlog:{name}:live"
+
+    async def append(self, event: Dict[str, Any]) -> int:
+        client = get_bus_client()
+        if client is None:
+            return 0
+        data = json.dumps(event, ensure_ascii=False)
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.rpush(self.list_key, data)
+            pipe.expire(self.list_key, self.ttl)
+            results = await pipe.execute()
+        seq = int(results[0])
+        await client.publish(self.channel, json.dumps({"seq": seq, "event": event}, ensure_ascii=False))
+        return seq
+
+    async def close(self) -> None:
+        try:
+            await self.append({"type": self.EOF})
+        except Exception as e:
+            logger.debug(f"EventLog close gagal ({self.name}): {e}")
+
+    async def exists(self) -> bool:
+        client = get_bus_client()
+        if client is None:
+            return False
+        try:
+            return bool(await client.exists(self.list_key))
+        except Exception:
+            return False
+
+    async def _range(self, start: int, end: int = -1):
+        client = get_bus_client()
+        raw = await client.lrange(self.list_key, start, end)
+        return [json.loads(r) for r in raw]
+
+    async def follow(
+        self,
+        after_seq: int = 0,
+        idle_timeout: float = 30.0,
+    ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Yield (seq, event) mulai dari seq > after_seq sampai EOF.
+        Berhenti juga kalau tidak ada event baru selama idle_timeout detik
+        (producer mati / worker restart) — pemanggil yang memutuskan fallback.
+        """
+        if get_bus_client() is None:
+            return
+        last = after_seq
+        async with subscription(self.channel) as pubsub:
+            for event in await self._range(last):
+                last += 1
+                if event.get("type") == self.EOF:
+                    return
+                yield last, event
+
+            loop = asyncio.get_running_loop()
+            idle_since = loop.time()
+            while True:
+                msg = await next_message(pubsub, timeout=1.0)
+                if msg is None:
+                    if loop.time() - idle_since > idle_timeout:
+                        logger.warning(f"⏱️ EventLog {self.name}: idle {idle_timeout}s, berhenti follow")
+                        return
+                    continue
+                idle_since = loop.time()
+                seq = int(msg.get("seq", 0))
+                if seq <= last:
+                    continue
+                # Ada celah (pesan pub/sub hilang) — isi dari list
+                pending = [msg.get("event") or {}]
+                if seq > last + 1:
+                    pending = await self._range(last, seq - 1)
+                for event in pending:
+                    last += 1
+                    if event.get("type") == self.EOF:
+                        return
+                    yield last, event
@@ -0,0 +1,178 @@
+"""
+Request Registry - Satu Request Aktif per Session (Lintas Worker)
+=================================================================
+Setiap /ask dan /ask/stream mendaftarkan CancellationToken untuk session-nya.
+Pesan baru di session yang sama membatalkan token lama (reason="superseded"),
+sehingga pipeline lama berhenti di titik await saat itu juga.
+
+Dengan 3 worker gunicorn, pesan baru sering mendarat di worker lain. Karena itu:
+- Key `denai:req:current:{session_id}` menyimpan request_id yang berlaku.
+- Request baru PUBLISH ke channel `denai:req:cancel`; listener di setiap worker
+  membatalkan token lokal untuk session itu yang request_id-nya berbeda.
+- Tanpa pub/sub (REDIS_URL kosong) tapi Upstash aktif: token lama mem-poll key
+  current setiap SUPERSEDE_POLL_INTERVAL detik sebagai fallback.
+
+cancel_session() dipakai tombol Stop: membatalkan request aktif session itu
+di worker mana pun, seketika (tidak menunggu grace period resume stream).
+"""
+
+import asyncio
+import logging
+import uuid
+from typing import Dict, List, Optional, Set
+
+from app.cancellation import CancellationToken
+from backend.services.redis_bus import get_bus_client, publish, subscription, next_message
+
+logger = logging.getLogger(__name__)
+
+CANCEL_CHANNEL = "denai:req:cancel"
+CURRENT_KEY_TTL = 600
+SUPERSEDE_POLL_INTERVAL = 2.0
+WORKER_ID = uuid.uuid4().hex[:8]
+
+
+def _current_key(session_id: str) -> str:
+    return f"denai:req:current:{session_id}"
+
+
+def _upstash():
+    try:
+        from memory.memory_hybrid import redis_client, REDIS_AVAILABLE
+        return redis_client if REDIS_AVAILABLE else None
+    except Exception:
+        return None
+
+
+class RequestRegistry:
+    def __init__(self):
+        self._active: Dict[str, CancellationToken] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self._releases: Set[asyncio.Task] = set()  # referensi agar task release tidak di-GC di tengah jalan
+
+    async def start(self, session_id: str, label: str = "") -> CancellationToken:
+        previous = self._active.get(session_id)
+        if previous is not None and not previous.cancelled:
+            logger.warning(f"🛑 Pesan baru di session {session_id[:8]} — batalkan request sebelumnya")
+            previous.cancel("superseded")
+
+        token = CancellationToken(label=label or session_id[:8])
+        self._active[session_id] = token
+
+        # Umumkan ke worker lain: request ini yang berlaku untuk session tersebut
+        bus = get_bus_client()
+        try:
+            if bus is not None:
+                await bus.set(_current_key(session_id), token.request_id, ex=CURRENT_KEY_TTL)
+                await publish(CANCEL_CHANNEL, {"session_id": session_id, "request_id": token.request_id, "worker": WORKER_ID})
+            else:
+                upstash = _upstash()
+                if upstash is not None:
+                    await upstash.set(_current_key(session_id), token.request_id, ex=CURRENT_KEY_TTL)
+                    self._spawn_poller(session_id, token, upstash)
+        except Exception as e:
+            logger.warning(f"⚠️ Registry Redis gagal (supersession hanya lokal): {e}")
+        return token
+
+    def finish(self, session_id: str, token: CancellationToken) -> None:
+        if self._active.get(session_id) is token:
+            del self._active[session_id]
+        token.close()
+        if not token.cancelled:
+            task = asyncio.create_task(self._release(session_id, token.request_id))
+            self._releases.add(task)
+            task.add_done_callback(self._release_done)
+
+    def _release_done(self, task: asyncio.Task) -> None:
+        self._releases.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"⚠️ Registry release gagal: {task.exception()}")
+
+    async def _release(self, session_id: str, request_id: str) -> None:
+        """Hapus key current hanya kalau masih milik request ini."""
+        client = get_bus_client() or _upstash()
+        if client is None or not request_id:
+            return
+        try:
+            if await client.get(_current_key(session_id)) == request_id:
+                await client.delete(_current_key(session_id))
+        except Exception as e:
+            logger.debug(f"Registry release gagal: {e}")
+
+    async def cancel_session(self, session_id: str, reason: str = "user_stopped") -> bool:
+        """Batalkan request aktif session ini (lokal + worker lain via channel cancel)."""
+        token = self._active.get(session_id)
+        cancelled = token.cancel(reason) if token is not None else False
+        if get_bus_client() is not None:
+            await publish(CANCEL_CHANNEL, {"session_id": session_id, "request_id": "", "worker": WORKER_ID, "reason": reason})
+        else:
+            upstash = _upstash()
+            if upstash is not None:
+                try:
+                    # Poller token di worker lain melihat key berubah → cancel
+                    await upstash.set(_current_key(session_id), f"stopped:{WORKER_ID}", ex=CURRENT_KEY_TTL)
+                except Exception as e:
+                    logger.debug(f"Registry stop gagal: {e}")
+        return cancelled
+
+    def get(self, session_id: str):
+        return self._active.get(session_id)
+
+    def active_sessions(self) -> List[str]:
+        return list(self._active.keys())
+
+    # ── Cross-worker ───────────────────────────────────────────────────
+    def _supersede_local(self, session_id: str, request_id: str, reason: str = "superseded") -> None:
+        token = self._active.get(session_id)
+        if token is not None and token.request_id != request_id and not token.cancelled:
+            logger.warning(f"🛑 Session {session_id[:8]} dibatalkan dari worker lain ({reason}) — cancel request lokal")
+            token.cancel(reason)
+
+    def _spawn_poller(self, session_id: str, token: CancellationToken, upstash) -> None:
+        async def _poll():
+            try:
+                while not token.cancelled and self._active.get(session_id) is token:
+                    await asyncio.sleep(SUPERSEDE_POLL_INTERVAL)
+                    current = await upstash.get(_current_key(session_id))
+                    if current and current != token.request_id:
+                        reason = "user_stopped" if current.startswith("stopped:") else "superseded"
+                        self._supersede_local(session_id, current, reason)
+                        return
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                logger.debug(f"Supersede poller error: {e}")
+
+        token.add_watcher(asyncio.create_task(_poll()))
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with subscription(CANCEL_CHANNEL) as pubsub:
+                    if pubsub is None:
+                        return
+                    logger.info(f"📡 Request cancel listener aktif (worker {WORKER_ID})")
+                    while True:
+                        msg = await next_message(pubsub, timeout=5.0)
+                        if msg and msg.get("worker") != WORKER_ID:
+                            self._supersede_local(
+                                msg.get("session_id", ""), msg.get("request_id", ""), msg.get("reason") or "superseded"
+                            )
+            except asyncio.CancelledError:
+                return
+            except Exception as e:
+                logger.warning(f"⚠️ Cancel listener terputus, reconnect 2s: {e}")
+                await asyncio.sleep(2)
+
+    def start_listener(self) -> None:
+        if get_bus_client() is None or self._listener is not None:
+            return
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop_listener(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+
+request_registry = RequestRegistry()
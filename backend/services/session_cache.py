@@ -0,0 +1,296 @@
+"""
+Session Metadata Cache - Redis + Near-Cache, Lintas Worker
+==========================================================
+Sebelumnya `_sessions_cache` hidup di memori satu proses (invalidasi dari
+worker A tidak sampai ke worker B), dan setiap /history + endpoint session
+memanggil get_session_owner ke Supabase.
+
+Sekarang ada dua lapis:
+
+1. Metadata per session (owner NIK, title, pinned, last_message_at)
+   - Redis `denai:sessmeta:{session_id}` (TTL SESSION_META_TTL)
+   - near-cache TTL-LRU in-process → cek kepemilikan biasanya lookup memori
+   - session baru di-prime setelah baris Supabase-nya benar-benar ter-INSERT
+     (SET NX, owner kosong tidak di-cache)
+
+2. Daftar session (sidebar) per NIK, dengan version counter
+   - `denai:sesslist:ver:{nik}` di-INCR setiap ada perubahan (pin, hapus,
+     session/pesan baru) → key daftar lama otomatis tidak terpakai lagi
+   - versi global `denai:sesslist:ver:__global__` di-bump untuk perubahan
+     session tanpa NIK (terlihat oleh semua user)
+   - versi di-cache lokal SESSION_VERSION_NEAR_TTL detik — batas atas
+     staleness lintas worker; worker yang melakukan perubahan langsung melihatnya
+
+Tanpa Redis semuanya jatuh ke near-cache lokal (perilaku lama per worker).
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.config import SESSION_META_TTL, SESSION_LIST_TTL, SESSION_VERSION_NEAR_TTL
+from backend.utils.ttl_cache import TTLCache, MISSING
+
+logger = logging.getLogger(__name__)
+
+_GLOBAL = "__global__"
+_ALL = "__all__"
+_NEAR_META_TTL = 30.0
+_NEGATIVE_TTL = 10.0
+
+
+def _redis():
+    try:
+        from memory.memory_hybrid import redis_client, REDIS_AVAILABLE
+        return redis_client if REDIS_AVAILABLE else None
+    except Exception:
+        return None
+
+
+def _meta_key(session_id: str) -> str:
+    return f"denai:sessmeta:{session_id}"
+
+
+def _ver_key(scope: str) -> str:
+    return f"denai:sesslist:ver:{scope}"
+
+
+def _list_key(scope: str, version: str, limit: int) -> str:
+    return f"denai:sesslist:{scope}:{version}:{limit}"
+
+
+class SessionCache:
+    def __init__(self):
+        self._meta = TTLCache(maxsize=5000, ttl=_NEAR_META_TTL)
+        self._lists = TTLCache(maxsize=1000, ttl=SESSION_LIST_TTL)
+        self._versions = TTLCache(maxsize=2000, ttl=SESSION_VERSION_NEAR_TTL)
+        # Fallback tanpa Redis: counter lokal
+        self._local_versions: Dict[str, int] = {}
+        # Referensi task background (prime / invalidasi) — tanpa ini task bisa di-GC sebelum selesai
+        self._background: Set[asyncio.Task] = set()
+
+    # ── Metadata & kepemilikan ─────────────────────────────────────────
+    def prime(self, session_id: str, owner: str = "", title: str = "", pinned: bool = False) -> None:
+        """Session yang BARU SAJA ter-INSERT oleh worker ini → owner diketahui tanpa Supabase.
+        Owner kosong tidak pernah di-cache (can_access menganggapnya terbuka untuk semua), dan
+        Redis ditulis SET NX — metadata yang sudah ada tidak pernah ditimpa."""
+        if not owner:
+            return
+        meta = {"session_id": session_id, "nik": owner, "title": title, "pinned": pinned, "last_message_at": None}
+        self._meta.set(session_id, meta)
+        client = _redis()
+        if client is not None:
+            self._spawn(self._store_meta(client, session_id, meta, only_new=True))
+
+    async def get_meta(self, session_id: str) -> Optional[Dict[str, Any]]:
+        meta = self._meta.get(session_id)
+        if meta is not MISSING:
+            return meta
+        client = _redis()
+        if client is not None:
+            try:
+                from memory.redis_pipeline import timed
+                raw = await timed("session.meta", client.get(_meta_key(session_id)))
+                if raw:
+                    meta = json.loads(raw) if isinstance(raw, str) else raw
+                    self._meta.set(session_id, meta)
+                    return meta
+            except Exception as e:
+                logger.debug(f"Session meta Redis gagal: {e}")
+        try:
+            from memory.memory_supabase import get_session_meta
+            meta = await asyncio.to_thread(get_session_meta, session_id)
+        except Exception as e:
+            logger.warning(f"⚠️ Session meta Supabase gagal: {e}")
+            return None
+        if meta is None:
+            # Negative cache singkat — session belum ada / belum ter-flush
+            self._meta.set(session_id, None, ttl=_NEGATIVE_TTL)
+            return None
+        self._meta.set(session_id, meta)
+        if client is not None:
+            await self._store_meta(client, session_id, meta)
+        return meta
+
+    async def get_owner(self, session_id: str) -> str:
+        meta = await self.get_meta(session_id)
+        return (meta or {}).get("nik") or ""
+
+    async def can_access(self, session_id: str, auth_nik: Optional[str]) -> bool:
+        """Sama dengan cek lama: hanya ditolak kalau session punya owner yang berbeda."""
+        if not auth_nik:
+            return True
+        owner = await self.get_owner(session_id)
+        return not owner or owner == auth_nik
+
+    async def update_meta(self, session_id: str, **fields) -> None:
+        meta = self._meta.get(session_id)
+        if meta is MISSING or meta is None:
+            meta = None
+        else:
+            meta = {**meta, **fields}
+            self._meta.set(session_id, meta)
+        client = _redis()
+        if client is None:
+            return
+        if meta is None:
+            # Tidak tahu nilai lengkapnya → hapus, biar diisi ulang dari Supabase
+            await self._delete_meta(client, session_id)
+        else:
+            await self._store_meta(client, session_id, meta)
+
+    async def drop(self, session_id: str) -> None:
+        self._meta.pop(session_id)
+        client = _redis()
+        if client is not None:
+            await self._delete_meta(client, session_id)
+
+    async def _store_meta(self, client, session_id: str, meta: Dict[str, Any], only_new: bool = False) -> None:
+        try:
+            from memory.redis_pipeline import timed
+            payload = json.dumps(meta, default=str)
+            if only_new:
+                await timed("session.meta_set", client.set(_meta_key(session_id), payload, ex=SESSION_META_TTL, nx=True))
+            else:
+                await timed("session.meta_set", client.set(_meta_key(session_id), payload, ex=SESSION_META_TTL))
+        except Exception as e:
+            logger.debug(f"Session meta set gagal: {e}")
+
+    async def _delete_meta(self, client, session_id: str) -> None:
+        try:
+            from memory.redis_pipeline import timed
+            await timed("session.meta_del", client.delete(_meta_key(session_id)))
+        except Exception as e:
+            logger.debug(f"Session meta delete gagal: {e}")
+
+    # ── Daftar session (versioned) ─────────────────────────────────────
+    async def _version(self, nik: Optional[str]) -> str:
+        scope = nik or _ALL
+        cached = self._versions.get(scope)
+        if cached is not MISSING:
+            return cached
+        client = _redis()
+        if client is None:
+            version = f"{self._local_versions.get(_GLOBAL, 0)}.{self._local_versions.get(scope, 0)}"
+        else:
+            try:
+                from memory.redis_pipeline import RedisBatch
+                g, v = await (
+                    RedisBatch(client, "session.list_version", transaction=False)
+                    .add("get", _ver_key(_GLOBAL))
+                    .add("get", _ver_key(scope))
+                    .execute()
+                )
+                version = f"{g or 0}.{v or 0}"
+            except Exception as e:
+                logger.debug(f"Session list version gagal: {e}")
+                version = f"{self._local_versions.get(_GLOBAL, 0)}.{self._local_versions.get(scope, 0)}"
+        self._versions.set(scope, version)
+        return version
+
+    async def get_list(self, nik: Optional[str], limit: int) -> Optional[Tuple[List[dict], Optional[str]]]:
+        scope = nik or _ALL
+        version = await self._version(nik)
+        key = _list_key(scope, version, limit)
+        cached = self._lists.get(key)
+        if cached is not MISSING:
+            return cached
+        client = _redis()
+        if client is None:
+            return None
+        try:
+            from memory.redis_pipeline import timed
+            raw = await timed("session.list_get", client.get(key))
+        except Exception as e:
+            logger.debug(f"Session list Redis gagal: {e}")
+            return None
+        if not raw:
+            return None
+        data = json.loads(raw) if isinstance(raw, str) else raw
+        page = (data.get("sessions") or [], data.get("next"))
+        self._lists.set(key, page)
+        return page
+
+    async def set_list(self, nik: Optional[str], limit: int, sessions: List[dict], next_cursor: Optional[str]) -> None:
+        scope = nik or _ALL
+        version = await self._version(nik)
+        key = _list_key(scope, version, limit)
+        self._lists.set(key, (sessions, next_cursor))
+        for s in sessions:
+            if s.get("session_id"):
+                self._meta.set(s["session_id"], {
+                    k: s.get(k) for k in ("session_id", "nik", "title", "pinned", "last_message_at")
+                })
+        client = _redis()
+        if client is None:
+            return
+        try:
+            from memory.redis_pipeline import timed
+            payload = json.dumps({"sessions": sessions, "next": next_cursor}, default=str)
+            await timed("session.list_set", client.set(key, payload, ex=SESSION_LIST_TTL))
+        except Exception as e:
+            logger.debug(f"Session list set gagal: {e}")
+
+    async def invalidate_list(self, nik: Optional[str] = None) -> None:
+        """Bump versi daftar milik NIK ini (nik kosong/None → versi global, semua user)."""
+        scope = nik or _GLOBAL
+        self._local_versions[scope] = self._local_versions.get(scope, 0) + 1
+        # Versi lokal langsung dibuang supaya worker ini tidak melayani daftar lama
+        if scope == _GLOBAL:
+            self._versions.clear()
+        else:
+            self._versions.pop(scope)
+            self._versions.pop(_ALL)
+        client = _redis()
+        if client is None:
+            return
+        try:
+            from memory.redis_pipeline import RedisBatch
+            batch = RedisBatch(client, "session.list_bump", transaction=False).add("incr", _ver_key(scope))
+            if scope != _GLOBAL:
+                # Tampilan "semua" (mode dev) juga berubah
+                batch.add("incr", _ver_key(_ALL))
+            await batch.execute()
+        except Exception as e:
+            logger.debug(f"Session list bump gagal: {e}")
+
+    def invalidate_list_nowait(self, nik: Optional[str] = None) -> None:
+        """Versi sync (dipanggil dari kode non-async) — bump di-schedule ke event loop."""
+        self._spawn(self.invalidate_list(nik))
+
+    async def touched(self, session_ids: List[str]) -> None:
+        """last_message_at session ini berubah → urutan sidebar pemiliknya basi, bump versinya."""
+        owners = set()
+        for sid in session_ids:
+            owners.add(await self.get_owner(sid))
+        for nik in owners:
+            await self.invalidate_list(nik or None)
+
+    def touched_nowait(self, session_ids: List[str]) -> None:
+        if session_ids:
+            self._spawn(self.touched(list(session_ids)))
+
+    def _spawn(self, coro) -> None:
+        try:
+            task = asyncio.get_running_loop().create_task(coro)
+        except RuntimeError:
+            coro.close()
+            return
+        self._background.add(task)
+        task.add_done_callback(self._background_done)
+
+    def _background_done(self, task: asyncio.Task) -> None:
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"⚠️ Session cache task background gagal: {task.exception()}")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "shared": _redis() is not None,
+            "meta_near_cache": self._meta.stats(),
+            "list_near_cache": self._lists.stats(),
+        }
+
+
+session_cache = SessionCache()
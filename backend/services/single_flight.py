@@ -0,0 +1,313 @@
+"""
+Single-Flight untuk Pertanyaan SOP
+==================================
+Setelah surat edaran HR keluar, puluhan karyawan bertanya hal yang sama dalam
+menit yang sama. Tanpa coalescing, tiap request menjalankan analyzer →
+retrieval → rerank → generation sendiri-sendiri.
+
+Layer ini menggabungkan request identik (pertanyaan kanonik + slot
+personalisasi band/lokasi) ke SATU pipeline "leader":
+
+- Dalam satu worker: follower menempel ke flight lokal, menerima replay token
+  yang sudah keluar lalu token live lewat asyncio.Queue masing-masing.
+- Lintas worker (REDIS_URL): leader dipilih via SET NX, token di-mirror ke
+  EventLog (redis_bus) dan follower di worker lain membacanya via pub/sub.
+
+Leader berjalan sebagai task terpisah (bukan milik request manapun), jadi
+follower yang disconnect / dibatalkan TIDAK membatalkan leader. Pipeline
+hanya dihentikan kalau semua subscriber (lokal + remote) sudah pergi.
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set
+
+from app.config import (
+    SINGLE_FLIGHT_ENABLED,
+    SINGLE_FLIGHT_LEADER_TTL,
+    SINGLE_FLIGHT_FOLLOW_TIMEOUT,
+)
+from backend.services.redis_bus import EventLog, get_bus_client
+
+logger = logging.getLogger(__name__)
+
+WORKER_ID = uuid.uuid4().hex[:8]
+
+# Producer menerima (out_context, cancellation_check) dan yield chunk teks
+Producer = Callable[[dict, Callable], AsyncIterator[str]]
+
+_END = object()
+
+
+def canonicalize_question(question: str) -> str:
+    """Lowercase, buang aksen/tanda baca, rapikan spasi — "Cuti  Melahirkan?" == "cuti melahirkan"."""
+    text = unicodedata.normalize("NFKD", question or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def make_flight_key(question: str, **slots: Any) -> str:
+    """Key = hash(pertanyaan kanonik + slot personalisasi yang mempengaruhi jawaban)."""
+    slot_str = "|".join(f"{k}={str(v).strip().lower()}" for k, v in sorted(slots.items()) if v not in (None, ""))
+    raw = f"{canonicalize_question(question)}#{slot_str}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class SingleFlightStats:
+    leaders: int = 0
+    local_followers: int = 0
+    remote_followers: int = 0
+    remote_fallbacks: int = 0
+
+
+@dataclass
+class _Flight:
+    key: str
+    chunks: List[str] = field(default_factory=list)
+    subscribers: Set[asyncio.Queue] = field(default_factory=set)
+    out_context: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[BaseException] = None
+    finished: bool = False
+    task: Optional[asyncio.Task] = None
+    event_log: Optional[EventLog] = None
+    flight_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    started_at: float = field(default_factory=time.time)
+
+
+class SingleFlight:
+    def __init__(self, namespace: str = "sop"):
+        self.namespace = namespace
+        self._flights: Dict[str, _Flight] = {}
+        # Referensi task background (abort orphan) — tanpa ini task bisa di-GC sebelum selesai
+        self._background: Set[asyncio.Task] = set()
+        self.stats = SingleFlightStats()
+
+    # ── Key Redis ──────────────────────────────────────────────────────
+    def _lead_key(self, key: str) -> str:
+        return f"denai:sf:{self.namespace}:lead:{key}"
+
+    def _followers_key(self, key: str) -> str:
+        return f"denai:sf:{self.namespace}:followers:{key}"
+
+    def _log_name(self, key: str, flight_id: str) -> str:
+        # flight_id unik per leader agar follower tidak membaca log flight lama
+        return f"sf:{self.namespace}:{key}:{flight_id}"
+
+    # ── Public API ─────────────────────────────────────────────────────
+    async def stream(
+        self,
+        key: str,
+        producer: Producer,
+        out_context: Optional[dict] = None,
+        cancellation_check: Optional[Callable] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Yield chunk jawaban untuk `key`. Request pertama menjadi leader,
+        request identik berikutnya (di worker mana pun) menjadi follower.
+        `out_context` diisi dengan context milik leader saat stream selesai.
+        `cancellation_check` milik request ini dipakai kalau pipeline dijalankan
+        sendiri (single-flight mati / fallback) — leader bersama tidak memakainya.
+        """
+        if not SINGLE_FLIGHT_ENABLED:
+            async for chunk in producer(out_context if out_context is not None else {}, cancellation_check):
+                yield chunk
+            return
+
+        flight = self._flights.get(key)
+        if flight is not None and not flight.finished:
+            self.stats.local_followers += 1
+            logger.info(f"🔗 Single-flight: follower lokal menempel ke {key[:10]}")
+            async for chunk in self._subscribe_local(flight, out_context):
+                yield chunk
+            return
+
+        client = get_bus_client()
+        flight = _Flight(key=key)
+        if client is not None:
+            leader_id = None
+            try:
+                acquired = await client.set(self._lead_key(key), flight.flight_id, nx=True, ex=SINGLE_FLIGHT_LEADER_TTL)
+                if not acquired:
+                    leader_id = await client.get(self._lead_key(key))
+            except Exception as e:
+                logger.warning(f"⚠️ Single-flight leader election gagal, jalan lokal: {e}")
+            if leader_id:
+                got_any = False
+                async for chunk in self._follow_remote(key, leader_id, out_context):
+                    got_any = True
+                    yield chunk
+                if got_any:
+                    return
+                # Leader remote tidak mengirim apapun (mati / timeout) — jalan sendiri.
+                # (Mati SETELAH mengirim token → _follow_remote raise, jawaban tidak dianggap lengkap.)
+                self.stats.remote_fallbacks += 1
+                logger.warning(f"⚠️ Single-flight: leader remote {key[:10]} tidak merespons, fallback pipeline sendiri")
+                async for chunk in producer(out_context if out_context is not None else {}, cancellation_check):
+                    yield chunk
+                return
+
+        flight = self._start_leader(flight, producer, mirror=client is not None)
+        async for chunk in self._subscribe_local(flight, out_context):
+            yield chunk
+
+    def active_flights(self) -> Dict[str, int]:
+        return {k[:10]: len(f.subscribers) for k, f in self._flights.items() if not f.finished}
+
+    # ── Leader ─────────────────────────────────────────────────────────
+    def _start_leader(self, flight: _Flight, producer: Producer, mirror: bool) -> _Flight:
+        key = flight.key
+        if mirror:
+            flight.event_log = EventLog(self._log_name(key, flight.flight_id), ttl=SINGLE_FLIGHT_LEADER_TTL)
+        self._flights[key] = flight
+        self.stats.leaders += 1
+        # Task independen: pembatalan request apapun tidak merambat ke sini
+        flight.task = asyncio.create_task(self._run_leader(flight, producer))
+        logger.info(f"🚀 Single-flight: leader baru {key[:10]} (worker {WORKER_ID})")
+        return flight
+
+    async def _has_audience(self, flight: _Flight) -> bool:
+        if flight.subscribers:
+            return True
+        if flight.event_log is None:
+            return False
+        try:
+            remote = await get_bus_client().get(self._followers_key(flight.key))
+            return int(remote or 0) > 0
+        except Exception:
+            return False
+
+    async def _run_leader(self, flight: _Flight, producer: Producer) -> None:
+        async def _cancellation_check() -> bool:
+            # Leader hanya berhenti kalau TIDAK ada lagi yang mendengarkan
+            return not await self._has_audience(flight)
+
+        try:
+            async for chunk in producer(flight.out_context, _cancellation_check):
+                flight.chunks.append(chunk)
+                for q in list(flight.subscribers):
+                    q.put_nowait(chunk)
+                if flight.event_log is not None:
+                    try:
+                        await flight.event_log.append({"type": "token", "content": chunk})
+                    except Exception as e:
+                        logger.debug(f"Single-flight mirror gagal: {e}")
+        except asyncio.CancelledError as e:
+            flight.error = e
+        except Exception as e:
+            flight.error = e
+            logger.error(f"❌ Single-flight leader {flight.key[:10]} error: {e}")
+        finally:
+            flight.finished = True
+            for q in list(flight.subscribers):
+                q.put_nowait(_END)
+            if flight.event_log is not None:
+                try:
+                    if flight.error is None:
+                        await flight.event_log.append({"type": "context", "context": flight.out_context})
+                    else:
+                        await flight.event_log.append({"type": "error", "message": str(flight.error)})
+                    await flight.event_log.close()
+                    # Hapus lock hanya kalau masih milik flight ini
+                    client = get_bus_client()
+                    if await client.get(self._lead_key(flight.key)) == flight.flight_id:
+                        await client.delete(self._lead_key(flight.key))
+                except Exception as e:
+                    logger.debug(f"Single-flight cleanup Redis gagal: {e}")
+            if self._flights.get(flight.key) is flight:
+                self._flights.pop(flight.key, None)
+
+    # ── Follower ───────────────────────────────────────────────────────
+    async def _subscribe_local(self, flight: _Flight, out_context: Optional[dict]) -> AsyncIterator[str]:
+        queue: asyncio.Queue = asyncio.Queue()
+        # Replay chunk yang sudah keluar SEBELUM masuk daftar subscriber —
+        # tidak ada await di antaranya, jadi tidak ada chunk yang terlewat/dobel.
+        for chunk in flight.chunks:
+            queue.put_nowait(chunk)
+        if flight.finished:
+            queue.put_nowait(_END)
+        flight.subscribers.add(queue)
+        try:
+            while True:
+                item = await queue.get()
+                if item is _END:
+                    break
+                yield item
+            if flight.error is not None:
+                if isinstance(flight.error, asyncio.CancelledError):
+                    raise asyncio.CancelledError()
+                raise flight.error
+            if out_context is not None:
+                out_context.update(flight.out_context)
+        finally:
+            # Follower pergi (selesai / cancel / disconnect) — leader tetap jalan
+            # selama masih ada subscriber lain; kalau tidak ada, abort seketika.
+            flight.subscribers.discard(queue)
+            if not flight.subscribers and not flight.finished:
+                self._spawn(self._abort_if_orphaned(flight))
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background_done)
+
+    def _background_done(self, task: asyncio.Task) -> None:
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"⚠️ Single-flight task background gagal: {task.exception()}")
+
+    async def _abort_if_orphaned(self, flight: _Flight) -> None:
+        """Batalkan task leader (dan request HTTP provider-nya) kalau tidak ada lagi pendengar."""
+        if flight.finished or await self._has_audience(flight):
+            return
+        if flight.subscribers or flight.task is None or flight.task.done():
+            return
+        logger.info(f"🛑 Single-flight {flight.key[:10]}: semua subscriber pergi, abort leader")
+        if self._flights.get(flight.key) is flight:
+            self._flights.pop(flight.key, None)
+        flight.task.cancel()
+
+    async def _follow_remote(self, key: str, leader_id: str, out_context: Optional[dict]) -> AsyncIterator[str]:
+        client = get_bus_client()
+        followers_key = self._followers_key(key)
+        self.stats.remote_followers += 1
+        logger.info(f"🔗 Single-flight: follower remote menempel ke {key[:10]}")
+        try:
+            await client.incr(followers_key)
+            await client.expire(followers_key, SINGLE_FLIGHT_LEADER_TTL)
+        except Exception:
+            pass
+        got_any = completed = False
+        try:
+            log = EventLog(self._log_name(key, leader_id), ttl=SINGLE_FLIGHT_LEADER_TTL)
+            async for _seq, event in log.follow(idle_timeout=SINGLE_FLIGHT_FOLLOW_TIMEOUT):
+                etype = event.get("type")
+                if etype == "token":
+                    got_any = True
+                    yield event.get("content", "")
+                elif etype == "context":
+                    completed = True
+                    if out_context is not None:
+                        out_context.update(event.get("context") or {})
+                elif etype == "error":
+                    raise RuntimeError(event.get("message") or "single-flight leader error")
+            if got_any and not completed:
+                # Log berhenti (idle timeout / EOF) tanpa event context → leader mati di
+                # tengah jawaban; jangan kirim jawaban terpotong seolah-olah lengkap
+                raise RuntimeError(f"single-flight leader {key[:10]} berhenti sebelum jawaban selesai")
+        finally:
+            try:
+                await client.decr(followers_key)
+            except Exception:
+                pass
+
+
+# Singleton per worker untuk jalur SOP
+sop_single_flight = SingleFlight("sop")
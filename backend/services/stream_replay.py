@@ -0,0 +1,240 @@
+"""
+Stream Replay - SSE yang Bisa Di-resume (Last-Event-ID)
+=======================================================
+Koneksi mobile yang putus di tengah jawaban SOP 30 detik dulu berarti frontend
+bertanya ulang dan seluruh pipeline jalan lagi dari nol.
+
+Sekarang setiap /ask/stream punya stream_id dan setiap event diberi seq:
+
+- Pipeline (generator event di chat.py) berjalan sebagai task producer yang
+  terlepas dari koneksi HTTP. Koneksi hanyalah subscriber dari buffer.
+- Buffer lokal (memori worker) menyimpan semua event; subscriber baru
+  menerima replay event setelah seq tertentu lalu lanjut live.
+- Kalau REDIS_URL aktif, event di-mirror ke EventLog (redis_bus) per batch
+  (STREAM_REPLAY_FLUSH_MS) dengan TTL pendek, sehingga reconnect yang mendarat
+  di worker lain tetap bisa replay + follow live tanpa menghitung ulang.
+- Client putus → producer tetap jalan selama STREAM_RESUME_GRACE detik.
+  Kalau tidak ada yang resume (lokal maupun remote), token dibatalkan seperti
+  disconnect biasa. Stop eksplisit dari user tetap membatalkan seketika.
+
+Id event SSE = "{stream_id}:{seq}". stream_id adalah uuid acak — hanya
+pemilik response awal yang mengetahuinya.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+from app.config import STREAM_REPLAY_TTL, STREAM_RESUME_GRACE, STREAM_REPLAY_FLUSH_MS
+from backend.services.redis_bus import EventLog, get_bus_client
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+def format_event_id(stream_id: str, seq: int) -> str:
+    return f"{stream_id}:{seq}"
+
+
+def parse_event_id(event_id: Optional[str]) -> Optional[Tuple[str, int]]:
+    """"abc123:42" → ("abc123", 42). None kalau format tidak valid."""
+    if not event_id or ":" not in event_id:
+        return None
+    stream_id, _, seq = event_id.strip().rpartition(":")
+    if not stream_id or not seq.isdigit():
+        return None
+    return stream_id, int(seq)
+
+
+@dataclass
+class _ReplayBuffer:
+    stream_id: str
+    events: List[Dict[str, Any]] = field(default_factory=list)  # seq = index + 1
+    subscribers: Set[asyncio.Queue] = field(default_factory=set)
+    finished: bool = False
+    task: Optional[asyncio.Task] = None
+    on_orphan: Optional[Callable[[], Any]] = None
+    log: Optional[EventLog] = None
+    mirrored: int = 0
+    mirror_task: Optional[asyncio.Task] = None
+    reaper: Optional[asyncio.Task] = None
+    created_at: float = field(default_factory=time.time)
+
+
+class StreamHub:
+    def __init__(self):
+        self._streams: Dict[str, _ReplayBuffer] = {}
+
+    def _followers_key(self, stream_id: str) -> str:
+        return f"denai:stream:{stream_id}:followers"
+
+    # ── Producer ───────────────────────────────────────────────────────
+    def start(
+        self,
+        stream_id: str,
+        events: AsyncIterator[Dict[str, Any]],
+        on_orphan: Optional[Callable[[], Any]] = None,
+    ) -> None:
+        """
+        Jalankan generator event sebagai task terpisah. `on_orphan` dipanggil
+        kalau semua subscriber pergi dan tidak ada yang resume dalam grace period.
+        """
+        buf = _ReplayBuffer(stream_id=stream_id, on_orphan=on_orphan)
+        if get_bus_client() is not None:
+            buf.log = EventLog(f"stream:{stream_id}", ttl=STREAM_REPLAY_TTL)
+            buf.mirror_task = asyncio.create_task(self._mirror_loop(buf))
+        self._streams[stream_id] = buf
+        buf.task = asyncio.create_task(self._produce(buf, events))
+
+    async def _produce(self, buf: _ReplayBuffer, events: AsyncIterator[Dict[str, Any]]) -> None:
+        try:
+            async for event in events:
+                buf.events.append(event)
+                seq = len(buf.events)
+                for q in list(buf.subscribers):
+                    q.put_nowait((seq, event))
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"❌ Stream {buf.stream_id[:8]} producer error: {e}")
+            buf.events.append({"type": "error", "message": str(e)})
+            for q in list(buf.subscribers):
+                q.put_nowait((len(buf.events), buf.events[-1]))
+        finally:
+            buf.finished = True
+            for q in list(buf.subscribers):
+                q.put_nowait(_END)
+            if buf.mirror_task is not None:
+                buf.mirror_task.cancel()
+                await self._flush_mirror(buf)
+                if buf.log is not None:
+                    await buf.log.close()
+            if buf.reaper is not None:
+                buf.reaper.cancel()
+            # Buffer lokal disimpan selama TTL untuk resume setelah selesai
+            asyncio.get_running_loop().call_later(STREAM_REPLAY_TTL, self._drop, buf)
+
+    def _drop(self, buf: _ReplayBuffer) -> None:
+        if self._streams.get(buf.stream_id) is buf:
+            del self._streams[buf.stream_id]
+
+    async def _mirror_loop(self, buf: _ReplayBuffer) -> None:
+        interval = max(0.02, STREAM_REPLAY_FLUSH_MS / 1000.0)
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await self._flush_mirror(buf)
+        except asyncio.CancelledError:
+            pass
+
+    async def _flush_mirror(self, buf: _ReplayBuffer) -> None:
+        """Kirim event yang belum ter-mirror sebagai satu batch (satu append Redis)."""
+        if buf.log is None or buf.mirrored >= len(buf.events):
+            return
+        start, end = buf.mirrored, len(buf.events)
+        try:
+            await buf.log.append({"type": "batch", "from": start + 1, "events": buf.events[start:end]})
+            buf.mirrored = end
+        except Exception as e:
+            logger.debug(f"Stream mirror gagal ({buf.stream_id[:8]}): {e}")
+
+    # ── Subscriber ─────────────────────────────────────────────────────
+    def has_local(self, stream_id: str) -> bool:
+        return stream_id in self._streams
+
+    async def exists(self, stream_id: str) -> bool:
+        if stream_id in self._streams:
+            return True
+        if get_bus_client() is None:
+            return False
+        return await EventLog(f"stream:{stream_id}", ttl=STREAM_REPLAY_TTL).exists()
+
+    async def subscribe(self, stream_id: str, after_seq: int = 0) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Yield (event_id, event) dengan seq > after_seq — lokal kalau ada, kalau tidak dari Redis."""
+        buf = self._streams.get(stream_id)
+        if buf is not None:
+            async for item in self._subscribe_local(buf, after_seq):
+                yield item
+        else:
+            async for item in self._subscribe_remote(stream_id, after_seq):
+                yield item
+
+    async def _subscribe_local(self, buf: _ReplayBuffer, after_seq: int) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        queue: asyncio.Queue = asyncio.Queue()
+        # Replay + daftar subscriber tanpa await di antaranya → tidak ada event terlewat
+        for i in range(after_seq, len(buf.events)):
+            queue.put_nowait((i + 1, buf.events[i]))
+        if buf.finished:
+            queue.put_nowait(_END)
+        buf.subscribers.add(queue)
+        if buf.reaper is not None:
+            buf.reaper.cancel()
+            buf.reaper = None
+        try:
+            while True:
+                item = await queue.get()
+                if item is _END:
+                    return
+                seq, event = item
+                yield format_event_id(buf.stream_id, seq), event
+        finally:
+            buf.subscribers.discard(queue)
+            if not buf.subscribers and not buf.finished:
+                buf.reaper = asyncio.create_task(self._reap_if_orphaned(buf))
+
+    async def _reap_if_orphaned(self, buf: _ReplayBuffer) -> None:
+        """Tunggu grace period; kalau tidak ada yang resume, hentikan pipeline."""
+        try:
+            await asyncio.sleep(STREAM_RESUME_GRACE)
+        except asyncio.CancelledError:
+            return
+        if buf.finished or buf.subscribers:
+            return
+        client = get_bus_client()
+        if client is not None:
+            try:
+                if int(await client.get(self._followers_key(buf.stream_id)) or 0) > 0:
+                    return
+            except Exception:
+                pass
+        logger.info(f"🛑 Stream {buf.stream_id[:8]}: tidak ada resume dalam {STREAM_RESUME_GRACE}s, batalkan")
+        if buf.on_orphan is not None:
+            buf.on_orphan()
+        elif buf.task is not None:
+            buf.task.cancel()
+
+    async def _subscribe_remote(self, stream_id: str, after_seq: int) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        client = get_bus_client()
+        if client is None:
+            return
+        followers_key = self._followers_key(stream_id)
+        try:
+            await client.incr(followers_key)
+            await client.expire(followers_key, STREAM_REPLAY_TTL)
+        except Exception:
+            pass
+        last = after_seq
+        try:
+            log = EventLog(f"stream:{stream_id}", ttl=STREAM_REPLAY_TTL)
+            async for _n, batch in log.follow(idle_timeout=STREAM_REPLAY_TTL):
+                first = int(batch.get("from", 0))
+                for offset, event in enumerate(batch.get("events") or []):
+                    seq = first + offset
+                    if seq <= last:
+                        continue
+                    last = seq
+                    yield format_event_id(stream_id, seq), event
+        finally:
+            try:
+                await client.decr(followers_key)
+            except Exception:
+                pass
+
+    def active_streams(self) -> Dict[str, int]:
+        return {sid[:8]: len(b.subscribers) for sid, b in self._streams.items() if not b.finished}
+
+
+stream_hub = StreamHub()
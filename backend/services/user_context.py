@@ -2,42 +2,54 @@
 User Context Store - SINTA Integration
 =======================================
 Menyimpan data user dari SINTA per session_id.
-Layer 1: In-memory (cepat)
-Layer 2: Redis (persistent, survive server restart)
+Layer 1: In-memory TTL-LRU (cepat, ukuran terbatas — USER_CTX_CACHE_MAX)
+Layer 2: Redis async (persistent, survive server restart, lintas worker)
+
+Sebelumnya layer 2 memakai client Upstash SYNC dari handler async — setiap
+cache miss memblok event loop satu round trip HTTPS — dan dict in-memory
+tumbuh tanpa batas. Sekarang:
+- I/O Redis lewat client async memory_hybrid (Upstash async atau REDIS_URL)
+- Session yang tidak dikenal di-negative-cache USER_CTX_NEGATIVE_TTL detik
+  (header X-Auth-Session basi tidak memicu lookup Redis di setiap request)
+- Lookup paralel untuk session yang sama digabung jadi satu round trip
+
+API async (dipakai handler): get_user_context_async / set_user_context_async /
+clear_user_context_async. Versi sync get_user_context / set_user_context tetap
+ada untuk kode non-async: hanya membaca layer 1, Redis ditulis di background.
 """
 
+import asyncio
 import logging
 import json
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Set
 
-logger = logging.getLogger(__name__)
+from app.config import USER_CTX_CACHE_MAX, USER_CTX_CACHE_TTL, USER_CTX_NEGATIVE_TTL
+from backend.utils.ttl_cache import TTLCache, MISSING
 
-# In-memory cache (layer 1)
-_user_context_store: Dict[str, Dict[str, Any]] = {}
+logger = logging.getLogger(__name__)
 
-# Redis client (layer 2) — diinit lazy
-_redis = None
 REDIS_TTL = 86400 * 7  # 7 hari
 
 HC_UNIT_KEYWORDS = ["human capital", "hc ", " hc", "hcis", "people", "hr ", " hr"]
 
+# Layer 1 — value None = negative cache (session tidak dikenal)
+_user_context_store = TTLCache(maxsize=USER_CTX_CACHE_MAX, ttl=USER_CTX_CACHE_TTL)
+# Lookup Redis yang sedang berjalan per session (anti-stampede)
+_inflight: Dict[str, "asyncio.Future"] = {}
+
+
+def _redis_key(session_id: str) -> str:
+    return f"denai:user_ctx:{session_id}"
+
 
 def _get_redis():
-    global _redis
-    if _redis is not None:
-        return _redis
+    """Client Redis async dari memory_hybrid, atau None."""
     try:
-        from app.config import UPSTASH_REDIS_URL, UPSTASH_REDIS_TOKEN
-        if UPSTASH_REDIS_URL and UPSTASH_REDIS_TOKEN:
-            from upstash_redis import Redis
-            _redis = Redis(url=UPSTASH_REDIS_URL, token=UPSTASH_REDIS_TOKEN)
-            logger.info("✅ Redis connected for user context store")
-        else:
-            _redis = False  # tidak tersedia
+        from memory.memory_hybrid import redis_client, REDIS_AVAILABLE
+        return redis_client if REDIS_AVAILABLE else None
     except Exception as e:
         logger.warning(f"⚠️ Redis not available for user context: {e}")
-        _redis = False
-    return _redis
+        return None
 
 
 def determine_role_from_unit(unit_kerja: str) -> str:
@@ -48,50 +60,136 @@ def determine_role_from_unit(unit_kerja: str) -> str:
     return "karyawan"
 
 
-def set_user_context(session_id: str, context: Dict[str, Any]) -> None:
+def _log_saved(session_id: str, context: Dict[str, Any]) -> None:
+    logger.info(
+        f"✅ User context saved | session={session_id[:8]}... | "
+        f"nama={context.get('nama')} | band={context.get('band_angka')} | role={context.get('role')}"
+    )
+
+
+# ── Async API ────────────────────────────────────────────────────────────────
+async def set_user_context_async(session_id: str, context: Dict[str, Any]) -> None:
     """Simpan ke memory + Redis."""
-    _user_context_store[session_id] = context
+    _user_context_store.set(session_id, context)
 
     redis = _get_redis()
-    if redis:
+    if redis is not None:
         try:
-            redis.set(f"denai:user_ctx:{session_id}", json.dumps(context), ex=REDIS_TTL)
+            from memory.redis_pipeline import timed
+            await timed("user_ctx.set", redis.set(_redis_key(session_id), json.dumps(context), ex=REDIS_TTL))
         except Exception as e:
             logger.warning(f"⚠️ Failed to save user context to Redis: {e}")
 
-    logger.info(
-        f"✅ User context saved | session={session_id[:8]}... | "
-        f"nama={context.get('nama')} | band={context.get('band_angka')} | role={context.get('role')}"
-    )
+    _log_saved(session_id, context)
 
 
-def get_user_context(session_id: str) -> Optional[Dict[str, Any]]:
-    """Cek memory dulu, kalau tidak ada coba Redis."""
+async def get_user_context_async(session_id: str) -> Optional[Dict[str, Any]]:
+    """Cek memory dulu (termasuk negative cache), kalau tidak ada coba Redis."""
+    if not session_id:
+        return None
+
     # Layer 1: memory
-    if session_id in _user_context_store:
-        return _user_context_store[session_id]
+    cached = _user_context_store.get(session_id)
+    if cached is not MISSING:
+        return cached
 
-    # Layer 2: Redis (misalnya setelah server restart)
-    redis = _get_redis()
-    if redis:
+    # Layer 2: Redis — gabungkan lookup paralel untuk session yang sama
+    pending = _inflight.get(session_id)
+    if pending is not None:
         try:
-            raw = redis.get(f"denai:user_ctx:{session_id}")
-            if raw:
-                context = json.loads(raw)
-                _user_context_store[session_id] = context  # cache balik ke memory
-                logger.info(f"♻️ User context restored from Redis | session={session_id[:8]}...")
-                return context
-        except Exception as e:
-            logger.warning(f"⚠️ Failed to get user context from Redis: {e}")
-
-    return None
+            return await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            if not pending.cancelled():
+                raise  # request ini sendiri yang dibatalkan
+            # Pemilik lookup dibatalkan / gagal → lookup sendiri. Jangan anggap None:
+            # get_auth_nik akan mengubahnya jadi "" (tanpa filter NIK).
+            return await get_user_context_async(session_id)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[session_id] = future
+    try:
+        context = await _load_from_redis(session_id)
+        future.set_result(context)
+        return context
+    finally:
+        _inflight.pop(session_id, None)
+        if not future.done():
+            future.cancel()
 
 
-def clear_user_context(session_id: str) -> None:
-    _user_context_store.pop(session_id, None)
+async def _load_from_redis(session_id: str) -> Optional[Dict[str, Any]]:
     redis = _get_redis()
-    if redis:
+    if redis is None:
+        _user_context_store.set(session_id, None, ttl=USER_CTX_NEGATIVE_TTL)
+        return None
+    try:
+        from memory.redis_pipeline import timed
+        raw = await timed("user_ctx.get", redis.get(_redis_key(session_id)))
+    except Exception as e:
+        # Error Redis bukan berarti session tidak ada → jangan negative-cache
+        logger.warning(f"⚠️ Failed to get user context from Redis: {e}")
+        return None
+    if not raw:
+        _user_context_store.set(session_id, None, ttl=USER_CTX_NEGATIVE_TTL)
+        return None
+    context = json.loads(raw) if isinstance(raw, str) else raw
+    _user_context_store.set(session_id, context)  # cache balik ke memory
+    logger.info(f"♻️ User context restored from Redis | session={session_id[:8]}...")
+    return context
+
+
+async def clear_user_context_async(session_id: str) -> None:
+    _user_context_store.pop(session_id)
+    redis = _get_redis()
+    if redis is not None:
         try:
-            redis.delete(f"denai:user_ctx:{session_id}")
+            await redis.delete(_redis_key(session_id))
         except Exception:
             pass
+
+
+# ── Sync API (kompatibilitas) ────────────────────────────────────────────────
+# Referensi task tulis Redis background — tanpa ini task bisa di-GC sebelum selesai
+_background: Set["asyncio.Task"] = set()
+
+
+def _spawn(coro) -> None:
+    try:
+        task = asyncio.get_running_loop().create_task(coro)
+    except RuntimeError:
+        coro.close()
+        return
+    _background.add(task)
+    task.add_done_callback(_background_done)
+
+
+def _background_done(task: "asyncio.Task") -> None:
+    _background.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"⚠️ User context task background gagal: {task.exception()}")
+
+
+def set_user_context(session_id: str, context: Dict[str, Any]) -> None:
+    """Simpan ke memory sekarang; tulis Redis di background (butuh event loop berjalan)."""
+    _user_context_store.set(session_id, context)
+    redis = _get_redis()
+    if redis is not None:
+        _spawn(redis.set(_redis_key(session_id), json.dumps(context), ex=REDIS_TTL))
+    _log_saved(session_id, context)
+
+
+def get_user_context(session_id: str) -> Optional[Dict[str, Any]]:
+    """Lookup memory saja (tidak memblok). Pakai get_user_context_async untuk fallback Redis."""
+    cached = _user_context_store.get(session_id)
+    return None if cached is MISSING else cached
+
+
+def clear_user_context(session_id: str) -> None:
+    _user_context_store.pop(session_id)
+    redis = _get_redis()
+    if redis is not None:
+        _spawn(redis.delete(_redis_key(session_id)))
+
+
+def user_context_stats() -> Dict[str, Any]:
+    return {**_user_context_store.stats(), "inflight": len(_inflight)}
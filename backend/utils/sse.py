@@ -0,0 +1,267 @@
+"""
+DENAI SSE Writer
+Coalescing + encoding event stream untuk /ask/stream
+
+Sebelumnya setiap chunk LLM = satu `json.dumps` + satu frame `data:` —
+jawaban HTML panjang jadi ribuan write kecil (overhead framing + nginx proxy).
+
+SSEWriter:
+- Menggabungkan event token berurutan ke satu frame dalam jendela waktu
+  (SSE_COALESCE_MS) atau ukuran (SSE_COALESCE_MAX_CHARS). Token pertama
+  selalu langsung dikirim agar time-to-first-token tidak bertambah.
+- Event non-token (done, error, table_meta, stream_clear, ...) mem-flush
+  buffer token dulu sehingga urutan event tetap terjaga.
+- Encoding JSON via orjson (fallback json stdlib), atau mode biner ringkas:
+  frame = panjang 4 byte big-endian + payload CBOR (RFC 8949, subset:
+  map/array/string/int/float/bool/null). Mode biner dinegosiasi frontend
+  lewat header `X-Stream-Encoding: cbor`.
+- Mencatat bytes & frames per response (log + agregat di sse_stats).
+- Item bisa berupa event dict atau tuple (event_id, event). Dengan id, frame
+  SSE diberi baris `id:` (frame CBOR: key "_id") — frame token gabungan memakai
+  id event terakhir di dalamnya, sehingga Last-Event-ID tetap akurat.
+"""
+
+import asyncio
+import json
+import logging
+import struct
+import threading
+from dataclasses import dataclass, asdict
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.config import SSE_COALESCE_MS, SSE_COALESCE_MAX_CHARS, SSE_BINARY_ENABLED
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson as _orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    _orjson = None
+    ORJSON_AVAILABLE = False
+
+ENCODING_HEADER = "X-Stream-Encoding"
+CBOR_MEDIA_TYPE = "application/x-denai-cbor-stream"
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+_END = object()
+
+
+# =====================
+# ENCODERS
+# =====================
+def dumps_json(obj: Any) -> str:
+    if _orjson is not None:
+        return _orjson.dumps(obj, option=_orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, default=str)
+
+
+def _cbor_head(major: int, value: int) -> bytes:
+    if value < 24:
+        return bytes([(major << 5) | value])
+    if value < 0x100:
+        return bytes([(major << 5) | 24, value])
+    if value < 0x10000:
+        return bytes([(major << 5) | 25]) + struct.pack(">H", value)
+    if value < 0x100000000:
+        return bytes([(major << 5) | 26]) + struct.pack(">I", value)
+    return bytes([(major << 5) | 27]) + struct.pack(">Q", value)
+
+
+def dumps_cbor(obj: Any) -> bytes:
+    """Encoder CBOR minimal — cukup untuk payload event chat (tanpa tag/bytes)."""
+    if obj is None:
+        return b"\xf6"
+    if obj is True:
+        return b"\xf5"
+    if obj is False:
+        return b"\xf4"
+    if isinstance(obj, int):
+        if obj >= 0:
+            return _cbor_head(0, obj) if obj < 2 ** 64 else dumps_cbor(str(obj))
+        return _cbor_head(1, -1 - obj) if obj >= -(2 ** 64) else dumps_cbor(str(obj))
+    if isinstance(obj, float):
+        return b"\xfb" + struct.pack(">d", obj)
+    if isinstance(obj, str):
+        raw = obj.encode("utf-8")
+        return _cbor_head(3, len(raw)) + raw
+    if isinstance(obj, dict):
+        parts = [_cbor_head(5, len(obj))]
+        for k, v in obj.items():
+            parts.append(dumps_cbor(k if isinstance(k, str) else str(k)))
+            parts.append(dumps_cbor(v))
+        return b"".join(parts)
+    if isinstance(obj, (list, tuple)):
+        return _cbor_head(4, len(obj)) + b"".join(dumps_cbor(v) for v in obj)
+    # Decimal, datetime, dll → string (sama seperti default=str di JSON)
+    return dumps_cbor(str(obj))
+
+
+def wants_cbor(request) -> bool:
+    """Frontend minta mode biner lewat header X-Stream-Encoding: cbor."""
+    if not SSE_BINARY_ENABLED or request is None:
+        return False
+    return (request.headers.get(ENCODING_HEADER) or "").strip().lower() == "cbor"
+
+
+# =====================
+# METRICS
+# =====================
+@dataclass
+class SSEStats:
+    responses: int = 0
+    events: int = 0
+    frames: int = 0
+    bytes: int = 0
+    cbor_responses: int = 0
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data["avg_frames_per_response"] = round(self.frames / self.responses, 1) if self.responses else 0
+        data["avg_bytes_per_response"] = int(self.bytes / self.responses) if self.responses else 0
+        data["events_per_frame"] = round(self.events / self.frames, 2) if self.frames else 0
+        data["orjson"] = ORJSON_AVAILABLE
+        return data
+
+
+sse_stats = SSEStats()
+_stats_lock = threading.Lock()
+
+
+# =====================
+# WRITER
+# =====================
+class SSEWriter:
+    def __init__(
+        self,
+        binary: bool = False,
+        coalesce_ms: float = SSE_COALESCE_MS,
+        max_chars: int = SSE_COALESCE_MAX_CHARS,
+        label: str = "",
+    ):
+        self.binary = binary
+        self.window = max(0.0, coalesce_ms / 1000.0)
+        self.max_chars = max(1, max_chars)
+        self.label = label
+        self.events = 0
+        self.frames = 0
+        self.bytes = 0
+        self._buffer: List[str] = []
+        self._buffer_chars = 0
+        self._buffer_id: Optional[str] = None
+        self._first_token_sent = False
+
+    @property
+    def media_type(self) -> str:
+        return CBOR_MEDIA_TYPE if self.binary else "text/event-stream"
+
+    def encode(self, event: Dict[str, Any], event_id: Optional[str] = None) -> bytes:
+        if self.binary:
+            payload = dumps_cbor({**event, "_id": event_id} if event_id else event)
+            frame = struct.pack(">I", len(payload)) + payload
+        else:
+            head = f"id: {event_id}\n" if event_id else ""
+            frame = f"{head}data: {dumps_json(event)}\n\n".encode("utf-8")
+        self.frames += 1
+        self.bytes += len(frame)
+        return frame
+
+    # ── Coalescing ──────────────────────────────────────────────────────
+    def _take_buffer(self) -> Optional[bytes]:
+        if not self._buffer:
+            return None
+        content = "".join(self._buffer)
+        self._buffer.clear()
+        self._buffer_chars = 0
+        return self.encode({"type": "token", "content": content}, self._buffer_id)
+
+    def _push(self, item) -> List[bytes]:
+        """Terima satu event (atau (event_id, event)), return frame yang siap dikirim sekarang."""
+        event_id, event = item if isinstance(item, tuple) else (None, item)
+        self.events += 1
+        if event.get("type") == "token" and set(event) <= {"type", "content"}:
+            if not self._first_token_sent:
+                self._first_token_sent = True
+                return [self.encode(event, event_id)]
+            content = event.get("content") or ""
+            self._buffer.append(content)
+            self._buffer_chars += len(content)
+            self._buffer_id = event_id
+            if self._buffer_chars >= self.max_chars:
+                return [self._take_buffer()]
+            return []
+        out = [f for f in (self._take_buffer(),) if f is not None]
+        out.append(self.encode(event, event_id))
+        return out
+
+    async def stream(self, events: AsyncIterator[Any]) -> AsyncIterator[bytes]:
+        """
+        Bungkus generator event → generator bytes. Generator sumber dipompa di
+        task terpisah supaya buffer bisa di-flush berdasarkan waktu meskipun
+        LLM sedang diam (membatalkan __anext__ langsung akan mematikan generator).
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def _pump():
+            try:
+                async for event in events:
+                    queue.put_nowait(event)
+            except BaseException as e:  # noqa: B902 — diteruskan ke konsumen
+                queue.put_nowait(e)
+            finally:
+                queue.put_nowait(_END)
+
+        pump = asyncio.create_task(_pump())
+        loop = asyncio.get_running_loop()
+        flush_at: Optional[float] = None
+        try:
+            while True:
+                timeout = None if flush_at is None else max(0.0, flush_at - loop.time())
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    frame = self._take_buffer()
+                    flush_at = None
+                    if frame:
+                        yield frame
+                    continue
+                if item is _END:
+                    break
+                if isinstance(item, BaseException):
+                    if isinstance(item, asyncio.CancelledError):
+                        break
+                    raise item
+                for frame in self._push(item):
+                    yield frame
+                if self._buffer and flush_at is None:
+                    flush_at = loop.time() + self.window
+                elif not self._buffer:
+                    flush_at = None
+            frame = self._take_buffer()
+            if frame:
+                yield frame
+        finally:
+            if not pump.done():
+                pump.cancel()
+                try:
+                    await pump
+                except BaseException:
+                    pass
+            self._record()
+
+    def _record(self) -> None:
+        with _stats_lock:
+            sse_stats.responses += 1
+            sse_stats.events += self.events
+            sse_stats.frames += self.frames
+            sse_stats.bytes += self.bytes
+            if self.binary:
+                sse_stats.cbor_responses += 1
+        logger.info(
+            f"📦 [SSE] {self.label or '-'}: {self.events} events → {self.frames} frames, "
+            f"{self.bytes} bytes ({'cbor' if self.binary else 'json'})"
+        )
+
+
+def sse_stats_dict() -> Dict:
+    return sse_stats.to_dict()
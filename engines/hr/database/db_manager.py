@@ -2,80 +2,370 @@
 Database Manager - Supabase PostgreSQL Edition
 SATU-SATUNYA gerbang ke Supabase PostgreSQL database
 Enterprise-grade connection management dengan schema hr
+
+Sebelumnya get_connection() membuka koneksi TLS baru (+ SET search_path) untuk
+SETIAP query lalu menutupnya — SchemaReader yang menjalankan ratusan query
+membayar handshake berkali-kali. Sekarang semua DatabaseManager (QueryExecutor,
+SchemaReader, ConstraintInterceptor) berbagi satu pool per connection string:
+
+- psycopg2 ThreadedConnectionPool, HR_DB_POOL_MIN koneksi hangat sejak awal
+- search_path & statement_timeout di-set SEKALI per koneksi (session-level);
+  override per pemakaian lewat get_connection(statement_timeout_ms=...)
+- Pool penuh → thread menunggu (maks HR_DB_POOL_WAIT_TIMEOUT), bukan error
+- Koneksi idle > HR_DB_HEALTHCHECK_IDLE_SECONDS di-ping sebelum dipinjamkan;
+  koneksi rusak dibuang dan diganti
+- Metrik antrean pool: pool_stats() (ditampilkan di /status)
+
+execute_columnar(): hasil query HR (QueryExecutor) diambil lewat named cursor
+(server-side) per HR_DB_FETCH_BATCH baris sebagai tuple — tanpa dict per baris —
+dan langsung disusun per kolom. NUMERIC dikonversi ke float oleh typecaster
+psycopg2 saat parsing, bukan dengan menelusuri ulang setiap nilai.
+explain(): plan JSON tanpa eksekusi, dipakai cost guard (engines/hr/query/cost_guard.py).
 """
 
 import psycopg2
+import psycopg2.extensions
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+import json
 import logging
+import threading
+import time
+import uuid
+from dataclasses import dataclass, asdict
 from typing import Dict, Any, Tuple, Optional, List
 from contextlib import contextmanager
 
 # ✅ FIX: Mengambil connection string langsung dari Config tersentralisasi
-from app.config import SUPABASE_CONNECTION_STRING
+from app.config import (
+    SUPABASE_CONNECTION_STRING,
+    HR_DB_POOL_MIN,
+    HR_DB_POOL_MAX,
+    HR_DB_POOL_WAIT_TIMEOUT,
+    HR_DB_STATEMENT_TIMEOUT_MS,
+    HR_DB_HEALTHCHECK_IDLE_SECONDS,
+    HR_DB_FETCH_BATCH,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# NUMERIC → float saat parsing (frontend & analyzer butuh angka, bukan Decimal).
+# Didaftarkan per cursor, jadi query lain (SchemaReader, dll) tidak terpengaruh.
+_NUMERIC_FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values, "DENAI_NUMERIC_FLOAT",
+    lambda value, cursor: float(value) if value is not None else None,
+)
+
+# OID tipe PostgreSQL → tipe kolom ringkas untuk frontend (sisanya "text")
+_NUMBER_OIDS = {20, 21, 23, 26, 700, 701, 1700}
+_TYPE_NAMES = {16: "bool", 1082: "date", 1083: "time", 1114: "datetime", 1184: "datetime", 1186: "interval"}
+
+
+def column_type(type_code: Any) -> str:
+    if type_code in _NUMBER_OIDS:
+        return "number"
+    return _TYPE_NAMES.get(type_code, "text")
+
+
+class PoolTimeout(Exception):
+    """Tidak ada koneksi kosong dalam HR_DB_POOL_WAIT_TIMEOUT detik."""
+
+
+def normalize_dsn(connection_string: Optional[str]) -> str:
+    """Bersihkan format connection string dari .env (quote, skema postgres://)."""
+    dsn = (connection_string or "").strip().strip("'").strip('"')
+    return dsn.replace("postgres://", "postgresql://", 1)
+
+
+class _SessionPool(ThreadedConnectionPool):
+    """ThreadedConnectionPool yang menyiapkan session SEKALI saat koneksi dibuat."""
+
+    def _connect(self, key=None):
+        conn = super()._connect(key)
+        with conn.cursor() as cursor:
+            cursor.execute("SET search_path TO hr, public")
+            cursor.execute("SET statement_timeout = %s", (HR_DB_STATEMENT_TIMEOUT_MS,))
+        conn.commit()
+        return conn
+
+
+@dataclass
+class PoolStats:
+    checkouts: int = 0
+    waited: int = 0
+    wait_ms_total: float = 0.0
+    wait_ms_max: float = 0.0
+    timeouts: int = 0
+    health_checks: int = 0
+    health_check_failures: int = 0
+    discarded: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["wait_ms_total"] = round(self.wait_ms_total, 1)
+        data["wait_ms_max"] = round(self.wait_ms_max, 1)
+        data["wait_ms_avg"] = round(self.wait_ms_total / self.checkouts, 2) if self.checkouts else 0
+        return data
+
+
+class _SharedPool:
+    """Pool + semaphore (antrean tunggu) + metrik, satu per connection string per proses."""
+
+    def __init__(self, dsn: str):
+        self.maxconn = max(1, HR_DB_POOL_MAX)
+        self._pool = _SessionPool(
+            min(max(0, HR_DB_POOL_MIN), self.maxconn),
+            self.maxconn,
+            dsn,
+            cursor_factory=RealDictCursor,
+            sslmode='require',
+            connect_timeout=10,  # ✅ Tambahan safety timeout untuk Digital Ocean
+        )
+        self._slots = threading.BoundedSemaphore(self.maxconn)
+        self._last_used: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.stats = PoolStats()
+
+    def acquire(self):
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=HR_DB_POOL_WAIT_TIMEOUT):
+            self.stats.timeouts += 1
+            raise PoolTimeout(f"HR DB pool penuh ({self.maxconn} koneksi) selama {HR_DB_POOL_WAIT_TIMEOUT:.0f}s")
+        waited_ms = (time.monotonic() - start) * 1000
+        try:
+            conn = self._checkout_healthy()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_use += 1
+            self.stats.checkouts += 1
+            if waited_ms >= 1:
+                self.stats.waited += 1
+            self.stats.wait_ms_total += waited_ms
+            self.stats.wait_ms_max = max(self.stats.wait_ms_max, waited_ms)
+        return conn
+
+    def _checkout_healthy(self):
+        # Maks dua percobaan: koneksi lama rusak → dibuang, ambil/buat yang baru
+        for _ in range(2):
+            conn = self._pool.getconn()
+            if conn.closed:
+                self._discard(conn)
+                continue
+            last_used = self._last_used.get(id(conn))
+            # Koneksi baru (belum pernah dipakai) tidak perlu di-ping
+            if last_used is None or time.monotonic() - last_used < HR_DB_HEALTHCHECK_IDLE_SECONDS:
+                return conn
+            self.stats.health_checks += 1
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                conn.rollback()
+                return conn
+            except Exception as e:
+                self.stats.health_check_failures += 1
+                logger.warning(f"⚠️ HR DB koneksi idle tidak sehat, diganti: {e}")
+                self._discard(conn)
+        return self._pool.getconn()
+
+    def _discard(self, conn) -> None:
+        self.stats.discarded += 1
+        self._last_used.pop(id(conn), None)
+        try:
+            self._pool.putconn(conn, close=True)
+        except Exception:
+            pass
+
+    def release(self, conn, broken: bool = False) -> None:
+        try:
+            if broken or conn.closed:
+                self._discard(conn)
+            else:
+                try:
+                    conn.rollback()  # akhiri transaksi (read-only) sebelum kembali ke pool
+                    self._last_used[id(conn)] = time.monotonic()
+                    self._pool.putconn(conn)
+                except Exception:
+                    self._discard(conn)
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    def close(self) -> None:
+        self._pool.closeall()
+
+    def status(self) -> Dict[str, Any]:
+        return {"max": self.maxconn, "in_use": self.in_use, "idle": len(self._pool._pool), **self.stats.to_dict()}
+
+
+_pools: Dict[str, _SharedPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(dsn: str) -> _SharedPool:
+    pool = _pools.get(dsn)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(dsn)
+            if pool is None:
+                pool = _SharedPool(dsn)
+                _pools[dsn] = pool
+                logger.info(f"🏊 HR DB pool dibuat (min {HR_DB_POOL_MIN}, max {pool.maxconn})")
+    return pool
+
+
+def pool_stats() -> List[Dict[str, Any]]:
+    return [pool.status() for pool in list(_pools.values())]
+
+
+def close_pools() -> None:
+    with _pools_lock:
+        for pool in _pools.values():
+            try:
+                pool.close()
+            except Exception:
+                pass
+        _pools.clear()
+
 
 class DatabaseManager:
     """Mengelola koneksi dan eksekusi SQL ke Supabase PostgreSQL"""
-    
+
     def __init__(self, connection_string: str = None):
-        self.connection_string = connection_string or SUPABASE_CONNECTION_STRING
+        self.connection_string = normalize_dsn(connection_string or SUPABASE_CONNECTION_STRING)
         self.logger = logging.getLogger(__name__)
-        
+
         if not self.connection_string:
             self.logger.error("❌ SUPABASE_CONNECTION_STRING is missing!")
             raise ValueError("Database connection string is required")
-            
+
         if not self.test_connection():
             self.logger.error("❌ Cannot connect to Supabase PostgreSQL database")
-    
+
     @contextmanager
-    def get_connection(self):
-        """Context manager untuk Supabase PostgreSQL connection"""
+    def get_connection(self, statement_timeout_ms: Optional[int] = None):
+        """Pinjam koneksi dari pool (search_path hr sudah aktif).
+        statement_timeout_ms: override timeout untuk transaksi ini saja (SET LOCAL)."""
+        pool = None
         conn = None
+        broken = False
         try:
-            conn = psycopg2.connect(
-                self.connection_string,
-                cursor_factory=RealDictCursor,
-                sslmode='require',
-                connect_timeout=10 # ✅ Tambahan safety timeout untuk Digital Ocean
-            )
-            conn.autocommit = False
-            
-            with conn.cursor() as cursor:
-                cursor.execute("SET search_path TO hr, public")
-            
+            pool = _get_pool(self.connection_string)
+            conn = pool.acquire()
+            if statement_timeout_ms is not None:
+                with conn.cursor() as cursor:
+                    cursor.execute("SET LOCAL statement_timeout = %s", (int(statement_timeout_ms),))
+
             yield conn
-            
+
+        except psycopg2.extensions.QueryCanceledError as e:
+            # statement_timeout / cancel: subclass OperationalError, tapi koneksinya sehat —
+            # release() me-rollback transaksi yang gagal lalu mengembalikannya ke pool
+            self.logger.warning(f"⏱️ Query dibatalkan server (koneksi tetap dipakai ulang): {e}")
+            raise
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            broken = True
+            self.logger.error(f"❌ Supabase connection error: {e}")
+            raise
         except Exception as e:
-            if conn: conn.rollback()
             self.logger.error(f"❌ Supabase connection error: {e}")
             raise
         finally:
-            if conn: conn.close()
-    
-    def execute_query(self, sql: str, params: Optional[Tuple] = None) -> Dict[str, Any]:
+            if conn is not None:
+                pool.release(conn, broken=broken)
+
+    def execute_query(self, sql: str, params: Optional[Tuple] = None, statement_timeout_ms: Optional[int] = None) -> Dict[str, Any]:
         """Execute SELECT query pada Supabase dan return hasil"""
         sql_upper = sql.strip().upper()
         if not sql_upper.startswith('SELECT'):
             raise ValueError("Only SELECT queries are allowed")
-        
+
         try:
-            with self.get_connection() as conn:
+            with self.get_connection(statement_timeout_ms=statement_timeout_ms) as conn:
                 with conn.cursor() as cursor:
                     cursor.execute(sql, params) if params else cursor.execute(sql)
-                    
+
                     columns = [desc[0] for desc in cursor.description] if cursor.description else []
                     rows = cursor.fetchall()
                     rows_list = [dict(row) for row in rows]
-                    
+
                     self.logger.info(f"✅ Query executed successfully: {len(rows_list)} rows returned")
                     return {'columns': columns, 'rows': rows_list, 'total_rows': len(rows_list)}
-                    
+
         except Exception as e:
             self.logger.error(f"❌ Database query failed: {e}\nSQL: {sql}")
             raise Exception(f"Database query failed: {str(e)}")
-            
+
+    def execute_columnar(
+        self,
+        sql: str,
+        max_rows: int,
+        batch_size: Optional[int] = None,
+        statement_timeout_ms: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """SELECT lewat named cursor, diambil per batch, hasil per kolom:
+        {'columns', 'types', 'data' (list per kolom), 'total_rows', 'truncated', 'batches'}."""
+        if not sql.strip().upper().startswith('SELECT'):
+            raise ValueError("Only SELECT queries are allowed")
+        batch_size = max(1, batch_size or HR_DB_FETCH_BATCH)
+
+        try:
+            with self.get_connection(statement_timeout_ms=statement_timeout_ms) as conn:
+                cursor = conn.cursor(name=f"denai_{uuid.uuid4().hex[:12]}", cursor_factory=psycopg2.extensions.cursor)
+                try:
+                    psycopg2.extensions.register_type(_NUMERIC_FLOAT, cursor)
+                    cursor.itersize = batch_size
+                    cursor.execute(sql)
+
+                    columns: List[str] = []
+                    types: List[str] = []
+                    data: List[List[Any]] = []
+                    total, batches, truncated = 0, 0, False
+                    while total < max_rows:
+                        rows = cursor.fetchmany(min(batch_size, max_rows - total))
+                        if not columns and cursor.description:
+                            columns = [desc[0] for desc in cursor.description]
+                            types = [column_type(desc[1]) for desc in cursor.description]
+                            data = [[] for _ in columns]
+                        if not rows:
+                            break
+                        batches += 1
+                        for values, column in zip(data, zip(*rows)):
+                            values.extend(column)
+                        total += len(rows)
+                    else:
+                        # Batas max_rows tercapai — cek apakah masih ada baris (tanpa menariknya semua)
+                        truncated = bool(cursor.fetchmany(1))
+                finally:
+                    cursor.close()
+
+            self.logger.info(f"✅ Query executed (server-side cursor): {total} rows in {batches} batch(es)")
+            return {'columns': columns, 'types': types, 'data': data, 'total_rows': total,
+                    'truncated': truncated, 'batches': batches}
+
+        except Exception as e:
+            self.logger.error(f"❌ Database query failed: {e}\nSQL: {sql}")
+            raise Exception(f"Database query failed: {str(e)}")
+
+    def explain(self, sql: str, statement_timeout_ms: Optional[int] = None) -> Dict[str, Any]:
+        """EXPLAIN (FORMAT JSON) tanpa ANALYZE — hanya planning, query tidak dijalankan.
+        Return objek plan teratas ({'Plan': {...}, 'Planning Time'?: ...})."""
+        if not sql.strip().upper().startswith('SELECT'):
+            raise ValueError("Only SELECT queries are allowed")
+        with self.get_connection(statement_timeout_ms=statement_timeout_ms) as conn:
+            with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cursor:
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql.strip().rstrip(';')}")
+                plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0] if isinstance(plan, list) else plan
+
     def test_connection(self) -> bool:
-        """Test Supabase PostgreSQL connection"""
+        """Test Supabase PostgreSQL connection (sekaligus menghangatkan pool)"""
         try:
             with self.get_connection() as conn:
                 with conn.cursor() as cursor:
@@ -85,4 +375,18 @@ class DatabaseManager:
                     return True
         except Exception as e:
             self.logger.error(f"❌ Supabase connection test failed: {e}")
-            return False
\ No newline at end of file
+            return False
+
+
+_default_manager: Optional[DatabaseManager] = None
+_default_lock = threading.Lock()
+
+
+def get_db_manager() -> DatabaseManager:
+    """DatabaseManager bersama (lazy) — untuk modul di luar HRService, mis. ConstraintInterceptor."""
+    global _default_manager
+    if _default_manager is None:
+        with _default_lock:
+            if _default_manager is None:
+                _default_manager = DatabaseManager()
+    return _default_manager
@@ -4,14 +4,65 @@ Schema Reader - Supabase PostgreSQL Only
 ✅ SMART SAMPLING: 
    - Teks/Varchar: Sampling detail (Kategori lengkap)
    - Angka/Tanggal: Sampling ringan (Limit 3, tanpa kalkulasi berat)
+✅ SINGLE-PASS INTROSPECTION:
+   - Semua kolom dari satu query katalog (bukan satu query per tabel)
+   - Kardinalitas & contoh nilai dari pg_stats (tanpa COUNT(DISTINCT) full scan)
+   - Query data hanya untuk kolom teks berkardinalitas rendah (atau tanpa
+     statistik), paralel lewat pool koneksi; waktu per fase di schema['introspection']
+✅ VALUE INDEX:
+   - Nilai distinct kolom teks (<= VALUE_INDEX_MAX_VALUES) disimpan mentah di
+     'category_values' → engines/hr/query/value_index.py me-resolve mention di
+     pertanyaan, sehingga prompt cukup membawa nilai yang cocok
 """
 
 import time
 import logging
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional, Tuple
 
+from app.config import HR_DB_POOL_MAX, VALUE_INDEX_MAX_VALUES
 from engines.hr.database.db_manager import DatabaseManager
 
+# Kolom teks dengan estimasi distinct <= ini ditampilkan sebagai daftar 'Kategori' lengkap
+LOW_CARDINALITY_MAX = 30
+# Kolom teks dengan distinct <= ini nilainya diambil lengkap untuk value index
+VALUE_FETCH_MAX = max(LOW_CARDINALITY_MAX, VALUE_INDEX_MAX_VALUES)
+# Saat value index aktif, daftar kategori sependek ini tetap ditulis utuh di prompt
+_INLINE_CATEGORY_MAX = 8
+
+_TEXT_TYPES = ('character varying', 'text', 'varchar', 'char', 'character')
+_SAMPLE_TYPES = ('integer', 'bigint', 'smallint', 'numeric', 'decimal', 'double precision', 'real', 'float',
+                 'timestamp without time zone', 'timestamp with time zone', 'date', 'time', 'boolean', 'bool')
+
+_CATALOG_SQL = """
+    SELECT c.table_name, c.column_name, c.data_type
+    FROM information_schema.columns c
+    JOIN information_schema.tables t
+      ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+    WHERE c.table_schema = 'hr' AND t.table_type = 'BASE TABLE'
+    ORDER BY c.table_name, c.ordinal_position
+"""
+
+# anyarray → text → text[] → json: nilai apa pun jadi list string di Python
+_STATS_SQL = """
+    SELECT s.tablename, s.attname, s.null_frac, s.n_distinct, cl.reltuples,
+           array_to_json(s.most_common_vals::text::text[]) AS mcv,
+           array_to_json(s.histogram_bounds::text::text[]) AS histogram
+    FROM pg_stats s
+    JOIN pg_namespace n ON n.nspname = s.schemaname
+    JOIN pg_class cl ON cl.relnamespace = n.oid AND cl.relname = s.tablename
+    WHERE s.schemaname = 'hr'
+"""
+
+
+def _estimate_distinct(stat: Dict[str, Any]) -> int:
+    """n_distinct > 0 = jumlah distinct; < 0 = -(fraksi dari jumlah baris)."""
+    n_distinct = float(stat.get('n_distinct') or 0)
+    if n_distinct >= 0:
+        return int(n_distinct)
+    reltuples = max(float(stat.get('reltuples') or 0), 0)
+    return max(int(round(-n_distinct * reltuples)), 1)
+
 class SchemaReader:
     """OWNER TUNGGAL schema database untuk Supabase PostgreSQL"""
     
@@ -29,121 +80,175 @@ class SchemaReader:
     def get_schema(self, refresh_cache: bool = False) -> Dict[str, Any]:
         """Get schema dengan fitur Fast Cache (Mencegah ratusan query berulang)"""
         
-        # Cek apakah cache masih segar (< 5 menit)
+        if not refresh_cache:
+            # Snapshot bersama (di-rebuild di background hanya saat fingerprint katalog berubah)
+            from engines.hr.database.schema_snapshot import schema_snapshot
+            snapshot_schema = schema_snapshot.current_schema()
+            if snapshot_schema is not None:
+                return snapshot_schema
+
+        # Fallback tanpa service snapshot (script/CLI): cache lokal TTL 5 menit
         if not refresh_cache and self._cached_schema and (time.time() - self._cache_timestamp < self._cache_ttl):
             self.logger.info("⚡ Using CACHED Schema (Instant!)")
             return self._cached_schema
-            
-        self.logger.info("🔄 Fetching FRESH Schema from Supabase... (This might take a few seconds)")
+
+        schema = self.build_schema()
+        # 🚀 SIMPAN KE CACHE MEMORI!
+        self._cached_schema = schema
+        self._cache_timestamp = time.time()
+        return schema
+
+    def build_schema(self) -> Dict[str, Any]:
+        """Introspeksi penuh katalog hr (tanpa cache)."""
+        self.logger.info("🔄 Fetching FRESH Schema from Supabase...")
         start_time = time.time()
+        timings = {}
         
         try:
+            # 1. KATALOG: semua kolom semua tabel hr dalam SATU query
+            t0 = time.time()
             with self.db.get_connection() as conn:
                 with conn.cursor() as cursor:
-                    
-                    cursor.execute("""
-                        SELECT table_name FROM information_schema.tables 
-                        WHERE table_schema = 'hr' 
-                        AND table_type = 'BASE TABLE'
-                        ORDER BY table_name
-                    """)
-                    
-                    hr_tables = cursor.fetchall()
-                    
-                    if not hr_tables:
-                        self.logger.warning("⚠️ No valid tables found in hr schema")
-                        return {'total_tables': 0, 'schema_name': 'hr', 'tables': {}, 'formatted_schema': "No valid tables found."}
-                    
-                    schema = {'total_tables': len(hr_tables), 'schema_name': 'hr', 'connection_type': 'Supabase PostgreSQL', 'tables': {}}
-                    
-                    for table_info in hr_tables:
-                        table_name = table_info['table_name'] if isinstance(table_info, dict) else table_info[0]
-                        
-                        cursor.execute("""
-                            SELECT column_name, data_type FROM information_schema.columns 
-                            WHERE table_schema = 'hr' AND table_name = %s ORDER BY ordinal_position
-                        """, (table_name,))
-                        
-                        columns_info = cursor.fetchall()
-                        columns = []
-                        column_types = {}
-                        distinct_values = {} 
-                        
-                        for col in columns_info:
-                            col_name = col['column_name'] if isinstance(col, dict) else col[0]
-                            data_type = col['data_type'] if isinstance(col, dict) else col[1]
-                            
-                            columns.append(col_name)
-                            column_types[col_name] = data_type
-                            
-                            # ========================================================
-                            # 🚀 SMART SAMPLING LOGIC
-                            # ========================================================
-                            try:
-                                # 1. TEXT/VARCHAR (Sampling Detail: Cek Distinct Count)
-                                if data_type in ('character varying', 'text', 'varchar', 'char'):
-                                    cursor.execute(f"""
-                                        SELECT COUNT(DISTINCT "{col_name}") 
-                                        FROM hr."{table_name}" 
-                                        WHERE "{col_name}" IS NOT NULL AND "{col_name}" != ''
-                                    """)
-                                    res_count = cursor.fetchone()
-                                    distinct_count = res_count['count'] if isinstance(res_count, dict) else res_count[0]
-                                    
-                                    if distinct_count == 0: continue
-                                        
-                                    if distinct_count <= 30:
-                                        cursor.execute(f"""
-                                            SELECT DISTINCT "{col_name}" FROM hr."{table_name}"
-                                            WHERE "{col_name}" IS NOT NULL AND "{col_name}" != ''
-                                            ORDER BY "{col_name}"
-                                        """)
-                                        vals = cursor.fetchall()
-                                        val_list = [v[col_name] if isinstance(v, dict) else v[0] for v in vals]
-                                        distinct_values[col_name] = f"Kategori: {val_list}"
-                                    else:
-                                        cursor.execute(f"""
-                                            SELECT "{col_name}" FROM hr."{table_name}"
-                                            WHERE "{col_name}" IS NOT NULL AND "{col_name}" != '' LIMIT 3
-                                        """)
-                                        vals = cursor.fetchall()
-                                        val_list = [v[col_name] if isinstance(v, dict) else v[0] for v in vals]
-                                        distinct_values[col_name] = f"Contoh: {val_list} ... ({distinct_count} data unik)"
-                                        
-                                # 2. ANGKA/TANGGAL/BOOLEAN (Sampling Ringan: Cuma ambil 3 baris teratas)
-                                elif data_type in ('integer', 'bigint', 'smallint', 'numeric', 'decimal', 'double precision', 'real', 'float', 'timestamp without time zone', 'timestamp with time zone', 'date', 'time', 'boolean', 'bool'):
-                                    cursor.execute(f"""
-                                        SELECT "{col_name}" FROM hr."{table_name}"
-                                        WHERE "{col_name}" IS NOT NULL LIMIT 3
-                                    """)
-                                    vals = cursor.fetchall()
-                                    # Ubah jadi string biar aman saat ditaruh di list
-                                    val_list = [str(v[col_name] if isinstance(v, dict) else v[0]) for v in vals]
-                                    if val_list:
-                                        distinct_values[col_name] = f"Contoh: {val_list}"
-                                        
-                            except Exception as e:
-                                self.logger.warning(f"⚠️ Gagal ambil sampel untuk {col_name}: {e}")
-                        
-                        schema['tables'][table_name] = {
-                            'columns': columns, 
-                            'column_types': column_types, 
-                            'total_columns': len(columns),
-                            'distinct_values': distinct_values
-                        }
+                    cursor.execute(_CATALOG_SQL)
+                    catalog_rows = cursor.fetchall()
+                    timings['catalog_ms'] = round((time.time() - t0) * 1000, 1)
+
+                    # 2. STATISTIK: pg_stats (hasil ANALYZE) — kardinalitas & nilai umum tanpa table scan
+                    t0 = time.time()
+                    cursor.execute(_STATS_SQL)
+                    stats_rows = cursor.fetchall()
+                    timings['stats_ms'] = round((time.time() - t0) * 1000, 1)
+
+            if not catalog_rows:
+                self.logger.warning("⚠️ No valid tables found in hr schema")
+                return {'total_tables': 0, 'schema_name': 'hr', 'tables': {}, 'formatted_schema': "No valid tables found."}
+
+            tables: Dict[str, Dict[str, Any]] = {}
+            for row in catalog_rows:
+                info = tables.setdefault(row['table_name'], {'columns': [], 'column_types': {}, 'distinct_values': {},
+                                                             'category_values': {}})
+                info['columns'].append(row['column_name'])
+                info['column_types'][row['column_name']] = row['data_type']
+            stats = {(r['tablename'], r['attname']): r for r in stats_rows}
+
+            # 3. SAMPLING dari statistik; query data hanya untuk kolom berkardinalitas rendah / tanpa statistik
+            t0 = time.time()
+            fetch_jobs = []
+            for table_name, info in tables.items():
+                for col_name in info['columns']:
+                    job = self._describe_column(table_name, col_name, info['column_types'][col_name],
+                                                stats.get((table_name, col_name)), info['distinct_values'])
+                    if job:
+                        fetch_jobs.append(job)
+            timings['sampling_ms'] = round((time.time() - t0) * 1000, 1)
+
+            t0 = time.time()
+            self._run_value_queries(fetch_jobs, tables)
+            timings['value_queries_ms'] = round((time.time() - t0) * 1000, 1)
+            timings['value_queries'] = len(fetch_jobs)
+
+            schema = {'total_tables': len(tables), 'schema_name': 'hr', 'connection_type': 'Supabase PostgreSQL', 'tables': {}}
+            for table_name, info in tables.items():
+                schema['tables'][table_name] = {
+                    'columns': info['columns'], 
+                    'column_types': info['column_types'], 
+                    'total_columns': len(info['columns']),
+                    'distinct_values': info['distinct_values'],
+                    'category_values': info['category_values']
+                }
             
             schema['formatted_schema'] = self._format_schema_for_llm(schema)
+            timings['total_ms'] = round((time.time() - start_time) * 1000, 1)
+            schema['introspection'] = timings
             
-            # 🚀 SIMPAN KE CACHE MEMORI!
-            self._cached_schema = schema
-            self._cache_timestamp = time.time()
-            
-            self.logger.info(f"✅ Schema Fresh dimuat dalam {time.time() - start_time:.2f} detik!")
+            self.logger.info(
+                f"✅ Schema Fresh dimuat dalam {timings['total_ms']:.0f}ms | katalog {timings['catalog_ms']:.0f}ms · "
+                f"pg_stats {timings['stats_ms']:.0f}ms · {len(fetch_jobs)} query nilai {timings['value_queries_ms']:.0f}ms"
+            )
             return schema
             
         except Exception as e:
             self.logger.error(f"❌ Schema reading failed: {e}")
             raise Exception(f"Schema reading failed: {str(e)}")
+
+    def _describe_column(self, table_name: str, col_name: str, data_type: str,
+                         stat: Optional[Dict[str, Any]], distinct_values: Dict[str, str]) -> Optional[Tuple[str, str, str]]:
+        """Isi distinct_values dari pg_stats. Return job (table, col, mode) kalau butuh query data."""
+        if data_type not in _TEXT_TYPES and data_type not in _SAMPLE_TYPES:
+            return None
+
+        if stat is None:
+            # Tabel belum pernah di-ANALYZE → query terbatas (LIMIT), bukan COUNT(DISTINCT) full scan
+            return (table_name, col_name, 'categories' if data_type in _TEXT_TYPES else 'sample')
+
+        if (stat.get('null_frac') or 0) >= 1:
+            return None
+        common = [v for v in (stat.get('mcv') or []) if v not in (None, '')]
+        bounds = [v for v in (stat.get('histogram') or []) if v not in (None, '')]
+        estimated = _estimate_distinct(stat)
+
+        # 1. TEXT/VARCHAR: kardinalitas rendah → nilai lengkap (query), tinggi → contoh dari statistik
+        if data_type in _TEXT_TYPES:
+            if estimated and estimated <= VALUE_FETCH_MAX:
+                return (table_name, col_name, 'categories')
+            examples = (common or bounds)[:3]
+            if examples:
+                distinct_values[col_name] = f"Contoh: {examples} ... (~{estimated} data unik)"
+            return None
+
+        # 2. ANGKA/TANGGAL/BOOLEAN (Sampling Ringan: 3 nilai dari statistik)
+        examples = (common or bounds)[:3]
+        if examples:
+            distinct_values[col_name] = f"Contoh: {examples}"
+        return None
+
+    def _run_value_queries(self, jobs: List[Tuple[str, str, str]], tables: Dict[str, Dict[str, Any]]) -> None:
+        """Jalankan query nilai secara paralel lewat pool koneksi bersama."""
+        if not jobs:
+            return
+        workers = max(1, min(len(jobs), HR_DB_POOL_MAX - 1 or 1))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="schema-values") as pool:
+            futures = {pool.submit(self._fetch_values, *job): job for job in jobs}
+            for future in as_completed(futures):
+                table_name, col_name, _mode = futures[future]
+                try:
+                    described, values = future.result()
+                except Exception as e:
+                    self.logger.warning(f"⚠️ Gagal ambil sampel untuk {col_name}: {e}")
+                    continue
+                if described:
+                    tables[table_name]['distinct_values'][col_name] = described
+                if values:
+                    tables[table_name]['category_values'][col_name] = values
+
+    def _fetch_values(self, table_name: str, col_name: str, mode: str) -> Tuple[Optional[str], Optional[List[str]]]:
+        """Return (teks untuk prompt, nilai lengkap untuk value index atau None)."""
+        with self.db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                if mode == 'categories':
+                    # LIMIT N+1: cukup untuk tahu apakah kolom masih "kategori" tanpa hitung semua distinct
+                    cursor.execute(f"""
+                        SELECT DISTINCT "{col_name}" AS v FROM hr."{table_name}"
+                        WHERE "{col_name}" IS NOT NULL AND "{col_name}" != ''
+                        ORDER BY 1 LIMIT {VALUE_FETCH_MAX + 1}
+                    """)
+                    val_list = [r['v'] for r in cursor.fetchall()]
+                    if not val_list:
+                        return None, None
+                    values = [str(v) for v in val_list] if len(val_list) <= VALUE_FETCH_MAX else None
+                    if len(val_list) <= LOW_CARDINALITY_MAX:
+                        return f"Kategori: {val_list}", values
+                    if values:
+                        return f"Contoh: {val_list[:3]} ... ({len(values)} data unik)", values
+                    return f"Contoh: {val_list[:3]} ... (>{VALUE_FETCH_MAX} data unik)", None
+
+                cursor.execute(f"""
+                    SELECT "{col_name}" AS v FROM hr."{table_name}"
+                    WHERE "{col_name}" IS NOT NULL LIMIT 3
+                """)
+                # Ubah jadi string biar aman saat ditaruh di list
+                val_list = [str(r['v']) for r in cursor.fetchall()]
+                return (f"Contoh: {val_list}" if val_list else None), None
             
     def get_schema_text(self) -> str:
         try:
@@ -153,7 +258,42 @@ class SchemaReader:
             self.logger.error(f"❌ Failed to get schema text: {e}")
             return "ERROR: Database schema could not be loaded. Do not generate SQL."
             
-    def _format_schema_for_llm(self, schema: Dict[str, Any]) -> str:
+    def get_schema_text_for(self, question: str, embed_client=None, timeout: Optional[float] = None):
+        """Schema untuk prompt SQL yang dipangkas sesuai pertanyaan.
+        Return (schema_text, selection, value_matches) — selection None = semua tabel/kolom,
+        value_matches None = value index tidak aktif (daftar kategori ditulis utuh)."""
+        try:
+            schema = self.get_schema()
+        except Exception as e:
+            self.logger.error(f"❌ Failed to get schema text: {e}")
+            return "ERROR: Database schema could not be loaded. Do not generate SQL.", None, None
+        try:
+            from engines.hr.query.schema_retriever import schema_retriever
+            selection = schema_retriever.select(question, schema, embed_client=embed_client, timeout=timeout)
+        except Exception as e:
+            self.logger.warning(f"⚠️ Schema pruning gagal, pakai schema utuh: {e}")
+            selection = None
+        try:
+            from engines.hr.query.value_index import value_index
+            value_matches = value_index.resolve(question, schema)
+        except Exception as e:
+            self.logger.warning(f"⚠️ Value index gagal, pakai daftar kategori utuh: {e}")
+            value_matches = None
+        if selection is None and value_matches is None:
+            return schema.get('formatted_schema', 'No schema available'), None, None
+        if selection is not None and value_matches:
+            # Kolom yang nilainya disebut di pertanyaan pasti dibutuhkan di WHERE
+            for m in value_matches:
+                columns = selection.tables.setdefault(m.table, [])
+                if m.column not in columns:
+                    columns.append(m.column)
+                if m.table in selection.other_tables:
+                    selection.other_tables.remove(m.table)
+        return self._format_schema_for_llm(schema, selection=selection, value_matches=value_matches), selection, value_matches
+
+    def _format_schema_for_llm(self, schema: Dict[str, Any], selection=None, value_matches=None) -> str:
+        """selection (SchemaSelection): hanya tabel/kolom terpilih ditulis lengkap, sisanya nama saja.
+        value_matches (list ValueMatch): daftar kategori panjang dipadatkan, nilai yang cocok ditulis."""
         try:
             lines = [
                 "=== HR SCHEMA (Supabase PostgreSQL) ===",
@@ -162,17 +302,37 @@ class SchemaReader:
             ]
             
             for table_name, table_info in schema['tables'].items():
+                if selection is not None and table_name not in selection.tables:
+                    continue
                 lines.append(f"TABLE: hr.{table_name} ({table_info['total_columns']} columns)")
-                for col_name in table_info['columns']:
+                detailed = selection.tables[table_name] if selection is not None else table_info['columns']
+                for col_name in detailed:
                     col_type = table_info['column_types'][col_name]
                     col_str = f"  • {col_name}: {col_type}"
                     
                     dist_vals = table_info.get('distinct_values', {}).get(col_name)
+                    categories = table_info.get('category_values', {}).get(col_name)
+                    if value_matches is not None and categories and len(categories) > _INLINE_CATEGORY_MAX:
+                        matched = [m.value for m in value_matches if m.table == table_name and m.column == col_name]
+                        dist_vals = (f"Kategori ({len(categories)} nilai), cocok dengan pertanyaan: {matched}" if matched
+                                     else f"Kategori ({len(categories)} nilai), mis. {categories[:3]}")
                     if dist_vals:
                         col_str += f"  --> {dist_vals}"
                         
                     lines.append(col_str)
+                if selection is not None:
+                    others = [c for c in table_info['columns'] if c not in detailed]
+                    if others:
+                        lines.append(f"  • (kolom lain, tanpa contoh nilai): {', '.join(others)}")
                 lines.append("")
+
+            if selection is not None and selection.other_tables:
+                lines.append(f"TABEL LAIN (kemungkinan tidak relevan untuk pertanyaan ini): {', '.join('hr.' + t for t in selection.other_tables)}")
+                lines.append("")
+
+            if value_matches:
+                from engines.hr.query.value_index import format_value_hints
+                lines.extend(format_value_hints(value_matches))
             
             lines.extend([
                 "=== SQL GENERATION GUIDELINES ===",
@@ -181,6 +341,7 @@ class SchemaReader:
                 "• JOINs between hr tables are allowed",
                 "• SANGAT PENTING: Gunakan referensi 'Kategori' atau 'Contoh' di atas saat memfilter (WHERE).",
                 "• Jika user menggunakan sinonim (misal: 'Sarjana' atau 'Strata 1'), Anda WAJIB memetakan ke nilai yang TEPAT ada di 'Kategori' (misal: 'S1') menggunakan ILIKE.",
+                "• Jika ada blok 'NILAI TERDETEKSI', nilai di sana sudah dipetakan ke isi database — gunakan apa adanya.",
                 "• DILARANG KERAS memfilter kolom 'band' dengan isian pendidikan. Kolom 'band' hanya untuk level jabatan/strata struktural."
             ])
             return "\n".join(lines)
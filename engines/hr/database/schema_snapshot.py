@@ -0,0 +1,299 @@
+"""
+Schema Snapshot - Fingerprint Katalog hr + Refresh di Background
+================================================================
+Sebelumnya SchemaReader menyimpan `_cached_schema` per proses dengan TTL tetap
+300 detik: begitu expired, request HR berikutnya membayar introspeksi penuh
+secara inline, di setiap worker.
+
+Sekarang satu task background per worker:
+1. Setiap SCHEMA_FINGERPRINT_INTERVAL detik menghitung fingerprint murah
+   (satu query ke katalog):
+   - structure : md5 daftar kolom (pg_attribute) → berubah saat DDL
+   - data      : md5 waktu ANALYZE terakhir + bucket reltuples (kelipatan √2)
+                 → berubah hanya saat statistik (pg_stats) yang dipakai snapshot
+                 berubah. Counter n_tup_* sengaja TIDAK ikut: satu INSERT/UPDATE
+                 tidak boleh memaksa rebuild snapshot + invalidasi cache SQL.
+2. Fingerprint sama → tidak ada apa-apa. Berubah → ambil snapshot yang sudah
+   dipublikasikan worker lain di Redis, atau (pemegang lock) rebuild lewat
+   SchemaReader.build_schema di thread lalu publish ke Redis. Worker tanpa
+   snapshot (cold start) yang kalah lock menunggu snapshot pemegang lock
+   (maks _COLD_START_WAIT detik) alih-alih ikut rebuild.
+3. Listener (cache SQL / hasil query) diberi tahu lewat subscribe() supaya
+   entry dengan versi lama tidak dipakai lagi.
+4. Versi per tabel (counter modifikasi pg_stat_user_tables) diperbarui di
+   setiap cek → table_versions() untuk invalidasi cache hasil query.
+
+SchemaReader.get_schema() membaca snapshot ini dulu; tanpa service yang
+berjalan (script/CLI) ia jatuh ke cache lokal TTL seperti dulu.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import SCHEMA_FINGERPRINT_INTERVAL, SCHEMA_SNAPSHOT_TTL
+
+logger = logging.getLogger(__name__)
+
+_LOCK_TTL = 300
+_COLD_START_WAIT = 20.0
+_COLD_START_POLL = 0.5
+
+_FINGERPRINT_SQL = """
+    SELECT
+      (SELECT md5(coalesce(string_agg(
+                  c.relname || '.' || a.attname || ':' || format_type(a.atttypid, a.atttypmod),
+                  ',' ORDER BY c.relname, a.attnum), ''))
+         FROM pg_class c
+         JOIN pg_namespace n ON n.oid = c.relnamespace
+         JOIN pg_attribute a ON a.attrelid = c.oid
+        WHERE n.nspname = 'hr' AND c.relkind IN ('r', 'p')
+          AND a.attnum > 0 AND NOT a.attisdropped) AS structure,
+      (SELECT md5(coalesce(string_agg(
+                  c.relname || ':' || floor(ln(greatest(c.reltuples, 0) + 1) / ln(2) * 2)::int || ':'
+                  || coalesce(greatest(t.last_analyze, t.last_autoanalyze)::text, ''),
+                  ',' ORDER BY c.relname), ''))
+         FROM pg_class c
+         JOIN pg_namespace n ON n.oid = c.relnamespace
+         LEFT JOIN pg_stat_user_tables t ON t.relid = c.oid
+        WHERE n.nspname = 'hr' AND c.relkind IN ('r', 'p')) AS data,
+      (SELECT coalesce(json_object_agg(t.relname, (t.n_tup_ins + t.n_tup_upd + t.n_tup_del)::text), '{}'::json)
+         FROM pg_stat_user_tables t
+        WHERE t.schemaname = 'hr') AS tables
+"""
+
+Fingerprint = Tuple[str, str]  # (structure, data)
+
+
+def _redis():
+    try:
+        from memory.memory_hybrid import redis_client, REDIS_AVAILABLE
+        return redis_client if REDIS_AVAILABLE else None
+    except Exception:
+        return None
+
+
+def _snap_key(fp: Fingerprint) -> str:
+    return f"denai:hr_schema:snap:{fp[0]}:{fp[1]}"
+
+
+def _lock_key(fp: Fingerprint) -> str:
+    return f"denai:hr_schema:lock:{fp[0]}:{fp[1]}"
+
+
+class SchemaSnapshot:
+    def __init__(self):
+        self._schema: Optional[Dict[str, Any]] = None
+        self._fingerprint: Optional[Fingerprint] = None
+        self._table_versions: Dict[str, str] = {}
+        self._built_at: float = 0.0
+        self._reader = None
+        self._task: Optional[asyncio.Task] = None
+        self._refresh_lock: Optional[asyncio.Lock] = None
+        self._listeners: List[Callable[[str, str], None]] = []
+        self._last_error: Optional[str] = None
+        self.checks = 0
+        self.rebuilds = 0
+        self.loaded_from_redis = 0
+        self.last_check_ms = 0.0
+        self.last_build_ms = 0.0
+
+    # ── Read API ───────────────────────────────────────────────────────
+    def current_schema(self) -> Optional[Dict[str, Any]]:
+        return self._schema
+
+    @property
+    def structure_version(self) -> str:
+        return self._fingerprint[0] if self._fingerprint else ""
+
+    @property
+    def data_version(self) -> str:
+        return self._fingerprint[1] if self._fingerprint else ""
+
+    @property
+    def fingerprint(self) -> str:
+        return f"{self.structure_version[:12]}.{self.data_version[:12]}" if self._fingerprint else ""
+
+    def table_versions(self) -> Dict[str, str]:
+        """nama tabel hr → counter modifikasi (berubah saat INSERT/UPDATE/DELETE)."""
+        return self._table_versions
+
+    def subscribe(self, callback: Callable[[str, str], None]) -> None:
+        """callback(structure_version, data_version) dipanggil setiap fingerprint berubah."""
+        self._listeners.append(callback)
+
+    async def get_schema_async(self) -> Dict[str, Any]:
+        """Untuk handler async: snapshot kalau ada, kalau belum ada refresh (di thread)."""
+        if self._schema is not None:
+            return self._schema
+        schema = await self.refresh()
+        if schema is not None:
+            return schema
+        reader = await asyncio.to_thread(self._get_reader)
+        return await asyncio.to_thread(reader.get_schema)
+
+    # ── Lifecycle ──────────────────────────────────────────────────────
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"🧬 Schema snapshot aktif (cek fingerprint tiap {SCHEMA_FINGERPRINT_INTERVAL:.0f}s)")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                return
+            except Exception as e:
+                self._log_error(e)
+            try:
+                await asyncio.sleep(SCHEMA_FINGERPRINT_INTERVAL)
+            except asyncio.CancelledError:
+                return
+
+    # ── Refresh ────────────────────────────────────────────────────────
+    async def refresh(self, force: bool = False) -> Optional[Dict[str, Any]]:
+        """Cek fingerprint; rebuild/ambil snapshot hanya kalau berubah (force = selalu rebuild)."""
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            start = time.monotonic()
+            fp = await asyncio.to_thread(self._compute_fingerprint)
+            self.checks += 1
+            self.last_check_ms = round((time.monotonic() - start) * 1000, 1)
+            self._last_error = None
+
+            if not force and fp == self._fingerprint and self._schema is not None:
+                return self._schema
+
+            client = _redis()
+            if not force and client is not None:
+                published = await self._load_published(client, fp)
+                if published is not None:
+                    self.loaded_from_redis += 1
+                    self._adopt(fp, published)
+                    return published
+                if not await self._try_lock(client, fp):
+                    # Worker lain sedang rebuild → tetap layani snapshot lama, cek lagi tick berikutnya
+                    if self._schema is not None:
+                        return self._schema
+                    # Cold start: tunggu snapshot pemegang lock (rebuild sendiri kalau tidak muncul)
+                    published = await self._wait_published(client, fp)
+                    if published is not None:
+                        self.loaded_from_redis += 1
+                        self._adopt(fp, published)
+                        return published
+
+            start = time.monotonic()
+            reader = await asyncio.to_thread(self._get_reader)
+            schema = await asyncio.to_thread(reader.build_schema)
+            self.rebuilds += 1
+            self.last_build_ms = round((time.monotonic() - start) * 1000, 1)
+            self._adopt(fp, schema)
+            if client is not None:
+                await self._publish(client, fp, schema)
+            return schema
+
+    def _get_reader(self):
+        if self._reader is None:
+            from engines.hr.database.db_manager import get_db_manager
+            from engines.hr.database.schema_reader import SchemaReader
+            self._reader = SchemaReader(db_manager=get_db_manager())
+        return self._reader
+
+    def _compute_fingerprint(self) -> Fingerprint:
+        reader = self._get_reader()
+        with reader.db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(_FINGERPRINT_SQL)
+                row = cursor.fetchone()
+        self._table_versions = dict(row["tables"] or {})
+        return (row["structure"] or "", row["data"] or "")
+
+    def _adopt(self, fp: Fingerprint, schema: Dict[str, Any]) -> None:
+        previous = self._fingerprint
+        self._schema = schema
+        self._fingerprint = fp
+        self._built_at = time.time()
+        if previous is None or previous == fp:
+            return
+        what = "struktur" if previous[0] != fp[0] else "data"
+        logger.info(f"🧬 Fingerprint schema hr berubah ({what}) → {self.fingerprint}")
+        for callback in list(self._listeners):
+            try:
+                callback(fp[0], fp[1])
+            except Exception as e:
+                logger.warning(f"⚠️ Listener schema snapshot gagal: {e}")
+
+    # ── Redis (dibagi ke semua worker) ─────────────────────────────────
+    async def _load_published(self, client, fp: Fingerprint) -> Optional[Dict[str, Any]]:
+        try:
+            from memory.redis_pipeline import timed
+            raw = await timed("hr_schema.get", client.get(_snap_key(fp)))
+        except Exception as e:
+            logger.debug(f"Schema snapshot Redis get gagal: {e}")
+            return None
+        if not raw:
+            return None
+        data = json.loads(raw) if isinstance(raw, str) else raw
+        return data.get("schema")
+
+    async def _wait_published(self, client, fp: Fingerprint) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + _COLD_START_WAIT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(_COLD_START_POLL)
+            published = await self._load_published(client, fp)
+            if published is not None:
+                return published
+        logger.warning("⚠️ Snapshot schema dari worker lain tidak muncul, rebuild lokal")
+        return None
+
+    async def _try_lock(self, client, fp: Fingerprint) -> bool:
+        try:
+            from memory.redis_pipeline import timed
+            return bool(await timed("hr_schema.lock", client.set(_lock_key(fp), "1", nx=True, ex=_LOCK_TTL)))
+        except Exception:
+            return True  # Redis bermasalah → rebuild lokal saja
+
+    async def _publish(self, client, fp: Fingerprint, schema: Dict[str, Any]) -> None:
+        try:
+            from memory.redis_pipeline import timed
+            payload = json.dumps({"structure": fp[0], "data": fp[1], "built_at": self._built_at, "schema": schema}, default=str)
+            await timed("hr_schema.set", client.set(_snap_key(fp), payload, ex=SCHEMA_SNAPSHOT_TTL))
+        except Exception as e:
+            logger.warning(f"⚠️ Schema snapshot gagal dipublikasikan ke Redis: {e}")
+
+    def _log_error(self, e: Exception) -> None:
+        message = str(e)
+        if message != self._last_error:
+            logger.warning(f"⚠️ Schema snapshot refresh gagal: {message}")
+        self._last_error = message
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "fingerprint": self.fingerprint,
+            "age_seconds": round(time.time() - self._built_at, 1) if self._built_at else None,
+            "checks": self.checks,
+            "rebuilds": self.rebuilds,
+            "loaded_from_redis": self.loaded_from_redis,
+            "last_check_ms": self.last_check_ms,
+            "last_build_ms": self.last_build_ms,
+            "last_error": self._last_error,
+        }
+
+
+schema_snapshot = SchemaSnapshot()
@@ -1,18 +1,24 @@
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Callable, Tuple
 
 from engines.hr.models.hr_response import HRResponse
 from engines.hr.intent.hr_intent_analyzer import HRIntentAnalyzer
-from engines.hr.query.sql_generator import SQLGenerator
+from engines.hr.query.sql_generator import SQLGenerator, SQL_EXPLANATION_FALLBACK
 from engines.hr.query.sql_validator import SQLValidator
 from engines.hr.query.query_executor import QueryExecutor, QueryResult
+from engines.hr.query.cost_guard import CostRejected
 from engines.hr.database.schema_reader import SchemaReader
+from engines.hr.query.schema_retriever import schema_retriever
+from engines.hr.query.sql_cache import CachedSQL
+from engines.hr.query.sql_templates import sql_templates
 from engines.hr.database.db_manager import DatabaseManager
 from engines.hr.analysis.data_first_analyzer import DataFirstAnalyzer
 from engines.hr.analysis.data_narrator import ProductionDataNarrator
 
 from openai import OpenAI
-from app.config import OPENAI_API_KEY
+from app.config import OPENAI_API_KEY, DEADLINE_MIN_SQL_EXPLANATION, SQL_EXPLANATION_LAZY
+from app.deadline import Deadline, budget_allows
+from app.cancellation import record_savings
 
 class HRService:
     """
@@ -54,10 +60,23 @@ class HRService:
             self.logger.error(f"❌ HR Service initialization failed: {e}")
             raise
 
-    def process_hr_query(self, question: str, user_role: str, selected_chart: Optional[str] = None, session_id: str = "default") -> HRResponse:
+    def process_hr_query(
+        self,
+        question: str,
+        user_role: str,
+        selected_chart: Optional[str] = None,
+        session_id: str = "default",
+        deadline: Optional[Deadline] = None,
+        should_cancel: Optional[Callable[[], bool]] = None,
+        cached_sql: Optional[CachedSQL] = None,
+    ) -> HRResponse:
         """
         🔥 MAIN ENTRY POINT
         SQL Result → Insight Generation → Frontend-Ready HRResponse + SQL Transparency
+        deadline: budget request — panggilan LLM dibatasi sisa waktu, penjelasan SQL di-skip kalau menipis.
+        should_cancel: callable sync dari CancellationToken — dicek antar tahap karena
+                       method ini jalan di worker thread dan tidak bisa di-cancel dari event loop.
+        cached_sql: hasil sql_cache.lookup() (dilakukan di event loop) — generate SQL & penjelasan di-skip.
         """
         try:
             # 1. Security check
@@ -73,7 +92,14 @@ class HRService:
             self.logger.info(f"⚙️ Memproses HR Query: '{standalone_question}'")
 
             # 3. Execute query flow
-            query_result = self._execute_query_flow(standalone_question)
+            try:
+                query_result, sql, sql_source, ready_explanation = self._execute_query_flow(
+                    standalone_question, deadline=deadline, should_cancel=should_cancel, cached_sql=cached_sql
+                )
+            except CostRejected as e:
+                return HRResponse(errors=[str(e)], cost_rejected=True, sql_source=e.origin or "generated")
+            if self._is_cancelled(should_cancel, "after_query"):
+                return HRResponse(errors=["Request cancelled"])
             
             # 4. Check results
             if not query_result or not query_result.rows:
@@ -105,18 +131,35 @@ class HRService:
                 query_dict = query_result.to_dict()
                 
                 # ✅ SUNTIKKAN SQL LANGSUNG KE DALAM DICTIONARY
-                if self._last_generated_sql:
-                    query_dict['sql_query'] = self._last_generated_sql
-                    query_dict['sql_explanation'] = self._generate_sql_explanation(
-                        self._last_generated_sql, self._last_user_question
-                    )
+                cache_entry = None
+                if sql:
+                    query_dict['sql_query'] = sql
+                    if ready_explanation:
+                        # SQL dari cache/template → penjelasannya juga, tanpa panggilan LLM
+                        query_dict['sql_explanation'] = ready_explanation
+                    elif SQL_EXPLANATION_LAZY:
+                        # Penjelasan dibuat saat panel Transparansi Query dibuka
+                        # (GET /artifacts/{turn_id}/sql-explanation, cache per hash SQL)
+                        cache_entry = {'sql': sql, 'explanation': None}
+                    else:
+                        if self._is_cancelled(should_cancel, "sql_explanation", tokens_saved=1000):
+                            return HRResponse(errors=["Request cancelled"])
+                        explanation = None
+                        if budget_allows(deadline, "skip_sql_explanation", DEADLINE_MIN_SQL_EXPLANATION):
+                            explanation = self._generate_sql_explanation(sql, standalone_question, deadline=deadline)
+                        query_dict['sql_explanation'] = explanation or "Query untuk mengambil data HR."
+                        # Lolos validator + dieksekusi + ada baris → layak masuk SQL cache
+                        # (entry cache yang belum punya penjelasan ikut dilengkapi)
+                        cache_entry = {'sql': sql, 'explanation': None if explanation == SQL_EXPLANATION_FALLBACK else explanation}
                 
                 response = HRResponse(
                     data=query_dict,
                     insight=narration_result.raw_data_display + "\n" + narration_result.llm_interpretation,
                     narrative=narrative_for_frontend,
                     analysis=analysis_for_frontend,  
-                    recommendations=[]
+                    recommendations=[],
+                    sql_cache_entry=cache_entry,
+                    sql_source=sql_source
                 )
                 return response
                 
@@ -130,8 +173,8 @@ class HRService:
                     analysis={'note': 'Analysis temporarily unavailable'},
                     recommendations=[]
                 )
-                if self._last_generated_sql:
-                    fallback.sql_query = self._last_generated_sql
+                if sql:
+                    fallback.sql_query = sql
                     fallback.sql_explanation = "Query untuk mengambil data HR."
                 return fallback
             
@@ -139,6 +182,22 @@ class HRService:
             self.logger.error(f"❌ HR query processing failed: {e}")
             return HRResponse(errors=[f"Query processing failed: {str(e)}"])
     
+    def get_metrics(self) -> Dict[str, Any]:
+        """Metrik cache pipeline HR (ditampilkan di /status)."""
+        from engines.hr.query.result_cache import result_cache
+        from engines.hr.query.sql_cache import sql_cache
+        from engines.hr.query.sql_explainer import sql_explainer
+        from engines.hr.query.query_executor import fetch_stats
+        from engines.hr.query.cost_guard import cost_guard
+        return {
+            "result_cache": result_cache.status(),
+            "sql_cache": sql_cache.status(),
+            "sql_templates": sql_templates.status(),
+            "sql_explanations": sql_explainer.status(),
+            "result_fetch": fetch_stats.status(),
+            "cost_guard": cost_guard.status(),
+        }
+    
     def _prepare_analysis_for_frontend(self, analysis_response, computed_metrics) -> Dict[str, Any]:
         """Prepare analysis data in the format frontend expects"""
         analysis_for_frontend = {}
@@ -187,12 +246,75 @@ class HRService:
         valid_roles = ['hr', 'admin', 'manager']
         return str(user_role).lower() in valid_roles
     
-    def _execute_query_flow(self, question: str) -> Optional[QueryResult]:
-        """Orchestrate SQL Generation -> Validation -> Execution"""
+    def _is_cancelled(self, should_cancel: Optional[Callable[[], bool]], stage: str, tokens_saved: int = 0) -> bool:
+        if should_cancel is None:
+            return False
         try:
-            schema = self.schema_reader.get_schema_text() 
-            
-            sql = self.sql_generator.generate_sql(question, schema)
+            cancelled = bool(should_cancel())
+        except Exception:
+            return False
+        if cancelled:
+            self.logger.warning(f"🛑 HR query cancelled before '{stage}'")
+            if tokens_saved:
+                record_savings(tokens_saved, 0, stage=f"hr_{stage}")
+        return cancelled
+
+    def _execute_query_flow(
+        self,
+        question: str,
+        deadline: Optional[Deadline] = None,
+        should_cancel: Optional[Callable[[], bool]] = None,
+        cached_sql: Optional[CachedSQL] = None,
+    ) -> Tuple[Optional[QueryResult], Optional[str], str, Optional[str]]:
+        """Orchestrate SQL Generation (atau SQL cache / template) -> Validation -> Execution.
+        Return (hasil, sql, sumber, penjelasan siap pakai) — sumber "generated" | "template:<nama>" |
+        "cache:exact" | "cache:semantic"; penjelasan None = perlu dibuat LLM."""
+        if cached_sql is not None:
+            try:
+                if not self.sql_validator.is_valid(cached_sql.sql):
+                    raise Exception("SQL did not pass security validation.")
+                if self._is_cancelled(should_cancel, "sql_execution"):
+                    return None, None, "generated", None
+                self._last_generated_sql = cached_sql.sql
+                self._last_user_question = question
+                query_result = self.query_executor.execute_with_limit(
+                    cached_sql.sql, max_rows=1000, guarded=True, origin=f"cache:{cached_sql.level}"
+                )
+                return query_result, cached_sql.sql, f"cache:{cached_sql.level}", cached_sql.explanation
+            except CostRejected as e:
+                # Generate ulang untuk pertanyaan yang sama hampir pasti sama beratnya → langsung ke user;
+                # entry-nya dibuang dari sql_cache oleh caller (sql_source "cache:*")
+                self.logger.warning(f"⚠️ SQL dari cache ditolak cost guard: {e}")
+                raise
+            except Exception as e:
+                # Entry cache rusak/usang → jalur normal (generate ulang)
+                self.logger.warning(f"⚠️ SQL dari cache gagal dipakai, generate ulang: {e}")
+
+        # Pertanyaan berpola umum → SQL dari template, tanpa LLM (gagal → LLM)
+        template = sql_templates.match(
+            question, self.schema_reader.get_schema(), self.sql_generator.analyze_indonesian_intent(question)
+        )
+        if template is not None:
+            try:
+                if not self.sql_validator.is_valid(template.sql):
+                    raise Exception("SQL did not pass security validation.")
+                if self._is_cancelled(should_cancel, "sql_execution"):
+                    return None, None, "generated", None
+                self._last_generated_sql = template.sql
+                self._last_user_question = question
+                query_result = self.query_executor.execute_with_limit(
+                    template.sql, max_rows=1000, origin=f"template:{template.template}"
+                )
+                return query_result, template.sql, f"template:{template.template}", template.explanation
+            except Exception as e:
+                sql_templates.record_failure(template.template)
+                self.logger.warning(f"⚠️ SQL template '{template.template}' gagal, fallback ke LLM: {e}")
+
+        sql = None
+        try:
+            sql = self._generate_sql(question, deadline=deadline, should_cancel=should_cancel)
+            if sql is None:
+                return None, None, "generated", None
             
             self._last_generated_sql = sql
             self._last_user_question = question
@@ -200,26 +322,72 @@ class HRService:
             if not self.sql_validator.is_valid(sql):
                 raise Exception("SQL did not pass security validation.")
             
+            if self._is_cancelled(should_cancel, "sql_execution"):
+                return None, None, "generated", None
+
             # Menggunakan fitur execute_with_limit dari QueryExecutor untuk safety
-            query_result = self.query_executor.execute_with_limit(sql, max_rows=1000)
-            return query_result
-            
+            # (+ cost guard: EXPLAIN dulu, plan kemahalan di-LIMIT ulang atau ditolak)
+            query_result = self.query_executor.execute_with_limit(sql, max_rows=1000, guarded=True, origin="generated")
+            return query_result, sql, "generated", None
+
+        except CostRejected as e:
+            self.logger.warning(f"⚠️ Query rejected (cost guard): {e}")
+            raise
         except Exception as e:
             err_msg = str(e)
             if "INVALID_QUERY" in err_msg:
                 self.logger.warning(f"⚠️ Query rejected (non-DB/simulasi): {err_msg}")
             else:
                 self.logger.error(f"❌ Query execution flow failed: {err_msg}")
+            return None, None, "generated", None
+
+    def _generate_sql(
+        self,
+        question: str,
+        deadline: Optional[Deadline] = None,
+        should_cancel: Optional[Callable[[], bool]] = None,
+    ) -> Optional[str]:
+        """Schema terpangkas + value index → LLM. None kalau dibatalkan sebelum generate."""
+        # Schema dipangkas ke tabel/kolom yang relevan dengan pertanyaan (BM25 + embedding),
+        # mention nilai (sarjana → 'S1') di-resolve lewat value index
+        schema, selection, value_matches = self.schema_reader.get_schema_text_for(
+            question, embed_client=self.llm, timeout=deadline.timeout_for(5) if deadline else 5
+        )
+        
+        # Prompt SQL (schema + glosarium) ~4-5rb token — skip kalau user sudah pergi
+        if self._is_cancelled(should_cancel, "sql_generation", tokens_saved=5000):
             return None
+
+        try:
+            sql = self.sql_generator.generate_sql(
+                question, schema, timeout=deadline.timeout_for(30, floor=5) if deadline else None
+            )
+        except Exception as e:
+            if (selection is None and value_matches is None) or "INVALID_QUERY" not in str(e):
+                raise
+            # Jaring pengaman recall: ditolak dengan schema terpangkas → ulangi dengan schema utuh
+            self.logger.info("✂️ INVALID_QUERY dengan schema terpangkas → ulangi dengan schema utuh")
+            if selection is not None:
+                schema_retriever.record_full_schema_retry()
+            selection = None
+            sql = self.sql_generator.generate_sql(
+                question, self.schema_reader.get_schema_text(),
+                timeout=deadline.timeout_for(30, floor=5) if deadline else None
+            )
+        schema_retriever.record_sql(selection, sql, self.schema_reader.get_schema(), question=question)
+        return sql
     
-    def _generate_sql_explanation(self, sql_query: str, user_question: str) -> str:
-        """Memanggil LLM untuk menjelaskan SQL"""
+    def _generate_sql_explanation(self, sql_query: str, user_question: str, deadline: Optional[Deadline] = None) -> Optional[str]:
+        """Memanggil LLM untuk menjelaskan SQL (None kalau gagal — jangan sampai fallback masuk SQL cache)"""
         try:
             if hasattr(self.sql_generator, 'generate_sql_explanation'):
-                return self.sql_generator.generate_sql_explanation(sql_query, user_question)
-            return "Query berhasil diproses."
+                return self.sql_generator.generate_sql_explanation(
+                    sql_query, user_question, timeout=deadline.timeout_for(20, floor=3) if deadline else None
+                )
+            return None
         except Exception as e:
-            return "Query HR berhasil dijalankan."
+            self.logger.warning(f"⚠️ SQL explanation gagal: {e}")
+            return None
         
 def create_hr_service() -> HRService:
     """Factory function untuk HRService"""
@@ -27,6 +27,14 @@ class HRResponse:
     sql_query: Optional[str] = None
     sql_explanation: Optional[str] = None
     
+    # SQL cache: diisi kalau SQL lolos validator + berhasil dieksekusi dan layak disimpan
+    # ({'sql': ..., 'explanation': ...}); sql_source = "generated" | "template:<nama>" | "cache:exact" | "cache:semantic"
+    sql_cache_entry: Optional[Dict[str, Any]] = None
+    sql_source: Optional[str] = None
+
+    # Cost guard menolak plan SQL (sql_source menunjukkan asalnya; "cache:*" → entry sql_cache dibuang)
+    cost_rejected: bool = False
+    
     def has_data(self) -> bool:
         """Check apakah ada data yang berhasil di-query dengan aman"""
         # ✅ FIX: Pastikan data adalah dictionary sebelum memanggil .get()
@@ -0,0 +1,244 @@
+"""
+Cost Guard - Admission Control Berbasis EXPLAIN untuk SQL dari LLM
+==================================================================
+SQLValidator hanya memeriksa keyword/regex, bukan biaya. Satu CROSS JOIN yang
+salah generate di tabel karyawan bisa menahan koneksi pool sampai
+statement_timeout (30 detik) dan memperlambat semua user lain.
+
+Untuk SQL hasil LLM (dan SQL dari sql_cache, yang asalnya juga LLM):
+1. EXPLAIN (FORMAT JSON) — planning saja, dibatasi COST_GUARD_EXPLAIN_TIMEOUT_MS
+2. Lolos kalau Total Cost ≤ COST_GUARD_MAX_COST dan estimasi baris terbesar
+   ≤ COST_GUARD_MAX_ROWS. Node di bawah LIMIT tidak dihitung (eksekusinya
+   berhenti lebih awal), KECUALI input node blocking (Sort, Hash, Aggregate
+   non-sorted) — node itu tetap membaca seluruh input sebelum LIMIT bekerja.
+   QueryExecutor.execute_with_limit meng-EXPLAIN SQL sebelum LIMIT-nya sendiri
+   ditambahkan, supaya rewrite di langkah 3 masih punya arti.
+3. Kemahalan + COST_GUARD_REWRITE → dibungkus SELECT * FROM (...) LIMIT max_rows+1
+   lalu di-EXPLAIN ulang. Hasil yang terlihat user tidak berubah (QueryExecutor
+   memang hanya mengambil max_rows baris); yang hilang hanya kerja ekstra
+   database. Masih kemahalan → ditolak (COST_REJECTED).
+4. Yang lolos dijalankan dengan statement_timeout COST_GUARD_STATEMENT_TIMEOUT_MS.
+
+Filter tidak di-push-down secara tekstual — itu sudah dikerjakan planner
+PostgreSQL, dan mengubah predikat SQL LLM berarti mengubah jawabannya.
+
+Plan yang ditolak/di-rewrite, query yang timeout, dan query ≥ COST_GUARD_SLOW_MS
+dicatat ke tabel hr_slow_queries (memory/migrations/003_hr_slow_queries.sql)
+lewat persistence queue, untuk tuning index. EXPLAIN gagal (koneksi, timeout
+planning) → fail-open: query tetap jalan dengan statement_timeout guard.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from app.config import (
+    COST_GUARD_ENABLED,
+    COST_GUARD_MAX_COST,
+    COST_GUARD_MAX_ROWS,
+    COST_GUARD_REWRITE,
+    COST_GUARD_EXPLAIN_TIMEOUT_MS,
+    COST_GUARD_STATEMENT_TIMEOUT_MS,
+    COST_GUARD_SLOW_MS,
+)
+from engines.hr.query.result_cache import normalize_sql
+
+logger = logging.getLogger(__name__)
+
+_WRAP_ALIAS = "denai_guarded"
+_MAX_PLAN_CHARS = 20000
+_BLOCKING_NODES = {"Sort", "Hash"}
+
+
+class CostRejected(Exception):
+    """Plan query melewati batas cost guard (dan tidak bisa diselamatkan dengan LIMIT)."""
+
+    def __init__(self, message: str, origin: str = ""):
+        super().__init__(message)
+        self.origin = origin
+
+
+@dataclass
+class CostDecision:
+    action: str                     # accept | rewrite | reject | unchecked
+    sql: str                        # SQL yang dijalankan (bisa hasil rewrite)
+    total_cost: float = 0.0
+    peak_rows: float = 0.0
+    reason: str = ""
+    plan: Optional[Dict[str, Any]] = None
+    statement_timeout_ms: int = COST_GUARD_STATEMENT_TIMEOUT_MS
+
+
+def _is_blocking(node: Dict[str, Any]) -> bool:
+    """Node yang harus menghabiskan seluruh input sebelum mengeluarkan baris pertama."""
+    node_type = node.get("Node Type")
+    if node_type in _BLOCKING_NODES:
+        return True
+    return node_type in ("Aggregate", "SetOp") and node.get("Strategy") != "Sorted"
+
+
+def _peak_rows(node: Dict[str, Any], bounded: bool = False) -> float:
+    """Estimasi baris terbesar di plan; subtree di bawah node Limit diabaikan,
+    kecuali input node blocking (Sort/Hash/Aggregate) yang tetap dibaca penuh."""
+    peak = 0.0 if bounded else float(node.get("Plan Rows") or 0)
+    if node.get("Node Type") == "Limit":
+        child_bounded = True
+    elif _is_blocking(node):
+        child_bounded = False
+    else:
+        child_bounded = bounded
+    for child in node.get("Plans") or []:
+        peak = max(peak, _peak_rows(child, child_bounded))
+    return peak
+
+
+def _with_limit(sql: str, limit: int) -> str:
+    body = sql.strip().rstrip(";").strip()
+    return f"SELECT * FROM ({body}) AS {_WRAP_ALIAS} LIMIT {int(limit)}"
+
+
+class CostGuard:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.accepted = 0
+        self.rewritten = 0
+        self.rejected = 0
+        self.explain_failures = 0
+        self.timeouts = 0
+        self.slow = 0
+        self.explain_ms = 0.0
+        self.max_cost_seen = 0.0
+        self.logged = 0
+
+    # ── Plan ───────────────────────────────────────────────────────────
+    def _measure(self, db, sql: str):
+        started = time.monotonic()
+        try:
+            plan = db.explain(sql, statement_timeout_ms=COST_GUARD_EXPLAIN_TIMEOUT_MS)
+        finally:
+            with self._lock:
+                self.explain_ms += (time.monotonic() - started) * 1000
+        root = plan.get("Plan") or {}
+        return plan, float(root.get("Total Cost") or 0), _peak_rows(root)
+
+    @staticmethod
+    def _over_budget(cost: float, rows: float) -> str:
+        reasons = []
+        if COST_GUARD_MAX_COST > 0 and cost > COST_GUARD_MAX_COST:
+            reasons.append(f"cost {cost:,.0f} > {COST_GUARD_MAX_COST:,.0f}")
+        if COST_GUARD_MAX_ROWS > 0 and rows > COST_GUARD_MAX_ROWS:
+            reasons.append(f"rows {rows:,.0f} > {COST_GUARD_MAX_ROWS:,.0f}")
+        return ", ".join(reasons)
+
+    # ── API ────────────────────────────────────────────────────────────
+    def admit(self, db, sql: str, max_rows: int, origin: str = "") -> CostDecision:
+        """Keputusan untuk satu SQL sebelum dieksekusi. Raise CostRejected kalau ditolak."""
+        if not COST_GUARD_ENABLED:
+            return CostDecision("unchecked", sql)
+        with self._lock:
+            self.checked += 1
+        try:
+            plan, cost, rows = self._measure(db, sql)
+        except Exception as e:
+            # Planning gagal/timeout → jangan blokir user; statement_timeout tetap membatasi
+            with self._lock:
+                self.explain_failures += 1
+            logger.warning(f"⚠️ Cost guard: EXPLAIN gagal, query jalan dengan timeout guard: {e}")
+            return CostDecision("unchecked", sql, reason=str(e)[:200])
+
+        with self._lock:
+            self.max_cost_seen = max(self.max_cost_seen, cost)
+        reason = self._over_budget(cost, rows)
+        if not reason:
+            with self._lock:
+                self.accepted += 1
+            return CostDecision("accept", sql, cost, rows, plan=plan)
+
+        if COST_GUARD_REWRITE and _WRAP_ALIAS not in sql:
+            limited = _with_limit(sql, max_rows + 1)  # +1: QueryExecutor tetap bisa mendeteksi truncated
+            try:
+                new_plan, new_cost, new_rows = self._measure(db, limited)
+                if not self._over_budget(new_cost, new_rows):
+                    decision = CostDecision("rewrite", limited, new_cost, new_rows,
+                                            reason=f"{reason} → LIMIT {max_rows + 1}", plan=new_plan)
+                    with self._lock:
+                        self.rewritten += 1
+                    logger.info(f"🛡️ Cost guard: SQL dibungkus LIMIT ({reason} → cost {new_cost:,.0f})")
+                    self.log(decision.action, sql, origin, decision)
+                    return decision
+            except Exception as e:
+                logger.debug(f"Cost guard: EXPLAIN versi LIMIT gagal: {e}")
+
+        decision = CostDecision("reject", sql, cost, rows, reason=reason, plan=plan)
+        with self._lock:
+            self.rejected += 1
+        logger.warning(f"🛡️ Cost guard: SQL ditolak ({reason})")
+        self.log(decision.action, sql, origin, decision)
+        raise CostRejected(f"COST_REJECTED: {reason}", origin=origin)
+
+    def observe(self, sql: str, origin: str, decision: Optional[CostDecision],
+                duration_ms: float, error: Optional[Exception] = None) -> None:
+        """Dipanggil QueryExecutor setelah eksekusi: catat query timeout / lambat."""
+        if error is not None:
+            if "statement timeout" in str(error):
+                with self._lock:
+                    self.timeouts += 1
+                self.log("timeout", sql, origin, decision, duration_ms)
+            return
+        if COST_GUARD_SLOW_MS > 0 and duration_ms >= COST_GUARD_SLOW_MS:
+            with self._lock:
+                self.slow += 1
+            self.log("slow", sql, origin, decision, duration_ms)
+
+    def log(self, kind: str, sql: str, origin: str, decision: Optional[CostDecision],
+            duration_ms: Optional[float] = None) -> None:
+        """Satu baris hr_slow_queries (ditulis batch oleh persistence queue)."""
+        plan = json.dumps(decision.plan, default=str) if decision and decision.plan else None
+        row = {
+            "sql_hash": hashlib.sha1(normalize_sql(sql).encode("utf-8")).hexdigest(),
+            "sql_text": sql,
+            "executed_sql": decision.sql if decision and decision.sql != sql else None,
+            "origin": origin or None,
+            "decision": kind,
+            "reason": (decision.reason if decision else "") or None,
+            "total_cost": decision.total_cost if decision and decision.plan else None,
+            "plan_rows": decision.peak_rows if decision and decision.plan else None,
+            "duration_ms": round(duration_ms, 1) if duration_ms is not None else None,
+            # Plan besar dipotong — yang dibutuhkan untuk tuning index adalah node teratas
+            "plan": decision.plan if plan and len(plan) <= _MAX_PLAN_CHARS else None,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        try:
+            from memory.persistence_queue import persistence_queue
+            persistence_queue.enqueue_slow_query(row)
+            with self._lock:
+                self.logged += 1
+        except Exception as e:
+            logger.debug(f"Cost guard: log slow query gagal: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": COST_GUARD_ENABLED,
+            "max_cost": COST_GUARD_MAX_COST,
+            "max_rows": COST_GUARD_MAX_ROWS,
+            "statement_timeout_ms": COST_GUARD_STATEMENT_TIMEOUT_MS,
+            "checked": self.checked,
+            "accepted": self.accepted,
+            "rewritten": self.rewritten,
+            "rejected": self.rejected,
+            "explain_failures": self.explain_failures,
+            "timeouts": self.timeouts,
+            "slow": self.slow,
+            "logged": self.logged,
+            "avg_explain_ms": round(self.explain_ms / self.checked, 1) if self.checked else 0,
+            "max_cost_seen": round(self.max_cost_seen, 1),
+        }
+
+
+cost_guard = CostGuard()
@@ -2,27 +2,92 @@
 Query Executor - COMPLETE FIXED VERSION
 Menjalankan SQL HANYA di Supabase PostgreSQL dengan data structure yang BENAR
 Menggunakan DatabaseManager untuk efisiensi koneksi (Connection Pooling)
+Hasil di-cache per SQL ternormalisasi, invalid saat versi tabel hr berubah (result_cache.py)
+Hasil disimpan per kolom (data[i] = semua nilai kolom i) langsung dari named cursor
+DatabaseManager.execute_columnar; rows (list dict) baru dibentuk saat dibutuhkan.
+SQL dari LLM (guarded=True) di-EXPLAIN dulu oleh cost_guard.py sebelum dijalankan.
 """
 
 import logging
-from typing import Dict, Any
+import threading
+import time
+from typing import Dict, Any, List, Optional
 from engines.hr.database.db_manager import DatabaseManager
-import decimal
+from engines.hr.query.result_cache import result_cache
+from engines.hr.query.cost_guard import cost_guard, CostRejected
+from app.config import HR_DB_FETCH_BATCH
+
 
 class QueryResult:
     """QueryResult model yang menyimpan result query dalam format yang benar"""
-    def __init__(self, columns: list, rows: list, total_rows: int):
+    def __init__(self, columns: list, rows: Optional[list] = None, total_rows: Optional[int] = None,
+                 data: Optional[List[list]] = None, types: Optional[List[str]] = None, truncated: bool = False):
         self.columns = columns
-        self.rows = rows  # List[Dict]
-        self.total_rows = total_rows
-    
+        self.types = types or []
+        self.truncated = truncated
+        if data is None:
+            # Format lama (list dict) → kolom
+            rows = rows or []
+            data = [[row.get(col) for row in rows] for col in columns]
+        self.data = data  # List[List] per kolom
+        self._rows = rows
+        self.total_rows = total_rows if total_rows is not None else (len(data[0]) if data else 0)
+
+    @property
+    def rows(self) -> List[Dict[str, Any]]:
+        """List dict per baris (analyzer, narrator, tabel markdown) — dibentuk sekali, lazily."""
+        if self._rows is None:
+            self._rows = [dict(zip(self.columns, values)) for values in zip(*self.data)] if self.data else []
+        return self._rows
+
+    def to_columnar(self) -> Dict[str, Any]:
+        return {'columns': self.columns, 'types': self.types, 'data': self.data, 'total_rows': self.total_rows}
+
     def to_dict(self) -> Dict[str, Any]:
-        return {'columns': self.columns, 'rows': self.rows, 'total_rows': self.total_rows}
+        return {'columns': self.columns, 'rows': self.rows, 'total_rows': self.total_rows,
+                'column_types': self.types}
     
     def __repr__(self) -> str:
         return f"QueryResult(columns={len(self.columns)}, rows={self.total_rows})"
 
 
+class _FetchStats:
+    """Metrik pengambilan hasil (ditampilkan di /status lewat HRService.get_metrics)."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.rows = 0
+        self.batches = 0
+        self.truncated = 0
+        self.db_ms = 0.0
+        self.cpu_ms = 0.0
+
+    def record(self, rows: int, batches: int, truncated: bool, db_ms: float, cpu_ms: float) -> None:
+        with self._lock:
+            self.queries += 1
+            self.rows += rows
+            self.batches += batches
+            self.truncated += int(truncated)
+            self.db_ms += db_ms
+            self.cpu_ms += cpu_ms
+
+    def status(self) -> Dict[str, Any]:
+        n = self.queries
+        return {
+            "queries": n,
+            "fetch_batch": HR_DB_FETCH_BATCH,
+            "avg_rows": round(self.rows / n, 1) if n else 0,
+            "avg_batches": round(self.batches / n, 2) if n else 0,
+            "truncated": self.truncated,
+            "avg_db_ms": round(self.db_ms / n, 1) if n else 0,
+            # CPU thread pemanggil (parsing + penyusunan kolom), di luar waktu tunggu database
+            "avg_cpu_ms": round(self.cpu_ms / n, 2) if n else 0,
+        }
+
+
+fetch_stats = _FetchStats()
+
+
 class QueryExecutor:
     """
     Pure PostgreSQL executor untuk Supabase.
@@ -34,33 +99,56 @@ class QueryExecutor:
         # ✅ FIX: Gunakan DatabaseManager yang sudah ada!
         self.db = db_manager or DatabaseManager()
     
-    def execute(self, sql: str) -> QueryResult:
+    def execute(self, sql: str, max_rows: int = 1000, guarded: bool = False, origin: str = "",
+                guard_sql: Optional[str] = None) -> QueryResult:
+        """guarded=True: SQL dari LLM/sql_cache → EXPLAIN cost guard + statement_timeout guard.
+        origin (generated / cache:exact / template:<nama> ...) hanya untuk log hr_slow_queries.
+        guard_sql: versi SQL yang di-EXPLAIN (execute_with_limit: sebelum LIMIT ditambahkan)."""
         try:
-            result_dict = self.db.execute_query(sql)
-            
-            # 🌟 FIX DECIMAL KE FLOAT AGAR FRONTEND BISA BACA ANGKA
-            clean_rows = []
-            for r in result_dict['rows']:
-                clean_row = {}
-                for k, v in r.items():
-                    if isinstance(v, decimal.Decimal):
-                        clean_row[k] = float(v)
-                    else:
-                        clean_row[k] = v
-                clean_rows.append(clean_row)
-            
+            # ♻️ Hasil yang sama selama tabel yang dirujuk belum berubah → tanpa ke database
+            cached, cache_token = result_cache.get(sql)
+            if cached is not None:
+                return QueryResult(columns=cached['columns'], data=cached['data'], types=cached.get('types'),
+                                   truncated=cached.get('truncated', False))
+
+            # 🛡️ Plan kemahalan → dibungkus LIMIT atau ditolak (CostRejected) sebelum memakai koneksi lama
+            decision = cost_guard.admit(self.db, guard_sql or sql, max_rows, origin=origin) if guarded else None
+            run_sql = decision.sql if decision and decision.action == "rewrite" else sql
+
+            start = time.monotonic()
+            cpu_start = time.thread_time()
+            # Named cursor per batch; NUMERIC → float lewat typecaster (tanpa loop Decimal per nilai)
+            try:
+                result_dict = self.db.execute_columnar(
+                    run_sql, max_rows=max_rows,
+                    statement_timeout_ms=decision.statement_timeout_ms if decision else None,
+                )
+            except Exception as e:
+                cost_guard.observe(guard_sql or sql, origin, decision, (time.monotonic() - start) * 1000, error=e)
+                raise
+            db_ms = (time.monotonic() - start) * 1000
+            fetch_stats.record(result_dict['total_rows'], result_dict['batches'], result_dict['truncated'],
+                               db_ms, (time.thread_time() - cpu_start) * 1000)
+            cost_guard.observe(guard_sql or sql, origin, decision, db_ms)
+
             result = QueryResult(
                 columns=result_dict['columns'],
-                rows=clean_rows, 
-                total_rows=result_dict['total_rows']
+                data=result_dict['data'],
+                types=result_dict['types'],
+                total_rows=result_dict['total_rows'],
+                truncated=result_dict['truncated'],
             )
+            result_cache.put(cache_token, result.columns, result.data, types=result.types, db_ms=db_ms,
+                             truncated=result.truncated)
             return result
-                    
+
+        except CostRejected:
+            raise  # penolakan cost guard bukan kegagalan eksekusi — caller menanganinya per tipe
         except Exception as e:
             self.logger.error(f"❌ Query execution failed: {e}")
             raise Exception(f"Failed to execute query: {str(e)}")
     
-    def execute_with_limit(self, sql: str, max_rows: int = 1000) -> QueryResult:
+    def execute_with_limit(self, sql: str, max_rows: int = 1000, guarded: bool = False, origin: str = "") -> QueryResult:
         try:
             sql_upper = sql.upper()
             if 'LIMIT' not in sql_upper:
@@ -68,10 +156,14 @@ class QueryExecutor:
             else:
                 limited_sql = sql
             
-            result = self.execute(limited_sql)
-            if result.total_rows >= max_rows:
+            # Cost guard menilai SQL asli: LIMIT di atas plan akan menyembunyikan baris yang
+            # sebenarnya diproses, dan membuat rewrite LIMIT max_rows+1 tidak berarti
+            result = self.execute(limited_sql, max_rows=max_rows, guarded=guarded, origin=origin, guard_sql=sql)
+            if result.truncated or result.total_rows >= max_rows:
                 self.logger.warning(f"⚠️ Results limited to {max_rows} rows")
             return result
+        except CostRejected:
+            raise
         except Exception as e:
             self.logger.error(f"❌ Limited query execution failed: {e}")
             raise
\ No newline at end of file
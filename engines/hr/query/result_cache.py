@@ -0,0 +1,336 @@
+"""
+Result Cache - Cache Hasil Query HR dengan Invalidasi per Versi Tabel
+=====================================================================
+SELECT yang sama (mis. "... GROUP BY band") dijalankan ke Supabase puluhan
+kali sehari, padahal data hr hanya berubah saat ada ingestion.
+
+- Key    : sha1 SQL yang dinormalisasi (komentar dibuang, spasi dirapikan,
+           huruf kecil di luar literal '...' dan identifier "...")
+- Valid  : selama versi setiap tabel hr yang dirujuk SQL sama dengan saat
+           hasil disimpan. Versi = counter modifikasi pg_stat_user_tables yang
+           dibaca schema_snapshot setiap SCHEMA_FINGERPRINT_INTERVAL detik,
+           ditambah watermark ingestion global di Redis (bump_ingestion_watermark,
+           dipanggil /api/schema/refresh) untuk invalidasi seketika.
+- Simpan : JSON per kolom (tanggal/waktu tetap bertipe) → gzip, di near-cache per worker
+           dan Redis (base64). Hasil > RESULT_CACHE_MAX_ROWS baris atau
+           > RESULT_CACHE_MAX_BYTES setelah kompresi tidak disimpan.
+- Tidak di-cache: SQL dengan fungsi volatil (random(), nextval(), ...), SQL
+  yang merujuk tabel di luar hr/tanpa versi. SQL dengan CURRENT_DATE/now()/age()
+  di-key per tanggal.
+
+QueryExecutor berjalan di worker thread → Redis diakses dengan client SINKRON
+(upstash_redis.Redis atau redis-py), bukan redis_client async milik memory_hybrid.
+"""
+
+import base64
+import datetime
+import decimal
+import gzip
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import (
+    UPSTASH_REDIS_URL,
+    UPSTASH_REDIS_TOKEN,
+    REDIS_URL,
+    RESULT_CACHE_ENABLED,
+    RESULT_CACHE_TTL,
+    RESULT_CACHE_MAX_ROWS,
+    RESULT_CACHE_MAX_BYTES,
+)
+from backend.utils.ttl_cache import TTLCache, MISSING
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_KEY = "denai:hr_result:watermark"
+_NEAR_TTL = 300
+
+_SEGMENT_RE = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_VOLATILE_RE = re.compile(r"\b(random|setseed|nextval|currval|clock_timestamp|statement_timestamp|timeofday|txid_current|gen_random_uuid)\s*\(")
+_DATE_RE = re.compile(r"\b(current_date|current_timestamp|localtimestamp|localtime|now\s*\(|age\s*\()")
+_TOKEN_RE = re.compile(r'"(?:[^"]|"")*"|[a-z_][a-z0-9_$]*|[(),.]')
+_CTE_RE = re.compile(r'("(?:[^"]|"")*"|\b[a-z_][a-z0-9_]*)\s*(?:\([^()]*\))?\s+as\s+(?:not\s+)?(?:materialized\s+)?\(')
+_FROM_ARG_FUNCS = {"extract", "substring", "trim", "overlay", "position"}
+_FROM_LIST_END = {"where", "group", "order", "having", "limit", "offset", "union", "intersect",
+                  "except", "window", "on", "using", "fetch", "for", "select"}
+
+
+def normalize_sql(sql: str) -> str:
+    """Huruf kecil + spasi tunggal di luar literal/identifier ber-quote; tanpa komentar & ';' akhir."""
+    parts = _SEGMENT_RE.split(sql or "")
+    out = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            out.append(part)  # literal / quoted identifier: apa adanya
+        else:
+            out.append(" ".join(_COMMENT_RE.sub(" ", part).lower().split()))
+    return " ".join(p for p in out if p).strip().rstrip(";").strip()
+
+
+def _referenced_tables(normalized: str) -> Optional[List[str]]:
+    """Semua relasi setelah FROM/JOIN (termasuk daftar koma), dengan schema kalau ditulis.
+    Nama CTE dibuang; literal string diabaikan. None kalau ada fungsi di FROM (tidak punya versi)."""
+    code = " ".join(p for i, p in enumerate(_SEGMENT_RE.split(normalized)) if i % 2 == 0 or p.startswith('"'))
+    tokens = _TOKEN_RE.findall(code)
+    ctes = {m.group(1).strip('"') for m in _CTE_RE.finditer(code)} if "with" in tokens else set()
+    found: List[str] = []
+    special: List[bool] = []  # stack kurung: True = argumen extract()/substring()/... (FROM di sana bukan tabel)
+    from_depth: Optional[int] = None
+    expect, prev, i = False, "", 0
+    while i < len(tokens):
+        tok = tokens[i]
+        if tok == "(":
+            special.append(prev in _FROM_ARG_FUNCS)
+            expect = False  # subquery — relasinya ditangkap FROM di dalamnya
+        elif tok == ")":
+            if special:
+                special.pop()
+            if from_depth is not None and len(special) < from_depth:
+                from_depth = None
+        elif tok == ",":
+            expect = from_depth == len(special)
+        elif tok in ("from", "join"):
+            if not (special and special[-1]):
+                expect, from_depth = True, len(special)
+        elif expect and tok not in ("lateral", "only"):
+            name = tok.strip('"')
+            if i + 2 < len(tokens) and tokens[i + 1] == ".":
+                name = name + "." + tokens[i + 2].strip('"')
+                i += 2
+            if i + 1 < len(tokens) and tokens[i + 1] == "(":
+                return None
+            found.append(name)
+            expect = False
+        elif tok in _FROM_LIST_END:
+            from_depth = None
+        prev = tok
+        i += 1
+    return [r for r in found if r not in ctes]
+
+
+# ── Serialisasi: tanggal/waktu tetap bertipe setelah round trip ───────────
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime.datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"$d": value.isoformat()}
+    if isinstance(value, datetime.time):
+        return {"$t": value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        raise TypeError("binary column")
+    return str(value)
+
+
+def _object_hook(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1:
+        key, value = next(iter(obj.items()))
+        if key == "$dt":
+            return datetime.datetime.fromisoformat(value)
+        if key == "$d":
+            return datetime.date.fromisoformat(value)
+        if key == "$t":
+            return datetime.time.fromisoformat(value)
+    return obj
+
+
+def _encode(columns: List[str], data: List[List[Any]], types: Optional[List[str]] = None,
+            truncated: bool = False) -> bytes:
+    raw = json.dumps({"columns": columns, "types": types or [], "data": data, "truncated": truncated},
+                     default=_json_default, separators=(",", ":"))
+    return gzip.compress(raw.encode("utf-8"), compresslevel=5)
+
+
+def _decode(blob: bytes) -> Dict[str, Any]:
+    result = json.loads(gzip.decompress(blob).decode("utf-8"), object_hook=_object_hook)
+    if "data" not in result:
+        # Entry format lama (list dict per baris)
+        rows = result.get("rows") or []
+        result["data"] = [[row.get(col) for row in rows] for col in result["columns"]]
+    return result
+
+
+class ResultCache:
+    def __init__(self):
+        self._near = TTLCache(maxsize=128, ttl=_NEAR_TTL)
+        self._client = None
+        self._client_checked = False
+        self._client_lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.near_hits = 0
+        self.stale = 0
+        self.stores = 0
+        self.skipped_uncacheable = 0
+        self.skipped_too_large = 0
+        self.redis_errors = 0
+        self.bytes_stored = 0
+        self.saved_db_ms = 0.0
+
+    # ── Redis sinkron (worker thread) ──────────────────────────────────
+    def _redis(self):
+        if self._client_checked:
+            return self._client
+        with self._client_lock:
+            if not self._client_checked:
+                try:
+                    if UPSTASH_REDIS_URL and UPSTASH_REDIS_TOKEN:
+                        from upstash_redis import Redis
+                        self._client = Redis(url=UPSTASH_REDIS_URL, token=UPSTASH_REDIS_TOKEN)
+                    elif REDIS_URL:
+                        import redis
+                        self._client = redis.Redis.from_url(REDIS_URL, decode_responses=True, socket_timeout=2)
+                except Exception as e:
+                    logger.warning(f"⚠️ Result cache tanpa Redis (near-cache saja): {e}")
+                    self._client = None
+                self._client_checked = True
+        return self._client
+
+    # ── Key & versi ────────────────────────────────────────────────────
+    def _plan(self, sql: str) -> Optional[Tuple[str, Dict[str, str]]]:
+        """(key, versi tabel saat ini) atau None kalau SQL tidak boleh di-cache."""
+        from engines.hr.database.schema_snapshot import schema_snapshot
+        normalized = normalize_sql(sql)
+        known = schema_snapshot.table_versions()
+        if not normalized or not known or _VOLATILE_RE.search(normalized):
+            return None
+        # Setiap relasi harus tabel hr yang punya versi — satu relasi tanpa versi
+        # (schema lain, view, fungsi) berarti hasil bisa basi tanpa pernah terdeteksi
+        relations = _referenced_tables(normalized)
+        if not relations:
+            return None
+        tables = set()
+        for relation in relations:
+            schema, _, name = relation.rpartition(".")
+            if schema not in ("", "hr") or name not in known:
+                return None
+            tables.add(name)
+        tables = sorted(tables)
+        bucket = datetime.date.today().isoformat() if _DATE_RE.search(normalized) else ""
+        key = hashlib.sha1(f"{normalized}\n{bucket}".encode("utf-8")).hexdigest()
+        return key, {t: known[t] for t in tables}
+
+    # ── API ────────────────────────────────────────────────────────────
+    def get(self, sql: str) -> Tuple[Optional[Dict[str, Any]], Optional[Tuple[str, Dict[str, str], str]]]:
+        """Return (hasil {'columns','types','data','truncated'} atau None, token untuk put())."""
+        if not RESULT_CACHE_ENABLED:
+            return None, None
+        plan = self._plan(sql)
+        if plan is None:
+            self.skipped_uncacheable += 1
+            return None, None
+        key, versions = plan
+        self.lookups += 1
+
+        client = self._redis()
+        watermark = ""
+        entry = MISSING
+        near = self._near.get(key)
+        if client is None:
+            entry = near
+        else:
+            try:
+                values = client.mget(f"denai:hr_result:{key}", WATERMARK_KEY)
+                raw, watermark = values[0], str(values[1] or "")
+                if near is not MISSING and near["versions"] == versions and near["watermark"] == watermark:
+                    entry = near
+                    self.near_hits += 1
+                elif raw:
+                    stored = json.loads(raw)
+                    entry = {"versions": stored["versions"], "watermark": stored.get("watermark", ""),
+                             "blob": base64.b64decode(stored["data"]), "db_ms": stored.get("db_ms", 0.0)}
+                    self._near.set(key, entry)
+            except Exception as e:
+                self.redis_errors += 1
+                logger.debug(f"Result cache Redis get gagal: {e}")
+                entry = near
+
+        token = (key, versions, watermark)
+        if entry is MISSING:
+            return None, token
+        if entry["versions"] != versions or entry["watermark"] != watermark:
+            self.stale += 1
+            return None, token
+        try:
+            result = _decode(entry["blob"])
+        except Exception:
+            return None, token
+        self.hits += 1
+        self.saved_db_ms += entry.get("db_ms", 0.0)
+        logger.info(f"♻️ Result cache HIT ({len(result['data'][0]) if result['data'] else 0} rows, tabel {', '.join(versions)})")
+        return result, token
+
+    def put(self, token: Optional[Tuple[str, Dict[str, str], str]], columns: List[str],
+            data: List[List[Any]], types: Optional[List[str]] = None, db_ms: float = 0.0,
+            truncated: bool = False) -> None:
+        """token dari get() — versi diambil SEBELUM query jalan, jadi label tidak pernah lebih baru dari datanya.
+        data = nilai per kolom (QueryResult.data)."""
+        if token is None or not RESULT_CACHE_ENABLED:
+            return
+        if data and len(data[0]) > RESULT_CACHE_MAX_ROWS:
+            self.skipped_too_large += 1
+            return
+        key, versions, watermark = token
+        try:
+            blob = _encode(columns, data, types, truncated)
+        except Exception as e:
+            self.skipped_uncacheable += 1
+            logger.debug(f"Result cache: hasil tidak bisa diserialisasi ({e})")
+            return
+        if len(blob) > RESULT_CACHE_MAX_BYTES:
+            self.skipped_too_large += 1
+            return
+        entry = {"versions": versions, "watermark": watermark, "blob": blob, "db_ms": round(db_ms, 1)}
+        self._near.set(key, entry)
+        self.stores += 1
+        self.bytes_stored += len(blob)
+
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            payload = json.dumps({"versions": versions, "watermark": watermark, "db_ms": entry["db_ms"],
+                                  "data": base64.b64encode(blob).decode("ascii")})
+            client.set(f"denai:hr_result:{key}", payload, ex=RESULT_CACHE_TTL)
+        except Exception as e:
+            self.redis_errors += 1
+            logger.debug(f"Result cache Redis set gagal: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": RESULT_CACHE_ENABLED,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+            "near_hits": self.near_hits,
+            "stale": self.stale,
+            "stores": self.stores,
+            "skipped_uncacheable": self.skipped_uncacheable,
+            "skipped_too_large": self.skipped_too_large,
+            "redis_errors": self.redis_errors,
+            "avg_stored_kb": round(self.bytes_stored / self.stores / 1024, 1) if self.stores else 0.0,
+            "saved_db_ms": round(self.saved_db_ms, 1),
+            "near_cache": self._near.stats(),
+        }
+
+
+async def bump_ingestion_watermark() -> None:
+    """Invalidasi semua hasil ter-cache di semua worker (dipanggil setelah ingestion data hr)."""
+    try:
+        from memory.memory_hybrid import redis_client, REDIS_AVAILABLE
+        if REDIS_AVAILABLE:
+            from memory.redis_pipeline import timed
+            await timed("hr_result.watermark", redis_client.set(WATERMARK_KEY, str(time.time())))
+    except Exception as e:
+        logger.warning(f"⚠️ Watermark ingestion gagal di-bump: {e}")
+    result_cache._near.clear()
+
+
+result_cache = ResultCache()
@@ -0,0 +1,343 @@
+"""
+Schema Retriever - Pruning Schema untuk Prompt NL→SQL
+=====================================================
+Sebelumnya SQLGenerator menerima `formatted_schema` UTUH di setiap panggilan:
+semua tabel, semua kolom, plus daftar kategori hasil sampling. Token & latency
+naik linear setiap HR menambah tabel.
+
+Retriever ini mengindeks setiap kolom (nama tabel/kolom, tipe, nilai
+kategori/contoh, sinonim bahasa Indonesia) dan memberi skor hybrid:
+- BM25 leksikal (murni Python, korpus kecil)
+- cosine embedding (EMBEDDING_MODEL) — vektor dokumen dihitung sekali per
+  versi schema; kalau embedding gagal/nonaktif → BM25 saja
+
+Yang ditulis lengkap di prompt hanya tabel teratas (SCHEMA_PRUNING_MAX_TABLES)
+dengan kolom teratas (SCHEMA_PRUNING_MAX_COLUMNS) + join key. Tetangga join
+(tabel yang berbagi join key dengan tabel terpilih) ikut ditarik kalau slot
+masih ada: tabel jembatan yang menghubungkan dua tabel terpilih, lalu tetangga
+dengan skor > 0 yang terpotong ambang relatif. Kolom/tabel lain
+tetap disebut NAMANYA saja (murah) supaya model tidak mengira kolom itu tidak
+ada. Schema kecil (< SCHEMA_PRUNING_MIN_COLUMNS kolom) dikirim utuh.
+
+Recall: record_sql() membandingkan kolom yang dipakai SQL hasil generate dengan
+kolom yang ditulis lengkap; metrik ada di status(). Evaluasi offline atas
+pasangan pertanyaan/SQL: evaluation/schema_pruning_recall.py.
+"""
+
+import hashlib
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.config import (
+    EMBEDDING_MODEL,
+    SCHEMA_PRUNING_ENABLED,
+    SCHEMA_PRUNING_MIN_COLUMNS,
+    SCHEMA_PRUNING_MAX_TABLES,
+    SCHEMA_PRUNING_MAX_COLUMNS,
+    SCHEMA_PRUNING_EMBEDDINGS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Kata pertama = bentuk kanonik. Dipakai di sisi pertanyaan DAN dokumen kolom.
+_SYNONYM_GROUPS = (
+    ("gaji", "salary", "upah", "penghasilan", "income", "pay", "payroll", "remunerasi", "tunjangan"),
+    ("pendidikan", "education", "ijazah", "sarjana", "diploma", "strata", "jenjang", "lulusan"),
+    ("pensiun", "retirement", "retire", "mpp"),
+    ("usia", "umur", "age", "lahir", "birth", "dob"),
+    ("gender", "kelamin", "sex", "pria", "wanita", "laki", "perempuan"),
+    ("perusahaan", "company", "entitas", "opco", "anper"),
+    ("unit", "divisi", "department", "departemen", "direktorat", "biro", "organisasi", "org"),
+    ("jabatan", "position", "posisi", "title", "role"),
+    ("band", "level", "grade", "golongan"),
+    ("karyawan", "pegawai", "employee", "staff", "headcount", "orang"),
+    ("lokasi", "location", "kota", "city", "site", "wilayah", "area"),
+    ("masuk", "join", "hire", "hiring", "rekrut", "tmt"),
+    ("status", "kontrak", "tetap", "permanent", "contract", "pkwt", "pkwtt"),
+    ("masa", "tenure", "lama", "service"),
+)
+_SYNONYMS: Dict[str, str] = {word: group[0] for group in _SYNONYM_GROUPS for word in group}
+
+# Kata pengisi dari format distinct_values SchemaReader
+_NOISE = {"kategori", "contoh", "data", "unik", "hr"}
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_IDENT_RE = re.compile(r'"?([A-Za-z_][A-Za-z0-9_]*)"?')
+_TABLE_REF_RE = re.compile(r'\bhr\s*\.\s*"?([A-Za-z_][A-Za-z0-9_]*)"?', re.IGNORECASE)
+
+
+def tokenize(text: str) -> List[str]:
+    """lowercase, pecah di non-alfanumerik (termasuk '_'), tambah token sinonim kanonik."""
+    tokens = [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in _NOISE]
+    canon = [f"syn:{_SYNONYMS[t]}" for t in tokens if t in _SYNONYMS]
+    return tokens + canon
+
+
+class _BM25:
+    def __init__(self, docs: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self.tf = [Counter(d) for d in docs]
+        self.len = [len(d) for d in docs]
+        self.avg_len = (sum(self.len) / len(docs)) if docs else 0.0
+        df = Counter(t for d in docs for t in set(d))
+        n = len(docs)
+        self.idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def scores(self, query: List[str]) -> List[float]:
+        out = []
+        terms = [t for t in set(query) if t in self.idf]
+        for tf, length in zip(self.tf, self.len):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / (self.avg_len or 1))
+            for t in terms:
+                f = tf.get(t)
+                if f:
+                    score += self.idf[t] * f * (self.k1 + 1) / (f + norm)
+            out.append(score)
+        return out
+
+
+def _normalize(values: List[float]) -> List[float]:
+    if not values:
+        return values
+    lo, hi = min(values), max(values)
+    if hi - lo <= 1e-9:
+        return [0.0 if hi <= 0 else 1.0 for _ in values]
+    return [(v - lo) / (hi - lo) for v in values]
+
+
+@dataclass
+class SchemaSelection:
+    """Tabel → kolom yang ditulis lengkap. Tabel lain hanya disebut namanya."""
+    tables: Dict[str, List[str]]
+    other_tables: List[str]
+    total_columns: int
+    detailed_columns: int
+    method: str
+    elapsed_ms: float
+    join_keys: List[str] = field(default_factory=list)
+
+    def includes(self, table: str, column: str) -> bool:
+        return column in self.tables.get(table, ())
+
+
+class _SchemaIndex:
+    def __init__(self, schema: Dict[str, Any]):
+        tables = schema.get("tables", {})
+        self.columns: List[Tuple[str, str]] = []
+        docs, texts = [], []
+        name_count: Counter = Counter()
+        for table, info in tables.items():
+            for col in info.get("columns", []):
+                name_count[col] += 1
+                ctype = info.get("column_types", {}).get(col, "")
+                values = info.get("distinct_values", {}).get(col, "") or ""
+                self.columns.append((table, col))
+                docs.append(tokenize(f"{table} {col} {col} {ctype} {values}"))
+                texts.append(f"{table}.{col} ({ctype}) {values[:300]}")
+        self.table_names = list(tables)
+        self.table_bm25 = _BM25([tokenize(f"{t} {t} " + " ".join(tables[t].get("columns", []))) for t in self.table_names])
+        self.bm25 = _BM25(docs)
+        self.texts = texts
+        # Nama kolom yang muncul di >1 tabel = kandidat join key (nik, *_id, ...)
+        self.join_keys = {c for c, n in name_count.items() if n > 1}
+        self.table_keys = {t: set(tables[t].get("columns", [])) & self.join_keys for t in self.table_names}
+        self.vectors = None  # diisi lazily (embedding dokumen)
+        self.vector_error = False
+
+
+class SchemaRetriever:
+    def __init__(self):
+        self._index: Optional[_SchemaIndex] = None
+        self._index_key = ""
+        self._lock = threading.Lock()
+        self.selections = 0
+        self.skipped_small = 0
+        self.columns_total = 0
+        self.columns_detailed = 0
+        self.recall_checks = 0
+        self.recall_sum = 0.0
+        self.recall_min = 1.0
+        self.full_schema_retries = 0
+        self._misses: "deque[Dict[str, Any]]" = deque(maxlen=20)
+
+    # ── Index ──────────────────────────────────────────────────────────
+    def _get_index(self, schema: Dict[str, Any]) -> _SchemaIndex:
+        key = hashlib.md5((schema.get("formatted_schema") or repr(sorted(schema.get("tables", {})))).encode("utf-8")).hexdigest()
+        with self._lock:
+            if self._index is None or key != self._index_key:
+                self._index = _SchemaIndex(schema)
+                self._index_key = key
+            return self._index
+
+    def _embed_scores(self, index: _SchemaIndex, question: str, client, timeout: Optional[float]) -> Optional[List[float]]:
+        if not (SCHEMA_PRUNING_EMBEDDINGS and client) or index.vector_error:
+            return None
+        try:
+            import numpy as np
+            if index.vectors is None:
+                with self._lock:
+                    if index.vectors is None:
+                        res = client.embeddings.create(model=EMBEDDING_MODEL, input=index.texts, timeout=timeout)
+                        matrix = np.array([d.embedding for d in res.data], dtype="float32")
+                        index.vectors = matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-9)
+            res = client.embeddings.create(model=EMBEDDING_MODEL, input=[question], timeout=timeout)
+            q = np.array(res.data[0].embedding, dtype="float32")
+            q = q / (np.linalg.norm(q) + 1e-9)
+            return (index.vectors @ q).tolist()
+        except Exception as e:
+            # Jangan coba embed dokumen lagi untuk versi schema ini — BM25 saja
+            if index.vectors is None:
+                index.vector_error = True
+            logger.warning(f"⚠️ Schema pruning tanpa embedding: {e}")
+            return None
+
+    # ── Seleksi ────────────────────────────────────────────────────────
+    def select(self, question: str, schema: Dict[str, Any], embed_client=None,
+               timeout: Optional[float] = None) -> Optional[SchemaSelection]:
+        """None = kirim schema utuh (pruning nonaktif, schema kecil, atau tidak ada sinyal)."""
+        if not SCHEMA_PRUNING_ENABLED or not schema.get("tables"):
+            return None
+        start = time.time()
+        index = self._get_index(schema)
+        if len(index.columns) < SCHEMA_PRUNING_MIN_COLUMNS:
+            self.skipped_small += 1
+            return None
+
+        query = tokenize(question)
+        lexical = _normalize(index.bm25.scores(query))
+        semantic = self._embed_scores(index, question, embed_client, timeout)
+        if semantic is not None:
+            semantic = _normalize(semantic)
+            scores = [0.6 * l + 0.4 * s for l, s in zip(lexical, semantic)]
+            method = "bm25+embedding"
+        else:
+            scores = lexical
+            method = "bm25"
+        if max(scores, default=0.0) <= 0:
+            return None
+
+        per_table: Dict[str, List[Tuple[float, str]]] = {}
+        for (table, col), score in zip(index.columns, scores):
+            per_table.setdefault(table, []).append((score, col))
+        table_lexical = dict(zip(index.table_names, _normalize(index.table_bm25.scores(query))))
+        table_score = {t: max(s for s, _ in cols) + 0.5 * table_lexical.get(t, 0.0) for t, cols in per_table.items()}
+
+        ranked = sorted(table_score, key=table_score.get, reverse=True)
+        best = table_score[ranked[0]]
+        chosen = [t for t in ranked if table_score[t] >= 0.3 * best][:max(1, SCHEMA_PRUNING_MAX_TABLES)]
+        chosen = _with_join_neighbours(chosen, ranked, table_score, index.table_keys,
+                                       max(1, SCHEMA_PRUNING_MAX_TABLES))
+
+        selected: Dict[str, List[str]] = {}
+        for table in chosen:
+            top = {c for _, c in sorted(per_table[table], reverse=True)[:SCHEMA_PRUNING_MAX_COLUMNS]}
+            keep = top | (index.join_keys & {c for _, c in per_table[table]})
+            # Urutan kolom asli (ordinal) dipertahankan
+            selected[table] = [c for t, c in index.columns if t == table and c in keep]
+
+        detailed = sum(len(c) for c in selected.values())
+        selection = SchemaSelection(
+            tables=selected,
+            other_tables=[t for t in index.table_names if t not in selected],
+            total_columns=len(index.columns),
+            detailed_columns=detailed,
+            method=method,
+            elapsed_ms=round((time.time() - start) * 1000, 1),
+            join_keys=sorted(index.join_keys),
+        )
+        self.selections += 1
+        self.columns_total += selection.total_columns
+        self.columns_detailed += detailed
+        logger.info(
+            f"✂️ Schema pruning ({method}): {len(selected)}/{len(index.table_names)} tabel, "
+            f"{detailed}/{selection.total_columns} kolom lengkap ({selection.elapsed_ms:.0f}ms)"
+        )
+        return selection
+
+    # ── Recall ─────────────────────────────────────────────────────────
+    def record_sql(self, selection: Optional[SchemaSelection], sql: str, schema: Dict[str, Any],
+                   question: str = "") -> Optional[float]:
+        """Recall kolom yang dipakai SQL terhadap kolom yang ditulis lengkap di prompt."""
+        if selection is None or not sql:
+            return None
+        recall, missed = selection_recall(selection, sql, schema)
+        if recall is None:
+            return None
+        self.recall_checks += 1
+        self.recall_sum += recall
+        self.recall_min = min(self.recall_min, recall)
+        if missed:
+            self._misses.append({"question": question[:120], "missed": sorted(f"{t}.{c}" for t, c in missed)})
+            logger.warning(f"⚠️ Schema pruning melewatkan kolom yang dipakai SQL: {sorted(missed)}")
+        return recall
+
+    def record_full_schema_retry(self) -> None:
+        self.full_schema_retries += 1
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": SCHEMA_PRUNING_ENABLED,
+            "selections": self.selections,
+            "skipped_small_schema": self.skipped_small,
+            "column_ratio": round(self.columns_detailed / self.columns_total, 3) if self.columns_total else None,
+            "recall_checks": self.recall_checks,
+            "recall_avg": round(self.recall_sum / self.recall_checks, 4) if self.recall_checks else None,
+            "recall_min": round(self.recall_min, 4) if self.recall_checks else None,
+            "full_schema_retries": self.full_schema_retries,
+            "recent_misses": list(self._misses),
+        }
+
+
+def _with_join_neighbours(chosen: List[str], ranked: List[str], table_score: Dict[str, float],
+                          table_keys: Dict[str, Set[str]], limit: int) -> List[str]:
+    """Tambahkan tetangga join tabel terpilih selama slot (limit) masih ada."""
+    chosen = list(chosen)
+    candidates = [t for t in ranked if t not in chosen]
+    # 1. Jembatan: berbagi key dengan dua tabel terpilih yang tidak bisa di-join langsung
+    for table in candidates:
+        if len(chosen) >= limit:
+            return chosen
+        linked = [c for c in chosen if table_keys.get(table, set()) & table_keys.get(c, set())]
+        if any(not (table_keys.get(a, set()) & table_keys.get(b, set()))
+               for i, a in enumerate(linked) for b in linked[i + 1:]):
+            chosen.append(table)
+    # 2. Tetangga langsung yang masih punya sinyal (skor > 0) tapi terpotong ambang relatif
+    for table in candidates:
+        if len(chosen) >= limit:
+            break
+        if table in chosen or table_score.get(table, 0.0) <= 0:
+            continue
+        if any(table_keys.get(table, set()) & table_keys.get(c, set()) for c in chosen):
+            chosen.append(table)
+    return chosen
+
+
+def sql_referenced_columns(sql: str, schema: Dict[str, Any]) -> Set[Tuple[str, str]]:
+    """Kolom (tabel, kolom) schema yang disebut di SQL. Heuristik identifier — cukup untuk metrik."""
+    tables = schema.get("tables", {})
+    idents = {m.lower() for m in _IDENT_RE.findall(sql or "")}
+    used_tables = {t for t in _TABLE_REF_RE.findall(sql or "") if t in tables}
+    used_tables |= {t for t in tables if t.lower() in idents}
+    referenced = set()
+    for table in used_tables:
+        for col in tables[table].get("columns", []):
+            if col.lower() in idents:
+                referenced.add((table, col))
+    return referenced
+
+
+def selection_recall(selection: SchemaSelection, sql: str, schema: Dict[str, Any]) -> Tuple[Optional[float], Set[Tuple[str, str]]]:
+    referenced = sql_referenced_columns(sql, schema)
+    if not referenced:
+        return None, set()
+    missed = {(t, c) for t, c in referenced if not selection.includes(t, c)}
+    return 1 - len(missed) / len(referenced), missed
+
+
+schema_retriever = SchemaRetriever()
@@ -0,0 +1,396 @@
+"""
+SQL Cache - NL→SQL Tervalidasi per Fingerprint Schema
+=====================================================
+Pertanyaan analitik HR berulang terus ("distribusi karyawan per band",
+"jumlah pensiun tahun ini"), dan setiap kali membayar generate_sql +
+generate_sql_explanation ke LLM. Cache ini menyimpan SQL yang SUDAH lolos
+SQLValidator dan SUDAH berhasil dieksekusi (ada baris), beserta penjelasannya.
+
+Dua level lookup, keduanya per structure_version schema_snapshot (DDL berubah
+→ key baru, entry lama tidak pernah terbaca lagi dan habis oleh TTL):
+1. exact    : pertanyaan dinormalisasi (lowercase, tanpa tanda baca & kata
+              pengisi) → Redis GET (near-cache TTL-LRU per worker di depannya)
+2. semantic : cosine embedding (EMBEDDING_MODEL, SQL_CACHE_EMBED_DIMENSIONS)
+              ≥ SQL_CACHE_SIMILARITY terhadap pertanyaan yang pernah disimpan.
+              Vektor dibagi lewat satu Redis hash per versi schema.
+
+Pengaman semantic: signature harus SAMA — angka di pertanyaan (tahun, band),
+nilai kategori hasil value index (S1 vs S2, Tuban vs Gresik) dan bucket waktu
+untuk frasa relatif ("tahun ini" → tahun berjalan), serta kata arah/perbandingan/
+negasi (tertinggi vs terendah, lebih vs kurang dari, S1 vs bukan S1). "pensiun 2025"
+tidak akan pernah memakai SQL "pensiun 2026" walau embedding-nya nyaris identik.
+
+Redis client di sini async → lookup()/store() dipanggil dari
+app.tools.query_hr_database (event loop), bukan dari HRService (worker thread).
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from app.config import (
+    EMBEDDING_MODEL,
+    SQL_CACHE_ENABLED,
+    SQL_CACHE_TTL,
+    SQL_CACHE_SIMILARITY,
+    SQL_CACHE_MAX_ENTRIES,
+    SQL_CACHE_EMBED_DIMENSIONS,
+)
+from backend.utils.ttl_cache import TTLCache, MISSING
+
+logger = logging.getLogger(__name__)
+
+# Vektor semantic per worker dimuat ulang dari Redis paling cepat tiap N detik
+_VECTOR_RELOAD_SECONDS = 30
+_NEAR_TTL = 600
+
+_FILLERS = {"tolong", "mohon", "dong", "donk", "ya", "yah", "sih", "coba", "please", "kak", "min", "nih", "deh", "kah"}
+_DIGITS_RE = re.compile(r"\d+")
+_DAY_RE = re.compile(r"\b(hari ini|kemarin|besok|minggu ini|minggu lalu|minggu depan|today|yesterday|this week|last week)\b")
+_MONTH_RE = re.compile(r"\b(bulan ini|bulan lalu|bulan depan|this month|last month|next month)\b")
+_YEAR_RE = re.compile(r"\b(tahun ini|tahun lalu|tahun depan|this year|last year|next year|ytd)\b")
+# Kata yang membalik arti SQL walau embedding-nya nyaris sama: arah urutan
+# (ORDER BY DESC/ASC), operator perbandingan, dan negasi filter
+_POLARITY = {
+    "desc": ("tertinggi", "terbanyak", "terbesar", "teratas", "paling banyak", "paling besar", "paling tinggi",
+             "highest", "most", "largest"),
+    "asc": ("terendah", "tersedikit", "terkecil", "terbawah", "paling sedikit", "paling kecil", "paling rendah",
+            "lowest", "least", "fewest", "smallest"),
+    "gt": ("lebih", "di atas", "diatas", "more than", "greater than", "above", "over"),
+    "lt": ("kurang", "di bawah", "dibawah", "less than", "below", "under"),
+    "gte": ("minimal", "minimum", "sekurangnya", "at least"),
+    "lte": ("maksimal", "maksimum", "maximal", "maximum", "sebanyak banyaknya", "at most"),
+    "not": ("tidak", "bukan", "selain", "kecuali", "tanpa", "non", "not", "except", "excluding", "other than"),
+}
+_POLARITY_OF = {phrase: tag for tag, phrases in _POLARITY.items() for phrase in phrases}
+_POLARITY_RE = re.compile(r"\b(" + "|".join(sorted(map(re.escape, _POLARITY_OF), key=len, reverse=True)) + r")\b")
+
+
+def _redis():
+    try:
+        from memory.memory_hybrid import redis_client, REDIS_AVAILABLE
+        return redis_client if REDIS_AVAILABLE else None
+    except Exception:
+        return None
+
+
+def normalize_question(question: str) -> str:
+    from engines.hr.query.value_index import normalize_value
+    return " ".join(w for w in normalize_value(question).split() if w not in _FILLERS)
+
+
+def _time_bucket(normalized: str) -> str:
+    now = time.localtime()
+    if _DAY_RE.search(normalized):
+        return time.strftime("%Y-%m-%d", now)
+    if _MONTH_RE.search(normalized):
+        return time.strftime("%Y-%m", now)
+    if _YEAR_RE.search(normalized):
+        return time.strftime("%Y", now)
+    return ""
+
+
+def _polarity(normalized: str) -> str:
+    """Urutan tag arah/perbandingan/negasi, mis. "tertinggi ... bukan S1" → "desc,not"."""
+    return ",".join(_POLARITY_OF[m] for m in _POLARITY_RE.findall(normalized))
+
+
+def question_signature(question: str, normalized: str) -> str:
+    """Bagian pertanyaan yang WAJIB sama agar SQL boleh dipakai ulang."""
+    digits = ",".join(sorted(_DIGITS_RE.findall(normalized)))
+    values = ""
+    try:
+        from engines.hr.database.schema_snapshot import schema_snapshot
+        from engines.hr.query.value_index import value_index
+        schema = schema_snapshot.current_schema()
+        if schema is not None:
+            matches = value_index.resolve(question, schema, record=False) or []
+            values = ",".join(sorted({f"{m.table}.{m.column}={m.value}" for m in matches}))
+    except Exception as e:
+        logger.debug(f"SQL cache signature tanpa value index: {e}")
+    return f"{_time_bucket(normalized)}|{digits}|{_polarity(normalized)}|{values}"
+
+
+def _entry_key(normalized: str, signature: str) -> str:
+    return hashlib.sha1(f"{normalized}\n{signature}".encode("utf-8")).hexdigest()
+
+
+def _sql_key(structure: str, key: str) -> str:
+    return f"denai:sqlcache:{structure[:16]}:q:{key}"
+
+
+def _vectors_key(structure: str) -> str:
+    return f"denai:sqlcache:{structure[:16]}:vec"
+
+
+@dataclass
+class CachedSQL:
+    sql: str
+    explanation: Optional[str]
+    question: str
+    level: str  # "exact" | "semantic"
+    similarity: float = 1.0
+    key: str = ""
+
+
+class _VectorSet:
+    def __init__(self):
+        self.keys: List[str] = []
+        self.signatures: List[str] = []
+        self.matrix = None  # numpy (n, d), baris sudah dinormalisasi
+        self.loaded_at = 0.0
+
+    def add(self, key: str, signature: str, vector) -> None:
+        import numpy as np
+        if key in self.keys:
+            return
+        row = np.asarray(vector, dtype="float32")[None, :]
+        if self.matrix is not None and self.matrix.shape[1] != row.shape[1]:
+            return
+        self.keys.append(key)
+        self.signatures.append(signature)
+        self.matrix = row if self.matrix is None else np.vstack([self.matrix, row])
+
+    def remove(self, key: str) -> None:
+        import numpy as np
+        if key not in self.keys:
+            return
+        i = self.keys.index(key)
+        del self.keys[i]
+        del self.signatures[i]
+        self.matrix = np.delete(self.matrix, i, axis=0) if self.keys else None
+
+
+class SQLCache:
+    def __init__(self):
+        self._near = TTLCache(maxsize=512, ttl=_NEAR_TTL)
+        # Vektor pertanyaan yang baru di-embed saat lookup → dipakai ulang saat store
+        self._pending_vectors = TTLCache(maxsize=256, ttl=300)
+        self._vectors: Dict[str, _VectorSet] = {}
+        self._structure = ""
+        self._subscribed = False
+        self.lookups = 0
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.signature_rejects = 0
+        self.stores = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.embed_errors = 0
+
+    # ── Versi schema ───────────────────────────────────────────────────
+    def _current_structure(self) -> str:
+        from engines.hr.database.schema_snapshot import schema_snapshot
+        if not self._subscribed:
+            schema_snapshot.subscribe(self._on_schema_change)
+            self._subscribed = True
+        structure = schema_snapshot.structure_version
+        if structure and structure != self._structure:
+            self._on_schema_change(structure, schema_snapshot.data_version)
+        return structure
+
+    def _on_schema_change(self, structure: str, data: str) -> None:
+        # Perubahan data saja tidak mengubah validitas SQL — hanya DDL yang membuang cache lokal
+        if structure != self._structure:
+            if self._structure:
+                self.invalidations += 1
+                logger.info("🗃️ SQL cache: struktur schema hr berubah → cache lokal dikosongkan")
+            self._structure = structure
+            self._near.clear()
+            self._pending_vectors.clear()
+            self._vectors.clear()
+
+    # ── Lookup ─────────────────────────────────────────────────────────
+    async def lookup(self, question: str, embed_client=None, timeout: Optional[float] = None) -> Optional[CachedSQL]:
+        if not SQL_CACHE_ENABLED or not question:
+            return None
+        structure = self._current_structure()
+        if not structure:
+            return None  # snapshot schema belum ada → tidak ada versi untuk di-key
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+        self.lookups += 1
+        signature = question_signature(question, normalized)
+        key = _entry_key(normalized, signature)
+
+        entry = await self._get_entry(structure, key)
+        if entry is not None:
+            self.exact_hits += 1
+            logger.info(f"🗃️ SQL cache HIT (exact): '{question[:60]}'")
+            return CachedSQL(entry["sql"], entry.get("explanation"), entry.get("question", ""), "exact", key=key)
+
+        if embed_client is None:
+            return None
+        vector = await self._embed(embed_client, question, timeout)
+        if vector is None:
+            return None
+        self._pending_vectors.set(key, vector)
+
+        vectors = await self._load_vectors(structure)
+        if vectors.matrix is None:
+            return None
+        sims = vectors.matrix @ vector
+        best, best_sim, rejected = None, 0.0, False
+        for i in sims.argsort()[::-1][:5]:
+            sim = float(sims[i])
+            if sim < SQL_CACHE_SIMILARITY:
+                break
+            if vectors.signatures[i] != signature:
+                rejected = True
+                continue
+            best, best_sim = vectors.keys[i], sim
+            break
+        if best is None:
+            if rejected:
+                self.signature_rejects += 1
+            return None
+        entry = await self._get_entry(structure, best)
+        if entry is None:
+            return None
+        self.semantic_hits += 1
+        logger.info(f"🗃️ SQL cache HIT (semantic {best_sim:.3f}): '{question[:60]}' ≈ '{entry.get('question', '')[:60]}'")
+        return CachedSQL(entry["sql"], entry.get("explanation"), entry.get("question", ""), "semantic",
+                         round(best_sim, 4), key=best)
+
+    async def _get_entry(self, structure: str, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._near.get((structure, key))
+        if entry is not MISSING:
+            return entry
+        client = _redis()
+        if client is None:
+            return None
+        try:
+            from memory.redis_pipeline import timed
+            raw = await timed("sql_cache.get", client.get(_sql_key(structure, key)))
+        except Exception as e:
+            logger.debug(f"SQL cache Redis get gagal: {e}")
+            return None
+        if not raw:
+            return None
+        entry = json.loads(raw) if isinstance(raw, str) else raw
+        self._near.set((structure, key), entry)
+        return entry
+
+    async def _embed(self, client, question: str, timeout: Optional[float]):
+        try:
+            import numpy as np
+            kwargs = {"model": EMBEDDING_MODEL, "input": [question], "timeout": timeout}
+            if SQL_CACHE_EMBED_DIMENSIONS:
+                kwargs["dimensions"] = SQL_CACHE_EMBED_DIMENSIONS
+            res = await asyncio.to_thread(client.embeddings.create, **kwargs)
+            vector = np.asarray(res.data[0].embedding, dtype="float32")
+            return vector / (np.linalg.norm(vector) + 1e-9)
+        except Exception as e:
+            self.embed_errors += 1
+            logger.warning(f"⚠️ SQL cache tanpa level semantic: {e}")
+            return None
+
+    async def _load_vectors(self, structure: str) -> _VectorSet:
+        vectors = self._vectors.setdefault(structure, _VectorSet())
+        if time.monotonic() - vectors.loaded_at < _VECTOR_RELOAD_SECONDS:
+            return vectors
+        vectors.loaded_at = time.monotonic()
+        client = _redis()
+        if client is None:
+            return vectors
+        try:
+            from memory.redis_pipeline import timed
+            raw = await timed("sql_cache.vectors", client.hgetall(_vectors_key(structure))) or {}
+        except Exception as e:
+            logger.debug(f"SQL cache Redis hgetall gagal: {e}")
+            return vectors
+        for key, value in raw.items():
+            try:
+                item = json.loads(value)
+                vectors.add(key, item["sig"], item["v"])
+            except Exception:
+                continue
+        return vectors
+
+    # ── Store ──────────────────────────────────────────────────────────
+    async def store(self, question: str, sql: str, explanation: Optional[str] = None) -> None:
+        """Hanya untuk SQL yang lolos SQLValidator dan berhasil dieksekusi (ada baris)."""
+        if not SQL_CACHE_ENABLED or not question or not sql:
+            return
+        structure = self._current_structure()
+        if not structure:
+            return
+        normalized = normalize_question(question)
+        if not normalized:
+            return
+        signature = question_signature(question, normalized)
+        key = _entry_key(normalized, signature)
+        entry = {"question": question, "sql": sql, "explanation": explanation, "created_at": time.time()}
+        self._near.set((structure, key), entry)
+        self.stores += 1
+
+        vector = self._pending_vectors.pop(key)
+        vectors = self._vectors.setdefault(structure, _VectorSet())
+        if vector is not None:
+            vectors.add(key, signature, vector)
+
+        client = _redis()
+        if client is None:
+            return
+        try:
+            from memory.redis_pipeline import RedisBatch
+            batch = RedisBatch(client, "sql_cache.store").add(
+                "set", _sql_key(structure, key), json.dumps(entry), ex=SQL_CACHE_TTL
+            )
+            if vector is not None and len(vectors.keys) <= SQL_CACHE_MAX_ENTRIES:
+                packed = json.dumps({"sig": signature, "v": [round(float(x), 5) for x in vector]})
+                batch.add("hset", _vectors_key(structure), key, packed)
+                batch.add("expire", _vectors_key(structure), SQL_CACHE_TTL)
+            await batch.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ SQL cache gagal disimpan ke Redis: {e}")
+
+    # ── Evict ──────────────────────────────────────────────────────────
+    async def evict(self, cached: CachedSQL) -> None:
+        """Buang entry yang SQL-nya ternyata tidak layak dipakai (mis. ditolak cost guard)."""
+        if not cached.key:
+            return
+        structure = self._current_structure()
+        self._near.pop((structure, cached.key))
+        if structure in self._vectors:
+            self._vectors[structure].remove(cached.key)
+        self.evictions += 1
+        logger.info(f"🗃️ SQL cache: entry '{cached.question[:60]}' dibuang")
+        client = _redis()
+        if client is None:
+            return
+        try:
+            from memory.redis_pipeline import RedisBatch
+            await (RedisBatch(client, "sql_cache.evict")
+                   .add("delete", _sql_key(structure, cached.key))
+                   .add("hdel", _vectors_key(structure), cached.key)
+                   .execute())
+        except Exception as e:
+            logger.warning(f"⚠️ SQL cache gagal dibuang dari Redis: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        hits = self.exact_hits + self.semantic_hits
+        return {
+            "enabled": SQL_CACHE_ENABLED,
+            "structure_version": self._structure[:12],
+            "lookups": self.lookups,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "hit_rate": round(hits / self.lookups, 3) if self.lookups else 0.0,
+            "signature_rejects": self.signature_rejects,
+            "stores": self.stores,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "embed_errors": self.embed_errors,
+            "semantic_entries": sum(len(v.keys) for v in self._vectors.values()),
+            "near_cache": self._near.stats(),
+        }
+
+
+sql_cache = SQLCache()
@@ -0,0 +1,177 @@
+"""
+SQL Explainer - Penjelasan SQL Ditunda & Di-cache per Hash SQL
+==============================================================
+Penjelasan 3 bagian (Bisnis / Logika / Teknis) di panel "Transparansi Query"
+butuh satu panggilan LLM lagi (~1-3 detik) SEBELUM data dikirim, padahal
+kebanyakan user tidak pernah membuka panel itu.
+
+Sekarang (SQL_EXPLANATION_LAZY=true):
+- HRService tidak lagi memanggil generate_sql_explanation; data langsung dikirim.
+- Kalau penjelasan SQL yang sama sudah pernah dibuat → ikut terkirim inline
+  (query_hr_database mengecek cache ini).
+- Selain itu frontend mem-fetch GET /artifacts/{turn_id}/sql-explanation saat
+  panel dibuka; SQL + pertanyaan diambil dari artifact turn tersebut.
+
+Cache: key = sha1(normalize_sql(sql)) → near-cache per worker + Redis
+(SQL_EXPLANATION_TTL). Permintaan bersamaan untuk SQL yang sama di satu
+worker digabung (satu panggilan LLM). SQL_EXPLANATION_FALLBACK tidak disimpan.
+
+Cache miss yang butuh panggilan LLM baru dibatasi SQL_EXPLANATION_RATE_LIMIT
+per rate_key (NIK / IP, storage limiter yang sama dengan slowapi). Lewat batas
+→ penjelasan statis SQL_EXPLANATION_FALLBACK, bukan HTTP 429: cache hit dan
+request yang menempel ke panggilan yang sedang berjalan tetap gratis.
+"""
+
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+
+from app.config import SQL_EXPLANATION_LAZY, SQL_EXPLANATION_TTL, SQL_EXPLANATION_RATE_LIMIT
+from backend.utils.ttl_cache import TTLCache, MISSING
+from engines.hr.query.result_cache import normalize_sql
+
+logger = logging.getLogger(__name__)
+
+_NEAR_TTL = 3600
+
+
+def _redis():
+    try:
+        from memory.memory_hybrid import redis_client, REDIS_AVAILABLE
+        return redis_client if REDIS_AVAILABLE else None
+    except Exception:
+        return None
+
+
+def _allow_llm_call(rate_key: str) -> bool:
+    try:
+        from limits import parse as parse_rate
+        from backend.limiter import limiter
+        return limiter.limiter.hit(parse_rate(SQL_EXPLANATION_RATE_LIMIT), "sql_explanation", rate_key)
+    except Exception as e:
+        logger.debug(f"SQL explanation rate limit storage gagal (diizinkan): {e}")
+        return True
+
+
+def sql_hash(sql: str) -> str:
+    return hashlib.sha1(normalize_sql(sql).encode("utf-8")).hexdigest()
+
+
+class SQLExplainer:
+    def __init__(self):
+        self._near = TTLCache(maxsize=512, ttl=_NEAR_TTL)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.deferred = 0
+        self.inline_hits = 0
+        self.requests = 0
+        self.hits = 0
+        self.generated = 0
+        self.coalesced = 0
+        self.failures = 0
+        self.rate_limited = 0
+
+    async def get(self, sql: str) -> Optional[str]:
+        """Penjelasan ter-cache untuk SQL ini (near-cache → Redis), atau None."""
+        if not sql:
+            return None
+        key = sql_hash(sql)
+        cached = self._near.get(key)
+        if cached is not MISSING:
+            return cached
+        client = _redis()
+        if client is None:
+            return None
+        try:
+            from memory.redis_pipeline import timed
+            value = await timed("sql_explain.get", client.get(f"denai:sql_explain:{key}"))
+        except Exception as e:
+            logger.debug(f"SQL explanation Redis get gagal: {e}")
+            return None
+        if value:
+            self._near.set(key, value)
+            return value
+        return None
+
+    async def put(self, sql: str, explanation: str) -> None:
+        from engines.hr.query.sql_generator import SQL_EXPLANATION_FALLBACK
+        if not sql or not explanation or explanation == SQL_EXPLANATION_FALLBACK:
+            return
+        key = sql_hash(sql)
+        self._near.set(key, explanation)
+        client = _redis()
+        if client is None:
+            return
+        try:
+            from memory.redis_pipeline import timed
+            await timed("sql_explain.set", client.set(f"denai:sql_explain:{key}", explanation, ex=SQL_EXPLANATION_TTL))
+        except Exception as e:
+            logger.warning(f"⚠️ SQL explanation Redis set gagal: {e}")
+
+    async def attach_cached(self, sql: str) -> Optional[str]:
+        """Dipanggil query_hr_database saat HRService mengirim data tanpa penjelasan."""
+        explanation = await self.get(sql)
+        if explanation:
+            self.inline_hits += 1
+        else:
+            self.deferred += 1
+        return explanation
+
+    async def explain(self, sql: str, question: str, generator, timeout: Optional[float] = 20,
+                      rate_key: Optional[str] = None) -> Optional[str]:
+        """Penjelasan on-demand: cache → (satu panggilan LLM per SQL per worker) → simpan.
+        rate_key: pemanggil yang dibatasi SQL_EXPLANATION_RATE_LIMIT (None = tanpa batas)."""
+        self.requests += 1
+        cached = await self.get(sql)
+        if cached:
+            self.hits += 1
+            return cached
+
+        key = sql_hash(sql)
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        from engines.hr.query.sql_generator import SQL_EXPLANATION_FALLBACK
+        if rate_key and not _allow_llm_call(rate_key):
+            self.rate_limited += 1
+            logger.info(f"⏳ SQL explanation: rate limit {rate_key} → penjelasan statis")
+            return SQL_EXPLANATION_FALLBACK
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        explanation = None
+        try:
+            explanation = await asyncio.to_thread(generator.generate_sql_explanation, sql, question or "", timeout=timeout)
+            if explanation and explanation != SQL_EXPLANATION_FALLBACK:
+                self.generated += 1
+                await self.put(sql, explanation)
+            else:
+                self.failures += 1
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"⚠️ SQL explanation on-demand gagal: {e}")
+        finally:
+            future.set_result(explanation)
+            self._inflight.pop(key, None)
+        return explanation
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "lazy": SQL_EXPLANATION_LAZY,
+            "deferred": self.deferred,
+            "inline_hits": self.inline_hits,
+            "requests": self.requests,
+            "hits": self.hits,
+            "generated": self.generated,
+            "coalesced": self.coalesced,
+            "failures": self.failures,
+            "rate_limited": self.rate_limited,
+            # Penjelasan yang tidak pernah diminta = panggilan LLM yang dihemat
+            "open_rate": round(self.requests / self.deferred, 3) if self.deferred else None,
+            "near_cache": self._near.stats(),
+        }
+
+
+sql_explainer = SQLExplainer()
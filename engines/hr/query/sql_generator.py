@@ -4,12 +4,15 @@ Generates SQL ONLY untuk Supabase PostgreSQL
 """
 
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from openai import OpenAI
 
 # ✅ FIX: Mengambil Key dan Model dari sumber yang benar (config.py)
 from app.config import OPENAI_API_KEY, LLM_MODEL
 
+# Dikembalikan generate_sql_explanation saat LLM gagal — tidak boleh ikut masuk SQL cache
+SQL_EXPLANATION_FALLBACK = "<b>Status:</b><br>Query berhasil dijalankan untuk menarik data sesuai permintaan Anda."
+
 class SQLGenerator:
     """Enhanced PostgreSQL SQL generator untuk Supabase"""
     
@@ -223,13 +226,14 @@ EXPERTISE ANDA:
 
 PENTING: Generate HANYA SQL PostgreSQL yang valid untuk hr schema di Supabase, tanpa penjelasan atau komentar."""
     
-    def generate_sql(self, question: str, schema: str) -> str:
+    def generate_sql(self, question: str, schema: str, timeout: Optional[float] = None) -> str:
         """
         Generate PostgreSQL SQL untuk natural Indonesian queries (casual & formal)
         
         Args:
             question: Natural language question dalam bahasa Indonesia
             schema: Database schema information
+            timeout: Batas waktu panggilan OpenAI (detik) dari deadline request
             
         Returns:
             PostgreSQL SQL query string yang akurat
@@ -257,7 +261,8 @@ PENTING: Generate HANYA SQL PostgreSQL yang valid untuk hr schema di Supabase, t
                     }
                 ],
                 temperature=0.15,  # Balanced untuk natural language flexibility + consistency
-                max_tokens=1000    # Increased untuk complex analytical queries
+                max_tokens=1000,   # Increased untuk complex analytical queries
+                timeout=timeout,
             )
             
             # Extract SQL dari response
@@ -283,7 +288,7 @@ PENTING: Generate HANYA SQL PostgreSQL yang valid untuk hr schema di Supabase, t
                 self.logger.error(f"Indonesian natural language SQL generation failed: {err_msg}")
             raise Exception(f"Failed to generate SQL: {err_msg}")
         
-    def generate_sql_explanation(self, sql: str, question: str) -> str:
+    def generate_sql_explanation(self, sql: str, question: str, timeout: Optional[float] = None) -> str:
         """Menerjemahkan SQL menjadi 3 bagian: Bisnis, Logika Non-Teknis, & Teknis"""
         try:
             prompt = f"""Anda adalah Senior HR Data Analyst. 
@@ -324,7 +329,8 @@ Berikan penjelasan logikanya dalam format HTML tersebut:"""
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.1, # Dikecilkan jadi 0.1 agar AI sangat patuh pada format dan tidak kreatif berlebihan
-                max_tokens=600 
+                max_tokens=600,
+                timeout=timeout,
             )
             
             explanation = response.choices[0].message.content.strip()
@@ -335,7 +341,7 @@ Berikan penjelasan logikanya dalam format HTML tersebut:"""
             
         except Exception as e:
             self.logger.error(f"❌ Gagal membuat penjelasan SQL: {e}")
-            return "<b>Status:</b><br>Query berhasil dijalankan untuk menarik data sesuai permintaan Anda."
+            return SQL_EXPLANATION_FALLBACK
     
     def _clean_sql(self, sql: str) -> str:
         """
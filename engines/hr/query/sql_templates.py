@@ -0,0 +1,446 @@
+"""
+SQL Templates - Jalur Cepat Tanpa LLM untuk Pertanyaan HR yang Umum
+===================================================================
+Sebagian besar pertanyaan HR berpola sama: "berapa karyawan per band",
+"top 5 unit dengan karyawan terbanyak", "persentase karyawan S1",
+"berapa karyawan yang pensiun dalam 5 tahun". Untuk pola ini SQL-nya bisa
+dirakit langsung dari template — tanpa prompt ~5rb token dan tanpa LLM.
+
+Bahan template:
+- intent     : SQLGenerator.analyze_indonesian_intent (distribusi/ranking/persentase/statistik)
+- dimensi    : kata setelah 'per'/'berdasarkan'/'distribusi' → kolom kategori tabel
+               karyawan (nama kolom atau sinonim schema_retriever)
+- filter     : ValueMatch dari value_index (nilai PERSIS dari database)
+- angka      : top N, horizon pensiun (dalam N tahun / tahun ini / tahun 2027)
+
+Template:
+- headcount_total        : COUNT(*) [+ filter]
+- headcount_by_dimension : COUNT(*) + persentase per dimensi [+ filter]
+- top_n_dimension        : headcount_by_dimension + LIMIT N
+- percentage_share       : porsi filter (satu kolom) terhadap total
+- pension_within         : pensiun dalam horizon [+ dimensi, + filter] — hanya kalau
+                           ada kolom tanggal pensiun (atau tanggal lahir +
+                           SQL_TEMPLATE_RETIREMENT_AGE)
+
+Konservatif: SETIAP kata di pertanyaan harus terjelaskan (kata pengisi, kata
+intent, nilai, dimensi, angka). Ada kata lain ("gaji", "rata", "lebih",
+"siapa", ...), nilai ambigu, atau kolom tidak ada di schema → None, LLM yang
+mengerjakan. Nilai dan identifier berasal dari katalog/database (bukan teks
+user) dan di-quote saat dirender; SQL hasil template tetap lewat SQLValidator.
+"""
+
+import logging
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.config import SQL_TEMPLATES_ENABLED, SQL_TEMPLATE_TABLE, SQL_TEMPLATE_RETIREMENT_AGE
+from engines.hr.query.schema_retriever import _SYNONYMS
+from engines.hr.query.value_index import value_index, normalize_value
+
+logger = logging.getLogger(__name__)
+
+# Kata yang boleh ada tanpa mengubah makna SQL template
+_FILLER = {
+    "berapa", "jumlah", "jumlahnya", "banyak", "banyaknya", "total", "hitung", "hitungkan", "headcount",
+    "karyawan", "karyawannya", "pegawai", "pegawainya", "pekerja", "orang", "sdm",
+    "yang", "yg", "di", "ke", "pada", "dari", "untuk", "utk", "dengan", "dgn", "dan", "atau", "serta",
+    "ada", "semua", "seluruh", "keseluruhan", "secara", "mana", "apa", "adalah", "nya", "masing",
+    "tampilkan", "tunjukkan", "berikan", "kasih", "lihat", "liat", "coba", "tolong", "mohon", "bisa",
+    "gimana", "bagaimana", "dong", "sih", "nih", "deh", "ya", "kah", "mau", "tau", "tahu", "pengen",
+    "ingin", "saya", "aku", "kita", "data", "hr", "hasil", "keluarkan", "dibagi", "dikelompokkan",
+    "kelompok", "sekarang", "saat",
+}
+# Pemicu dimensi (GROUP BY)
+_GROUP_WORDS = {"per", "berdasarkan", "berdasar", "menurut", "tiap", "setiap", "distribusi", "sebaran",
+                "penyebaran", "breakdown", "jabarkan", "komposisi"}
+_PERCENT_WORDS = {"persentase", "persen", "proporsi", "porsi", "share"}
+_RANK_DESC = {"top", "teratas", "terbanyak", "terbesar", "tertinggi", "paling", "ranking", "urutan", "urut",
+              "urutkan", "peringkat"}
+_RANK_ASC = {"terendah", "tersedikit", "terkecil", "sedikit"}
+_COUNT_WORDS = {"berapa", "jumlah", "jumlahnya", "banyak", "banyaknya", "total", "hitung", "hitungkan", "headcount"}
+_PENSION_WORDS = {"pensiun", "purnabakti", "mpp"}
+_KNOWN = _FILLER | _GROUP_WORDS | _PERCENT_WORDS | _RANK_DESC | _RANK_ASC
+
+# Mention yang maknanya tergantung konteks: "di sig" di glosarium SQLGenerator = seluruh grup,
+# bukan company_home = 'SIG' → biarkan LLM yang memutuskan
+_AMBIGUOUS_MENTIONS = {"sig", "semen indonesia"}
+_MIN_FILTER_SCORE = 0.9  # exact / kolom / sinonim / singkatan; 'kata' & fuzzy → LLM
+
+_TOP_RE = (
+    re.compile(r"\btop (\d{1,3})\b"),
+    re.compile(r"\b(\d{1,3}) (?:[a-z]+ ){0,2}(?:teratas|terbesar|terbanyak|tertinggi|terendah|tersedikit|terkecil)\b"),
+)
+_HORIZON_RE = (
+    ("years", re.compile(r"\b(?:dalam|dlm) (\d{1,2}) tahun(?: (?:ke depan|kedepan|lagi|mendatang|terakhir))?\b")),
+    ("years", re.compile(r"\b(\d{1,2}) tahun (?:ke depan|kedepan|lagi|mendatang)\b")),
+    ("this_year", re.compile(r"\btahun ini\b")),
+    ("year", re.compile(r"\btahun (20\d\d)\b")),
+)
+_EMPLOYEE_TABLE_RE = re.compile(r"employee|karyawan|pegawai|pekerja")
+_PLAIN_IDENT_RE = re.compile(r"[a-z_][a-z0-9_]*")
+
+
+def _ident(name: str) -> str:
+    return name if _PLAIN_IDENT_RE.fullmatch(name) else '"' + name.replace('"', '""') + '"'
+
+
+def _literal(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+@dataclass
+class TemplateMatch:
+    template: str
+    sql: str
+    explanation: str
+    params: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class _Parsed:
+    filters: Dict[str, List[str]]
+    dimension: Optional[str]
+    top_n: Optional[int]
+    horizon: Optional[Tuple[str, int]]
+    percent: bool
+    rank: Optional[str]
+    count: bool
+    group: bool
+
+
+class _NoMatch(Exception):
+    """Alasan fallback ke LLM (dicatat di metrik coverage)."""
+
+
+class SQLTemplateMatcher:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.questions = 0
+        self.matched = 0
+        self.by_template = Counter()
+        self.fallback_reasons = Counter()
+        self.unknown_words = Counter()
+        self.execution_failures = 0
+
+    # ── Schema ─────────────────────────────────────────────────────────
+    def _base_table(self, schema: Dict[str, Any]) -> Optional[str]:
+        tables = schema.get("tables") or {}
+        if SQL_TEMPLATE_TABLE:
+            return SQL_TEMPLATE_TABLE if SQL_TEMPLATE_TABLE in tables else None
+        candidates = [t for t in tables if _EMPLOYEE_TABLE_RE.search(t.lower())]
+        if not candidates:
+            return None
+        # Tabel master karyawan = yang paling banyak kolom kategorinya
+        return max(candidates, key=lambda t: len(tables[t].get("category_values") or {}))
+
+    def _pension_expr(self, info: Dict[str, Any]) -> Optional[str]:
+        types = info.get("column_types") or {}
+        dated = [c for c in info.get("columns", []) if "date" in str(types.get(c, "")).lower()
+                 or "timestamp" in str(types.get(c, "")).lower()]
+        for col in dated:
+            if re.search(r"pensiun|retire|mpp", col.lower()):
+                return _ident(col)
+        if SQL_TEMPLATE_RETIREMENT_AGE > 0:
+            for col in dated:
+                if re.search(r"lahir|birth|dob", col.lower()):
+                    return f"({_ident(col)} + INTERVAL '{int(SQL_TEMPLATE_RETIREMENT_AGE)} years')"
+        return None
+
+    def _resolve_dimension(self, phrase: List[str], columns: List[str]) -> Tuple[Optional[str], Set[str]]:
+        """Frasa ("unit kerja") → kolom kategori dengan kata cocok terbanyak; return (kolom, kata terjelaskan)."""
+        best, best_key, best_words = None, None, set()
+        for ordinal, col in enumerate(columns):
+            col_words = [w for w in col.lower().split("_") if w]
+            col_canon = {_SYNONYMS.get(w, w) for w in col_words}
+            explained, score = set(), 0
+            for w in phrase:
+                if w in col_words:
+                    explained.add(w)
+                    score += 2
+                elif _SYNONYMS.get(w, w) in col_canon:
+                    explained.add(w)
+                    score += 1
+            if not score:
+                continue
+            # Seri → nama kolom paling pendek, lalu urutan kolom di tabel
+            key = (score, -len(col_words), -ordinal)
+            if best_key is None or key > best_key:
+                best, best_key, best_words = col, key, explained
+        return best, best_words
+
+    # ── Parsing ────────────────────────────────────────────────────────
+    def _parse(self, question: str, schema: Dict[str, Any], table: str, intent: Dict[str, Any]) -> _Parsed:
+        info = schema["tables"][table]
+        text = normalize_value(question)
+        consumed_text = text
+
+        top_n = None
+        for pattern in _TOP_RE:
+            m = pattern.search(consumed_text)
+            if m:
+                top_n = int(m.group(1))
+                consumed_text = consumed_text[:m.start(1)] + consumed_text[m.end(1):]
+                break
+
+        horizon = None
+        if any(w in text.split() for w in _PENSION_WORDS):
+            for kind, pattern in _HORIZON_RE:
+                m = pattern.search(consumed_text)
+                if m:
+                    horizon = (kind, int(m.group(1)) if m.groups() else 0)
+                    consumed_text = consumed_text[:m.start()] + " " + consumed_text[m.end():]
+                    break
+            # Tanpa horizon: "karyawan pensiun" = status, diserahkan ke value index
+
+        tokens = consumed_text.split()
+        consumed = [False] * len(tokens)
+        for i, w in enumerate(tokens):
+            if horizon is not None and w in _PENSION_WORDS:
+                consumed[i] = True
+
+        # Filter dari value index: nilai persis, satu kandidat terbaik per mention
+        filters: Dict[str, List[str]] = {}
+        by_mention: Dict[str, List[Any]] = {}
+        for match in value_index.resolve(question, schema, record=False) or []:
+            by_mention.setdefault(match.mention, []).append(match)
+        for mention, matches in by_mention.items():
+            words = mention.split()
+            if horizon is not None and set(words) & _PENSION_WORDS:
+                continue  # "pensiun" di sini = horizon, bukan status = 'Pensiun'
+            if mention in _AMBIGUOUS_MENTIONS:
+                raise _NoMatch("cakupan_ambigu")
+            top = max(m.score for m in matches)
+            if top < _MIN_FILTER_SCORE:
+                continue  # 'kata'/fuzzy: kata dibiarkan — bisa jadi nama dimensi, kalau tidak → kata_tidak_dikenal
+            best = [m for m in matches if m.score == top and m.table == table]
+            if not best:
+                raise _NoMatch("tabel_lain")
+            if len(best) > 1:
+                # Nilai sama di beberapa kolom (company_home / company_host) → kolom pertama di tabel,
+                # sama dengan urutan yang dipakai glosarium prompt SQL; nilai berbeda = ambigu
+                if len({m.value for m in best}) > 1:
+                    raise _NoMatch("nilai_ambigu")
+                order = info.get("columns", [])
+                best.sort(key=lambda m: order.index(m.column) if m.column in order else len(order))
+            start = next((i for i in range(len(tokens) - len(words) + 1)
+                          if tokens[i:i + len(words)] == words and not any(consumed[i:i + len(words)])), None)
+            if start is None:
+                continue
+            for i in range(start, start + len(words)):
+                consumed[i] = True
+            values = filters.setdefault(best[0].column, [])
+            if best[0].value not in values:
+                values.append(best[0].value)
+
+        # Dimensi: frasa kata yang belum terjelaskan (dipisah kata pengisi)
+        dim_columns = list(info.get("category_values") or {})
+        dimensions: Set[str] = set()
+        leftovers: List[str] = []
+        phrase: List[str] = []
+
+        def flush():
+            if not phrase:
+                return
+            column, explained = self._resolve_dimension(phrase, dim_columns)
+            if column is not None:
+                dimensions.add(column)
+            leftovers.extend(w for w in phrase if w not in explained)
+            phrase.clear()
+
+        for i, w in enumerate(tokens):
+            if consumed[i] or w in _KNOWN:
+                flush()
+            else:
+                phrase.append(w)
+        flush()
+
+        if leftovers:
+            for w in leftovers:
+                if w in self.unknown_words or len(self.unknown_words) < 500:
+                    self.unknown_words[w] += 1
+            raise _NoMatch("kata_tidak_dikenal")
+        if len(dimensions) > 1:
+            raise _NoMatch("multi_dimensi")
+
+        words = set(tokens)
+        features = intent.get("analytical_features") or []
+        rank = None
+        if intent.get("query_type") == "ranking" or top_n is not None or words & (_RANK_DESC | _RANK_ASC):
+            rank = "ASC" if words & _RANK_ASC else "DESC"
+        return _Parsed(
+            filters=filters,
+            dimension=next(iter(dimensions), None),
+            top_n=top_n,
+            horizon=horizon,
+            percent="percentage_calculation" in features or bool(words & _PERCENT_WORDS),
+            rank=rank,
+            count="statistical_analysis" in features or bool(words & _COUNT_WORDS),
+            group=intent.get("query_type") == "distribution" or bool(words & _GROUP_WORDS) or rank is not None,
+        )
+
+    # ── Rendering ──────────────────────────────────────────────────────
+    @staticmethod
+    def _where(conditions: List[str]) -> str:
+        return f"\nWHERE {' AND '.join(conditions)}" if conditions else ""
+
+    @staticmethod
+    def _filter_sql(filters: Dict[str, List[str]]) -> List[str]:
+        out = []
+        for column, values in filters.items():
+            if len(values) == 1:
+                out.append(f"{_ident(column)} = {_literal(values[0])}")
+            else:
+                out.append(f"{_ident(column)} IN ({', '.join(_literal(v) for v in values)})")
+        return out
+
+    @staticmethod
+    def _filter_text(filters: Dict[str, List[str]]) -> str:
+        return " dan ".join(f"{c} {'=' if len(v) == 1 else 'salah satu dari'} {', '.join(v)}"
+                            for c, v in filters.items())
+
+    def _render(self, parsed: _Parsed, table: str, info: Dict[str, Any]) -> TemplateMatch:
+        source = f"hr.{_ident(table)}"
+        conditions = self._filter_sql(parsed.filters)
+        params: Dict[str, Any] = {"table": table, "filters": parsed.filters}
+        steps: List[str] = []
+        if parsed.filters:
+            steps.append(f"Data karyawan difilter: {self._filter_text(parsed.filters)}.")
+
+        if parsed.horizon is not None:
+            expr = self._pension_expr(info)
+            if expr is None:
+                raise _NoMatch("kolom_pensiun_tidak_ada")
+            kind, n = parsed.horizon
+            if kind == "years":
+                if n <= 0:
+                    raise _NoMatch("horizon_tidak_valid")
+                conditions.append(f"{expr} >= CURRENT_DATE AND {expr} < CURRENT_DATE + INTERVAL '{n} years'")
+                steps.append(f"Hanya karyawan dengan tanggal pensiun mulai hari ini sampai {n} tahun ke depan.")
+            elif kind == "this_year":
+                conditions.append(f"EXTRACT(YEAR FROM {expr}) = EXTRACT(YEAR FROM CURRENT_DATE)")
+                steps.append("Hanya karyawan yang tanggal pensiunnya jatuh pada tahun berjalan.")
+            else:
+                conditions.append(f"EXTRACT(YEAR FROM {expr}) = {n}")
+                steps.append(f"Hanya karyawan yang tanggal pensiunnya jatuh pada tahun {n}.")
+            params["horizon"] = {"kind": kind, "value": n}
+
+        where = self._where(conditions)
+        if parsed.dimension is not None and parsed.group:
+            if parsed.percent and parsed.filters:
+                # "persentase perempuan per unit": porsi di dalam tiap unit atau sebaran antar unit? → LLM
+                raise _NoMatch("persentase_ambigu")
+            dim = _ident(parsed.dimension)
+            order = parsed.rank or "DESC"
+            name = "pension_within" if parsed.horizon else ("top_n_dimension" if parsed.top_n else "headcount_by_dimension")
+            sql = (f"SELECT {dim}, COUNT(*) AS jumlah_karyawan,\n"
+                   f"       ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (), 2) AS persentase\n"
+                   f"FROM {source}{where}\nGROUP BY {dim}\nORDER BY jumlah_karyawan {order}")
+            if parsed.top_n:
+                sql += f"\nLIMIT {parsed.top_n}"
+                steps.append(f"Hanya {parsed.top_n} kelompok {'terbanyak' if order == 'DESC' else 'tersedikit'} yang ditampilkan.")
+            params.update(dimension=parsed.dimension, top_n=parsed.top_n, order=order)
+            purpose = f"Melihat jumlah dan porsi karyawan per {parsed.dimension}"
+            steps.insert(0, f"Karyawan dikelompokkan per {parsed.dimension}, lalu dihitung jumlah dan persentasenya terhadap total.")
+            technical = [
+                f"<code>SELECT {dim}</code> digunakan untuk menampilkan kategori {parsed.dimension}",
+                "<code>COUNT(*)</code> digunakan untuk menghitung jumlah karyawan per kategori",
+                "<code>SUM(COUNT(*)) OVER ()</code> digunakan untuk mendapatkan total seluruh kategori sebagai dasar persentase",
+                f"<code>GROUP BY {dim}</code> digunakan untuk mengelompokkan data per kategori",
+                f"<code>ORDER BY jumlah_karyawan {order}</code> digunakan untuk mengurutkan hasil",
+            ]
+            if parsed.top_n:
+                technical.append(f"<code>LIMIT {parsed.top_n}</code> digunakan untuk membatasi jumlah kategori yang ditampilkan")
+        elif parsed.dimension is not None:
+            raise _NoMatch("dimensi_tanpa_intent")
+        elif parsed.horizon is not None or (parsed.count and not parsed.percent and parsed.rank is None):
+            name = "pension_within" if parsed.horizon else "headcount_total"
+            sql = f"SELECT COUNT(*) AS jumlah_karyawan\nFROM {source}{where}"
+            purpose = "Mengetahui jumlah karyawan" + (" yang akan pensiun" if parsed.horizon else "") \
+                + (" sesuai kriteria yang ditanyakan" if conditions else "")
+            steps.append("Baris karyawan yang memenuhi kriteria dihitung.")
+            technical = ["<code>COUNT(*)</code> digunakan untuk menghitung jumlah karyawan"]
+        elif parsed.percent and len(parsed.filters) == 1 and parsed.rank is None:
+            name = "percentage_share"
+            condition = " AND ".join(conditions)
+            sql = (f"SELECT COUNT(*) FILTER (WHERE {condition}) AS jumlah_karyawan,\n"
+                   f"       COUNT(*) AS total_karyawan,\n"
+                   f"       ROUND(COUNT(*) FILTER (WHERE {condition}) * 100.0 / NULLIF(COUNT(*), 0), 2) AS persentase\n"
+                   f"FROM {source}")
+            purpose = "Mengetahui porsi karyawan dengan kriteria tertentu terhadap seluruh karyawan"
+            steps = [f"Karyawan dengan {self._filter_text(parsed.filters)} dihitung, lalu dibandingkan dengan total seluruh karyawan."]
+            technical = [
+                f"<code>COUNT(*) FILTER (WHERE ...)</code> digunakan untuk menghitung karyawan yang memenuhi kriteria",
+                "<code>COUNT(*)</code> digunakan untuk menghitung total karyawan sebagai pembagi",
+                "<code>ROUND(... * 100.0 / NULLIF(...))</code> digunakan untuk menghitung persentase dua desimal",
+            ]
+        else:
+            raise _NoMatch("tanpa_intent")
+
+        if conditions:
+            technical.append("<code>WHERE</code> digunakan untuk menerapkan filter sebelum perhitungan")
+        explanation = (
+            "<b>Tujuan Bisnis (Untuk HR):</b>\n<ul>\n"
+            f"  <li>{purpose}.</li>\n</ul>\n<br>\n"
+            "<b>Langkah Logika Query (Non-Teknis):</b>\n<ul>\n"
+            + "".join(f"  <li>{s}</li>\n" for s in steps)
+            + "</ul>\n<br>\n<b>Langkah Teknis SQL:</b>\n<ul>\n"
+            + "".join(f"  <li>{t}</li>\n" for t in technical)
+            + "</ul>"
+        )
+        return TemplateMatch(template=name, sql=sql + ";", explanation=explanation, params=params)
+
+    # ── API ────────────────────────────────────────────────────────────
+    def match(self, question: str, schema: Dict[str, Any], intent: Dict[str, Any]) -> Optional[TemplateMatch]:
+        """SQL siap pakai dari template, atau None → LLM."""
+        if not SQL_TEMPLATES_ENABLED or not question:
+            return None
+        with self._lock:
+            self.questions += 1
+        try:
+            table = self._base_table(schema)
+            if table is None:
+                raise _NoMatch("tabel_karyawan_tidak_ada")
+            parsed = self._parse(question, schema, table, intent or {})
+            result = self._render(parsed, table, schema["tables"][table])
+        except _NoMatch as reason:
+            with self._lock:
+                self.fallback_reasons[str(reason)] += 1
+            logger.debug(f"🧩 Template tidak cocok ({reason}) → LLM")
+            return None
+        except Exception as e:
+            with self._lock:
+                self.fallback_reasons["error"] += 1
+            logger.warning(f"⚠️ SQL template error, fallback ke LLM: {e}")
+            return None
+        with self._lock:
+            self.matched += 1
+            self.by_template[result.template] += 1
+        logger.info(f"🧩 SQL dari template '{result.template}' (tanpa LLM): {result.params}")
+        return result
+
+    def record_failure(self, template: str) -> None:
+        """SQL template gagal divalidasi/dieksekusi → pertanyaan dikerjakan LLM."""
+        with self._lock:
+            self.execution_failures += 1
+            self.matched -= 1
+            self.by_template[template] -= 1
+            self.fallback_reasons["eksekusi_gagal"] += 1
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": SQL_TEMPLATES_ENABLED,
+            "questions": self.questions,
+            "matched": self.matched,
+            "coverage": round(self.matched / self.questions, 3) if self.questions else 0.0,
+            "by_template": {k: v for k, v in self.by_template.items() if v},
+            "fallback_reasons": dict(self.fallback_reasons),
+            "execution_failures": self.execution_failures,
+            # Kata yang paling sering membuat template gagal → kandidat template/sinonim berikutnya
+            "top_unknown_words": dict(self.unknown_words.most_common(15)),
+        }
+
+
+sql_templates = SQLTemplateMatcher()
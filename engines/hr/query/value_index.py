@@ -0,0 +1,315 @@
+"""
+Value Index - Kamus Nilai Kategori untuk Pertanyaan HR
+======================================================
+Sebelumnya prompt SQL membawa daftar 'Kategori: [...]' lengkap untuk setiap
+kolom teks, supaya LLM sendiri yang memetakan 'Sarjana'/'Strata 1' → 'S1' atau
+'surabya' → 'Surabaya'. Token prompt ikut membengkak seiring jumlah kategori.
+
+Index ini dibangun dari nilai distinct kolom teks (schema['tables'][t]
+['category_values'], diisi SchemaReader) dan me-resolve mention di pertanyaan
+SEBELUM generate SQL:
+- exact     : bentuk normal (lowercase, tanpa aksen/tanda baca/spasi, tanpa PT/Tbk)
+- sinonim   : kelompok padanan bahasa Indonesia (sarjana ↔ S1, pria ↔ L, jatim ↔ Jawa Timur)
+- singkatan : akronim nilai multi-kata (Solusi Bangun Indonesia → SBI)
+- kolom     : "band 3" → kolom band = '3' (nilai pendek didahului nama kolom)
+- kata      : satu kata khas yang hanya ada di satu nilai (padang → Semen Padang)
+- fuzzy     : salah ketik, difflib ratio ≥ VALUE_INDEX_FUZZY_CUTOFF (kandidat
+              disaring trigram dulu supaya tidak membandingkan semua nilai)
+
+Hasilnya (ValueMatch) ditulis di prompt sebagai blok 'NILAI TERDETEKSI', dan
+daftar kategori panjang dipadatkan (lihat SchemaReader._format_schema_for_llm).
+"""
+
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.config import VALUE_INDEX_ENABLED, VALUE_INDEX_FUZZY_CUTOFF
+
+logger = logging.getLogger(__name__)
+
+# Kelompok padanan: semua anggota (dalam bentuk compact) menunjuk ke kelompok yang sama.
+# Nilai di database yang compact-nya ada di kelompok → bisa ditemukan lewat anggota mana pun.
+_VALUE_EQUIVALENTS = (
+    # Pendidikan
+    ("s1", "sarjana", "strata 1", "strata satu", "bachelor", "sarjana strata 1"),
+    ("s2", "magister", "master", "strata 2", "strata dua", "pascasarjana", "pasca sarjana"),
+    ("s3", "doktor", "doktoral", "doctoral", "phd", "strata 3", "strata tiga"),
+    ("d1", "diploma 1", "diploma satu"),
+    ("d2", "diploma 2", "diploma dua"),
+    ("d3", "diploma 3", "diploma tiga", "ahli madya", "diploma"),
+    ("d4", "diploma 4", "diploma empat", "sarjana terapan"),
+    ("sma", "slta", "smk", "smu", "stm", "sma sederajat", "slta sederajat"),
+    ("smp", "sltp", "smp sederajat"),
+    ("sd", "sekolah dasar"),
+    # Gender
+    ("laki laki", "l", "pria", "lelaki", "male", "m", "cowok"),
+    ("perempuan", "p", "wanita", "female", "f", "cewek"),
+    # Status kepegawaian
+    ("tetap", "permanen", "permanent", "pkwtt", "karyawan tetap", "pegawai tetap"),
+    ("kontrak", "contract", "pkwt", "karyawan kontrak", "pegawai kontrak"),
+    ("aktif", "active"),
+    ("pensiun", "retired", "purnabakti", "purna bakti"),
+    # Wilayah
+    ("jakarta", "dki", "dki jakarta", "jkt"),
+    ("yogyakarta", "diy", "jogja", "yogya", "jogjakarta", "di yogyakarta"),
+    ("jawa timur", "jatim"),
+    ("jawa tengah", "jateng"),
+    ("jawa barat", "jabar"),
+    ("sumatera utara", "sumut", "sumatra utara"),
+    ("sumatera barat", "sumbar", "sumatra barat"),
+    ("sumatera selatan", "sumsel", "sumatra selatan"),
+    ("sulawesi selatan", "sulsel"),
+    ("kalimantan timur", "kaltim"),
+    ("nusa tenggara timur", "ntt"),
+    ("nusa tenggara barat", "ntb"),
+)
+
+# Kata yang tidak pernah dianggap mention nilai sendirian
+_STOPWORDS = {
+    "berapa", "jumlah", "total", "karyawan", "pegawai", "yang", "di", "ke", "dan", "atau", "dari", "per",
+    "dengan", "untuk", "data", "tampilkan", "siapa", "ada", "rata", "berdasarkan", "setiap", "tiap",
+    "tahun", "bulan", "paling", "banyak", "sedikit", "tertinggi", "terendah", "semua", "seluruh",
+    "orang", "daftar", "list", "show", "how", "many", "count", "what", "the", "of", "in", "by", "and",
+    "to", "is", "are", "who", "berdasar", "menurut", "masing", "saja", "hanya", "lebih", "kurang",
+    "sama", "tidak", "bukan", "yg", "dgn", "utk", "tolong", "mohon", "bisa", "apa", "mana",
+}
+
+# Awalan/akhiran badan usaha yang diabaikan saat mencocokkan nama perusahaan
+_CORPORATE = {"pt", "tbk", "persero", "cv", "perum", "the"}
+
+_MAX_NGRAM = 4
+_MAX_MATCHES_PER_MENTION = 5
+# Nilai sependek ini juga diindeks dengan nama kolomnya ("band 3", "grade a")
+_SHORT_VALUE_MAX = 3
+
+
+def normalize_value(text: Any) -> str:
+    """lowercase, buang aksen & tanda baca, rapikan spasi."""
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii").lower()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+
+def _compact(normalized: str) -> str:
+    return normalized.replace(" ", "")
+
+
+def _trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+_GROUP_OF: Dict[str, int] = {_compact(normalize_value(alias)): gid
+                             for gid, group in enumerate(_VALUE_EQUIVALENTS) for alias in group}
+
+
+@dataclass
+class ValueMatch:
+    mention: str
+    table: str
+    column: str
+    value: str
+    method: str
+    score: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"mention": self.mention, "table": self.table, "column": self.column,
+                "value": self.value, "method": self.method, "score": round(self.score, 3)}
+
+
+# Skor per metode — dipakai untuk memilih entry terbaik kalau satu key menunjuk ke beberapa cara
+_METHOD_SCORE = {"exact": 1.0, "kolom": 1.0, "sinonim": 0.95, "singkatan": 0.9, "kata": 0.75}
+
+
+class _Index:
+    def __init__(self, schema: Dict[str, Any]):
+        self.entries: List[Tuple[str, str, str]] = []
+        # compact key → {entry_idx: (method, score)}
+        self.keys: Dict[str, Dict[int, Tuple[str, float]]] = defaultdict(dict)
+        self.columns = 0
+        word_owner: Dict[str, Set[int]] = defaultdict(set)
+
+        for table, info in (schema.get("tables") or {}).items():
+            for column, values in (info.get("category_values") or {}).items():
+                self.columns += 1
+                col_key = _compact(normalize_value(column))
+                for value in values:
+                    normalized = normalize_value(value)
+                    if not normalized:
+                        continue
+                    idx = len(self.entries)
+                    self.entries.append((table, column, str(value)))
+                    words = normalized.split()
+                    core = [w for w in words if w not in _CORPORATE] or words
+
+                    self._add(_compact(normalized), idx, "exact")
+                    self._add("".join(core), idx, "exact")
+                    group = _GROUP_OF.get(_compact(normalized))
+                    if group is not None:
+                        for alias in _VALUE_EQUIVALENTS[group]:
+                            self._add(_compact(normalize_value(alias)), idx, "sinonim")
+                    if len(core) >= 3:
+                        self._add("".join(w[0] for w in core), idx, "singkatan")
+                    if len(_compact(normalized)) <= _SHORT_VALUE_MAX:
+                        self._add(col_key + _compact(normalized), idx, "kolom")
+                    if len(core) > 1:
+                        for w in core:
+                            if len(w) >= 5 and w not in _STOPWORDS and not w.isdigit():
+                                word_owner[w].add(idx)
+
+        # Kata khas: hanya milik satu nilai di seluruh index dan bukan nilai utuh lain
+        for word, owners in word_owner.items():
+            if len(owners) == 1 and word not in self.keys:
+                self._add(word, next(iter(owners)), "kata")
+
+        # Trigram hanya untuk key nilai (exact) yang cukup panjang untuk fuzzy
+        self.trigrams: Dict[str, Set[str]] = defaultdict(set)
+        for key, owners in self.keys.items():
+            if len(key) >= 4 and any(method == "exact" for method, _ in owners.values()):
+                for tri in _trigrams(key):
+                    self.trigrams[tri].add(key)
+
+    def _add(self, key: str, idx: int, method: str) -> None:
+        if not key:
+            return
+        score = _METHOD_SCORE[method]
+        current = self.keys[key].get(idx)
+        if current is None or current[1] < score:
+            self.keys[key][idx] = (method, score)
+
+    def lookup(self, key: str) -> Dict[int, Tuple[str, float]]:
+        return self.keys.get(key, {})
+
+    def fuzzy(self, key: str, cutoff: float) -> Dict[int, Tuple[str, float]]:
+        grams = _trigrams(key)
+        shared = Counter(k for tri in grams for k in self.trigrams.get(tri, ()))
+        need = max(2, len(grams) // 3)
+        best: Dict[int, Tuple[str, float]] = {}
+        for candidate, count in shared.items():
+            if count < need or abs(len(candidate) - len(key)) > max(2, len(key) // 3):
+                continue
+            ratio = SequenceMatcher(None, key, candidate).ratio()
+            if ratio < cutoff:
+                continue
+            for idx, (method, _score) in self.keys[candidate].items():
+                if method != "exact":
+                    continue
+                score = 0.9 * ratio
+                if idx not in best or best[idx][1] < score:
+                    best[idx] = ("fuzzy", score)
+        return best
+
+
+class ValueIndex:
+    def __init__(self):
+        self._index: Optional[_Index] = None
+        self._source: Optional[Dict[str, Any]] = None  # schema yang sedang diindeks (identity)
+        self._lock = threading.Lock()
+        self.build_ms = 0.0
+        self.resolutions = 0
+        self.questions_matched = 0
+        self.matches = Counter()
+        self.resolve_ms_total = 0.0
+
+    def _get_index(self, schema: Dict[str, Any]) -> _Index:
+        # Snapshot schema selalu dict baru saat di-rebuild → cukup bandingkan identity.
+        # Referensi disimpan supaya id() tidak dipakai ulang oleh objek lain.
+        with self._lock:
+            if self._index is None or self._source is not schema:
+                start = time.time()
+                self._index = _Index(schema)
+                self._source = schema
+                self.build_ms = round((time.time() - start) * 1000, 1)
+                logger.info(
+                    f"📖 Value index dibangun: {len(self._index.entries)} nilai dari {self._index.columns} kolom "
+                    f"({self.build_ms:.0f}ms)"
+                )
+            return self._index
+
+    def resolve(self, question: str, schema: Dict[str, Any], record: bool = True) -> Optional[List[ValueMatch]]:
+        """Mention nilai di pertanyaan → nilai persis di database.
+        None = index tidak aktif (nonaktif atau schema tanpa category_values).
+        record=False: tanpa metrik/log (dipakai untuk signature SQL cache)."""
+        if not VALUE_INDEX_ENABLED or not question:
+            return None
+        index = self._get_index(schema)
+        if not index.entries:
+            return None
+
+        start = time.time()
+        tokens = normalize_value(question).split()
+        consumed: Set[int] = set()
+        found: List[Tuple[int, ValueMatch]] = []
+
+        # Greedy dari n-gram terpanjang: "jawa timur" menang atas "jawa"
+        for n in range(min(_MAX_NGRAM, len(tokens)), 0, -1):
+            for i in range(len(tokens) - n + 1):
+                span = set(range(i, i + n))
+                if span & consumed:
+                    continue
+                words = tokens[i:i + n]
+                if all(w in _STOPWORDS for w in words):
+                    continue
+                if n == 1 and (len(words[0]) < 2 or words[0].isdigit()):
+                    continue
+                key = "".join(words)
+                hits = index.lookup(key)
+                # Fuzzy hanya untuk n-gram pendek tanpa kata pengisi di tepi ("di surabya" → cukup "surabya")
+                if not hits and len(key) >= 5 and n <= 2 and words[0] not in _STOPWORDS and words[-1] not in _STOPWORDS:
+                    hits = index.fuzzy(key, VALUE_INDEX_FUZZY_CUTOFF)
+                if not hits:
+                    continue
+                consumed |= span
+                mention = " ".join(words)
+                ranked = sorted(hits.items(), key=lambda kv: kv[1][1], reverse=True)[:_MAX_MATCHES_PER_MENTION]
+                for idx, (method, score) in ranked:
+                    table, column, value = index.entries[idx]
+                    found.append((i, ValueMatch(mention, table, column, value, method, score)))
+
+        matches = [m for _, m in sorted(found, key=lambda x: (x[0], -x[1].score))]
+        elapsed = (time.time() - start) * 1000
+        if not record:
+            return matches
+        self.resolutions += 1
+        self.resolve_ms_total += elapsed
+        if matches:
+            self.questions_matched += 1
+            for m in matches:
+                self.matches[m.method] += 1
+            logger.info(f"📖 Nilai terdeteksi ({elapsed:.1f}ms): "
+                        + ", ".join(f"'{m.mention}'→{m.column}='{m.value}'" for m in matches))
+        return matches
+
+    def status(self) -> Dict[str, Any]:
+        index = self._index
+        return {
+            "enabled": VALUE_INDEX_ENABLED,
+            "values": len(index.entries) if index else 0,
+            "columns": index.columns if index else 0,
+            "keys": len(index.keys) if index else 0,
+            "build_ms": self.build_ms,
+            "resolutions": self.resolutions,
+            "questions_matched": self.questions_matched,
+            "matches_by_method": dict(self.matches),
+            "resolve_ms_avg": round(self.resolve_ms_total / self.resolutions, 2) if self.resolutions else None,
+        }
+
+
+def format_value_hints(matches: List[ValueMatch]) -> List[str]:
+    """Baris prompt untuk blok NILAI TERDETEKSI."""
+    if not matches:
+        return []
+    lines = ["🎯 NILAI TERDETEKSI DARI PERTANYAAN (pakai nilai PERSIS ini di WHERE, dengan '='):"]
+    for m in matches:
+        lines.append(f"  • \"{m.mention}\" → hr.{m.table}.{m.column} = '{m.value}'  ({m.method})")
+    lines.append("")
+    return lines
+
+
+value_index = ValueIndex()
@@ -30,6 +30,8 @@ from engines.sop.templates_engine import SimpleTemplateEngine
 from engines.sop.policy_injector import HRTravelPolicy
 from engines.sop.rag_interceptor import ConstraintInterceptor
 from engines.sop.utils.currency import get_usd_idr_rate
+from app.deadline import Deadline, budget_allows
+from app.cancellation import record_savings
 
 try:
     from app.langfuse_client import LANGFUSE_ENABLED, get_langchain_callback, langfuse_observation
@@ -47,7 +49,9 @@ from app.config import (
     OPENAI_API_KEY, PINECONE_API_KEY, PINECONE_INDEX,
     EMBEDDING_MODEL, COHERE_API_KEY, COHERE_MODEL,
     RAG_TOP_K, RAG_RETRIEVAL_K, RAG_MIN_SCORE, LLM_MODEL, LLM_TEMPERATURE,
-    PINECONE_NAMESPACE
+    PINECONE_NAMESPACE,
+    DEADLINE_MIN_MULTI_QUERY, DEADLINE_MIN_RERANK, DEADLINE_MIN_FULL_TOP_K,
+    DEADLINE_MIN_FX_FETCH, DEADLINE_DEGRADED_TOP_K,
 )
 
 # =====================
@@ -62,8 +66,29 @@ class RAGMetrics:
     cohere_rerank_calls: int = 0
     gkl_fallback_calls: int = 0
     cancelled_requests: int = 0  # 🔥 NEW
+    deadline_degradations: int = 0  # ⏳ tahap yang di-degrade karena budget request menipis
+    # EWMA untuk estimasi penghematan saat request dibatalkan
+    avg_prompt_tokens: float = 0.0
+    avg_completion_tokens: float = 0.0
+
+    def observe_generation(self, prompt_chars: int, completion_chars: int) -> None:
+        # ~4 karakter per token (cukup untuk estimasi biaya)
+        alpha = 0.2
+        p_tok, c_tok = prompt_chars / 4, completion_chars / 4
+        self.avg_prompt_tokens = p_tok if not self.avg_prompt_tokens else (1 - alpha) * self.avg_prompt_tokens + alpha * p_tok
+        self.avg_completion_tokens = c_tok if not self.avg_completion_tokens else (1 - alpha) * self.avg_completion_tokens + alpha * c_tok
 
 metrics = RAGMetrics()
+
+
+def _record_cancel_savings(start_time: float, prompt_sent: bool, generated_chars: int, stage: str) -> None:
+    """Estimasi token & ms yang tidak jadi dibayar: sisa waktu rata-rata + sisa token generasi."""
+    elapsed_ms = (time.time() - start_time) * 1000
+    ms_saved = max(0.0, metrics.avg_response_time * 1000 - elapsed_ms)
+    tokens_saved = max(0.0, (metrics.avg_completion_tokens or 600) - generated_chars / 4)
+    if not prompt_sent:
+        tokens_saved += metrics.avg_prompt_tokens or 3000
+    record_savings(int(tokens_saved), int(ms_saved), stage=stage)
 satpam_aturan = ConstraintInterceptor()
 
 def validate_input(question: str) -> Tuple[bool, str]:
@@ -118,10 +143,11 @@ class FastQueryAnalyzer:
         self.parser = PydanticOutputParser(pydantic_object=QuerySchema)
         logger.info("✅ FastQueryAnalyzer Ready (Powered by Pydantic JSON Guard)")
 
-    async def analyze_async(self, query: str) -> Dict:
+    async def analyze_async(self, query: str, deadline: Optional[Deadline] = None) -> Dict:
         """
         Menganalisis pertanyaan yang SUDAH BERSIH (Standalone) dari Chat Service.
         Tidak perlu lagi memparafrase ulang atau membaca history di sini.
+        Dengan deadline, panggilan LLM dibatasi sisa budget; timeout → default_result.
         """
         format_instructions = self.parser.get_format_instructions()
         prompt = f"""Anda adalah sistem Query Analyzer Spesialis SOP HRD PT Semen Indonesia.
@@ -157,7 +183,10 @@ LANGKAH 5 — Isi field lainnya sesuai panduan di setiap field.
         default_result = {"sop_topic": "general", "search_keywords": query, "scope": "general", "doc_type": "general", "template_type": "general", "kota_asal": "", "kota_tujuan": "", "butuh_kalkulasi_jarak": False}
         try:
             print("   👉 [RADAR DALAM] Ainvoke dipanggil...")
-            response = await self.llm.ainvoke(prompt)
+            if deadline is not None:
+                response = await asyncio.wait_for(self.llm.ainvoke(prompt), timeout=deadline.timeout_for(30))
+            else:
+                response = await self.llm.ainvoke(prompt)
             print("   ✅ [RADAR DALAM] Ainvoke berhasil!")
             parsed_result = self.parser.invoke(response)
             result = parsed_result.model_dump()
@@ -165,6 +194,10 @@ LANGKAH 5 — Isi field lainnya sesuai panduan di setiap field.
             result['doc_type'] = result.get('doc_type', 'general').lower()
             logger.info(f"🏷️  sop_topic: {result.get('sop_topic')} | doc_type: {result.get('doc_type')}")
             return result
+        except asyncio.TimeoutError:
+            if deadline is not None:
+                deadline.degrade("default_query_analysis", "analyzer timeout")
+            return default_result
         except Exception as e:
             logger.error(f"❌ Pydantic Parse Failed: {e}. Fallback to default.")
             return default_result
@@ -174,20 +207,20 @@ LANGKAH 5 — Isi field lainnya sesuai panduan di setiap field.
 # =====================
 class ContextEnrichedCohereReranker:
     def __init__(self, api_key: str, model: str):
-        self.client = cohere.Client(api_key) 
+        # AsyncClient (httpx): task yang di-cancel langsung menutup request HTTP ke Cohere,
+        # beda dengan client sync di to_thread yang tetap jalan sampai selesai.
+        self.client = cohere.AsyncClient(api_key)
         self.model = model
 
     async def rerank_async(self, query: str, chunks: List[Dict], top_k: int = 5) -> List[Dict]:
         if not chunks: return []
-        def _blocking_rerank():
-            documents = [f"[{c.get('metadata', {}).get('parent_section', '').strip()}]\n{c.get('metadata', {}).get('text', '').strip()}" for c in chunks]
-            response = self.client.rerank(query=query, documents=documents, top_n=top_k, model=self.model)
-            return [{**chunks[r.index], 'score': r.relevance_score} for r in response.results]
+        documents = [f"[{c.get('metadata', {}).get('parent_section', '').strip()}]\n{c.get('metadata', {}).get('text', '').strip()}" for c in chunks]
         try:
-            return await asyncio.to_thread(_blocking_rerank)
+            response = await self.client.rerank(query=query, documents=documents, top_n=top_k, model=self.model)
+            return [{**chunks[r.index], 'score': r.relevance_score} for r in response.results]
         except Exception as e:
             logger.error(f"❌ Cohere Async failed: {e}")
-            return chunks[:top_k]
+            return sorted(chunks, key=lambda c: c.get('score', 0), reverse=True)[:top_k]
 
 # =====================
 # CORE ENGINE INITIALIZATION (✅ LAZY LOAD PROTECTED)
@@ -212,6 +245,15 @@ class RAGEngine:
         )
         pc = Pinecone(api_key=PINECONE_API_KEY)
         self.index = pc.Index(PINECONE_INDEX)
+        # Client asyncio Pinecone (SDK v6+) agar query bisa di-abort saat cancel;
+        # SDK lama → fallback ke index sync di worker thread.
+        self.async_index = None
+        try:
+            if hasattr(pc, "IndexAsyncio"):
+                self.async_index = pc.IndexAsyncio(host=pc.describe_index(PINECONE_INDEX).host)
+                logger.info("⚡ Pinecone IndexAsyncio aktif (cancellable queries)")
+        except Exception as e:
+            logger.warning(f"⚠️ Pinecone IndexAsyncio tidak tersedia, pakai thread: {e}")
         self.query_analyzer = FastQueryAnalyzer(self.llm)
         self.cohere_reranker = ContextEnrichedCohereReranker(COHERE_API_KEY, COHERE_MODEL) if COHERE_API_KEY else None
         self.travel_analyzer = TravelAnalyzer(llm_client=self.llm)
@@ -224,7 +266,14 @@ rag_engine = RAGEngine()
 # =====================
 # LAYER 3 & 4: RETRIEVAL (Multi-Query)
 # =====================
-async def _generate_multi_queries(question: str, sop_topic: str) -> List[str]:
+def _bounded(awaitable, deadline: Optional[Deadline], cap: float):
+    """Batasi satu panggilan upstream dengan sisa budget request. Tanpa deadline → apa adanya."""
+    if deadline is None:
+        return awaitable
+    return asyncio.wait_for(awaitable, timeout=deadline.timeout_for(cap))
+
+
+async def _generate_multi_queries(question: str, sop_topic: str, deadline: Optional[Deadline] = None) -> List[str]:
     """Generate 3 alternative search queries using synonym variation."""
     prompt = f"""Kamu adalah asisten pencarian dokumen regulasi HR perusahaan.
 Tugasmu: buat TEPAT 3 query pencarian dengan TERMINOLOGI yang BENAR-BENAR BERBEDA dari pertanyaan berikut.
@@ -245,34 +294,73 @@ Panduan:
 
 Tulis HANYA 3 baris, satu query per baris, tanpa nomor atau label apapun."""
     try:
-        response = await rag_engine.llm.ainvoke(prompt)
+        response = await _bounded(rag_engine.llm.ainvoke(prompt), deadline, 20)
         queries = [q.strip() for q in response.content.strip().split('\n') if q.strip()][:3]
         logger.info(f"🔀 Multi-query alternatives: {queries}")
         return queries
+    except asyncio.TimeoutError:
+        if deadline is not None:
+            deadline.degrade("skip_multi_query", "multi-query timeout")
+        logger.warning("⚠️ Multi-query generation timeout. Fallback to single query.")
+        return []
     except Exception as e:
         logger.warning(f"⚠️ Multi-query generation failed: {e}. Fallback to single query.")
         return []
 
 
-async def retrieve_context_async(query: str, search_keywords: str, scope: str, sop_topic: str = "general") -> List[Dict]:
-    # Step 1: Generate alternative queries + embed primary secara paralel
-    alt_queries, primary_vector = await asyncio.gather(
-        _generate_multi_queries(query, sop_topic),
-        rag_engine.embeddings.aembed_query(search_keywords)
-    )
+async def retrieve_context_async(
+    query: str,
+    search_keywords: str,
+    scope: str,
+    sop_topic: str = "general",
+    deadline: Optional[Deadline] = None,
+) -> List[Dict]:
+    # Budget menipis → kecilkan pool retrieval & hasil akhir
+    retrieval_k, final_top_k = RAG_RETRIEVAL_K, RAG_TOP_K
+    if not budget_allows(deadline, "shrink_top_k", DEADLINE_MIN_FULL_TOP_K):
+        metrics.deadline_degradations += 1
+        final_top_k = min(RAG_TOP_K, DEADLINE_DEGRADED_TOP_K)
+        retrieval_k = max(final_top_k * 2, RAG_RETRIEVAL_K // 2)
 
-    # Step 2: Embed alternative queries secara paralel
-    alt_vectors = list(await asyncio.gather(*[
-        rag_engine.embeddings.aembed_query(q) for q in alt_queries
-    ])) if alt_queries else []
+    # Step 1: Generate alternative queries + embed primary secara paralel
+    if budget_allows(deadline, "skip_multi_query", DEADLINE_MIN_MULTI_QUERY):
+        alt_queries, primary_vector = await asyncio.gather(
+            _generate_multi_queries(query, sop_topic, deadline=deadline),
+            _bounded(rag_engine.embeddings.aembed_query(search_keywords), deadline, 20),
+        )
+    else:
+        metrics.deadline_degradations += 1
+        alt_queries = []
+        primary_vector = await _bounded(rag_engine.embeddings.aembed_query(search_keywords), deadline, 20)
+
+    # Step 2: Embed alternative queries secara paralel.
+    # Timeout di sini cukup membuang alternatif — primary vector sudah ada.
+    alt_vectors = []
+    if alt_queries:
+        try:
+            alt_vectors = list(await _bounded(asyncio.gather(*[
+                rag_engine.embeddings.aembed_query(q) for q in alt_queries
+            ]), deadline, 20))
+        except asyncio.TimeoutError:
+            metrics.deadline_degradations += 1
+            if deadline is not None:
+                deadline.degrade("skip_alt_embeddings", "embedding alternatif timeout")
 
     all_vectors = [primary_vector] + alt_vectors
 
-    def _run_pinecone_query(vector, filter_dict, top_k):
-        return rag_engine.index.query(
-            vector=vector, top_k=top_k, filter=filter_dict,
-            include_metadata=True, namespace=PINECONE_NAMESPACE
-        )
+    async def _run_pinecone_query(vector, filter_dict, top_k):
+        if rag_engine.async_index is not None:
+            call = rag_engine.async_index.query(
+                vector=vector, top_k=top_k, filter=filter_dict,
+                include_metadata=True, namespace=PINECONE_NAMESPACE
+            )
+        else:
+            call = asyncio.to_thread(
+                rag_engine.index.query,
+                vector=vector, top_k=top_k, filter=filter_dict,
+                include_metadata=True, namespace=PINECONE_NAMESPACE
+            )
+        return await _bounded(call, deadline, 10)
 
     # Step 3: Tentukan filter berdasarkan scope
     if scope in ['domestic', 'international']:
@@ -283,20 +371,34 @@ async def retrieve_context_async(query: str, search_keywords: str, scope: str, s
         fallback_filter = None
 
     # Step 4: Jalankan semua Pinecone query secara paralel
-    # Primary pakai RAG_RETRIEVAL_K penuh, alternatif cukup 5 per query
+    # Primary pakai retrieval_k penuh, alternatif cukup 5 per query
+    # Timeout primary = gagal; timeout alternatif cukup dibuang
     tasks = [
-        asyncio.to_thread(_run_pinecone_query, vec, main_filter, RAG_RETRIEVAL_K if i == 0 else 5)
+        _run_pinecone_query(vec, main_filter, retrieval_k if i == 0 else 5)
         for i, vec in enumerate(all_vectors)
     ]
-    results = await asyncio.gather(*tasks)
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    if isinstance(results[0], BaseException):
+        raise results[0]
+    for res in results[1:]:
+        if isinstance(res, asyncio.TimeoutError):
+            metrics.deadline_degradations += 1
+            if deadline is not None:
+                deadline.degrade("skip_alt_pinecone", "query Pinecone alternatif timeout")
+        elif isinstance(res, BaseException):
+            raise res
+    results = [res for res in results if not isinstance(res, BaseException)]
 
     # Step 5: Fallback scope untuk primary query jika hasil < 3
     primary_matches = results[0].matches
     if scope in ['domestic', 'international'] and len(primary_matches) < 3:
-        fallback_res = await asyncio.to_thread(
-            _run_pinecone_query, primary_vector, fallback_filter, RAG_RETRIEVAL_K
-        )
-        primary_matches = fallback_res.matches
+        try:
+            fallback_res = await _run_pinecone_query(primary_vector, fallback_filter, retrieval_k)
+            primary_matches = fallback_res.matches
+        except asyncio.TimeoutError:
+            metrics.deadline_degradations += 1
+            if deadline is not None:
+                deadline.degrade("skip_scope_fallback", "query Pinecone fallback timeout")
 
     # Step 6: Merge + deduplikasi by vector ID, simpan score tertinggi
     seen: Dict[str, Dict] = {}
@@ -311,12 +413,22 @@ async def retrieve_context_async(query: str, search_keywords: str, scope: str, s
 
     # Step 7: Cohere rerank dari pool yang lebih besar
     if rag_engine.cohere_reranker and merged:
-        metrics.cohere_rerank_calls += 1
-        rerank_query = f"[Topik: {sop_topic}] {query}" if sop_topic and sop_topic != "general" else query
-        logger.info(f"🔍 Cohere rerank query: {rerank_query}")
-        merged = await rag_engine.cohere_reranker.rerank_async(query=rerank_query, chunks=merged, top_k=RAG_TOP_K)
+        if budget_allows(deadline, "skip_rerank", DEADLINE_MIN_RERANK):
+            metrics.cohere_rerank_calls += 1
+            rerank_query = f"[Topik: {sop_topic}] {query}" if sop_topic and sop_topic != "general" else query
+            logger.info(f"🔍 Cohere rerank query: {rerank_query}")
+            try:
+                return await _bounded(
+                    rag_engine.cohere_reranker.rerank_async(query=rerank_query, chunks=merged, top_k=final_top_k),
+                    deadline, 15,
+                )
+            except asyncio.TimeoutError:
+                if deadline is not None:
+                    deadline.degrade("skip_rerank", "rerank timeout")
+        metrics.deadline_degradations += 1
 
-    return merged
+    # Tanpa Cohere (tidak dikonfigurasi / budget menipis): skor Pinecone, tetap dipotong ke final_top_k
+    return sorted(merged, key=lambda m: m['score'], reverse=True)[:final_top_k]
 
 
 # =====================
@@ -327,6 +439,7 @@ async def answer_question_async(
     question: str,
     session_id: str,
     cancellation_check: Optional[Callable] = None,
+    deadline: Optional[Deadline] = None,
 ) -> str:
     """
     🔥 ENHANCED with 8 cancellation checkpoints.
@@ -337,6 +450,7 @@ async def answer_question_async(
         question: User query
         session_id: Session ID
         cancellation_check: Async callable returning True if should cancel
+        deadline: Budget waktu request (opsional) — tahap mahal di-degrade kalau menipis
     """
     
     # 🔥 Helper function for cancellation checks
@@ -364,6 +478,7 @@ async def answer_question_async(
     
     start_time = time.time()
     metrics.queries += 1
+    _prompt_sent = False
     
     try:
         print("🚩 [RADAR 3] Validasi input...")
@@ -379,7 +494,7 @@ async def answer_question_async(
         await check_cancelled()
 
         with langfuse_observation("query_analysis", input={"question": question}) as _sp_analysis:
-            analysis = await rag_engine.query_analyzer.analyze_async(question)
+            analysis = await rag_engine.query_analyzer.analyze_async(question, deadline=deadline)
             if _sp_analysis:
                 _sp_analysis.update(output={
                     "keywords": analysis.get("search_keywords"),
@@ -436,7 +551,7 @@ async def answer_question_async(
         )
 
         with langfuse_observation("vector_retrieval", input={"keywords": keywords, "scope": scope, "doc_type": doc_type}) as _sp_ret:
-            matches = await retrieve_context_async(question, keywords, scope, sop_topic=analysis.get('sop_topic', 'general'))
+            matches = await retrieve_context_async(question, keywords, scope, sop_topic=analysis.get('sop_topic', 'general'), deadline=deadline)
 
             # Filter chunks dengan Cohere relevance score di bawah threshold
             before_filter = len(matches)
@@ -527,7 +642,9 @@ async def answer_question_async(
                 logger.info(f"🛣️ TravelAnalyzer injected: route={route_str}, dist={dist_km}km, dur={dur_hrs}hrs")
 
                 if scope == 'international':
-                    _idr_rate = await get_usd_idr_rate()
+                    _idr_rate = await get_usd_idr_rate(
+                        allow_fetch=budget_allows(deadline, "cached_fx_rate", DEADLINE_MIN_FX_FETCH)
+                    )
                     tool_info = HRTravelPolicy.get_international_policy_injection(route_str, dur_hrs, idr_rate=_idr_rate)
                 else:
                     tool_info = HRTravelPolicy.get_domestic_policy_injection(route_str, dist_km, dur_hrs)
@@ -611,7 +728,11 @@ Anda adalah Asisten Profesional HRD PT Semen Indonesia.
         await check_cancelled()
 
         with langfuse_observation("llm_generation", input={"prompt_length": len(prompt), "model": LLM_MODEL}) as _sp_gen:
-            response = await rag_engine.llm.ainvoke(prompt)
+            _prompt_sent = True
+            if deadline is not None:
+                response = await asyncio.wait_for(rag_engine.llm.ainvoke(prompt), timeout=deadline.timeout_for(45, floor=10))
+            else:
+                response = await rag_engine.llm.ainvoke(prompt)
 
             # 🔥 CHECKPOINT 8: After LLM call
             await check_cancelled()
@@ -623,10 +744,13 @@ Anda adalah Asisten Profesional HRD PT Semen Indonesia.
         # Safety net: hapus placeholder yang tidak diganti LLM
         cleaned_response = cleaned_response.replace('[KOTAK_PERINGATAN_KOREKSI]', '')
     
+        metrics.observe_generation(len(prompt), len(response.content))
         metrics.successful_responses += 1
         metrics.avg_response_time = ((metrics.avg_response_time * (metrics.queries - 1)) + (time.time() - start_time)) / metrics.queries
         
         logger.info(f"✅ Success in {time.time() - start_time:.2f}s | Guardrails Active: {bool(guardrails)}")
+        if deadline is not None and deadline.degradations:
+            logger.info(f"⏳ RAG degradations: {', '.join(deadline.degradations)}")
         
         return cleaned_response
 
@@ -635,6 +759,7 @@ Anda adalah Asisten Profesional HRD PT Semen Indonesia.
         logger.warning(f"🛑 RAG processing cancelled for session {session_id}")
         metrics.failed_responses += 1
         metrics.cancelled_requests += 1
+        _record_cancel_savings(start_time, _prompt_sent, 0, stage="rag_async")
         raise  # Re-raise to propagate cancellation
         
     except Exception as e:
@@ -642,33 +767,54 @@ Anda adalah Asisten Profesional HRD PT Semen Indonesia.
         metrics.failed_responses += 1
         return "<h3>⚠️ Terjadi Kesalahan Sistem</h3><p>Mohon maaf, sistem sedang sibuk.</p>"
 
+def _cancellation_stats_dict() -> Dict:
+    from app.cancellation import cancellation_stats
+    return cancellation_stats.to_dict()
+
 def get_engine_metrics() -> Dict:
     return {
         "total_queries": metrics.queries,
         "avg_response_time_seconds": round(metrics.avg_response_time, 2),
         "success_rate_percent": round((metrics.successful_responses / metrics.queries * 100) if metrics.queries > 0 else 0, 1),
         "cancelled_requests": metrics.cancelled_requests,  # 🔥 NEW
+        "deadline_degradations": metrics.deadline_degradations,
+        "cancellation": _cancellation_stats_dict(),
         "version": "v7.2.0 (CANCELLATION EDITION)"
     }
     
 # Entry point wrapper
-async def answer_question(question: str, session_id: str, cancellation_check=None) -> str:
-    return await answer_question_async(question, session_id, cancellation_check)
+async def answer_question(question: str, session_id: str, cancellation_check=None, deadline: Optional[Deadline] = None) -> str:
+    return await answer_question_async(question, session_id, cancellation_check, deadline=deadline)
 
 
 # =====================
 # STREAMING VERSION
 # =====================
+async def _astream_with_first_token_deadline(prompt: str, deadline: Optional[Deadline]):
+    """llm.astream() dengan batas waktu TTFT dari sisa budget; token berikutnya tidak dibatasi."""
+    stream = rag_engine.llm.astream(prompt).__aiter__()
+    if deadline is not None:
+        try:
+            first = await asyncio.wait_for(stream.__anext__(), timeout=deadline.timeout_for(30, floor=8))
+        except StopAsyncIteration:
+            return
+        yield first
+    async for chunk in stream:
+        yield chunk
+
+
 async def answer_question_stream(
     question: str,
     session_id: str,
     cancellation_check: Optional[Callable] = None,
     out_context: Optional[dict] = None,
+    deadline: Optional[Deadline] = None,
 ):
     """
     Async generator version of answer_question_async.
     Yields raw text chunks (tokens) from the LLM for streaming responses.
     All preprocessing is identical; only the final LLM call uses astream().
+    Dengan deadline, token pertama wajib datang sebelum budget habis (min 8s).
     """
     async def check_cancelled():
         if cancellation_check:
@@ -687,6 +833,8 @@ async def answer_question_stream(
     await check_cancelled()
     start_time = time.time()
     metrics.queries += 1
+    _prompt_sent = False
+    full_response = ""
 
     try:
         is_valid, err_msg = validate_input(question)
@@ -697,7 +845,7 @@ async def answer_question_stream(
         await check_cancelled()
 
         with langfuse_observation("query_analysis", input={"question": question}) as _sp_analysis:
-            analysis = await rag_engine.query_analyzer.analyze_async(question)
+            analysis = await rag_engine.query_analyzer.analyze_async(question, deadline=deadline)
             if _sp_analysis:
                 _sp_analysis.update(output={
                     "keywords": analysis.get("search_keywords"),
@@ -740,7 +888,7 @@ async def answer_question_stream(
         )
 
         with langfuse_observation("vector_retrieval", input={"keywords": keywords, "scope": scope, "doc_type": doc_type}) as _sp_ret:
-            matches = await retrieve_context_async(question, keywords, scope, sop_topic=analysis.get('sop_topic', 'general'))
+            matches = await retrieve_context_async(question, keywords, scope, sop_topic=analysis.get('sop_topic', 'general'), deadline=deadline)
             before_filter = len(matches)
             filtered = [m for m in matches if m.get('score', 0.0) >= RAG_MIN_SCORE]
             # Jaga minimal 3 chunk agar LLM tidak false-negative "tidak ditemukan"
@@ -818,7 +966,9 @@ async def answer_question_stream(
                 dur_hrs = travel_data.get('duration_hours', 0)
                 logger.info(f"🛣️  TravelAnalyzer injected: route={route_str}, dist={dist_km}km, dur={dur_hrs}hrs")
                 if scope == 'international':
-                    _idr_rate = await get_usd_idr_rate()
+                    _idr_rate = await get_usd_idr_rate(
+                        allow_fetch=budget_allows(deadline, "cached_fx_rate", DEADLINE_MIN_FX_FETCH)
+                    )
                     tool_info = HRTravelPolicy.get_international_policy_injection(route_str, dur_hrs, idr_rate=_idr_rate)
                 else:
                     tool_info = HRTravelPolicy.get_domestic_policy_injection(route_str, dist_km, dur_hrs)
@@ -892,9 +1042,9 @@ Anda adalah Asisten Profesional HRD PT Semen Indonesia.
 
         await check_cancelled()
 
-        full_response = ""
         with langfuse_observation("llm_generation", input={"prompt_length": len(prompt), "model": LLM_MODEL}) as _sp_gen:
-            async for chunk in rag_engine.llm.astream(prompt):
+            _prompt_sent = True
+            async for chunk in _astream_with_first_token_deadline(prompt, deadline):
                 if chunk.content:
                     cleaned_chunk = chunk.content.replace('```html', '').replace('```', '')
                     full_response += cleaned_chunk
@@ -907,14 +1057,18 @@ Anda adalah Asisten Profesional HRD PT Semen Indonesia.
             if _sp_gen:
                 _sp_gen.update(output={"response_length": len(full_response)})
 
+        metrics.observe_generation(len(prompt), len(full_response))
         metrics.successful_responses += 1
         metrics.avg_response_time = ((metrics.avg_response_time * (metrics.queries - 1)) + (time.time() - start_time)) / metrics.queries
         logger.info(f"✅ Stream Success in {time.time() - start_time:.2f}s")
+        if deadline is not None and deadline.degradations:
+            logger.info(f"⏳ RAG stream degradations: {', '.join(deadline.degradations)}")
 
     except asyncio.CancelledError:
         logger.warning(f"🛑 RAG stream cancelled for session {session_id}")
         metrics.failed_responses += 1
         metrics.cancelled_requests += 1
+        _record_cancel_savings(start_time, _prompt_sent, len(full_response), stage="rag_stream")
         raise
     except Exception as e:
         logger.error(f"❌ Stream Error: {e}", exc_info=True)
@@ -1,6 +1,5 @@
 import os
 import json
-import psycopg2
 import asyncio
 import logging
 from typing import List, Dict
@@ -9,9 +8,8 @@ logger = logging.getLogger(__name__)
 
 class ConstraintInterceptor:
     def __init__(self):
-        # Ambil koneksi Supabase dari .env dan bersihkan formatnya
-        raw_conn_str = os.getenv("SUPABASE_CONNECTION_STRING", "")
-        self.db_conn_str = raw_conn_str.strip().strip("'").strip('"').replace("postgres://", "postgresql://", 1)
+        # Koneksi lewat pool HR bersama (engines.hr.database.db_manager) — bukan connect baru per file
+        self.db_conn_str = os.getenv("SUPABASE_CONNECTION_STRING", "").strip()
         
         # ✅ SIMPLE CACHE: Store guardrails by filename
         self._guardrails_cache = {}
@@ -31,22 +29,19 @@ class ConstraintInterceptor:
 
         def _fetch():
             try:
-                conn = psycopg2.connect(self.db_conn_str)
-                cursor = conn.cursor()
-
-                # Tarik data JSONB dari database
-                cursor.execute("""
-                    SELECT rules_json 
-                    FROM sop.document_rules 
-                    WHERE filename = %s;
-                """, (filename,))
-                
-                result = cursor.fetchone()
-                cursor.close()
-                conn.close()
-
-                if result and result[0]:
-                    rules_data = result[0]
+                from engines.hr.database.db_manager import get_db_manager
+                with get_db_manager().get_connection() as conn:
+                    with conn.cursor() as cursor:
+                        # Tarik data JSONB dari database
+                        cursor.execute("""
+                            SELECT rules_json 
+                            FROM sop.document_rules 
+                            WHERE filename = %s;
+                        """, (filename,))
+                        result = cursor.fetchone()
+
+                if result and result["rules_json"]:
+                    rules_data = result["rules_json"]
                     if isinstance(rules_data, str):
                         rules_data = json.loads(rules_data)
                     
@@ -23,11 +23,17 @@ _cache: dict = {
 _lock = asyncio.Lock()
 
 
-async def get_usd_idr_rate() -> float:
+async def get_usd_idr_rate(allow_fetch: bool = True) -> float:
     """
     Return current USD → IDR rate.
     Cached for CACHE_TTL_HOURS hours. Falls back to _FALLBACK_RATE on error.
+    allow_fetch=False (budget request menipis) → langsung pakai cache/fallback tanpa HTTP.
     """
+    if not allow_fetch:
+        rate = _cache["rate"] or _fallback_with_cache()
+        logger.info(f"💱 USD/IDR rate (deadline, no fetch): {rate:,.0f}")
+        return rate
+
     async with _lock:
         age = time.time() - _cache["fetched_at"]
         if _cache["rate"] and age < CACHE_TTL_HOURS * 3600:
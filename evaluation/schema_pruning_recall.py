@@ -0,0 +1,111 @@
+"""
+SCHEMA PRUNING RECALL EVALUATION
+================================
+Mengukur apakah engines/hr/query/schema_retriever.py pernah membuang kolom yang
+dibutuhkan: untuk setiap pasangan (pertanyaan, SQL benar), kolom yang dipakai
+SQL harus termasuk kolom yang ditulis lengkap di prompt hasil pruning.
+
+Sumber kasus:
+    --cases file.jsonl        satu JSON per baris: {"question": "...", "sql": "..."}
+    --from-history N          N pesan terakhir chat_memory yang punya sql_query + last_query
+
+Schema diambil dari database hr (SUPABASE_CONNECTION_STRING) atau dari dump
+SchemaReader.get_schema() dengan --schema-json.
+
+Contoh:
+    python -m evaluation.schema_pruning_recall --from-history 200 --embeddings
+"""
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, List
+
+
+def _load_cases(args) -> List[Dict[str, str]]:
+    cases = []
+    if args.cases:
+        with open(args.cases, encoding="utf-8") as f:
+            cases.extend(json.loads(line) for line in f if line.strip())
+    if args.from_history:
+        from memory.memory_supabase import supabase
+        res = (
+            supabase.table("chat_memory")
+            .select("last_query, sql_query")
+            .not_.is_("sql_query", "null")
+            .not_.is_("last_query", "null")
+            .order("created_at", desc=True)
+            .limit(args.from_history)
+            .execute()
+        )
+        cases.extend({"question": r["last_query"], "sql": r["sql_query"]} for r in res.data or [])
+    return [c for c in cases if c.get("question") and c.get("sql")]
+
+
+def _load_schema(args) -> Dict[str, Any]:
+    if args.schema_json:
+        with open(args.schema_json, encoding="utf-8") as f:
+            return json.load(f)
+    from engines.hr.database.db_manager import get_db_manager
+    from engines.hr.database.schema_reader import SchemaReader
+    return SchemaReader(db_manager=get_db_manager()).build_schema()
+
+
+def evaluate(cases: List[Dict[str, str]], schema: Dict[str, Any], embed_client=None) -> Dict[str, Any]:
+    from engines.hr.query.schema_retriever import SchemaRetriever, selection_recall
+
+    retriever = SchemaRetriever()
+    results, misses = [], []
+    unpruned = 0
+    for case in cases:
+        selection = retriever.select(case["question"], schema, embed_client=embed_client)
+        if selection is None:
+            unpruned += 1
+            continue
+        recall, missed = selection_recall(selection, case["sql"], schema)
+        if recall is None:
+            continue
+        results.append(recall)
+        if missed:
+            misses.append({"question": case["question"], "missed": sorted(f"{t}.{c}" for t, c in missed)})
+
+    status = retriever.status()
+    return {
+        "cases": len(cases),
+        "evaluated": len(results),
+        "unpruned": unpruned,
+        "recall_avg": round(sum(results) / len(results), 4) if results else None,
+        "recall_min": round(min(results), 4) if results else None,
+        "perfect_recall_rate": round(sum(1 for r in results if r >= 1.0) / len(results), 4) if results else None,
+        "column_ratio": status["column_ratio"],
+        "misses": misses,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Recall evaluation untuk schema pruning NL→SQL")
+    parser.add_argument("--cases", help="JSONL {question, sql}")
+    parser.add_argument("--from-history", type=int, default=0, help="ambil N kasus dari chat_memory")
+    parser.add_argument("--schema-json", help="dump SchemaReader.get_schema() (default: baca database)")
+    parser.add_argument("--embeddings", action="store_true", help="pakai skor embedding (butuh OPENAI_API_KEY)")
+    args = parser.parse_args()
+
+    cases = _load_cases(args)
+    if not cases:
+        print("❌ Tidak ada kasus (pakai --cases atau --from-history)")
+        return 1
+
+    embed_client = None
+    if args.embeddings:
+        from openai import OpenAI
+        from app.config import OPENAI_API_KEY
+        embed_client = OpenAI(api_key=OPENAI_API_KEY)
+
+    report = evaluate(cases, _load_schema(args), embed_client=embed_client)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    # Exit code != 0 kalau ada kolom yang terbuang → bisa dipakai sebagai gate di CI
+    return 0 if not report["misses"] else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
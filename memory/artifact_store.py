@@ -0,0 +1,180 @@
+"""
+HR Analytics Artifact Store
+===========================
+Sebelumnya hasil query HR analytics (columns + rows + SQL + chart hints) di-
+URL-encode ke <span class="denai-hidden-payload" data-payload="..."> dan ikut
+tersimpan di teks pesan assistant. Akibatnya setiap load /history menarik
+ulang seluruh rows (bisa ratusan KB per pesan), padahal user jarang membuka
+ulang tabel/chart lama.
+
+Sekarang payload disimpan SEKALI sebagai artifact terpisah:
+- JSON kanonik → gzip → content hash sha256 (hasil identik = satu blob)
+- Supabase: chat_artifact_blobs (hash) + chat_artifacts (turn_id → hash),
+  ditulis lewat persistence queue (write-behind, ikut spool kalau gagal)
+- Redis `denai:artifact:{turn_id}` (ARTIFACT_REDIS_TTL) + near-cache per
+  worker, jadi artifact yang baru dibuat bisa langsung di-fetch worker mana pun
+
+Pesan hanya membawa marker kecil:
+    <span class="denai-artifact" data-artifact="{turn_id}" data-rows="N"></span>
+Frontend mem-fetch GET /artifacts/{turn_id} saat user membuka tabel/chart.
+Pesan lama dengan denai-hidden-payload tetap didukung frontend.
+"""
+
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import urllib.parse
+import uuid
+from typing import Any, Dict, Optional
+
+from app.config import ARTIFACT_REDIS_TTL, ARTIFACT_NEAR_CACHE_MAX
+from backend.utils.ttl_cache import TTLCache, MISSING
+
+logger = logging.getLogger(__name__)
+
+ENCODING = "gzip+base64"
+
+
+def _redis():
+    try:
+        from memory.memory_hybrid import redis_client, REDIS_AVAILABLE
+        return redis_client if REDIS_AVAILABLE else None
+    except Exception:
+        return None
+
+
+def _redis_key(turn_id: str) -> str:
+    return f"denai:artifact:{turn_id}"
+
+
+def _encode(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON kanonik (sort_keys) → sha256 + gzip. Dipanggil lewat asyncio.to_thread."""
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+    packed = gzip.compress(raw, compresslevel=6, mtime=0)
+    return {
+        "hash": hashlib.sha256(raw).hexdigest(),
+        "gz": packed,
+        "raw_size": len(raw),
+        "stored_size": len(packed),
+    }
+
+
+def legacy_hidden_span(payload: Dict[str, Any]) -> str:
+    """Format lama (payload inline) — fallback kalau artifact gagal dibuat."""
+    safe_json = urllib.parse.quote(json.dumps(payload, default=str))
+    return f'<span class="denai-hidden-payload" data-payload="{safe_json}" style="display:none"></span>'
+
+
+class ArtifactStore:
+    def __init__(self):
+        # turn_id → {"session_id", "hash", "row_count", "gz"} (bytes gzip, hemat memori)
+        self._near = TTLCache(maxsize=ARTIFACT_NEAR_CACHE_MAX, ttl=ARTIFACT_REDIS_TTL)
+        self.stored = 0
+        self.bytes_raw = 0
+        self.bytes_stored = 0
+
+    async def put(self, session_id: str, payload: Dict[str, Any], turn_id: str = "") -> str:
+        """Simpan payload analytics, return marker HTML untuk ditempel ke pesan assistant."""
+        turn_id = str(turn_id or f"{session_id}-{uuid.uuid4().hex[:12]}")
+        rows = (payload or {}).get("rows")
+        row_count = len(rows) if isinstance(rows, list) else 0
+        try:
+            enc = await asyncio.to_thread(_encode, payload)
+        except Exception as e:
+            logger.error(f"❌ Artifact encode gagal, pakai payload inline: {e}")
+            return legacy_hidden_span(payload)
+
+        record = {"session_id": session_id, "hash": enc["hash"], "row_count": row_count, "gz": enc["gz"]}
+        self._near.set(turn_id, record)
+        self.stored += 1
+        self.bytes_raw += enc["raw_size"]
+        self.bytes_stored += enc["stored_size"]
+
+        b64 = base64.b64encode(enc["gz"]).decode("ascii")
+        client = _redis()
+        if client is not None:
+            try:
+                from memory.redis_pipeline import timed
+                value = json.dumps({"session_id": session_id, "hash": enc["hash"], "row_count": row_count, "data": b64})
+                await timed("artifact.set", client.set(_redis_key(turn_id), value, ex=ARTIFACT_REDIS_TTL))
+            except Exception as e:
+                logger.warning(f"⚠️ Artifact Redis set gagal: {e}")
+
+        try:
+            from memory.persistence_queue import persistence_queue
+            persistence_queue.enqueue_artifact({
+                "turn_id": turn_id, "session_id": session_id, "hash": enc["hash"], "row_count": row_count,
+                "encoding": ENCODING, "data": b64, "raw_size": enc["raw_size"], "stored_size": enc["stored_size"],
+            })
+        except Exception as e:
+            logger.warning(f"⚠️ Artifact tidak masuk persistence queue: {e}")
+
+        logger.info(
+            f"📦 Artifact {enc['hash'][:10]} | turn={turn_id[-12:]} | rows={row_count} | "
+            f"{enc['raw_size']}B → {enc['stored_size']}B"
+        )
+        return (
+            f'<span class="denai-artifact" data-artifact="{urllib.parse.quote(turn_id, safe="-_.")}" '
+            f'data-rows="{row_count}" style="display:none"></span>'
+        )
+
+    async def get(self, turn_id: str) -> Optional[Dict[str, Any]]:
+        """{"session_id", "hash", "row_count", "gz"} atau None. Near-cache → Redis → queue → Supabase."""
+        record = self._near.get(turn_id)
+        if record is not MISSING:
+            return record
+
+        client = _redis()
+        if client is not None:
+            try:
+                from memory.redis_pipeline import timed
+                raw = await timed("artifact.get", client.get(_redis_key(turn_id)))
+                if raw:
+                    record = self._from_row(json.loads(raw) if isinstance(raw, str) else raw)
+                    self._near.set(turn_id, record)
+                    return record
+            except Exception as e:
+                logger.debug(f"Artifact Redis get gagal: {e}")
+
+        try:
+            from memory.persistence_queue import persistence_queue
+            row = persistence_queue.pending_artifact(turn_id)
+        except Exception:
+            row = None
+        if row is None:
+            try:
+                from memory.memory_supabase import get_artifact_row
+                row = await asyncio.to_thread(get_artifact_row, turn_id)
+            except Exception as e:
+                logger.warning(f"⚠️ Artifact Supabase gagal: {e}")
+                return None
+        if not row or not row.get("data"):
+            return None
+
+        record = self._from_row(row)
+        self._near.set(turn_id, record)
+        return record
+
+    @staticmethod
+    def _from_row(row: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "session_id": row.get("session_id") or "",
+            "hash": row.get("hash") or "",
+            "row_count": row.get("row_count") or 0,
+            "gz": base64.b64decode(row["data"]),
+        }
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "stored": self.stored,
+            "bytes_raw": self.bytes_raw,
+            "bytes_stored": self.bytes_stored,
+            "compression_ratio": round(self.bytes_raw / self.bytes_stored, 1) if self.bytes_stored else 0,
+            "near_cache": self._near.stats(),
+        }
+
+
+artifact_store = ArtifactStore()
@@ -2,21 +2,33 @@
 Hybrid Memory Manager (Supabase + Upstash Redis)
 =================================================
 Mengatur caching di RAM (Redis) secara ASYNC dan penyimpanan permanen di Disk (Supabase).
+Tulis ke Supabase lewat write-behind queue (memory.persistence_queue) — tidak
+lagi menahan event `done` menunggu round trip Supabase.
+Operasi Redis multi-perintah dikirim sebagai satu pipeline (memory.redis_pipeline).
 """
 import logging
 import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 from app.config import UPSTASH_REDIS_URL, UPSTASH_REDIS_TOKEN
+from memory.redis_pipeline import RedisBatch, timed
 
 import re
 
 logger = logging.getLogger(__name__)
 
+HISTORY_TTL = 86400      # 24 jam
+HISTORY_MAX_ITEMS = 20   # cap list Redis per session
+
+def _history_key(session_id: str) -> str:
+    return f"chat:{session_id}"
+
 def _strip_html_payload(content: str) -> str:
     """Buang HANYA hidden payload span sebelum disimpan ke Redis.
     HTML formatting (h3, p, strong, dll) DIPERTAHANKAN agar tampilan history
-    sama persis dengan saat pertama kali di-render."""
+    sama persis dengan saat pertama kali di-render.
+    Marker <span class="denai-artifact"> (referensi artifact, beberapa byte) tetap
+    disimpan supaya tabel/chart bisa dibuka ulang dari history Redis."""
     if not content:
         return content
     # Hanya buang <span class="denai-hidden-payload"> yang berisi encoded JSON besar
@@ -27,7 +39,8 @@ def _strip_html_payload(content: str) -> str:
 # 1. INIT SUPABASE (Async Wrappers)
 # ---------------------------------------------------------
 try:
-    from memory.memory_supabase import get_recent_history_async, save_message_async, save_session
+    from memory.memory_supabase import get_recent_history_async
+    from memory.persistence_queue import persistence_queue
     import asyncio
     MEMORY_AVAILABLE = True
 except ImportError:
@@ -53,6 +66,18 @@ except Exception as e:
     REDIS_AVAILABLE = False
     logger.warning(f"⚠️ Redis belum aktif. Error: {e}")
 
+# Tanpa Upstash tapi ada Redis self-hosted (REDIS_URL) → pakai client redis-py yang sama
+if not REDIS_AVAILABLE:
+    try:
+        from backend.services.redis_bus import get_bus_client
+        redis_client = get_bus_client()
+        REDIS_AVAILABLE = redis_client is not None
+        if REDIS_AVAILABLE:
+            logger.info("⚡ Chat history cache memakai Redis TCP (REDIS_URL)")
+    except Exception:
+        redis_client = None
+        REDIS_AVAILABLE = False
+
 # ---------------------------------------------------------
 # CORE HYBRID FUNCTIONS (FULLY ASYNC)
 # ---------------------------------------------------------
@@ -63,23 +88,16 @@ async def setup_hybrid_session(session_id: str, initial_message: str, nik: str =
     # Kalau Redis sudah ada history untuk session ini, session sudah terbuat — skip Supabase
     if REDIS_AVAILABLE:
         try:
-            exists = await redis_client.exists(f"chat:{session_id}")
+            exists = await timed("session.exists", redis_client.exists(_history_key(session_id)))
             if exists:
                 return
         except Exception:
             pass
 
     if MEMORY_AVAILABLE:
-        history = await get_recent_history_async(session_id, limit=1)
-        if not history:
-            # save_session masih sync, kita lempar ke thread agar aman
-            await asyncio.to_thread(save_session, session_id, initial_message[:50] + "...", nik)
-            # Invalidate sessions list cache agar sidebar langsung tampil session baru
-            try:
-                from backend.api.sessions import _invalidate_sessions_cache
-                _invalidate_sessions_cache()
-            except Exception:
-                pass
+        # Insert-if-absent di-queue (tanpa SELECT dulu); sidebar di-invalidate dan owner
+        # di-prime oleh queue setelah baris session benar-benar ter-INSERT (bukan sudah ada)
+        persistence_queue.ensure_session(session_id, initial_message[:50] + "...", nik)
 
 async def get_hybrid_history(session_id: str, limit: int = 4) -> List[Dict[str, Any]]:
     """Mengambil history dengan prioritas: 1. Redis (RAM), 2. Supabase (Disk)"""
@@ -88,7 +106,7 @@ async def get_hybrid_history(session_id: str, limit: int = 4) -> List[Dict[str,
     if REDIS_AVAILABLE:
         try:
             # 🐛 FIX BUG: Gunakan index negatif untuk menarik data terbaru dari ujung kanan list
-            cached_data = await redis_client.lrange(f"chat:{session_id}", -limit, -1)
+            cached_data = await timed("history.read", redis_client.lrange(_history_key(session_id), -limit, -1))
             if cached_data:
                 logger.info("⚡ History ditarik INSTAN dari Redis!")
                 return [json.loads(msg) if isinstance(msg, str) else msg for msg in cached_data]
@@ -99,45 +117,68 @@ async def get_hybrid_history(session_id: str, limit: int = 4) -> List[Dict[str,
     if MEMORY_AVAILABLE:
         logger.info("💾 History ditarik dari Supabase (Lalu di-cache ke Redis)")
         history = await get_recent_history_async(session_id, limit=limit)
+        # Pesan yang masih di write-behind queue belum ada di Supabase
+        pending = persistence_queue.pending_messages(session_id)
+        if pending:
+            history = (list(history) + pending)[-limit:]
         
         # Simpan kembali ke Redis biar pemanggilan berikutnya kencang
+        # (delete + rpush semua pesan + expire = satu transaksi, satu round trip)
         if REDIS_AVAILABLE and history:
             try:
-                await redis_client.delete(f"chat:{session_id}") 
+                items = []
                 for msg in history:
                     msg_dict = msg if isinstance(msg, dict) else msg.__dict__
                     # Ekstrak waktu/data complex agar aman saat di json.dumps
                     safe_dict = {k: v for k, v in msg_dict.items() if k in ["role", "message"]}
-                    await redis_client.rpush(f"chat:{session_id}", json.dumps(safe_dict))
-                await redis_client.expire(f"chat:{session_id}", 86400) # Expire 24 Jam
-            except Exception:
-                pass
+                    items.append(json.dumps(safe_dict))
+                key = _history_key(session_id)
+                await (
+                    RedisBatch(redis_client, "history.rehydrate")
+                    .add("delete", key)
+                    .add("rpush", key, *items)
+                    .add("expire", key, HISTORY_TTL)
+                    .execute()
+                )
+            except Exception as e:
+                logger.debug(f"Redis rehydrate gagal: {e}")
         return history
     
     return []
 
+async def _append_redis_history(session_id: str, messages: List[Dict[str, str]], op: str) -> None:
+    """rpush semua pesan + ltrim + expire dalam satu transaksi."""
+    if not REDIS_AVAILABLE or not messages:
+        return
+    try:
+        key = _history_key(session_id)
+        items = [json.dumps({"role": m["role"], "message": _strip_html_payload(m["message"])}) for m in messages]
+        await (
+            RedisBatch(redis_client, op)
+            .add("rpush", key, *items)
+            .add("ltrim", key, -HISTORY_MAX_ITEMS, -1)  # cap list 20 pesan terakhir
+            .add("expire", key, HISTORY_TTL)
+            .execute()
+        )
+    except Exception as e:
+        logger.error(f"❌ Redis Save Error: {e}")
+
 async def save_hybrid_message(session_id: str, role: str, content: str, **kwargs):
-    """Menyimpan pesan secara paralel ke Supabase dan Redis"""
-    
-    tasks = []
-    
-    # Task 1: Simpan ke Supabase (Permanen)
+    """Menyimpan pesan ke Redis (langsung) dan Supabase (write-behind queue)"""
+    # Supabase (Permanen): cukup enqueue — di-batch & di-flush di background
     if MEMORY_AVAILABLE:
-        tasks.append(save_message_async(session_id, role, content, **kwargs))
-    
-    # Task 2: Simpan ke Redis (Cache Sementara)
-    if REDIS_AVAILABLE:
-        async def save_to_redis():
-            try:
-                msg_obj = {"role": role, "message": _strip_html_payload(content)}
-                await redis_client.rpush(f"chat:{session_id}", json.dumps(msg_obj))
-                await redis_client.ltrim(f"chat:{session_id}", -20, -1)  # cap list 20 pesan terakhir
-                await redis_client.expire(f"chat:{session_id}", 86400)
-            except Exception as e:
-                logger.error(f"❌ Redis Save Error: {e}")
-        
-        tasks.append(save_to_redis())
-    
-    # Jalankan kedua task penyimpanan secara bersamaan tanpa saling menunggu lama
-    if tasks:
-        await asyncio.gather(*tasks)
\ No newline at end of file
+        persistence_queue.enqueue_message(session_id, role, content, **kwargs)
+    # Redis (Cache Sementara)
+    await _append_redis_history(session_id, [{"role": role, "message": content}], "history.append")
+
+async def save_hybrid_turn(session_id: str, question: str, answer: Optional[str] = None, **kwargs):
+    """Simpan pasangan user + assistant satu turn: satu round trip Redis, bukan dua.
+    kwargs (sql_query, dll) hanya untuk pesan assistant."""
+    messages = [{"role": "user", "message": question}]
+    if answer:
+        messages.append({"role": "assistant", "message": answer})
+    if MEMORY_AVAILABLE:
+        persistence_queue.enqueue_message(session_id, "user", question)
+        if answer:
+            persistence_queue.enqueue_message(session_id, "assistant", answer, **kwargs)
+    await _append_redis_history(session_id, messages, "history.append_turn")
\ No newline at end of file
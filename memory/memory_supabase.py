@@ -3,9 +3,12 @@ DENAI Memory Management (Supabase)
 Handles chat history, sessions, and memory persistence safely.
 """
 
+import base64
 import logging
 import asyncio
+import time
 from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
 from supabase import create_client, Client
 
 from app.config import (
@@ -82,12 +85,60 @@ def save_session(session_id: str, title: str, nik: str = ""):
     except Exception as e:
         logger.error(f"❌ Failed to save session: {e}")
 
+# RPC list_chat_sessions (memory/migrations/001_session_listing.sql). Kalau
+# migrasi belum dijalankan, fallback ke query lama dan RPC dicoba lagi nanti.
+_SESSIONS_RPC_RETRY_SECONDS = 300
+_sessions_rpc_disabled_until = 0.0
+
+def encode_session_cursor(session: dict) -> str:
+    """Cursor keyset dari baris terakhir halaman: (pinned, last_message_at, session_id)."""
+    raw = f"{1 if session.get('pinned') else 0}|{session.get('last_message_at') or ''}|{session['session_id']}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_session_cursor(cursor: str) -> Optional[Tuple[bool, str, str]]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        pinned, last_at, session_id = raw.split("|", 2)
+        if not last_at or not session_id:
+            return None
+        return pinned == "1", last_at, session_id
+    except Exception:
+        return None
+
+def get_sessions_page(nik: str = None, limit: int = 30, cursor: str = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    Satu halaman sidebar via RPC (index scan di Postgres) → (sessions, next_cursor).
+    Tanpa RPC: fallback get_sessions() lama (tanpa pagination, next_cursor=None).
+    """
+    global _sessions_rpc_disabled_until
+    if not supabase: return [], None
+    if time.monotonic() >= _sessions_rpc_disabled_until:
+        params = {"p_nik": nik or None, "p_limit": limit}
+        if cursor:
+            decoded = decode_session_cursor(cursor)
+            if decoded is None:
+                return [], None
+            params.update({"p_cursor_pinned": decoded[0], "p_cursor_last": decoded[1], "p_cursor_id": decoded[2]})
+        try:
+            res = supabase.rpc("list_chat_sessions", params).execute()
+            sessions = res.data or []
+            next_cursor = encode_session_cursor(sessions[-1]) if len(sessions) >= limit else None
+            return sessions, next_cursor
+        except Exception as e:
+            _sessions_rpc_disabled_until = time.monotonic() + _SESSIONS_RPC_RETRY_SECONDS
+            logger.warning(f"⚠️ RPC list_chat_sessions tidak tersedia (jalankan migrasi 001), fallback: {e}")
+    if cursor:
+        return [], None
+    return get_sessions(nik, limit), None
+
 def get_sessions(nik: str = None, limit: int = 30):
     """
     Kembalikan sesi milik user yang didentifikasi oleh NIK.
     nik=None → tampilkan semua (mode dev/standalone).
     nik=""   → hanya sesi tanpa NIK (fallback backwards-compat).
     nik="xxx"→ filter ketat per user.
+
+    Query lama (fallback kalau RPC list_chat_sessions belum ada) — pakai get_sessions_page().
     """
     if not supabase: return []
     try:
@@ -125,6 +176,18 @@ def get_sessions(nik: str = None, limit: int = 30):
         logger.error(f"❌ Failed to get sessions: {e}")
         return []
 
+def get_session_meta(session_id: str):
+    """Metadata satu session (untuk session_cache). None kalau tidak ada."""
+    if not supabase: return None
+    res = (
+        supabase.table("chat_sessions")
+        .select("session_id,nik,title,pinned,last_message_at")
+        .eq("session_id", session_id)
+        .limit(1)
+        .execute()
+    )
+    return res.data[0] if res.data else None
+
 def get_session_owner(session_id: str) -> str:
     """Ambil NIK pemilik session. Return '' jika tidak ada / sesi lama."""
     if not supabase: return ""
@@ -169,6 +232,65 @@ def cleanup_old_sessions(days: int = None):
     except Exception as e:
         logger.error(f"❌ Error cleaning up sessions: {e}")
 
+# =========================================================
+# 📦 BULK WRITES (dipakai memory.persistence_queue)
+# Berbeda dari fungsi di atas, error TIDAK ditelan — queue perlu tahu
+# kapan harus spool & retry.
+# =========================================================
+MESSAGE_EXTRA_FIELDS = ("sql_query", "sql_explanation", "last_query")
+
+def save_sessions_bulk(rows: list) -> list:
+    """Insert session baru; session yang sudah ada dibiarkan (title/pinned tidak tertimpa).
+    Return baris yang BENAR-BENAR ter-insert (ON CONFLICT DO NOTHING hanya mengembalikan itu)."""
+    if not supabase or not rows: return []
+    res = supabase.table("chat_sessions").upsert(rows, on_conflict="session_id", ignore_duplicates=True).execute()
+    return res.data or []
+
+def save_messages_bulk(rows: list):
+    """Satu INSERT untuk banyak pesan lintas session. created_at diisi oleh queue
+    (waktu enqueue) agar urutan user → assistant tetap benar dalam satu statement."""
+    if not supabase or not rows: return
+    supabase.table("chat_memory").insert(rows).execute()
+
+def touch_sessions_bulk(session_ids: list, last_message_at: str):
+    """Update last_message_at banyak session sekaligus (nilai = pesan terakhir di batch)."""
+    if not supabase or not session_ids: return
+    supabase.table("chat_sessions").update({"last_message_at": last_message_at}).in_("session_id", session_ids).execute()
+
+def save_artifacts_bulk(rows: list):
+    """Artifact analytics: blob (content-addressed, dedupe by hash) lalu referensi turn_id.
+    rows = [{turn_id, session_id, hash, row_count, encoding, data, raw_size, stored_size}]"""
+    if not supabase or not rows: return
+    blobs = {}
+    for r in rows:
+        blobs.setdefault(r["hash"], {k: r[k] for k in ("hash", "encoding", "data", "raw_size", "stored_size")})
+    supabase.table("chat_artifact_blobs").upsert(list(blobs.values()), on_conflict="hash", ignore_duplicates=True).execute()
+    refs = [{k: r[k] for k in ("turn_id", "session_id", "hash", "row_count")} for r in rows]
+    supabase.table("chat_artifacts").upsert(refs, on_conflict="turn_id").execute()
+
+def save_slow_queries_bulk(rows: list):
+    """Log cost guard query HR (ditolak / di-rewrite / timeout / lambat) untuk tuning index."""
+    if not supabase or not rows: return
+    supabase.table("hr_slow_queries").insert(rows).execute()
+
+def get_artifact_row(turn_id: str):
+    """Referensi + blob satu artifact (satu request lewat embed FK). None kalau tidak ada."""
+    if not supabase: return None
+    res = (
+        supabase.table("chat_artifacts")
+        .select("turn_id,session_id,hash,row_count,chat_artifact_blobs(encoding,data)")
+        .eq("turn_id", turn_id)
+        .limit(1)
+        .execute()
+    )
+    if not res.data:
+        return None
+    row = res.data[0]
+    blob = row.pop("chat_artifact_blobs", None) or {}
+    if isinstance(blob, list):
+        blob = blob[0] if blob else {}
+    return {**row, "encoding": blob.get("encoding"), "data": blob.get("data")}
+
 # =========================================================
 # 🚀 ASYNC WRAPPERS
 # =========================================================
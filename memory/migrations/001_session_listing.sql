@@ -0,0 +1,159 @@
+-- =====================================================================
+-- 001 - Session listing di Postgres (message_count + keyset pagination)
+-- =====================================================================
+-- Sebelumnya get_sessions() menarik 500 baris chat_memory hanya untuk tahu
+-- session mana yang punya pesan, lalu memfilter limit*3 session di Python
+-- (salah begitu pesan > 500). Sekarang:
+--   * chat_sessions.message_count & last_message_at dijaga trigger
+--     statement-level (bulk insert dari persistence queue = 1 UPDATE per session)
+--   * RPC list_chat_sessions(): filter NIK + keyset (pinned, last_message_at,
+--     session_id) di atas partial index → satu index scan per halaman
+--
+-- Jalankan sekali:  psql "$SUPABASE_CONNECTION_STRING" -f memory/migrations/001_session_listing.sql
+-- Idempotent — aman dijalankan ulang.
+
+begin;
+
+-- ── Kolom ────────────────────────────────────────────────────────────
+alter table chat_sessions add column if not exists message_count integer not null default 0;
+alter table chat_sessions add column if not exists last_message_at timestamptz;
+
+-- NIK kosong dinormalisasi ke '' (sesi lama tanpa NIK) supaya filter NIK
+-- cukup dua equality lookup, bukan OR dengan IS NULL
+update chat_sessions set nik = '' where nik is null;
+alter table chat_sessions alter column nik set default '';
+-- Keyset memakai row comparison → pinned tidak boleh NULL
+update chat_sessions set pinned = false where pinned is null;
+alter table chat_sessions alter column pinned set default false;
+
+-- ── Backfill ─────────────────────────────────────────────────────────
+update chat_sessions s
+set message_count   = agg.cnt,
+    last_message_at = greatest(s.last_message_at, agg.last_at)
+from (
+    select session_id, count(*)::integer as cnt, max(created_at) as last_at
+    from chat_memory
+    group by session_id
+) agg
+where agg.session_id = s.session_id;
+
+update chat_sessions s
+set message_count = 0
+where message_count <> 0
+  and not exists (select 1 from chat_memory m where m.session_id = s.session_id);
+
+-- ── Trigger: jaga message_count & last_message_at ───────────────────
+create or replace function chat_memory_after_insert() returns trigger
+language plpgsql as $$
+begin
+    update chat_sessions s
+    set message_count   = s.message_count + d.cnt,
+        last_message_at = greatest(coalesce(s.last_message_at, d.last_at), d.last_at)
+    from (
+        select session_id, count(*)::integer as cnt, max(created_at) as last_at
+        from new_rows
+        group by session_id
+    ) d
+    where d.session_id = s.session_id;
+    return null;
+end;
+$$;
+
+create or replace function chat_memory_after_delete() returns trigger
+language plpgsql as $$
+begin
+    update chat_sessions s
+    set message_count = greatest(s.message_count - d.cnt, 0)
+    from (
+        select session_id, count(*)::integer as cnt
+        from old_rows
+        group by session_id
+    ) d
+    where d.session_id = s.session_id;
+    return null;
+end;
+$$;
+
+drop trigger if exists chat_memory_count_insert on chat_memory;
+create trigger chat_memory_count_insert
+    after insert on chat_memory
+    referencing new table as new_rows
+    for each statement execute function chat_memory_after_insert();
+
+drop trigger if exists chat_memory_count_delete on chat_memory;
+create trigger chat_memory_count_delete
+    after delete on chat_memory
+    referencing old table as old_rows
+    for each statement execute function chat_memory_after_delete();
+
+-- ── Index ────────────────────────────────────────────────────────────
+-- Partial: hanya session yang punya pesan (anti-ghost) ikut index listing
+create index if not exists chat_sessions_listing_nik_idx
+    on chat_sessions (nik, pinned desc, last_message_at desc, session_id desc)
+    where message_count > 0;
+
+-- Mode dev/standalone (tanpa filter NIK)
+create index if not exists chat_sessions_listing_all_idx
+    on chat_sessions (pinned desc, last_message_at desc, session_id desc)
+    where message_count > 0;
+
+-- get_recent_history: session_id + created_at desc
+create index if not exists chat_memory_session_created_idx
+    on chat_memory (session_id, created_at desc);
+
+-- ── RPC ──────────────────────────────────────────────────────────────
+-- p_nik NULL → semua session; selain itu milik NIK tsb + sesi lama tanpa NIK ('').
+-- Cursor = baris terakhir halaman sebelumnya (pinned, last_message_at, session_id).
+create or replace function list_chat_sessions(
+    p_nik           text        default null,
+    p_limit         integer     default 30,
+    p_cursor_pinned boolean     default null,
+    p_cursor_last   timestamptz default null,
+    p_cursor_id     text        default null
+)
+returns setof chat_sessions
+language sql stable as $$
+    with page as (
+        -- UNION ALL dua index range scan (nik = p_nik, nik = '') — masing-masing
+        -- sudah terurut, jadi Postgres cukup merge + limit
+        (
+            select s.*
+            from chat_sessions s
+            where s.message_count > 0
+              and p_nik is not null and s.nik = p_nik and p_nik <> ''
+              and (p_cursor_id is null
+                   or (s.pinned, s.last_message_at, s.session_id) < (p_cursor_pinned, p_cursor_last, p_cursor_id))
+            order by s.pinned desc, s.last_message_at desc, s.session_id desc
+            limit p_limit
+        )
+        union all
+        (
+            select s.*
+            from chat_sessions s
+            where s.message_count > 0
+              and p_nik is not null and s.nik = ''
+              and (p_cursor_id is null
+                   or (s.pinned, s.last_message_at, s.session_id) < (p_cursor_pinned, p_cursor_last, p_cursor_id))
+            order by s.pinned desc, s.last_message_at desc, s.session_id desc
+            limit p_limit
+        )
+        union all
+        (
+            select s.*
+            from chat_sessions s
+            where s.message_count > 0
+              and p_nik is null
+              and (p_cursor_id is null
+                   or (s.pinned, s.last_message_at, s.session_id) < (p_cursor_pinned, p_cursor_last, p_cursor_id))
+            order by s.pinned desc, s.last_message_at desc, s.session_id desc
+            limit p_limit
+        )
+    )
+    select * from page
+    order by pinned desc, last_message_at desc, session_id desc
+    limit p_limit;
+$$;
+
+grant execute on function list_chat_sessions(text, integer, boolean, timestamptz, text) to anon, authenticated;
+
+commit;
@@ -0,0 +1,51 @@
+-- =====================================================================
+-- 002 - Artifact HR analytics (payload tabel/chart di luar teks pesan)
+-- =====================================================================
+-- Sebelumnya columns + rows hasil query ikut tersimpan di chat_memory.message
+-- sebagai <span class="denai-hidden-payload" data-payload="..."> → setiap load
+-- history menarik ulang seluruh rows. Sekarang (memory/artifact_store.py):
+--   * chat_artifact_blobs : JSON kanonik gzip+base64, PK = sha256 konten
+--                           (hasil query identik hanya disimpan sekali)
+--   * chat_artifacts      : turn_id → hash, milik satu session
+-- Pesan hanya membawa <span class="denai-artifact" data-artifact="{turn_id}">.
+--
+-- Jalankan sekali:  psql "$SUPABASE_CONNECTION_STRING" -f memory/migrations/002_chat_artifacts.sql
+-- Idempotent — aman dijalankan ulang.
+
+begin;
+
+create table if not exists chat_artifact_blobs (
+    hash        text primary key,
+    encoding    text        not null default 'gzip+base64',
+    data        text        not null,
+    raw_size    integer     not null,
+    stored_size integer     not null,
+    created_at  timestamptz not null default now()
+);
+
+create table if not exists chat_artifacts (
+    turn_id    text primary key,
+    -- Hapus session (delete_session_and_messages / cleanup_old_sessions) ikut menghapus referensi
+    session_id text        not null references chat_sessions(session_id) on delete cascade,
+    hash       text        not null references chat_artifact_blobs(hash),
+    row_count  integer     not null default 0,
+    created_at timestamptz not null default now()
+);
+
+create index if not exists chat_artifacts_session_idx on chat_artifacts (session_id);
+create index if not exists chat_artifacts_hash_idx on chat_artifacts (hash);
+
+-- Blob tanpa referensi (session-nya sudah dihapus). Jalankan berkala, mis. dari pg_cron:
+--   select prune_chat_artifact_blobs();
+create or replace function prune_chat_artifact_blobs() returns integer
+language sql as $$
+    with gone as (
+        delete from chat_artifact_blobs b
+        where not exists (select 1 from chat_artifacts a where a.hash = b.hash)
+          and b.created_at < now() - interval '1 day'
+        returning 1
+    )
+    select count(*)::integer from gone;
+$$;
+
+commit;
@@ -0,0 +1,64 @@
+-- =====================================================================
+-- 003 - Log cost guard query HR (bahan tuning index)
+-- =====================================================================
+-- engines/hr/query/cost_guard.py menjalankan EXPLAIN (FORMAT JSON) untuk SQL
+-- hasil LLM sebelum dieksekusi. Baris ditulis (batch, lewat persistence queue)
+-- saat plan:
+--   * reject   : melewati COST_GUARD_MAX_COST / COST_GUARD_MAX_ROWS
+--   * rewrite  : diselamatkan dengan membungkus LIMIT (executed_sql)
+--   * timeout  : kena statement_timeout
+--   * slow     : durasi >= COST_GUARD_SLOW_MS
+--
+-- Jalankan sekali:  psql "$SUPABASE_CONNECTION_STRING" -f memory/migrations/003_hr_slow_queries.sql
+-- Idempotent — aman dijalankan ulang.
+
+begin;
+
+create table if not exists hr_slow_queries (
+    id           bigserial primary key,
+    sql_hash     text             not null,   -- sha1 SQL ternormalisasi (sama dengan key result cache)
+    sql_text     text             not null,
+    executed_sql text,                        -- hanya kalau di-rewrite
+    origin       text,                        -- generated | cache:exact | cache:semantic | template:<nama>
+    decision     text             not null check (decision in ('reject', 'rewrite', 'timeout', 'slow')),
+    reason       text,
+    total_cost   double precision,
+    plan_rows    double precision,            -- estimasi baris terbesar di plan (di luar LIMIT)
+    duration_ms  double precision,
+    plan         jsonb,
+    created_at   timestamptz      not null default now()
+);
+
+create index if not exists hr_slow_queries_hash_idx on hr_slow_queries (sql_hash);
+create index if not exists hr_slow_queries_created_idx on hr_slow_queries (created_at desc);
+
+-- Ringkasan per SQL untuk review index:  select * from hr_slow_query_summary limit 20;
+create or replace view hr_slow_query_summary as
+select
+    sql_hash,
+    min(sql_text)                                   as sql_text,
+    count(*)                                        as occurrences,
+    count(*) filter (where decision = 'reject')     as rejected,
+    count(*) filter (where decision = 'rewrite')    as rewritten,
+    count(*) filter (where decision = 'timeout')    as timeouts,
+    count(*) filter (where decision = 'slow')       as slow,
+    max(total_cost)                                 as max_cost,
+    round(avg(duration_ms)::numeric, 1)             as avg_duration_ms,
+    max(created_at)                                 as last_seen
+from hr_slow_queries
+group by sql_hash
+order by occurrences desc, last_seen desc;
+
+-- Log lama (mis. > 90 hari). Jalankan berkala, mis. dari pg_cron:
+--   select prune_hr_slow_queries();
+create or replace function prune_hr_slow_queries(keep_days integer default 90) returns integer
+language sql as $$
+    with gone as (
+        delete from hr_slow_queries
+        where created_at < now() - make_interval(days => keep_days)
+        returning 1
+    )
+    select count(*)::integer from gone;
+$$;
+
+commit;
@@ -0,0 +1,396 @@
+"""
+Write-Behind Persistence Queue (Supabase)
+=========================================
+Sebelumnya setiap turn selesai melakukan beberapa round trip Supabase berurutan
+SEBELUM event `done` dikirim: save_message x2 (masing-masing INSERT chat_memory
++ UPDATE chat_sessions.last_message_at) plus cek/insert session baru.
+
+Sekarang pipeline chat hanya memasukkan baris ke queue (instan), dan task
+flusher per worker menulis ke Supabase setiap PERSIST_FLUSH_MS:
+
+- Session baru  → satu UPSERT ignore-duplicates untuk semua session di batch
+- Artifact analytics → UPSERT blob (dedupe hash) + referensi turn_id (memory.artifact_store)
+- Pesan         → satu bulk INSERT lintas session (created_at diisi saat enqueue)
+- last_message_at → di-coalesce: satu UPDATE ... IN (session_ids) per timestamp
+- Log query HR lambat/ditolak (engines.hr.query.cost_guard) → bulk INSERT hr_slow_queries,
+  ikut flush berikutnya (boleh di-enqueue dari worker thread)
+
+Kalau Supabase gagal, tahap yang belum tertulis disimpan ke spool JSONL lokal
+(PERSIST_SPOOL_DIR) dan di-retry setiap PERSIST_RETRY_SECONDS. Spool milik
+worker yang sudah mati diambil alih saat startup. Shutdown mem-flush sisa queue.
+
+Catatan: retry INSERT pesan bersifat at-least-once — kalau INSERT sebenarnya
+sukses tapi response-nya gagal, baris bisa tersimpan dua kali.
+"""
+
+import asyncio
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.config import PERSIST_FLUSH_MS, PERSIST_BATCH_MAX, PERSIST_SPOOL_DIR, PERSIST_RETRY_SECONDS
+from memory.memory_supabase import (
+    MESSAGE_EXTRA_FIELDS,
+    save_sessions_bulk,
+    save_artifacts_bulk,
+    save_messages_bulk,
+    touch_sessions_bulk,
+    save_slow_queries_bulk,
+)
+
+logger = logging.getLogger(__name__)
+
+_KNOWN_SESSIONS_MAX = 5000
+_STAGES = ("sessions", "artifacts", "messages", "touch", "slow_queries")
+
+
+@dataclass
+class PersistStats:
+    enqueued_messages: int = 0
+    enqueued_sessions: int = 0
+    enqueued_artifacts: int = 0
+    flushes: int = 0
+    rows_written: int = 0
+    supabase_requests: int = 0
+    failures: int = 0
+    spooled_batches: int = 0
+    spool_replayed_batches: int = 0
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data["rows_per_request"] = round(self.rows_written / self.supabase_requests, 1) if self.supabase_requests else 0
+        return data
+
+
+def _utc_now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class PersistenceQueue:
+    def __init__(self):
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._artifacts: Dict[str, Dict[str, Any]] = {}
+        self._messages: List[Dict[str, Any]] = []
+        self._touch: Dict[str, str] = {}
+        self._slow_queries: List[Dict[str, Any]] = []
+        # Session yang sudah pasti ada di Supabase (atau sedang di-queue) — skip upsert berikutnya
+        self._known: "OrderedDict[str, None]" = OrderedDict()
+        # Session baru yang belum muncul di sidebar (butuh pesan pertama tersimpan) → NIK owner
+        self._fresh: Dict[str, str] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._spool_lock = threading.Lock()
+        # enqueue_slow_query dipanggil dari worker thread → list-nya dijaga lock sendiri
+        self._slow_lock = threading.Lock()
+        self._spool_path = os.path.join(PERSIST_SPOOL_DIR, f"persist-{os.getpid()}.jsonl")
+        self._last_retry = 0.0
+        self.stats = PersistStats()
+
+    # ── Enqueue (dipanggil dari pipeline chat) ─────────────────────────
+    def ensure_session(self, session_id: str, title: str, nik: str = "") -> bool:
+        """Queue insert session kalau belum pernah dilihat worker ini. True = baru di-queue."""
+        if session_id in self._known:
+            self._known.move_to_end(session_id)
+            return False
+        self._remember(session_id)
+        self._sessions[session_id] = {"session_id": session_id, "title": title, "nik": nik}
+        self._fresh[session_id] = nik or ""
+        self.stats.enqueued_sessions += 1
+        self._kick()
+        return True
+
+    def enqueue_message(self, session_id: str, role: str, message: str, **kwargs) -> None:
+        created_at = _utc_now_iso()
+        row = {"session_id": session_id, "role": role, "message": message, "created_at": created_at}
+        # Semua baris harus punya key yang sama untuk bulk insert PostgREST
+        for key in MESSAGE_EXTRA_FIELDS:
+            row[key] = kwargs.get(key) or None
+        self._messages.append(row)
+        self._touch[session_id] = created_at
+        self.stats.enqueued_messages += 1
+        self._kick(urgent=len(self._messages) >= PERSIST_BATCH_MAX)
+
+    def enqueue_artifact(self, row: Dict[str, Any]) -> None:
+        """Artifact analytics (sudah terkompresi) — key turn_id, tulis ulang = overwrite."""
+        self._artifacts[row["turn_id"]] = row
+        self.stats.enqueued_artifacts += 1
+        self._kick()
+
+    def enqueue_slow_query(self, row: Dict[str, Any]) -> None:
+        """Dipanggil dari worker thread QueryExecutor — tidak membangunkan flusher
+        (prioritas rendah, ikut flush berikutnya / maks PERSIST_RETRY_SECONDS)."""
+        with self._slow_lock:
+            if len(self._slow_queries) < PERSIST_BATCH_MAX * 10:
+                self._slow_queries.append(row)
+
+    def pending_artifact(self, turn_id: str) -> Optional[Dict[str, Any]]:
+        return self._artifacts.get(turn_id)
+
+    def pending_messages(self, session_id: str) -> List[Dict[str, Any]]:
+        """Pesan yang belum ter-flush (read-your-writes untuk history fallback Supabase)."""
+        return [m for m in self._messages if m["session_id"] == session_id]
+
+    def discard_session(self, session_id: str) -> None:
+        """Session dihapus user → jangan tulis baris pending-nya."""
+        self._sessions.pop(session_id, None)
+        self._touch.pop(session_id, None)
+        self._artifacts = {t: a for t, a in self._artifacts.items() if a["session_id"] != session_id}
+        self._messages = [m for m in self._messages if m["session_id"] != session_id]
+        self._known.pop(session_id, None)
+        self._fresh.pop(session_id, None)
+
+    def _remember(self, session_id: str) -> None:
+        self._known[session_id] = None
+        while len(self._known) > _KNOWN_SESSIONS_MAX:
+            self._known.popitem(last=False)
+
+    def _kick(self, urgent: bool = False) -> None:
+        if self._task is None:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self.start()
+        if urgent or not self._wake.is_set():
+            self._wake.set()
+
+    # ── Lifecycle ──────────────────────────────────────────────────────
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._claim_orphan_spools()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"💾 Persistence queue aktif (flush {PERSIST_FLUSH_MS:.0f}ms, spool {PERSIST_SPOOL_DIR})")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+        logger.info("💾 Persistence queue di-drain saat shutdown")
+
+    async def _run(self) -> None:
+        window = max(0.01, PERSIST_FLUSH_MS / 1000.0)
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=PERSIST_RETRY_SECONDS)
+                # Tunggu satu jendela supaya pesan user + assistant + turn lain ikut satu batch
+                if len(self._messages) < PERSIST_BATCH_MAX:
+                    await asyncio.sleep(window)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                return
+            self._wake.clear()
+            try:
+                await self.flush()
+                if time.monotonic() - self._last_retry >= PERSIST_RETRY_SECONDS:
+                    await self._replay_spool()
+            except asyncio.CancelledError:
+                return
+            except Exception as e:
+                logger.error(f"❌ Persistence flush error: {e}")
+
+    # ── Flush ──────────────────────────────────────────────────────────
+    def _take(self) -> Dict[str, Any]:
+        with self._slow_lock:
+            slow_queries, self._slow_queries = self._slow_queries, []
+        batch = {
+            "sessions": list(self._sessions.values()),
+            "artifacts": list(self._artifacts.values()),
+            "messages": self._messages[:PERSIST_BATCH_MAX],
+            "touch": {},
+            "slow_queries": slow_queries,
+        }
+        self._sessions = {}
+        self._artifacts = {}
+        self._messages = self._messages[PERSIST_BATCH_MAX:]
+        # last_message_at hanya untuk session yang semua pesannya sudah ikut batch ini
+        still_pending = {m["session_id"] for m in self._messages}
+        for sid in list(self._touch):
+            if sid not in still_pending:
+                batch["touch"][sid] = self._touch.pop(sid)
+        if self._messages:
+            self._wake.set()
+        return batch
+
+    async def flush(self) -> None:
+        if not (self._sessions or self._artifacts or self._messages or self._touch or self._slow_queries):
+            return
+        async with self._flush_lock:
+            batch = self._take()
+            failed = await asyncio.to_thread(self._write, batch)
+            self.stats.flushes += 1
+            if failed:
+                await asyncio.to_thread(self._spool, failed)
+                return
+            self._after_write(batch)
+
+    def _write(self, batch: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Tulis tahap berurutan (session → artifact → pesan → touch). Return tahap yang gagal + sisanya."""
+        for i, stage in enumerate(_STAGES):
+            rows = batch.get(stage)
+            if not rows:
+                continue
+            try:
+                if stage == "sessions":
+                    # Dipakai _after_write untuk prime owner (hanya session yang baru dibuat)
+                    batch["created_sessions"] = save_sessions_bulk(rows)
+                elif stage == "artifacts":
+                    save_artifacts_bulk(rows)
+                elif stage == "messages":
+                    save_messages_bulk(rows)
+                elif stage == "touch":
+                    # Setiap session mendapat waktu pesannya sendiri — satu UPDATE per timestamp
+                    by_time: Dict[str, List[str]] = {}
+                    for sid, ts in rows.items():
+                        by_time.setdefault(ts, []).append(sid)
+                    for ts, sids in by_time.items():
+                        touch_sessions_bulk(sids, ts)
+                else:
+                    save_slow_queries_bulk(rows)
+                self.stats.supabase_requests += 1
+                self.stats.rows_written += len(rows)
+            except Exception as e:
+                self.stats.failures += 1
+                logger.warning(f"⚠️ Persistence {stage} gagal ({len(rows)} baris) → spool: {e}")
+                return {s: batch[s] for s in _STAGES[i:] if batch.get(s)}
+        return None
+
+    def _after_write(self, batch: Dict[str, Any]) -> None:
+        self._prime_created(batch.get("created_sessions") or [])
+        written = {m["session_id"] for m in batch.get("messages") or []}
+        fresh = {sid: self._fresh.pop(sid) for sid in written if sid in self._fresh}
+        # Session lama dengan pesan baru → last_message_at (urutan sidebar) ikut berubah
+        touched = [sid for sid in batch.get("touch") or {} if sid not in fresh]
+        try:
+            from backend.services.session_cache import session_cache
+            # Session baru sudah punya pesan → muncul di sidebar pemiliknya (semua worker)
+            for nik in set(fresh.values()):
+                session_cache.invalidate_list_nowait(nik or None)
+            session_cache.touched_nowait(touched)
+        except Exception:
+            pass
+
+    @staticmethod
+    def _prime_created(created: List[Dict[str, Any]]) -> None:
+        """Owner session yang baru ter-INSERT → metadata lintas worker (SET NX, owner kosong dilewati)."""
+        if not created:
+            return
+        try:
+            from backend.services.session_cache import session_cache
+            for row in created:
+                if row.get("session_id") and row.get("nik"):
+                    session_cache.prime(row["session_id"], owner=row["nik"], title=row.get("title") or "")
+        except Exception:
+            pass
+
+    # ── Spool (retry durable) ──────────────────────────────────────────
+    def _spool(self, batch: Dict[str, Any]) -> bool:
+        try:
+            os.makedirs(PERSIST_SPOOL_DIR, exist_ok=True)
+            with self._spool_lock, open(self._spool_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(batch, ensure_ascii=False, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.stats.spooled_batches += 1
+            return True
+        except Exception as e:
+            logger.error(f"❌ Spool gagal ditulis, {sum(len(v) for v in batch.values())} baris hilang: {e}")
+            return False
+
+    def _claim_orphan_spools(self) -> None:
+        """Ambil alih spool worker lain yang sudah mati (rename atomik = satu pemilik)."""
+        for path in glob.glob(os.path.join(PERSIST_SPOOL_DIR, "persist-*.jsonl")):
+            if path == self._spool_path or self._owner_alive(path):
+                continue
+            try:
+                os.rename(path, f"{self._spool_path}.{uuid.uuid4().hex[:8]}.retry")
+            except OSError:
+                pass
+
+    @staticmethod
+    def _owner_alive(path: str) -> bool:
+        try:
+            pid = int(os.path.basename(path)[len("persist-"):-len(".jsonl")])
+            os.kill(pid, 0)
+            return True
+        except (ValueError, ProcessLookupError):
+            return False
+        except PermissionError:
+            return True
+
+    async def _replay_spool(self) -> None:
+        self._last_retry = time.monotonic()
+        written = await asyncio.to_thread(self._replay_spool_sync)
+        # Invalidasi/prime session_cache butuh event loop → dijalankan di sini, bukan di thread
+        for batch in written:
+            self._after_write(batch)
+
+    def _replay_spool_sync(self) -> List[Dict[str, Any]]:
+        """Retry semua spool .retry; return batch yang berhasil ditulis.
+
+        File .retry baru dihapus setelah SEMUA batch di dalamnya tertulis atau
+        di-spool ulang — crash di tengah jalan berarti file di-retry lagi
+        (at-least-once, sama seperti retry INSERT pesan).
+        """
+        with self._spool_lock:
+            if os.path.exists(self._spool_path):
+                try:
+                    os.rename(self._spool_path, f"{self._spool_path}.{uuid.uuid4().hex[:8]}.retry")
+                except OSError:
+                    return []
+        written: List[Dict[str, Any]] = []
+        for path in sorted(glob.glob(f"{self._spool_path}.*.retry")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    batches = [json.loads(line) for line in f if line.strip()]
+            except Exception as e:
+                logger.error(f"❌ Spool {os.path.basename(path)} tidak terbaca: {e}")
+                continue
+            kept = True
+            for batch in batches:
+                failed = self._write(batch)
+                if failed:
+                    kept = self._spool(failed) and kept
+                else:
+                    self.stats.spool_replayed_batches += 1
+                    written.append(batch)
+            if not kept:
+                # Sisa batch tidak bisa di-spool ulang → file dipertahankan untuk retry berikutnya
+                continue
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"⚠️ Spool {os.path.basename(path)} gagal dihapus: {e}")
+            logger.info(f"💾 Spool {os.path.basename(path)}: {len(batches)} batch di-retry")
+        return written
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "pending_messages": len(self._messages),
+            "pending_sessions": len(self._sessions),
+            "pending_artifacts": len(self._artifacts),
+            "pending_slow_queries": len(self._slow_queries),
+            **self.stats.to_dict(),
+        }
+
+
+persistence_queue = PersistenceQueue()
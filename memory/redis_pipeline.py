@@ -0,0 +1,145 @@
+"""
+Redis Pipeline - Satu Round Trip per Operasi Logis
+==================================================
+Dengan Upstash REST setiap perintah = satu request HTTPS. Operasi memory yang
+terdiri dari beberapa perintah (rpush + ltrim + expire, rehydrate history dari
+Supabase, dst) sekarang dikirim sebagai SATU pipeline/transaksi:
+
+- Upstash async  : client.multi() / client.pipeline() → await p.exec()
+- redis-py async : client.pipeline(transaction=...) → await p.execute()
+- Client lain    : fallback perintah berurutan (tetap tercatat di metrik)
+
+Setiap operasi diberi nama (mis. "history.append") dan latency-nya dicatat
+per nama: count, error, avg, p50/p95, max (sampel terakhir) → /chat/status.
+
+Pemakaian:
+    results = await (
+        RedisBatch(redis_client, "history.append")
+        .add("rpush", key, value)
+        .add("ltrim", key, -20, -1)
+        .add("expire", key, 86400)
+        .execute()
+    )
+    exists = await timed("history.exists", redis_client.exists(key))
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Deque, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SAMPLE_WINDOW = 256
+
+
+class _OpStats:
+    __slots__ = ("count", "errors", "commands", "total_ms", "max_ms", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.commands = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.samples: Deque[float] = deque(maxlen=_SAMPLE_WINDOW)
+
+    def to_dict(self) -> Dict[str, Any]:
+        ordered = sorted(self.samples)
+
+        def pct(p: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 1) if ordered else 0.0
+
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "commands_per_op": round(self.commands / self.count, 1) if self.count else 0,
+            "avg_ms": round(self.total_ms / self.count, 1) if self.count else 0.0,
+            "p50_ms": pct(0.5),
+            "p95_ms": pct(0.95),
+            "max_ms": round(self.max_ms, 1),
+        }
+
+
+_op_stats: Dict[str, _OpStats] = {}
+_stats_lock = threading.Lock()
+
+
+def _record(op: str, elapsed_ms: float, commands: int, ok: bool) -> None:
+    with _stats_lock:
+        stats = _op_stats.setdefault(op, _OpStats())
+        stats.count += 1
+        stats.commands += commands
+        stats.total_ms += elapsed_ms
+        stats.max_ms = max(stats.max_ms, elapsed_ms)
+        stats.samples.append(elapsed_ms)
+        if not ok:
+            stats.errors += 1
+
+
+def redis_op_stats() -> Dict[str, Dict[str, Any]]:
+    with _stats_lock:
+        return {op: s.to_dict() for op, s in sorted(_op_stats.items())}
+
+
+async def timed(op: str, awaitable: Awaitable[Any]) -> Any:
+    """Await satu perintah Redis tunggal sambil mencatat latency-nya."""
+    start = time.perf_counter()
+    ok = False
+    try:
+        result = await awaitable
+        ok = True
+        return result
+    finally:
+        _record(op, (time.perf_counter() - start) * 1000, 1, ok)
+
+
+class RedisBatch:
+    """Kumpulan perintah yang dikirim dalam satu round trip."""
+
+    def __init__(self, client, op: str, transaction: bool = True):
+        self.client = client
+        self.op = op
+        self.transaction = transaction
+        self._commands: List[Tuple[str, tuple, dict]] = []
+
+    def add(self, command: str, *args, **kwargs) -> "RedisBatch":
+        self._commands.append((command, args, kwargs))
+        return self
+
+    def __len__(self) -> int:
+        return len(self._commands)
+
+    async def execute(self) -> List[Any]:
+        if not self._commands:
+            return []
+        start = time.perf_counter()
+        ok = False
+        try:
+            results = await self._run()
+            ok = True
+            return results
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            _record(self.op, elapsed, len(self._commands), ok)
+            logger.debug(f"⚡ [Redis] {self.op}: {len(self._commands)} cmd / 1 round trip, {elapsed:.1f}ms")
+
+    async def _run(self) -> List[Any]:
+        client = self.client
+        # Upstash (upstash_redis.asyncio): multi() = MULTI/EXEC, pipeline() tanpa transaksi
+        if type(client).__module__.startswith("upstash_redis"):
+            pipe = client.multi() if self.transaction else client.pipeline()
+            self._queue(pipe)
+            return list(await pipe.exec())
+        # redis-py (redis.asyncio)
+        if hasattr(client, "pipeline"):
+            async with client.pipeline(transaction=self.transaction) as pipe:
+                self._queue(pipe)
+                return list(await pipe.execute())
+        # Client tanpa dukungan pipeline → berurutan
+        return [await getattr(client, cmd)(*args, **kwargs) for cmd, args, kwargs in self._commands]
+
+    def _queue(self, pipe) -> None:
+        for cmd, args, kwargs in self._commands:
+            getattr(pipe, cmd)(*args, **kwargs)
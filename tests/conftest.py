@@ -0,0 +1,17 @@
+"""
+Unit test untuk helper pure-logic (tanpa Supabase/Redis/OpenAI sungguhan).
+
+Beberapa modul membuat client OpenAI di level modul → butuh API key dummy
+saat import; tidak ada request keluar karena test tidak memanggil LLM.
+Jalankan dari root repo:  python -m pytest -q
+"""
+
+import os
+import sys
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test-dummy")
+# Redis / Supabase sengaja dikosongkan → modul jatuh ke mode lokal
+for _var in ("UPSTASH_REDIS_URL", "UPSTASH_REDIS_TOKEN", "REDIS_URL", "SUPABASE_URL", "SUPABASE_ANON_KEY"):
+    os.environ[_var] = ""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,79 @@
+import asyncio
+
+from app import cancellation
+from app.cancellation import CancellationToken
+
+
+def test_cancel_aborts_bound_task_at_its_current_await():
+    async def scenario():
+        token = CancellationToken("t")
+        reached = []
+
+        async def provider_call():
+            token.bind()
+            await asyncio.sleep(30)       # request HTTP provider yang sedang berjalan
+            reached.append("after")
+
+        task = asyncio.create_task(provider_call())
+        await asyncio.sleep(0)
+        assert token.cancel("superseded")
+        assert not token.cancel("superseded")   # idempoten
+        await asyncio.gather(task, return_exceptions=True)
+        return token, task, reached
+
+    token, task, reached = asyncio.run(scenario())
+    assert task.cancelled() and reached == []
+    assert token.reason == "superseded"
+
+
+def test_token_works_as_cancellation_check_and_from_threads():
+    async def scenario():
+        token = CancellationToken()
+        before = await token()
+        token.cancel("user_stopped")
+        in_thread = await asyncio.to_thread(token.is_cancelled)
+        return before, await token(), in_thread
+
+    assert asyncio.run(scenario()) == (False, True, True)
+
+
+def test_bind_after_cancel_cancels_immediately():
+    async def scenario():
+        token = CancellationToken()
+        token.cancel()
+        task = asyncio.create_task(asyncio.sleep(30))
+        token.bind(task)
+        await asyncio.gather(task, return_exceptions=True)
+        return task
+
+    assert asyncio.run(scenario()).cancelled()
+
+
+def test_disconnect_watcher_cancels_and_close_stops_watchers():
+    class _Request:
+        def __init__(self):
+            self.gone = False
+
+        async def is_disconnected(self):
+            return self.gone
+
+    async def scenario():
+        request = _Request()
+        token = CancellationToken().watch_disconnect(request, interval=0.01)
+        idle = CancellationToken().watch_disconnect(_Request(), interval=0.01)
+        request.gone = True
+        await asyncio.wait_for(token.wait(), timeout=1)
+        idle.close()
+        await asyncio.sleep(0.02)
+        return token, idle
+
+    token, idle = asyncio.run(scenario())
+    assert token.reason == "client_disconnected"
+    assert not idle.cancelled and not idle._watchers
+
+
+def test_record_savings_accumulates(monkeypatch):
+    monkeypatch.setattr(cancellation, "cancellation_stats", cancellation.CancellationStats())
+    cancellation.record_savings(120, 800, stage="rerank")
+    cancellation.record_savings(-5, 200)
+    assert (cancellation.cancellation_stats.tokens_saved, cancellation.cancellation_stats.ms_saved) == (120, 1000)
@@ -0,0 +1,10 @@
+from backend.services.chat_service import build_analytics_response
+
+
+def test_analytics_turn_ids_are_unique_within_a_second():
+    ids = {
+        build_analytics_response(domain="hr", text="t", columns=["a"], rows=[{"a": 1}], session_id="s1")["turn_id"]
+        for _ in range(50)
+    }
+    assert len(ids) == 50
+    assert all(i.startswith("s1-") for i in ids)
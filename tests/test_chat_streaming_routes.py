@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+import app.tools as tools
+from backend.services import user_context as uc
+from backend.services.chat_service import ChatService, SOP_NOT_FOUND_CODE
+
+
+@pytest.fixture(autouse=True)
+def no_user_context(monkeypatch):
+    monkeypatch.setattr(uc, "_get_redis", lambda: None)
+
+
+async def _drain(stream):
+    return [event async for event in stream]
+
+
+def _route(service, user_role="Employee"):
+    async def scenario():
+        routing = await service.run_ab_parallel_for_stream("cuti melahirkan berapa hari", user_role, "s-route")
+        events = await _drain(routing["stream"]) if routing else None
+        return routing, events
+    return asyncio.run(scenario())
+
+
+def test_route_a_streams_tokens_as_they_arrive(monkeypatch):
+    produced = []
+
+    async def fake_stream(question, session_id="default", cancellation_check=None, deadline=None, out_context=None):
+        for chunk in ("Cuti ", "melahirkan ", "3 bulan"):
+            produced.append(chunk)
+            yield chunk
+        out_context["context"] = "<dokumen>"
+
+    monkeypatch.setattr(tools, "search_sop_stream", fake_stream)
+    service = ChatService()
+
+    async def scenario():
+        routing = await service.run_ab_parallel_for_stream("cuti melahirkan berapa hari", "Employee", "s-route")
+        stream = routing["stream"]
+        first = await stream.__anext__()
+        # Token pertama sudah diteruskan sebelum RAG selesai menghasilkan jawaban
+        progress = list(produced)
+        rest = await _drain(stream)
+        return routing, first, progress, rest
+
+    routing, first, progress, rest = asyncio.run(scenario())
+    assert routing["mode"] == "a_only"
+    assert first == {"type": "token", "content": "Cuti "}
+    assert progress == ["Cuti "]
+    assert [e["content"] for e in rest] == ["melahirkan ", "3 bulan"]
+    assert routing["rag_out"] == {"context": "<dokumen>"}
+
+
+def test_route_a_exception_becomes_not_found_sentinel(monkeypatch):
+    async def failing_stream(question, **kwargs):
+        yield "Sebagian "
+        raise RuntimeError("pinecone timeout")
+
+    monkeypatch.setattr(tools, "search_sop_stream", failing_stream)
+    routing, events = _route(ChatService())
+    contents = [e["content"] for e in events]
+    assert contents == ["Sebagian ", SOP_NOT_FOUND_CODE]
+    assert not any("Error" in c for c in contents)
+
+
+def _hr_routes(monkeypatch, service):
+    async def decompose(question):
+        return {"run_a": True, "run_b": True, "query_a": question, "query_b": question}
+
+    monkeypatch.setattr(service, "_decompose_query", decompose)
+
+    async def hr_answer(question, **kwargs):
+        return "Jumlah karyawan tetap: 120 orang"
+
+    monkeypatch.setattr(tools, "query_hr_database", hr_answer)
+
+
+@pytest.mark.parametrize("search_sop", ["raises", "error_html"])
+def test_route_a_failure_falls_back_to_route_b(monkeypatch, search_sop):
+    async def sop(question, **kwargs):
+        if search_sop == "raises":
+            raise RuntimeError("rag down")
+        return "<h3>❌ Error Pencarian SOP</h3><p>Terjadi kesalahan: rag down</p>"
+
+    monkeypatch.setattr(tools, "search_sop", sop)
+    service = ChatService()
+    _hr_routes(monkeypatch, service)
+
+    routing, events = _route(service, user_role="HR")
+    assert routing["mode"] == "b_only"
+    assert events == [{"type": "token", "content": "Jumlah karyawan tetap: 120 orang"}]
@@ -0,0 +1,80 @@
+import json
+import re
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from backend.services import chat_service
+from backend.services.chat_service import columnar_table, table_row_events
+
+API_JS = Path(__file__).resolve().parent.parent / "web" / "js" / "api.js"
+
+DATA = {
+    "columns": ["Unit", "Jumlah", "Persentase"],
+    "rows": [{"Unit": f"Unit {i}", "Jumlah": i * 3, "Persentase": None if i == 4 else i / 10} for i in range(7)],
+    "total_rows": 7,
+}
+
+
+def test_columnar_done_payload():
+    wire = columnar_table(DATA)
+    assert wire["encoding"] == "columnar"
+    assert "rows" not in wire
+    assert wire["column_data"][0] == [f"Unit {i}" for i in range(7)]
+    assert wire["column_data"][2][4] is None
+    assert "row_keys" not in wire
+
+
+def test_row_keys_sent_when_they_differ_from_columns():
+    data = {"columns": ["Kategori", "Jumlah"], "rows": [{"category": "A", "jumlah": 1}]}
+    assert columnar_table(data)["row_keys"] == ["category", "jumlah"]
+
+
+def test_row_events_cover_every_row(monkeypatch):
+    monkeypatch.setattr(chat_service, "HR_STREAM_ROWS_BATCH", 3)
+    events = list(table_row_events(DATA))
+    assert [e["offset"] for e in events] == [0, 3, 6]
+    assert sum(len(e["column_data"][0]) for e in events) == 7
+    wire = columnar_table(DATA, rows_streamed=True)
+    assert wire["rows_streamed"] is True and "column_data" not in wire
+
+
+def _expand_in_node(payloads):
+    source = API_JS.read_text(encoding="utf-8")
+    fn = re.search(r"^function _expandTableData\(.*?^}\n", source, re.S | re.M).group(0)
+    script = fn + """
+const input = JSON.parse(require("fs").readFileSync(0, "utf8"));
+const out = input.map(([done, batches]) => {
+  let tableColumns = null;
+  for (const event of batches) {
+    if (!tableColumns) tableColumns = event.column_data.map(() => []);
+    event.column_data.forEach((values, i) => {
+      const target = tableColumns[i] || (tableColumns[i] = []);
+      values.forEach((v, j) => { target[event.offset + j] = v; });
+    });
+  }
+  return _expandTableData(done, tableColumns);
+});
+process.stdout.write(JSON.stringify(out));
+"""
+    proc = subprocess.run(["node", "-e", script], input=json.dumps(payloads), capture_output=True, text=True, timeout=30)
+    assert proc.returncode == 0, proc.stderr
+    return json.loads(proc.stdout)
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node tidak tersedia")
+def test_round_trip_through_frontend_decoder(monkeypatch):
+    monkeypatch.setattr(chat_service, "HR_STREAM_ROWS_BATCH", 2)
+    keyed = {"columns": ["Kategori", "Jumlah"], "rows": [{"category": "A", "jumlah": 1}, {"category": "B", "jumlah": 2}]}
+    inline, streamed, renamed = _expand_in_node([
+        [columnar_table(DATA), []],
+        [columnar_table(DATA, rows_streamed=True), list(table_row_events(DATA))],
+        [columnar_table(keyed), []],
+    ])
+    for expanded in (inline, streamed):
+        assert expanded["rows"] == DATA["rows"]
+        assert expanded["columns"] == DATA["columns"]
+        assert "column_data" not in expanded and "encoding" not in expanded
+    assert renamed["rows"] == keyed["rows"]
@@ -0,0 +1,94 @@
+import pytest
+
+from engines.hr.query import cost_guard as cg
+from engines.hr.query.cost_guard import CostGuard, CostRejected, _peak_rows
+
+
+class _FakeDB:
+    """db.explain palsu: plan per SQL; SQL yang dibungkus LIMIT memakai plan 'limited'."""
+
+    def __init__(self, plan=None, limited=None, error=None):
+        self.plan, self.limited, self.error = plan, limited, error
+        self.explained = []
+
+    def explain(self, sql, statement_timeout_ms=None):
+        self.explained.append(sql)
+        if self.error is not None:
+            raise self.error
+        return {"Plan": self.limited if "denai_guarded" in sql and self.limited else self.plan}
+
+
+def _node(cost, rows, node_type="Seq Scan", plans=()):
+    return {"Node Type": node_type, "Total Cost": cost, "Plan Rows": rows, "Plans": list(plans)}
+
+
+@pytest.fixture(autouse=True)
+def logged(monkeypatch):
+    monkeypatch.setattr(cg, "COST_GUARD_ENABLED", True)
+    monkeypatch.setattr(cg, "COST_GUARD_MAX_COST", 1000.0)
+    monkeypatch.setattr(cg, "COST_GUARD_MAX_ROWS", 5000.0)
+    monkeypatch.setattr(cg, "COST_GUARD_REWRITE", True)
+    monkeypatch.setattr(cg, "COST_GUARD_SLOW_MS", 100.0)
+    logged = []
+    monkeypatch.setattr(CostGuard, "log", lambda self, kind, *a, **k: logged.append(kind))
+    return logged
+
+
+def test_peak_rows_ignores_streaming_subtree_under_limit():
+    plan = _node(10, 10, "Limit", [_node(4e6, 1e6)])
+    assert _peak_rows(plan) == 10
+    assert _peak_rows(_node(5e6, 100, "Hash Join", [_node(1, 1e6), plan])) == 1e6
+
+
+def test_peak_rows_counts_blocking_input_under_limit():
+    sort = _node(10, 10, "Limit", [_node(5e6, 1e6, "Sort", [_node(4e6, 1e6)])])
+    assert _peak_rows(sort) == 1e6
+    hashed = {**_node(5e6, 50, "Aggregate", [_node(4e6, 2e6)]), "Strategy": "Hashed"}
+    assert _peak_rows(_node(10, 10, "Limit", [hashed])) == 2e6
+    grouped = {**_node(5e6, 50, "Aggregate", [_node(4e6, 2e6)]), "Strategy": "Sorted"}
+    assert _peak_rows(_node(10, 10, "Limit", [grouped])) == 10
+
+
+def test_accept_cheap_plan():
+    decision = CostGuard().admit(_FakeDB(_node(50, 100)), "select 1 from hr.a", max_rows=1000)
+    assert decision.action == "accept"
+    assert decision.sql == "select 1 from hr.a"
+
+
+def test_rewrite_wraps_limit_and_re_explains(logged):
+    db = _FakeDB(plan=_node(9e6, 1e6), limited=_node(500, 1001, "Limit", [_node(9e6, 1e6)]))
+    guard = CostGuard()
+    decision = guard.admit(db, "select * from hr.a;", max_rows=1000)
+    assert decision.action == "rewrite"
+    assert decision.sql == "SELECT * FROM (select * from hr.a) AS denai_guarded LIMIT 1001"
+    assert db.explained == ["select * from hr.a;", decision.sql]
+    assert guard.rewritten == 1 and logged == ["rewrite"]
+
+
+def test_reject_when_limit_does_not_help(logged):
+    db = _FakeDB(plan=_node(9e6, 1e6), limited=_node(9e6, 1001, "Limit", [_node(9e6, 1e6)]))
+    guard = CostGuard()
+    with pytest.raises(CostRejected) as exc:
+        guard.admit(db, "select * from hr.a cross join hr.b", max_rows=1000, origin="generated")
+    assert exc.value.origin == "generated"
+    assert "cost" in str(exc.value)
+    assert guard.rejected == 1 and logged == ["reject"]
+
+
+def test_fail_open_when_explain_raises():
+    guard = CostGuard()
+    decision = guard.admit(_FakeDB(error=RuntimeError("connection reset")), "select 1", max_rows=10)
+    assert decision.action == "unchecked"
+    assert decision.sql == "select 1"
+    assert decision.statement_timeout_ms == cg.COST_GUARD_STATEMENT_TIMEOUT_MS
+    assert guard.explain_failures == 1
+
+
+def test_observe_classifies_timeout_and_slow(logged):
+    guard = CostGuard()
+    guard.observe("q", "generated", None, 10000, error=Exception("canceling statement due to statement timeout"))
+    guard.observe("q", "generated", None, 5, error=Exception("syntax error"))
+    guard.observe("q", "generated", None, 250)
+    guard.observe("q", "generated", None, 20)
+    assert (guard.timeouts, guard.slow) == (1, 1)
+    assert logged == ["timeout", "slow"]
@@ -0,0 +1,60 @@
+import psycopg2
+import pytest
+
+from engines.hr.database import db_manager as dbm
+from engines.hr.database.db_manager import DatabaseManager
+
+
+class _FakeCursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, *args):
+        pass
+
+
+class _FakeConn:
+    closed = 0
+
+    def cursor(self, *args, **kwargs):
+        return _FakeCursor()
+
+
+class _FakePool:
+    def __init__(self):
+        self.released = []
+
+    def acquire(self):
+        return _FakeConn()
+
+    def release(self, conn, broken=False):
+        self.released.append(broken)
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    pool = _FakePool()
+    monkeypatch.setattr(dbm, "_get_pool", lambda dsn: pool)
+    manager = DatabaseManager.__new__(DatabaseManager)
+    manager.connection_string = "postgresql://test"
+    manager.logger = dbm.logging.getLogger("test")
+    return manager, pool
+
+
+def test_statement_timeout_returns_connection_to_pool(manager):
+    manager, pool = manager
+    with pytest.raises(psycopg2.extensions.QueryCanceledError):
+        with manager.get_connection(statement_timeout_ms=100):
+            raise psycopg2.extensions.QueryCanceledError("canceling statement due to statement timeout")
+    assert pool.released == [False]
+
+
+def test_operational_error_discards_connection(manager):
+    manager, pool = manager
+    with pytest.raises(psycopg2.OperationalError):
+        with manager.get_connection():
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+    assert pool.released == [True]
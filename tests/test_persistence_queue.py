@@ -0,0 +1,108 @@
+import asyncio
+
+import memory.persistence_queue as pq
+
+
+def test_touch_keeps_each_session_timestamp(monkeypatch):
+    calls = []
+    monkeypatch.setattr(pq, "touch_sessions_bulk", lambda sids, ts: calls.append((sorted(sids), ts)))
+    queue = pq.PersistenceQueue()
+    failed = queue._write({"touch": {"a": "2026-01-01T10:00:00", "b": "2026-01-01T10:05:00", "c": "2026-01-01T10:00:00"}})
+    assert failed is None
+    assert sorted(calls) == [(["a", "c"], "2026-01-01T10:00:00"), (["b"], "2026-01-01T10:05:00")]
+
+
+def test_failed_stage_is_returned_for_spool(monkeypatch):
+    def boom(rows):
+        raise RuntimeError("supabase down")
+    monkeypatch.setattr(pq, "save_messages_bulk", boom)
+    monkeypatch.setattr(pq, "touch_sessions_bulk", lambda sids, ts: None)
+    queue = pq.PersistenceQueue()
+    failed = queue._write({"messages": [{"session_id": "a"}], "touch": {"a": "t"}})
+    assert set(failed) == {"messages", "touch"}
+
+
+def test_touched_session_bumps_owner_list_version():
+    from backend.services.session_cache import SessionCache
+    cache = SessionCache()
+    cache.prime("old-session", owner="12345")
+
+    async def scenario():
+        before = await cache._version("12345")
+        await cache.touched(["old-session"])
+        return before, await cache._version("12345")
+
+    before, after = asyncio.run(scenario())
+    assert before != after
+
+
+def _spooled_queue(monkeypatch, tmp_path, batches):
+    monkeypatch.setattr(pq, "PERSIST_SPOOL_DIR", str(tmp_path))
+    queue = pq.PersistenceQueue()
+    for batch in batches:
+        queue._spool(batch)
+    return queue
+
+
+def test_replay_removes_spool_and_runs_after_write(monkeypatch, tmp_path):
+    written, after = [], []
+    monkeypatch.setattr(pq, "save_messages_bulk", lambda rows: written.extend(rows))
+    queue = _spooled_queue(monkeypatch, tmp_path, [{"messages": [{"session_id": "a"}]}])
+    monkeypatch.setattr(queue, "_after_write", after.append)
+
+    asyncio.run(queue._replay_spool())
+
+    assert written == [{"session_id": "a"}]
+    assert after == [{"messages": [{"session_id": "a"}]}]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_replay_keeps_spool_when_crashing_midway(monkeypatch, tmp_path):
+    queue = _spooled_queue(monkeypatch, tmp_path, [{"messages": [{"session_id": "a"}]},
+                                                   {"messages": [{"session_id": "b"}]}])
+    seen = []
+
+    def crash(batch):
+        seen.append(batch)
+        if len(seen) == 2:
+            raise SystemExit("worker mati")
+        return None
+
+    monkeypatch.setattr(queue, "_write", crash)
+    try:
+        queue._replay_spool_sync()
+    except SystemExit:
+        pass
+    retry = [p.name for p in tmp_path.iterdir()]
+    assert len(retry) == 1 and retry[0].endswith(".retry")
+
+
+def test_replay_keeps_spool_when_respool_fails(monkeypatch, tmp_path):
+    monkeypatch.setattr(pq, "save_messages_bulk", lambda rows: (_ for _ in ()).throw(RuntimeError("down")))
+    queue = _spooled_queue(monkeypatch, tmp_path, [{"messages": [{"session_id": "a"}]}])
+    monkeypatch.setattr(queue, "_spool", lambda batch: False)
+
+    assert queue._replay_spool_sync() == []
+    assert [p.name.endswith(".retry") for p in tmp_path.iterdir()] == [True]
+
+
+def test_slow_queries_from_threads_are_not_lost(monkeypatch):
+    import threading
+
+    monkeypatch.setattr(pq, "PERSIST_BATCH_MAX", 100_000)
+    queue = pq.PersistenceQueue()
+    taken = []
+
+    def produce():
+        for i in range(2000):
+            queue.enqueue_slow_query({"i": i})
+
+    threads = [threading.Thread(target=produce) for _ in range(4)]
+    for t in threads:
+        t.start()
+    while any(t.is_alive() for t in threads):
+        taken.extend(queue._take()["slow_queries"])
+    for t in threads:
+        t.join()
+    taken.extend(queue._take()["slow_queries"])
+    assert len(taken) == 8000
@@ -0,0 +1,85 @@
+import pytest
+
+from engines.hr.query.cost_guard import CostRejected
+from engines.hr.query.query_executor import QueryExecutor
+
+
+class _HeavyDB:
+    """Setiap plan kemahalan, juga versi yang dibungkus LIMIT."""
+
+    def __init__(self):
+        self.executed = []
+
+    def explain(self, sql, statement_timeout_ms=None):
+        return {"Plan": {"Node Type": "Nested Loop", "Total Cost": 9e9, "Plan Rows": 9e9}}
+
+    def execute_columnar(self, sql, **kwargs):
+        self.executed.append(sql)
+        return {"columns": [], "types": [], "data": [], "total_rows": 0, "truncated": False, "batches": 0}
+
+
+def test_cost_rejected_passes_through_unchanged():
+    db = _HeavyDB()
+    executor = QueryExecutor(db_manager=db)
+    with pytest.raises(CostRejected) as exc:
+        executor.execute_with_limit("select * from hr.a cross join hr.b", guarded=True, origin="cache:exact")
+    assert exc.value.origin == "cache:exact"
+    assert str(exc.value).startswith("COST_REJECTED")
+    assert db.executed == []
+
+
+class _PlannedDB:
+    """EXPLAIN palsu per SQL: kunci = potongan SQL, plan pertama yang cocok dipakai."""
+
+    def __init__(self, plans):
+        self.plans = plans
+        self.explained, self.executed = [], []
+
+    def explain(self, sql, statement_timeout_ms=None):
+        self.explained.append(sql)
+        for marker, plan in self.plans:
+            if marker in sql:
+                return {"Plan": plan}
+        raise AssertionError(sql)
+
+    def execute_columnar(self, sql, **kwargs):
+        self.executed.append(sql)
+        return {"columns": ["n"], "types": ["int4"], "data": [[1]], "total_rows": 1, "truncated": False, "batches": 1}
+
+
+@pytest.fixture
+def guard_limits(monkeypatch):
+    from engines.hr.query import cost_guard as cg
+    monkeypatch.setattr(cg, "COST_GUARD_ENABLED", True)
+    monkeypatch.setattr(cg, "COST_GUARD_MAX_COST", 1e6)
+    monkeypatch.setattr(cg, "COST_GUARD_MAX_ROWS", 5000.0)
+    monkeypatch.setattr(cg, "COST_GUARD_REWRITE", True)
+    monkeypatch.setattr(cg.CostGuard, "log", lambda self, *a, **k: None)
+
+
+def test_execute_with_limit_guards_sql_before_its_own_limit(guard_limits):
+    scan = {"Node Type": "Seq Scan", "Total Cost": 2e4, "Plan Rows": 2e6}
+    db = _PlannedDB([
+        ("denai_guarded", {"Node Type": "Limit", "Total Cost": 20, "Plan Rows": 1001, "Plans": [scan]}),
+        ("hr.big_rows", scan),
+    ])
+    QueryExecutor(db_manager=db).execute_with_limit("select * from hr.big_rows", guarded=True)
+    assert db.explained[0] == "select * from hr.big_rows"
+    assert db.executed == ["SELECT * FROM (select * from hr.big_rows) AS denai_guarded LIMIT 1001"]
+
+
+def test_execute_with_limit_runs_limited_sql_when_accepted(guard_limits):
+    db = _PlannedDB([("hr.small_rows", {"Node Type": "Seq Scan", "Total Cost": 20, "Plan Rows": 30})])
+    QueryExecutor(db_manager=db).execute_with_limit("select * from hr.small_rows", max_rows=100, guarded=True)
+    assert db.explained == ["select * from hr.small_rows"]
+    assert db.executed == ["select * from hr.small_rows LIMIT 100"]
+
+
+def test_execute_with_limit_rejects_sort_over_large_input(guard_limits):
+    sort = {"Node Type": "Sort", "Total Cost": 5e5, "Plan Rows": 2e6,
+            "Plans": [{"Node Type": "Seq Scan", "Total Cost": 4e5, "Plan Rows": 2e6}]}
+    db = _PlannedDB([("hr.sorted_rows", {"Node Type": "Limit", "Total Cost": 5e5, "Plan Rows": 10, "Plans": [sort]})])
+    with pytest.raises(CostRejected):
+        QueryExecutor(db_manager=db).execute_with_limit(
+            "select * from hr.sorted_rows order by 1 limit 10", guarded=True)
+    assert db.executed == []
@@ -0,0 +1,123 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.deadline import Deadline
+from engines.sop import rag_engine as rag
+
+
+class _Embeddings:
+    async def aembed_query(self, text):
+        return [0.1, 0.2]
+
+
+class _Index:
+    async def query(self, top_k, **kwargs):
+        matches = [SimpleNamespace(id=f"v{i}", metadata={"text": str(i)}, score=i / 100) for i in range(top_k)]
+        return SimpleNamespace(matches=matches)
+
+
+def test_merged_chunks_cut_to_top_k_without_cohere(monkeypatch):
+    monkeypatch.setattr(rag.rag_engine, "embeddings", _Embeddings(), raising=False)
+    monkeypatch.setattr(rag.rag_engine, "async_index", _Index(), raising=False)
+    monkeypatch.setattr(rag.rag_engine, "cohere_reranker", None, raising=False)
+
+    async def no_alternatives(query, topic, deadline=None):
+        return []
+    monkeypatch.setattr(rag, "_generate_multi_queries", no_alternatives)
+
+    chunks = asyncio.run(rag.retrieve_context_async("cuti", "cuti", "general"))
+    assert len(chunks) == rag.RAG_TOP_K
+    assert [c["score"] for c in chunks] == sorted((c["score"] for c in chunks), reverse=True)
+    assert chunks[0]["id"] == f"v{rag.RAG_RETRIEVAL_K - 1}"
+
+
+class _SlowEmbeddings:
+    """Embedding primary cepat, embedding query alternatif menggantung."""
+
+    async def aembed_query(self, text):
+        if text.startswith("alt"):
+            await asyncio.sleep(30)
+        return [0.1, 0.2]
+
+
+class _SlowAltIndex(_Index):
+    def __init__(self):
+        self.calls = 0
+
+    async def query(self, top_k, **kwargs):
+        self.calls += 1
+        if self.calls > 1:
+            await asyncio.sleep(30)
+        return await super().query(top_k=top_k, **kwargs)
+
+
+class _SlowLLM:
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(30)
+
+
+@pytest.fixture
+def bounded_rag(monkeypatch):
+    monkeypatch.setattr(rag.rag_engine, "embeddings", _Embeddings(), raising=False)
+    monkeypatch.setattr(rag.rag_engine, "async_index", _Index(), raising=False)
+    monkeypatch.setattr(rag.rag_engine, "cohere_reranker", None, raising=False)
+    monkeypatch.setattr(rag, "DEADLINE_MIN_MULTI_QUERY", 0)
+    monkeypatch.setattr(rag, "DEADLINE_MIN_FULL_TOP_K", 0)
+    return monkeypatch
+
+
+def _alternatives(monkeypatch):
+    async def alternatives(query, topic, deadline=None):
+        return ["alt satu", "alt dua"]
+    monkeypatch.setattr(rag, "_generate_multi_queries", alternatives)
+
+
+def _retrieve_timed(deadline):
+    start = time.monotonic()
+    chunks = asyncio.run(rag.retrieve_context_async("cuti", "cuti", "general", deadline=deadline))
+    return chunks, time.monotonic() - start
+
+
+def test_slow_multi_query_llm_is_bounded_by_deadline(bounded_rag):
+    bounded_rag.setattr(rag.rag_engine, "llm", _SlowLLM(), raising=False)
+    deadline = Deadline(1.0)
+
+    chunks, elapsed = _retrieve_timed(deadline)
+    assert elapsed < 5
+    assert len(chunks) == rag.RAG_TOP_K
+    assert "skip_multi_query" in deadline.degradations
+
+
+def test_slow_alternative_embeddings_are_dropped(bounded_rag):
+    _alternatives(bounded_rag)
+    bounded_rag.setattr(rag.rag_engine, "embeddings", _SlowEmbeddings(), raising=False)
+    deadline = Deadline(1.0)
+
+    chunks, elapsed = _retrieve_timed(deadline)
+    assert elapsed < 5
+    assert len(chunks) == rag.RAG_TOP_K
+    assert "skip_alt_embeddings" in deadline.degradations
+
+
+def test_slow_alternative_pinecone_queries_are_dropped(bounded_rag):
+    _alternatives(bounded_rag)
+    bounded_rag.setattr(rag.rag_engine, "async_index", _SlowAltIndex(), raising=False)
+    deadline = Deadline(1.0)
+
+    chunks, elapsed = _retrieve_timed(deadline)
+    assert elapsed < 5
+    assert chunks[0]["id"] == f"v{rag.RAG_RETRIEVAL_K - 1}"
+    assert "skip_alt_pinecone" in deadline.degradations
+
+
+def test_slow_primary_pinecone_query_raises(bounded_rag):
+    class _Hanging:
+        async def query(self, top_k, **kwargs):
+            await asyncio.sleep(30)
+
+    bounded_rag.setattr(rag.rag_engine, "async_index", _Hanging(), raising=False)
+    with pytest.raises(asyncio.TimeoutError):
+        _retrieve_timed(Deadline(1.0))
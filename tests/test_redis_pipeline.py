@@ -0,0 +1,214 @@
+import asyncio
+import json
+
+import pytest
+
+from memory import memory_hybrid
+from memory import redis_pipeline as rp
+from memory.redis_pipeline import RedisBatch, redis_op_stats, timed
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(rp, "_op_stats", {})
+
+
+class _Recorder:
+    """Pipeline palsu: antre perintah, dijalankan sekaligus saat exec/execute."""
+
+    def __init__(self, store, calls):
+        self.store = store
+        self.calls = calls
+        self.queued = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.queued.append((name, args))
+        return queue
+
+    def _flush(self):
+        self.calls.append([cmd for cmd, _ in self.queued])
+        results = []
+        for cmd, args in self.queued:
+            results.append(_apply(self.store, cmd, args))
+        return results
+
+
+def _apply(store, cmd, args):
+    key = args[0]
+    if cmd == "rpush":
+        store.setdefault(key, []).extend(args[1:])
+        return len(store[key])
+    if cmd == "ltrim":
+        start, stop = args[1], args[2]
+        items = store.get(key, [])
+        store[key] = items[start:] if stop == -1 else items[start:stop + 1]
+        return True
+    if cmd == "delete":
+        return 1 if store.pop(key, None) is not None else 0
+    if cmd == "expire":
+        return 1
+    if cmd == "lrange":
+        items = store.get(key, [])
+        return items[args[1]:] if args[2] == -1 else items[args[1]:args[2] + 1]
+    raise AssertionError(f"perintah tak dikenal: {cmd}")
+
+
+class _UpstashPipe(_Recorder):
+    async def exec(self):
+        return self._flush()
+
+
+class UpstashLike:
+    def __init__(self):
+        self.store, self.calls, self.modes = {}, [], []
+
+    def multi(self):
+        self.modes.append("multi")
+        return _UpstashPipe(self.store, self.calls)
+
+    def pipeline(self):
+        self.modes.append("pipeline")
+        return _UpstashPipe(self.store, self.calls)
+
+    async def lrange(self, key, start, stop):
+        return _apply(self.store, "lrange", (key, start, stop))
+
+
+# Deteksi Upstash memakai nama modul class client
+UpstashLike.__module__ = "upstash_redis.asyncio.client"
+
+
+class _RedisPyPipe(_Recorder):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self):
+        return self._flush()
+
+
+class RedisPyLike:
+    def __init__(self):
+        self.store, self.calls, self.transactions = {}, [], []
+
+    def pipeline(self, transaction=True):
+        self.transactions.append(transaction)
+        return _RedisPyPipe(self.store, self.calls)
+
+
+class PlainClient:
+    def __init__(self):
+        self.store, self.calls = {}, []
+
+    async def _run(self, name, *args):
+        self.calls.append(name)
+        return _apply(self.store, name, args)
+
+    async def rpush(self, *args):
+        return await self._run("rpush", *args)
+
+    async def ltrim(self, *args):
+        return await self._run("ltrim", *args)
+
+    async def expire(self, *args):
+        return await self._run("expire", *args)
+
+
+def _batch(client, op="history.append"):
+    return (
+        RedisBatch(client, op)
+        .add("rpush", "k", "a", "b", "c")
+        .add("ltrim", "k", -2, -1)
+        .add("expire", "k", 60)
+    )
+
+
+def test_upstash_client_uses_one_multi_exec():
+    client = UpstashLike()
+    results = asyncio.run(_batch(client).execute())
+    assert results == [3, True, 1]
+    assert client.modes == ["multi"]
+    assert client.calls == [["rpush", "ltrim", "expire"]]
+    assert client.store["k"] == ["b", "c"]
+
+
+def test_upstash_without_transaction_uses_pipeline():
+    client = UpstashLike()
+    asyncio.run(RedisBatch(client, "op", transaction=False).add("expire", "k", 1).execute())
+    assert client.modes == ["pipeline"]
+
+
+def test_redis_py_client_uses_pipeline_execute():
+    client = RedisPyLike()
+    results = asyncio.run(_batch(client).execute())
+    assert results == [3, True, 1]
+    assert client.transactions == [True]
+    assert client.calls == [["rpush", "ltrim", "expire"]]
+
+
+def test_client_without_pipeline_runs_sequentially():
+    client = PlainClient()
+    results = asyncio.run(_batch(client).execute())
+    assert results == [3, True, 1]
+    assert client.calls == ["rpush", "ltrim", "expire"]
+
+
+def test_empty_batch_is_a_noop():
+    assert asyncio.run(RedisBatch(UpstashLike(), "noop").execute()) == []
+    assert redis_op_stats() == {}
+
+
+def test_stats_record_commands_and_errors():
+    async def ok():
+        return "v"
+
+    async def fail():
+        raise ConnectionError("down")
+
+    async def run():
+        await _batch(PlainClient(), "batch").execute()
+        assert await timed("single", ok()) == "v"
+        with pytest.raises(ConnectionError):
+            await timed("single", fail())
+
+    asyncio.run(run())
+    stats = redis_op_stats()
+    assert stats["batch"]["count"] == 1
+    assert stats["batch"]["commands_per_op"] == 3
+    assert stats["single"]["count"] == 2
+    assert stats["single"]["errors"] == 1
+
+
+def test_history_turn_is_one_round_trip(monkeypatch):
+    client = UpstashLike()
+    monkeypatch.setattr(memory_hybrid, "redis_client", client)
+    monkeypatch.setattr(memory_hybrid, "REDIS_AVAILABLE", True)
+    monkeypatch.setattr(memory_hybrid, "MEMORY_AVAILABLE", False)
+
+    async def run():
+        await memory_hybrid.save_hybrid_turn("s1", "tanya", "jawab")
+        return await memory_hybrid.get_hybrid_history("s1", limit=4)
+
+    history = asyncio.run(run())
+    assert client.calls == [["rpush", "ltrim", "expire"]]
+    assert history == [{"role": "user", "message": "tanya"}, {"role": "assistant", "message": "jawab"}]
+    assert redis_op_stats()["history.append_turn"]["commands_per_op"] == 3
+
+
+def test_history_is_capped(monkeypatch):
+    client = UpstashLike()
+    monkeypatch.setattr(memory_hybrid, "redis_client", client)
+    monkeypatch.setattr(memory_hybrid, "REDIS_AVAILABLE", True)
+    monkeypatch.setattr(memory_hybrid, "MEMORY_AVAILABLE", False)
+
+    async def run():
+        for i in range(memory_hybrid.HISTORY_MAX_ITEMS + 5):
+            await memory_hybrid.save_hybrid_message("s2", "user", f"m{i}")
+
+    asyncio.run(run())
+    stored = client.store[memory_hybrid._history_key("s2")]
+    assert len(stored) == memory_hybrid.HISTORY_MAX_ITEMS
+    assert json.loads(stored[-1])["message"] == f"m{memory_hybrid.HISTORY_MAX_ITEMS + 4}"
@@ -0,0 +1,92 @@
+import asyncio
+
+from backend.services import request_registry as rr
+from backend.services.request_registry import RequestRegistry
+
+
+class _Upstash:
+    def __init__(self):
+        self.values = {}
+
+    async def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def delete(self, key):
+        self.values.pop(key, None)
+
+
+def test_new_request_supersedes_previous_in_same_worker(monkeypatch):
+    monkeypatch.setattr(rr, "_upstash", lambda: None)
+    registry = RequestRegistry()
+
+    async def scenario():
+        first = await registry.start("s1")
+        second = await registry.start("s1")
+        other = await registry.start("s2")
+        return first, second, other
+
+    first, second, other = asyncio.run(scenario())
+    assert first.cancelled and first.reason == "superseded"
+    assert not second.cancelled and not other.cancelled
+    assert registry.get("s1") is second
+
+
+def test_cancel_message_from_other_worker_only_hits_other_requests(monkeypatch):
+    monkeypatch.setattr(rr, "_upstash", lambda: None)
+    registry = RequestRegistry()
+
+    async def scenario():
+        return await registry.start("s1")
+
+    token = asyncio.run(scenario())
+    registry._supersede_local("s1", token.request_id)
+    assert not token.cancelled
+    registry._supersede_local("s1", "request-from-worker-b", reason="user_stopped")
+    assert token.cancelled and token.reason == "user_stopped"
+
+
+def test_upstash_poller_supersedes_across_workers(monkeypatch):
+    upstash = _Upstash()
+    monkeypatch.setattr(rr, "_upstash", lambda: upstash)
+    monkeypatch.setattr(rr, "SUPERSEDE_POLL_INTERVAL", 0.01)
+    worker_a = RequestRegistry()
+
+    async def scenario():
+        token = await worker_a.start("s1")
+        # Worker lain menerima pesan baru untuk session yang sama
+        upstash.values[rr._current_key("s1")] = "request-on-worker-b"
+        await asyncio.wait_for(token.wait(), timeout=1)
+        stopped = await worker_a.start("s2")
+        upstash.values[rr._current_key("s2")] = "stopped:worker-b"
+        await asyncio.wait_for(stopped.wait(), timeout=1)
+        return token, stopped
+
+    token, stopped = asyncio.run(scenario())
+    assert token.reason == "superseded"
+    assert stopped.reason == "user_stopped"
+
+
+def test_finish_releases_key_only_when_still_owned(monkeypatch):
+    upstash = _Upstash()
+    monkeypatch.setattr(rr, "_upstash", lambda: upstash)
+    registry = RequestRegistry()
+
+    async def scenario():
+        token = await registry.start("s1")
+        registry.finish("s1", token)
+        await asyncio.gather(*registry._releases)
+        released = rr._current_key("s1") not in upstash.values
+
+        token = await registry.start("s1")
+        upstash.values[rr._current_key("s1")] = "newer-request"
+        registry.finish("s1", token)
+        await asyncio.gather(*registry._releases)
+        return released, upstash.values.get(rr._current_key("s1"))
+
+    released, kept = asyncio.run(scenario())
+    assert released
+    assert kept == "newer-request"
+    assert registry.active_sessions() == []
@@ -0,0 +1,59 @@
+import datetime
+
+import pytest
+
+from engines.hr.database.schema_snapshot import schema_snapshot
+from engines.hr.query import result_cache as rc
+from engines.hr.query.result_cache import ResultCache, _referenced_tables, normalize_sql
+
+
+def test_normalize_sql_keeps_literals_and_quoted_identifiers():
+    sql = "SELECT  Nama -- komentar\nFROM hr.\"Karyawan\" WHERE unit = 'IT Pusat';"
+    assert normalize_sql(sql) == "select nama from hr. \"Karyawan\" where unit = 'IT Pusat'"
+    assert normalize_sql("select /* x */ 1") == normalize_sql("SELECT 1")
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("select * from hr.employees", ["hr.employees"]),
+    ("select * from employees e join hr.units u on u.id = e.unit_id", ["employees", "hr.units"]),
+    ("select * from employees, units where 1 = 1", ["employees", "units"]),
+    ("select * from (select * from employees) x", ["employees"]),
+    ("select extract(year from hire_date) from employees", ["employees"]),
+    ("with t as (select * from employees) select * from t", ["employees"]),
+    ("select * from employees where nama = 'from units'", ["employees"]),
+    ("select * from employees where id in (select emp_id from public.audit)", ["employees", "public.audit"]),
+])
+def test_referenced_tables(sql, expected):
+    assert _referenced_tables(normalize_sql(sql)) == expected
+
+
+def test_referenced_tables_rejects_set_returning_function():
+    assert _referenced_tables(normalize_sql("select * from generate_series(1, 3)")) is None
+
+
+@pytest.fixture
+def versions(monkeypatch):
+    monkeypatch.setattr(schema_snapshot, "_table_versions", {"employees": "10", "units": "3"}, raising=False)
+    monkeypatch.setattr(rc, "RESULT_CACHE_ENABLED", True)
+
+
+def test_plan_requires_every_relation_versioned(versions):
+    cache = ResultCache()
+    assert cache._plan("select * from hr.employees join hr.units using (unit_id)")[1] == {"employees": "10", "units": "3"}
+    assert cache._plan("select * from hr.employees join public.audit using (id)") is None
+    assert cache._plan("select * from employees join payroll_view using (id)") is None
+    assert cache._plan("select random() from employees") is None
+
+
+def test_put_get_round_trip_keeps_truncated_and_types(versions):
+    cache = ResultCache()
+    sql = "select nama, tgl from hr.employees"
+    assert cache.get(sql)[0] is None
+    token = cache.get(sql)[1]
+    data = [["a", "b"], [datetime.date(2024, 1, 2), datetime.date(2024, 3, 4)]]
+    cache.put(token, ["nama", "tgl"], data, types=["text", "date"], truncated=True)
+
+    result, _ = cache.get(sql)
+    assert result["data"] == data
+    assert result["types"] == ["text", "date"]
+    assert result["truncated"] is True
@@ -0,0 +1,62 @@
+import pytest
+
+from engines.hr.query import schema_retriever as sr
+from engines.hr.query.schema_retriever import SchemaRetriever, tokenize
+
+
+def _table(columns, values=None):
+    return {"columns": columns, "column_types": {c: "text" for c in columns}, "distinct_values": values or {}}
+
+
+SCHEMA = {
+    "tables": {
+        "employees": _table(["nik", "nama", "unit_id", "band", "tanggal_lahir", "jenis_kelamin"]),
+        "units": _table(["unit_id", "nama_unit", "direktorat"]),
+        "education": _table(["nik", "jenjang", "jurusan"],
+                            {"jurusan": "Kategori: Akuntansi, Teknik Sipil, Manajemen"}),
+        "trainings": _table(["nik", "nama_training", "jam_training"]),
+        "assets": _table(["asset_id", "kategori_aset", "nilai_buku"]),
+        "vendors": _table(["vendor_id", "nama_vendor", "npwp"]),
+    }
+}
+
+
+@pytest.fixture(autouse=True)
+def pruning(monkeypatch):
+    monkeypatch.setattr(sr, "SCHEMA_PRUNING_ENABLED", True)
+    monkeypatch.setattr(sr, "SCHEMA_PRUNING_MIN_COLUMNS", 1)
+    monkeypatch.setattr(sr, "SCHEMA_PRUNING_MAX_TABLES", 3)
+    monkeypatch.setattr(sr, "SCHEMA_PRUNING_MAX_COLUMNS", 2)
+
+
+def test_tokenize_adds_canonical_synonyms():
+    assert "syn:gaji" in tokenize("total salary karyawan")
+    assert "syn:karyawan" in tokenize("jumlah pegawai")
+
+
+def test_column_name_keeps_its_table():
+    selection = SchemaRetriever().select("rata-rata jam training per orang", SCHEMA)
+    assert selection.method == "bm25"
+    assert selection.includes("trainings", "jam_training")
+    assert "vendors" in selection.other_tables and "assets" in selection.other_tables
+
+
+def test_categorical_value_keeps_its_table():
+    selection = SchemaRetriever().select("berapa yang kuliah akuntansi", SCHEMA)
+    assert selection.includes("education", "jurusan")
+
+
+def test_join_keys_stay_with_pruned_columns():
+    selection = SchemaRetriever().select("nama unit dan direktorat", SCHEMA)
+    assert selection.includes("units", "unit_id")
+
+
+def test_bridge_table_is_pulled_in():
+    # trainings (nik) dan units (unit_id) tidak bisa di-join langsung → employees menjembatani
+    selection = SchemaRetriever().select("total jam training per direktorat", SCHEMA)
+    assert {"trainings", "units", "employees"} <= set(selection.tables)
+    assert selection.includes("employees", "nik") and selection.includes("employees", "unit_id")
+
+
+def test_no_signal_sends_full_schema():
+    assert SchemaRetriever().select("zzz qqq", SCHEMA) is None
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from engines.hr.database import schema_snapshot as ss
+from engines.hr.database.schema_snapshot import SchemaSnapshot
+
+
+class _FakeRedis:
+    """Redis bersama untuk beberapa 'worker' di satu proses."""
+
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return False
+        self.values[key] = value
+        return True
+
+
+class _Reader:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.builds = 0
+
+    def build_schema(self):
+        import time
+        self.builds += 1
+        time.sleep(self.delay)
+        return {"tables": {"employees": {}}}
+
+
+def _worker(reader, versions, fingerprint=("struct-1", "stats-1")):
+    snapshot = SchemaSnapshot()
+    snapshot._reader = reader
+
+    def compute():
+        snapshot._table_versions = dict(versions)
+        return fingerprint
+
+    snapshot._compute_fingerprint = compute
+    return snapshot
+
+
+def test_fingerprint_ignores_row_modification_counters():
+    data_part = ss._FINGERPRINT_SQL.split("AS structure,")[1].split("AS data,")[0]
+    assert "n_tup" not in data_part
+    assert "reltuples" in data_part and "last_autoanalyze" in data_part
+
+
+def test_table_writes_update_versions_without_rebuild(monkeypatch):
+    monkeypatch.setattr(ss, "_redis", lambda: None)
+    reader, versions = _Reader(), {"employees": "10"}
+    snapshot = _worker(reader, versions)
+    changes = []
+    snapshot.subscribe(lambda structure, data: changes.append((structure, data)))
+
+    async def scenario():
+        await snapshot.refresh()
+        versions["employees"] = "11"   # INSERT: counter naik, statistik belum berubah
+        await snapshot.refresh()
+
+    asyncio.run(scenario())
+    assert reader.builds == 1
+    assert snapshot.table_versions() == {"employees": "11"}
+    assert changes == []
+
+
+def test_concurrent_cold_starts_build_once(monkeypatch):
+    redis = _FakeRedis()
+    monkeypatch.setattr(ss, "_redis", lambda: redis)
+    monkeypatch.setattr(ss, "_COLD_START_POLL", 0.01)
+    reader = _Reader(delay=0.05)
+    workers = [_worker(reader, {"employees": "1"}) for _ in range(3)]
+
+    async def scenario():
+        return await asyncio.gather(*[w.refresh() for w in workers])
+
+    schemas = asyncio.run(scenario())
+    assert reader.builds == 1
+    assert schemas == [{"tables": {"employees": {}}}] * 3
+    assert sum(w.loaded_from_redis for w in workers) == 2
+
+
+def test_cold_start_rebuilds_when_lock_holder_never_publishes(monkeypatch):
+    redis = _FakeRedis()
+    redis.values[ss._lock_key(("struct-1", "stats-1"))] = "1"   # pemegang lock mati
+    monkeypatch.setattr(ss, "_redis", lambda: redis)
+    monkeypatch.setattr(ss, "_COLD_START_WAIT", 0.05)
+    monkeypatch.setattr(ss, "_COLD_START_POLL", 0.01)
+    reader = _Reader()
+
+    assert asyncio.run(_worker(reader, {}).refresh()) == {"tables": {"employees": {}}}
+    assert reader.builds == 1
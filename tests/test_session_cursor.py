@@ -0,0 +1,20 @@
+import pytest
+
+from memory.memory_supabase import decode_session_cursor, encode_session_cursor
+
+
+def test_cursor_round_trip():
+    row = {"session_id": "abc|123", "pinned": True, "last_message_at": "2026-05-01T10:00:00.123456+00:00"}
+    cursor = encode_session_cursor(row)
+    assert "=" not in cursor and "/" not in cursor and "+" not in cursor
+    assert decode_session_cursor(cursor) == (True, "2026-05-01T10:00:00.123456+00:00", "abc|123")
+
+
+def test_unpinned_cursor():
+    cursor = encode_session_cursor({"session_id": "s1", "pinned": None, "last_message_at": "2026-05-01T10:00:00+00:00"})
+    assert decode_session_cursor(cursor) == (False, "2026-05-01T10:00:00+00:00", "s1")
+
+
+@pytest.mark.parametrize("cursor", ["", "!!!", "bm90LWEtY3Vyc29y", encode_session_cursor({"session_id": "s1"})])
+def test_invalid_cursor_decodes_to_none(cursor):
+    assert decode_session_cursor(cursor) is None
@@ -0,0 +1,178 @@
+import asyncio
+
+import pytest
+
+from backend.services import single_flight as sf
+from backend.services.single_flight import SingleFlight
+
+
+def _producer(seen):
+    async def produce(ctx, cancel_check):
+        seen.append(cancel_check)
+        for chunk in ("a", "b", "c"):
+            await asyncio.sleep(0)
+            yield chunk
+    return produce
+
+
+async def _collect(flight, key, producer, **kwargs):
+    return [chunk async for chunk in flight.stream(key, producer, **kwargs)]
+
+
+def test_disabled_path_uses_caller_cancel_check(monkeypatch):
+    monkeypatch.setattr(sf, "SINGLE_FLIGHT_ENABLED", False)
+    seen = []
+
+    async def check():
+        return False
+
+    chunks = asyncio.run(_collect(SingleFlight("t"), "k", _producer(seen), cancellation_check=check))
+    assert chunks == ["a", "b", "c"]
+    assert seen == [check]
+
+
+def test_orphaned_leader_is_aborted_by_tracked_task(monkeypatch):
+    monkeypatch.setattr(sf, "SINGLE_FLIGHT_ENABLED", True)
+    monkeypatch.setattr(sf, "get_bus_client", lambda: None)
+    flight = SingleFlight("t")
+
+    async def slow(ctx, cancel_check):
+        yield "first"
+        await asyncio.sleep(30)
+        yield "never"
+
+    async def scenario():
+        stream = flight.stream("k", slow)
+        assert await stream.__anext__() == "first"
+        leader = flight._flights["k"]
+        await stream.aclose()
+        # Subscriber dalam di-finalize loop setelah stream luar ditutup
+        for _ in range(5):
+            await asyncio.sleep(0)
+        await asyncio.gather(leader.task, return_exceptions=True)
+        return leader
+
+    leader = asyncio.run(scenario())
+    assert isinstance(leader.error, asyncio.CancelledError)
+    assert flight._background == set()
+    assert flight._flights == {}
+
+
+def test_local_followers_share_one_leader(monkeypatch):
+    monkeypatch.setattr(sf, "SINGLE_FLIGHT_ENABLED", True)
+    monkeypatch.setattr(sf, "get_bus_client", lambda: None)
+    flight = SingleFlight("t")
+    calls = []
+
+    async def produce(ctx, cancel_check):
+        calls.append(1)
+        for chunk in ("a", "b", "c"):
+            await asyncio.sleep(0.01)
+            yield chunk
+        ctx["sources"] = ["sop-1"]
+
+    async def scenario():
+        ctx_a, ctx_b = {}, {}
+        return await asyncio.gather(
+            _collect(flight, "k", produce, out_context=ctx_a),
+            _collect(flight, "k", produce, out_context=ctx_b),
+        ), ctx_a, ctx_b
+
+    (a, b), ctx_a, ctx_b = asyncio.run(scenario())
+    assert a == b == ["a", "b", "c"]
+    assert calls == [1]
+    assert ctx_a == ctx_b == {"sources": ["sop-1"]}
+    assert flight.stats.leaders == 1 and flight.stats.local_followers == 1
+
+
+def test_follower_cancel_does_not_cancel_leader(monkeypatch):
+    monkeypatch.setattr(sf, "SINGLE_FLIGHT_ENABLED", True)
+    monkeypatch.setattr(sf, "get_bus_client", lambda: None)
+    flight = SingleFlight("t")
+
+    async def produce(ctx, cancel_check):
+        for chunk in ("a", "b", "c"):
+            await asyncio.sleep(0.01)
+            yield chunk
+
+    async def scenario():
+        leader = asyncio.create_task(_collect(flight, "k", produce))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(_collect(flight, "k", produce))
+        await asyncio.sleep(0.015)
+        follower.cancel()
+        await asyncio.gather(follower, return_exceptions=True)
+        return follower, await leader
+
+    follower, chunks = asyncio.run(scenario())
+    assert follower.cancelled()
+    assert chunks == ["a", "b", "c"]
+
+
+class _FakeBus:
+    """Client Redis palsu: leader lain sudah memegang lock."""
+
+    async def set(self, *a, **k):
+        return False
+
+    async def get(self, key):
+        return "remote-flight"
+
+    async def incr(self, key):
+        return 1
+
+    async def expire(self, key, ttl):
+        return True
+
+    async def decr(self, key):
+        return 0
+
+
+def _remote(monkeypatch, events):
+    class _Log:
+        def __init__(self, name, ttl=0):
+            self.name = name
+
+        async def follow(self, idle_timeout=0):
+            for i, event in enumerate(events, 1):
+                yield i, event
+
+    monkeypatch.setattr(sf, "SINGLE_FLIGHT_ENABLED", True)
+    monkeypatch.setattr(sf, "get_bus_client", lambda: _FakeBus())
+    monkeypatch.setattr(sf, "EventLog", _Log)
+
+
+def _never_called(ctx, cancel_check):
+    raise AssertionError("follower remote tidak boleh menjalankan pipeline sendiri")
+
+
+def test_remote_follower_reads_leader_log(monkeypatch):
+    _remote(monkeypatch, [{"type": "token", "content": "a"}, {"type": "token", "content": "b"},
+                          {"type": "context", "context": {"sources": ["sop-1"]}}])
+    ctx = {}
+    chunks = asyncio.run(_collect(SingleFlight("t"), "k", _never_called, out_context=ctx))
+    assert chunks == ["a", "b"]
+    assert ctx == {"sources": ["sop-1"]}
+
+
+def test_remote_leader_dying_midway_is_an_error(monkeypatch):
+    _remote(monkeypatch, [{"type": "token", "content": "a"}])
+    flight = SingleFlight("t")
+    got = []
+
+    async def scenario():
+        async for chunk in flight.stream("k", _never_called, out_context={}):
+            got.append(chunk)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(scenario())
+    assert got == ["a"]
+
+
+def test_silent_remote_leader_falls_back_to_own_pipeline(monkeypatch):
+    _remote(monkeypatch, [])
+    flight = SingleFlight("t")
+    seen = []
+    chunks = asyncio.run(_collect(flight, "k", _producer(seen)))
+    assert chunks == ["a", "b", "c"]
+    assert flight.stats.remote_fallbacks == 1
@@ -0,0 +1,76 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from engines.hr.query.sql_cache import SQLCache, normalize_question, question_signature
+
+
+def _sig(question):
+    return question_signature(question, normalize_question(question))
+
+
+def test_normalize_drops_fillers_and_punctuation():
+    assert normalize_question("Tolong, berapa jumlah karyawan dong?") == "berapa jumlah karyawan"
+    assert normalize_question("BERAPA jumlah   karyawan") == normalize_question("berapa jumlah karyawan")
+
+
+@pytest.mark.parametrize("a, b", [
+    ("unit dengan karyawan tertinggi", "unit dengan karyawan terendah"),
+    ("unit dengan karyawan terbanyak", "unit dengan karyawan paling sedikit"),
+    ("karyawan dengan masa kerja lebih dari 10 tahun", "karyawan dengan masa kerja kurang dari 10 tahun"),
+    ("karyawan dengan masa kerja minimal 10 tahun", "karyawan dengan masa kerja maksimal 10 tahun"),
+    ("jumlah karyawan pendidikan S1", "jumlah karyawan pendidikan bukan S1"),
+    ("jumlah karyawan per unit", "jumlah karyawan selain unit pusat"),
+])
+def test_signature_separates_direction_comparison_and_negation(a, b):
+    assert _sig(a) != _sig(b)
+
+
+def test_signature_ignores_fillers():
+    assert _sig("tolong unit dengan karyawan tertinggi") == _sig("unit dengan karyawan tertinggi")
+
+
+class _FakeEmbeddings:
+    """Vektor identik untuk semua pertanyaan → similarity 1.0, hanya signature yang membedakan."""
+
+    def create(self, **kwargs):
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[1.0, 0.0, 0.0])])
+
+
+def test_semantic_match_rejected_when_direction_differs(monkeypatch):
+    cache = SQLCache()
+    monkeypatch.setattr(cache, "_current_structure", lambda: "structure-v1")
+    embed = SimpleNamespace(embeddings=_FakeEmbeddings())
+
+    async def scenario():
+        q = "unit dengan karyawan tertinggi"
+        assert await cache.lookup(q, embed) is None
+        await cache.store(q, "SELECT unit FROM t ORDER BY n DESC LIMIT 1")
+        hit = await cache.lookup("unit yang karyawannya tertinggi", embed)
+        miss = await cache.lookup("unit dengan karyawan terendah", embed)
+        return hit, miss
+
+    hit, miss = asyncio.run(scenario())
+    assert hit is not None and hit.level == "semantic"
+    assert miss is None
+    assert cache.signature_rejects == 1
+
+
+def test_evict_drops_exact_and_semantic_entry(monkeypatch):
+    cache = SQLCache()
+    monkeypatch.setattr(cache, "_current_structure", lambda: "structure-v1")
+    embed = SimpleNamespace(embeddings=_FakeEmbeddings())
+
+    async def scenario():
+        q = "total gaji per unit"
+        await cache.lookup(q, embed)
+        await cache.store(q, "SELECT unit, sum(gaji) FROM t GROUP BY unit")
+        hit = await cache.lookup(q, embed)
+        await cache.evict(hit)
+        return hit, await cache.lookup(q, embed)
+
+    hit, after = asyncio.run(scenario())
+    assert hit is not None and hit.key
+    assert after is None
+    assert cache.evictions == 1
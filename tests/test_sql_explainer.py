@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import time
+import uuid
+
+import pytest
+
+from engines.hr.query import sql_explainer as se
+from engines.hr.query.sql_explainer import SQLExplainer
+from engines.hr.query.sql_generator import SQL_EXPLANATION_FALLBACK
+
+
+class _Generator:
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def generate_sql_explanation(self, sql, question, timeout=None):
+        with self._lock:
+            self.calls.append(sql)
+        time.sleep(self.delay)
+        return f"<b>Bisnis:</b> {question}"
+
+
+@pytest.fixture(autouse=True)
+def no_redis(monkeypatch):
+    monkeypatch.setattr(se, "_redis", lambda: None)
+
+
+def test_concurrent_identical_explains_share_one_llm_call():
+    explainer, generator = SQLExplainer(), _Generator()
+
+    async def scenario():
+        return await asyncio.gather(*[
+            explainer.explain("SELECT count(*)  FROM hr.employees", "jumlah karyawan", generator)
+            for _ in range(5)
+        ])
+
+    results = asyncio.run(scenario())
+    assert results == ["<b>Bisnis:</b> jumlah karyawan"] * 5
+    assert len(generator.calls) == 1
+    assert explainer.coalesced == 4 and explainer.generated == 1
+
+
+def test_cached_explanation_skips_llm():
+    explainer, generator = SQLExplainer(), _Generator(delay=0)
+
+    async def scenario():
+        await explainer.explain("select 1 from hr.units", "unit", generator)
+        return await explainer.explain("SELECT 1 FROM hr.units", "unit", generator)
+
+    assert asyncio.run(scenario()) == "<b>Bisnis:</b> unit"
+    assert len(generator.calls) == 1 and explainer.hits == 1
+
+
+def test_rate_limit_falls_back_to_static_explanation(monkeypatch):
+    monkeypatch.setattr(se, "SQL_EXPLANATION_RATE_LIMIT", "1/minute")
+    explainer, generator = SQLExplainer(), _Generator(delay=0)
+    rate_key = f"nik:{uuid.uuid4().hex}"
+
+    async def scenario():
+        first = await explainer.explain("select a from hr.x", "a", generator, rate_key=rate_key)
+        limited = await explainer.explain("select b from hr.x", "b", generator, rate_key=rate_key)
+        # Cache hit tetap dilayani walau kuota habis
+        cached = await explainer.explain("select a from hr.x", "a", generator, rate_key=rate_key)
+        return first, limited, cached
+
+    first, limited, cached = asyncio.run(scenario())
+    assert first == cached == "<b>Bisnis:</b> a"
+    assert limited == SQL_EXPLANATION_FALLBACK
+    assert generator.calls == ["select a from hr.x"]
+    assert explainer.rate_limited == 1
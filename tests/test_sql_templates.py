@@ -0,0 +1,73 @@
+import pytest
+
+from engines.hr.query.sql_templates import SQLTemplateMatcher
+
+SCHEMA = {
+    "tables": {
+        "employees": {
+            "columns": ["nik", "band", "unit_kerja", "pendidikan", "jenis_kelamin", "tanggal_pensiun"],
+            "column_types": {"tanggal_pensiun": "date"},
+            "category_values": {
+                "band": ["1", "2", "3"],
+                "unit_kerja": ["IT", "Finance", "Produksi"],
+                "pendidikan": ["S1", "S2", "SMA"],
+                "jenis_kelamin": ["Laki-laki", "Perempuan"],
+            },
+        }
+    }
+}
+
+
+def _match(question):
+    return SQLTemplateMatcher().match(question, SCHEMA, {})
+
+
+def test_headcount_total():
+    result = _match("berapa jumlah karyawan")
+    assert result.template == "headcount_total"
+    assert result.sql == "SELECT COUNT(*) AS jumlah_karyawan\nFROM hr.employees;"
+
+
+def test_headcount_total_with_filter():
+    result = _match("berapa karyawan perempuan")
+    assert result.template == "headcount_total"
+    assert "WHERE jenis_kelamin = 'Perempuan'" in result.sql
+
+
+def test_distribution_by_dimension():
+    result = _match("jumlah karyawan per band")
+    assert result.template == "headcount_by_dimension"
+    assert "GROUP BY band" in result.sql
+    assert "ORDER BY jumlah_karyawan DESC" in result.sql
+    assert "LIMIT" not in result.sql
+
+
+def test_top_n():
+    result = _match("top 3 unit kerja dengan karyawan terbanyak")
+    assert result.template == "top_n_dimension"
+    assert "GROUP BY unit_kerja" in result.sql
+    assert result.sql.endswith("LIMIT 3;")
+
+
+def test_percentage_share():
+    result = _match("persentase karyawan S1")
+    assert result.template == "percentage_share"
+    assert "COUNT(*) FILTER (WHERE pendidikan = 'S1')" in result.sql
+
+
+def test_pension_within_years():
+    result = _match("berapa karyawan pensiun dalam 5 tahun")
+    assert result.template == "pension_within"
+    assert "tanggal_pensiun < CURRENT_DATE + INTERVAL '5 years'" in result.sql
+
+
+@pytest.mark.parametrize("question", [
+    "jumlah karyawan yang tidak S1",
+    "jumlah karyawan selain unit IT",
+    "jumlah karyawan per band kecuali band 3",
+    "rata rata gaji per band",
+])
+def test_negation_and_unknown_words_fall_back_to_llm(question):
+    matcher = SQLTemplateMatcher()
+    assert matcher.match(question, SCHEMA, {}) is None
+    assert matcher.fallback_reasons["kata_tidak_dikenal"] == 1
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import struct
+
+import pytest
+
+from backend.utils.sse import SSEWriter, dumps_cbor
+
+
+def _collect(writer, items):
+    async def source():
+        for item in items:
+            yield item
+
+    async def run():
+        return [frame async for frame in writer.stream(source())]
+
+    return asyncio.run(run())
+
+
+def _sse_frames(frames):
+    out = []
+    for frame in frames:
+        text = frame.decode("utf-8")
+        head, _, data = text.partition("data: ")
+        event_id = head[len("id: "):].strip() if head.startswith("id: ") else None
+        out.append((event_id, json.loads(data)))
+    return out
+
+
+def test_first_token_immediate_rest_coalesced():
+    writer = SSEWriter(coalesce_ms=10_000, max_chars=1000)
+    frames = _sse_frames(_collect(writer, [
+        {"type": "token", "content": "Halo"},
+        {"type": "token", "content": " dunia"},
+        {"type": "token", "content": "!"},
+    ]))
+    assert [e for _, e in frames] == [
+        {"type": "token", "content": "Halo"},
+        {"type": "token", "content": " dunia!"},
+    ]
+    assert writer.events == 3 and writer.frames == 2
+
+
+def test_non_token_event_flushes_buffer_in_order():
+    writer = SSEWriter(coalesce_ms=10_000, max_chars=1000)
+    frames = _sse_frames(_collect(writer, [
+        {"type": "token", "content": "a"},
+        {"type": "token", "content": "b"},
+        {"type": "token", "content": "c"},
+        {"type": "table_meta", "rows": 2},
+        {"type": "token", "content": "d"},
+        {"type": "done"},
+    ]))
+    assert [e for _, e in frames] == [
+        {"type": "token", "content": "a"},
+        {"type": "token", "content": "bc"},
+        {"type": "table_meta", "rows": 2},
+        {"type": "token", "content": "d"},
+        {"type": "done"},
+    ]
+
+
+def test_max_chars_flushes_without_waiting():
+    writer = SSEWriter(coalesce_ms=10_000, max_chars=4)
+    frames = _sse_frames(_collect(writer, [
+        {"type": "token", "content": "x"},
+        {"type": "token", "content": "ab"},
+        {"type": "token", "content": "cd"},
+        {"type": "token", "content": "e"},
+    ]))
+    assert [e["content"] for _, e in frames] == ["x", "abcd", "e"]
+
+
+def test_coalesced_frame_carries_last_event_id():
+    writer = SSEWriter(coalesce_ms=10_000, max_chars=1000)
+    frames = _sse_frames(_collect(writer, [
+        ("1", {"type": "token", "content": "a"}),
+        ("2", {"type": "token", "content": "b"}),
+        ("3", {"type": "token", "content": "c"}),
+        ("4", {"type": "done"}),
+    ]))
+    assert [(i, e.get("content")) for i, e in frames] == [("1", "a"), ("3", "bc"), ("4", None)]
+
+
+@pytest.mark.parametrize("obj, expected", [
+    (None, b"\xf6"),
+    (True, b"\xf5"),
+    (False, b"\xf4"),
+    (0, b"\x00"),
+    (23, b"\x17"),
+    (24, b"\x18\x18"),
+    (1000, b"\x19\x03\xe8"),
+    (-1, b"\x20"),
+    (-500, b"\x39\x01\xf3"),
+    (1.5, b"\xfb" + struct.pack(">d", 1.5)),
+    ("a", b"\x61a"),
+    ("é", b"\x62\xc3\xa9"),
+    ([1, 2], b"\x82\x01\x02"),
+    ({"a": 1}, b"\xa1\x61a\x01"),
+])
+def test_dumps_cbor_known_encodings(obj, expected):
+    assert dumps_cbor(obj) == expected
+
+
+def test_cbor_frame_is_length_prefixed_with_id():
+    writer = SSEWriter(binary=True)
+    frame = writer.encode({"type": "done"}, "7")
+    (length,) = struct.unpack(">I", frame[:4])
+    assert length == len(frame) - 4
+    assert frame[4:] == dumps_cbor({"type": "done", "_id": "7"})
+    assert writer.media_type == "application/x-denai-cbor-stream"
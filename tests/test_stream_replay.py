@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+from backend.services import stream_replay as sr
+from backend.services.stream_replay import StreamHub, format_event_id, parse_event_id
+
+
+@pytest.fixture(autouse=True)
+def local_only(monkeypatch):
+    monkeypatch.setattr(sr, "get_bus_client", lambda: None)
+    monkeypatch.setattr(sr, "STREAM_RESUME_GRACE", 0.05)
+
+
+def _gated(gate, tokens=("a", "b", "c", "d")):
+    """Producer yang berhenti setelah token kedua sampai `gate` di-set."""
+    async def events():
+        for i, token in enumerate(tokens):
+            if i == 2:
+                await gate.wait()
+            yield {"type": "token", "content": token}
+    return events()
+
+
+async def _take(agen, n):
+    out = []
+    async for item in agen:
+        out.append(item)
+        if len(out) == n:
+            break
+    return out
+
+
+def test_parse_event_id_roundtrip():
+    assert parse_event_id(format_event_id("abc:def", 42)) == ("abc:def", 42)
+    assert parse_event_id("abc") is None
+    assert parse_event_id("abc:x") is None
+    assert parse_event_id(None) is None
+
+
+def test_resume_replays_after_seq_then_follows_live():
+    async def run():
+        hub = StreamHub()
+        gate = asyncio.Event()
+        hub.start("s1", _gated(gate))
+        first = await _take(hub.subscribe("s1"), 1)
+        resumed = hub.subscribe("s1", after_seq=1)
+        got = [await resumed.__anext__()]
+        gate.set()
+        got += [item async for item in resumed]
+        return first, got
+
+    first, got = asyncio.run(run())
+    assert first == [("s1:1", {"type": "token", "content": "a"})]
+    assert [eid for eid, _ in got] == ["s1:2", "s1:3", "s1:4"]
+    assert [e["content"] for _, e in got] == ["b", "c", "d"]
+
+
+def test_subscribe_after_finish_replays_buffer():
+    async def run():
+        hub = StreamHub()
+        gate = asyncio.Event()
+        gate.set()
+        hub.start("s2", _gated(gate))
+        await asyncio.sleep(0.01)
+        assert hub.active_streams() == {}
+        return [item async for item in hub.subscribe("s2", after_seq=2)]
+
+    got = asyncio.run(run())
+    assert [eid for eid, _ in got] == ["s2:3", "s2:4"]
+
+
+def test_producer_error_is_delivered_as_event():
+    async def broken():
+        yield {"type": "token", "content": "a"}
+        raise ValueError("boom")
+
+    async def run():
+        hub = StreamHub()
+        hub.start("s3", broken())
+        return [event async for _, event in hub.subscribe("s3")]
+
+    events = asyncio.run(run())
+    assert events[-1] == {"type": "error", "message": "boom"}
+
+
+def test_orphaned_stream_is_cancelled_after_grace():
+    async def run():
+        hub = StreamHub()
+        gate = asyncio.Event()
+        orphaned = []
+        hub.start("s4", _gated(gate), on_orphan=lambda: orphaned.append(True))
+        agen = hub.subscribe("s4")
+        await _take(agen, 1)
+        await agen.aclose()
+        await asyncio.sleep(0.15)
+        gate.set()
+        return orphaned
+
+    assert asyncio.run(run()) == [True]
+
+
+def test_resume_within_grace_keeps_producer_alive():
+    async def run():
+        hub = StreamHub()
+        gate = asyncio.Event()
+        orphaned = []
+        hub.start("s5", _gated(gate), on_orphan=lambda: orphaned.append(True))
+        agen = hub.subscribe("s5")
+        await _take(agen, 1)
+        await agen.aclose()
+        await asyncio.sleep(0.01)
+        resumed = hub.subscribe("s5", after_seq=1)
+        got = [await resumed.__anext__()]
+        await asyncio.sleep(0.15)
+        gate.set()
+        got += [item async for item in resumed]
+        return orphaned, got
+
+    orphaned, got = asyncio.run(run())
+    assert orphaned == []
+    assert [e["content"] for _, e in got] == ["b", "c", "d"]
+
+
+def test_orphan_without_callback_cancels_producer_task():
+    async def run():
+        hub = StreamHub()
+        gate = asyncio.Event()
+        hub.start("s6", _gated(gate))
+        agen = hub.subscribe("s6")
+        await _take(agen, 1)
+        await agen.aclose()
+        await asyncio.sleep(0.15)
+        buf = hub._streams["s6"]
+        return buf.finished, len(buf.events)
+
+    finished, n = asyncio.run(run())
+    assert finished is True
+    assert n == 2
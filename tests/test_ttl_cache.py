@@ -0,0 +1,76 @@
+import asyncio
+
+from backend.services import session_cache as sc
+from backend.utils import ttl_cache
+from backend.utils.ttl_cache import MISSING, TTLCache
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(ttl_cache.time, "monotonic", clock)
+    cache = TTLCache(maxsize=10, ttl=5)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=60)
+    clock.now += 6
+    assert cache.get("a") is MISSING
+    assert cache.get("b") == 2
+    assert len(cache) == 1
+
+
+def test_least_recently_used_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_none_is_a_cached_value_not_a_miss():
+    cache = TTLCache()
+    cache.set("unknown", None)
+    assert cache.get("unknown") is None
+    assert cache.get("other") is MISSING
+    assert cache.pop("unknown", "x") is None
+    assert cache.pop("unknown", "x") == "x"
+
+
+def test_unknown_session_meta_is_negative_cached(monkeypatch):
+    import memory.memory_supabase as ms
+    calls = []
+    monkeypatch.setattr(ms, "get_session_meta", lambda sid: calls.append(sid) or None)
+    monkeypatch.setattr(sc, "_redis", lambda: None)
+    cache = sc.SessionCache()
+
+    async def scenario():
+        return [await cache.get_owner("ghost") for _ in range(3)]
+
+    assert asyncio.run(scenario()) == ["", "", ""]
+    assert calls == ["ghost"]
+
+
+def test_session_cache_tracks_background_invalidation(monkeypatch):
+    monkeypatch.setattr(sc, "_redis", lambda: None)
+    cache = sc.SessionCache()
+
+    async def scenario():
+        before = await cache._version("12345")
+        cache.invalidate_list_nowait("12345")
+        assert len(cache._background) == 1
+        await asyncio.gather(*cache._background)
+        await asyncio.sleep(0)
+        return before, await cache._version("12345")
+
+    before, after = asyncio.run(scenario())
+    assert before != after
+    assert cache._background == set()
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from backend.services import user_context as uc
+
+
+class _FakeRedis:
+    def __init__(self, values=None, error=None):
+        self.values = values or {}
+        self.error = error
+        self.gets = 0
+
+    async def get(self, key):
+        self.gets += 1
+        await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+        return self.values.get(key)
+
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setattr(uc, "_user_context_store", uc.TTLCache(maxsize=10, ttl=60))
+    def use(redis):
+        monkeypatch.setattr(uc, "_get_redis", lambda: redis)
+        return redis
+    return use
+
+
+def test_unknown_session_is_negative_cached(store):
+    redis = store(_FakeRedis())
+
+    async def scenario():
+        return [await uc.get_user_context_async("stale") for _ in range(3)]
+
+    assert asyncio.run(scenario()) == [None, None, None]
+    assert redis.gets == 1
+
+
+def test_redis_error_is_not_negative_cached(store):
+    redis = store(_FakeRedis(error=ConnectionError("redis down")))
+
+    async def scenario():
+        return [await uc.get_user_context_async("s1") for _ in range(2)]
+
+    assert asyncio.run(scenario()) == [None, None]
+    assert redis.gets == 2
+
+
+def test_parallel_lookups_share_one_round_trip(store):
+    redis = store(_FakeRedis({uc._redis_key("s1"): '{"nik": "123", "role": "hc"}'}))
+
+    async def scenario():
+        return await asyncio.gather(*[uc.get_user_context_async("s1") for _ in range(5)])
+
+    assert asyncio.run(scenario()) == [{"nik": "123", "role": "hc"}] * 5
+    assert redis.gets == 1
+
+
+def test_cancelled_owner_does_not_hand_waiters_none(store):
+    class _SlowRedis(_FakeRedis):
+        async def get(self, key):
+            self.gets += 1
+            await asyncio.sleep(0.01)
+            return self.values.get(key)
+
+    redis = store(_SlowRedis({uc._redis_key("s1"): '{"nik": "123"}'}))
+
+    async def scenario():
+        owner = asyncio.create_task(uc.get_user_context_async("s1"))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(uc.get_user_context_async("s1"))
+        await asyncio.sleep(0)
+        owner.cancel()
+        return await waiter
+
+    assert asyncio.run(scenario()) == {"nik": "123"}
+    assert redis.gets == 2
+
+
+def test_sync_writes_are_tracked_until_done(store):
+    written = []
+
+    class _WriteRedis:
+        async def set(self, key, value, ex=None):
+            written.append(key)
+
+    store(_WriteRedis())
+
+    async def scenario():
+        uc.set_user_context("s2", {"nik": "9"})
+        assert len(uc._background) == 1
+        await asyncio.gather(*uc._background)
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert written == [uc._redis_key("s2")]
+    assert uc._background == set()
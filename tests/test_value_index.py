@@ -0,0 +1,50 @@
+from engines.hr.query.value_index import ValueIndex, normalize_value
+
+SCHEMA = {
+    "tables": {
+        "employees": {
+            "columns": ["nik", "band", "pendidikan", "jenis_kelamin", "company_home", "provinsi"],
+            "category_values": {
+                "band": ["1", "2", "3"],
+                "pendidikan": ["S1", "S2", "SMA", "D3"],
+                "jenis_kelamin": ["Laki-laki", "Perempuan"],
+                "company_home": ["PT Semen Padang", "PT Semen Tonasa"],
+                "provinsi": ["DKI Jakarta", "Jawa Timur", "Jawa Barat", "Sumatera Barat"],
+            },
+        }
+    }
+}
+
+
+def _resolve(question):
+    return {(m.column, m.value, m.method) for m in ValueIndex().resolve(question, SCHEMA, record=False)}
+
+
+def test_normalize_value():
+    assert normalize_value("  Laki-Laki, Jakarta! ") == "laki laki jakarta"
+    assert normalize_value("Pendidikan: S1") == "pendidikan s1"
+
+
+def test_exact_and_synonym_values():
+    assert ("pendidikan", "S1", "exact") in _resolve("berapa karyawan S1")
+    assert ("pendidikan", "S1", "sinonim") in _resolve("berapa karyawan sarjana")
+    assert ("jenis_kelamin", "Perempuan", "sinonim") in _resolve("jumlah karyawan wanita")
+    assert ("provinsi", "DKI Jakarta", "sinonim") in _resolve("karyawan di jakarta")
+
+
+def test_longest_ngram_wins():
+    assert {v for _, v, _ in _resolve("karyawan di jawa timur")} == {"Jawa Timur"}
+
+
+def test_short_value_needs_column_name():
+    assert ("band", "3", "kolom") in _resolve("karyawan band 3")
+    assert _resolve("karyawan 3") == set()
+
+
+def test_corporate_prefix_acronym_and_fuzzy():
+    assert ("company_home", "PT Semen Padang", "exact") in _resolve("karyawan semen padang")
+    assert any(v == "Sumatera Barat" and m == "fuzzy" for _, v, m in _resolve("karyawan sumatera barta"))
+
+
+def test_no_index_without_category_values():
+    assert ValueIndex().resolve("karyawan S1", {"tables": {"t": {"columns": ["a"]}}}) is None
@@ -0,0 +1,64 @@
+import asyncio
+import types
+
+from backend.api import ws_chat
+from backend.services.request_registry import request_registry
+
+
+class _FakeWS:
+    def __init__(self, host="10.0.0.1"):
+        self.client = types.SimpleNamespace(host=host)
+        self.sent = []
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+
+def test_question_messages_share_the_ask_stream_rate_limit():
+    conn = ws_chat._Connection(_FakeWS(), {"nik": "rate-test-nik"})
+    allowed = [conn.allow_turn() for _ in range(ws_chat._TURN_RATE.amount + 1)]
+    assert all(allowed[:-1]) and not allowed[-1]
+    # Koneksi lain dengan NIK yang sama berbagi kuota
+    assert not ws_chat._Connection(_FakeWS("10.0.0.2"), {"nik": "rate-test-nik"}).allow_turn()
+    # Tanpa auth → per IP
+    assert ws_chat._Connection(_FakeWS("10.0.0.3"), None).rate_key == "ip:10.0.0.3"
+
+
+def test_cancel_before_task_starts_releases_registry_token():
+    async def scenario():
+        conn = ws_chat._Connection(_FakeWS(), None)
+        req = ws_chat.QuestionRequest(question="berapa jumlah karyawan", session_id="ws-early-cancel")
+        task = asyncio.ensure_future(conn.run_turn("t1", req))
+        conn.tasks["t1"] = task
+        assert conn.cancel("t1")          # task belum jalan sama sekali
+        await task
+        return conn
+
+    conn = asyncio.run(scenario())
+    assert request_registry.get("ws-early-cancel") is None
+    assert not conn.tasks and not conn.turns and not conn.cancelled_early
+    assert '"cancelled"' in conn.ws.sent[0]
+
+
+def test_scheduler_keeps_background_tasks_until_done():
+    scheduler = ws_chat._TaskScheduler()
+    done = []
+
+    async def persist(value):
+        await asyncio.sleep(0)
+        done.append(value)
+
+    async def boom():
+        raise RuntimeError("supabase down")
+
+    async def scenario():
+        scheduler.add_task(persist, "turn-1")
+        scheduler.add_task(boom)
+        pending = len(scheduler._tasks)
+        await asyncio.gather(*scheduler._tasks, return_exceptions=True)
+        await asyncio.sleep(0)
+        return pending
+
+    assert asyncio.run(scenario()) == 2
+    assert done == ["turn-1"]
+    assert scheduler._tasks == set()
@@ -46,126 +46,167 @@ async function askBackend(text) {
 
   let streamingBubble = null;
   let fullAnswer = "";
+  let tableColumns = null;  // nilai per kolom dari event table_rows
 
   try {
     const timeoutId = setTimeout(() => controller.abort(), 120000);
+    let events = null;
 
-    const _authSid = window.DenaiApp?.sintaUserData?.session_id || '';
-    const res = await fetch(`${window.API_URL}/ask/stream`, {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/json",
+    // WebSocket persisten (tanpa handshake/header per pertanyaan); gagal → SSE
+    if (window.DENAI_CHAT_TRANSPORT === "ws" && await ChatSocket.ready()) {
+      events = ChatSocket.ask(payload, controller.signal);
+    } else {
+      const _authSid = window.DenaiApp?.sintaUserData?.session_id || '';
+      const _streamHeaders = {
         "Accept": "text/event-stream",
+        ...(window.DENAI_STREAM_ENCODING === "cbor" ? { "X-Stream-Encoding": "cbor" } : {}),
         ...(_authSid ? { "X-Auth-Session": _authSid } : {})
-      },
-      body: JSON.stringify(payload),
-      signal: controller.signal
-    });
-
-    clearTimeout(timeoutId);
-    window.SpeechModule?.stopProcessingFeedback();
+      };
+      const res = await fetch(`${window.API_URL}/ask/stream`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json", ..._streamHeaders },
+        body: JSON.stringify(payload),
+        signal: controller.signal
+      });
 
-    if (!res.ok) {
-      if (res.status === 429) throw new Error("Rate Limit: Terlalu banyak permintaan.");
-      throw new Error(`HTTP ${res.status}: ${res.statusText}`);
+      if (!res.ok) {
+        clearTimeout(timeoutId);
+        window.SpeechModule?.stopProcessingFeedback();
+        if (res.status === 429) throw new Error("Rate Limit: Terlalu banyak permintaan.");
+        throw new Error(`HTTP ${res.status}: ${res.statusText}`);
+      }
+      // Event dibaca dari SSE (JSON) atau frame CBOR — tergantung Content-Type response.
+      // Koneksi putus di tengah jalan di-resume otomatis via Last-Event-ID.
+      events = _resumableStreamEvents(res, controller.signal, _streamHeaders);
     }
 
-    const reader = res.body.getReader();
-    const decoder = new TextDecoder();
-    let buffer = "";
-
-    while (true) {
-      const { done, value } = await reader.read();
-      if (done) break;
-
-      buffer += decoder.decode(value, { stream: true });
-      const parts = buffer.split("\n\n");
-      buffer = parts.pop(); // keep incomplete trailing chunk
+    clearTimeout(timeoutId);
+    window.SpeechModule?.stopProcessingFeedback();
 
-      for (const part of parts) {
-        if (!part.startsWith("data: ")) continue;
-        let event;
-        try { event = JSON.parse(part.slice(6)); } catch { continue; }
-
-        if (event.type === "token") {
-          // First token: remove thinking animation and create streaming bubble
-          if (!streamingBubble) {
-            if (thinkingMessage) {
-              window.CoreApp?.removeThinkingAnimation();
-              thinkingMessage = null;
-            }
-            streamingBubble = _createStreamingBubble();
+    for await (const event of events) {
+      if (event.type === "token") {
+        // First token: remove thinking animation and create streaming bubble
+        if (!streamingBubble) {
+          if (thinkingMessage) {
+            window.CoreApp?.removeThinkingAnimation();
+            thinkingMessage = null;
           }
-          fullAnswer += event.content;
-          if (streamingBubble) {
-            try {
-              let rendered = (typeof marked !== 'undefined')
-                ? marked.parse(fullAnswer)
-                : fullAnswer;
-
-              const hasRujukan = fullAnswer.includes('Rujukan Dokumen');
-              const postProcess = window.CoreApp?._postProcessBotHTML;
-
-              if (hasRujukan && postProcess) {
-                // Rujukan sudah muncul → proses jadi cards langsung
-                rendered = postProcess(rendered);
-              } else {
-                // Belum ada Rujukan → cukup strip [N] dari teks
-                rendered = rendered.replace(/\s*\[\d+\]/g, '');
-              }
-
-              streamingBubble.innerHTML = rendered;
-            } catch (e) {
-              streamingBubble.innerHTML = fullAnswer;
-            }
-            // Auto-scroll hanya kalau user sudah dekat bawah (≤120px dari bottom)
-            // Kalau user scroll ke atas, biarkan — jangan ganggu
-            const msgs = document.getElementById("messages");
-            if (msgs) {
-              const distFromBottom = msgs.scrollHeight - msgs.scrollTop - msgs.clientHeight;
-              if (distFromBottom <= 120) msgs.scrollTop = msgs.scrollHeight;
+          streamingBubble = _createStreamingBubble();
+        }
+        fullAnswer += event.content;
+        if (streamingBubble) {
+          try {
+            let rendered = (typeof marked !== 'undefined')
+              ? marked.parse(fullAnswer)
+              : fullAnswer;
+
+            const hasRujukan = fullAnswer.includes('Rujukan Dokumen');
+            const postProcess = window.CoreApp?._postProcessBotHTML;
+
+            if (hasRujukan && postProcess) {
+              // Rujukan sudah muncul → proses jadi cards langsung
+              rendered = postProcess(rendered);
+            } else {
+              // Belum ada Rujukan → cukup strip [N] dari teks
+              rendered = rendered.replace(/\s*\[\d+\]/g, '');
             }
-          }
 
-        } else if (event.type === "stream_clear") {
-          // Backend detected sentinel — wipe any partial text already shown
-          fullAnswer = "";
-          if (streamingBubble) streamingBubble.innerHTML = "";
-
-        } else if (event.type === "done") {
-          // Simpan source chunks agar DocPanel bisa tampilkan teks kutipan asli
-          window._lastSourceChunks = event.source_chunks?.length ? event.source_chunks : null;
-          // Persist ke sessionStorage — dua key: session-specific + 'last' sebagai fallback
-          if (window._lastSourceChunks) {
-            const _sid = event.session_id || window.CoreApp?.activeChatId;
-            const _json = JSON.stringify(window._lastSourceChunks);
-            try { sessionStorage.setItem('dp_chunks_last', _json); } catch(e) {}
-            if (_sid) try { sessionStorage.setItem(`dp_chunks_${_sid}`, _json); } catch(e) {}
+            streamingBubble.innerHTML = rendered;
+          } catch (e) {
+            streamingBubble.innerHTML = fullAnswer;
           }
-          window.CoreApp?.removeThinkingAnimation();
-
-          // Replace SOP "not found" sentinel with a user-friendly message
-          const _NOT_FOUND = "[DATA_TIDAK_DITEMUKAN_DI_SOP]";
-          const _FRIENDLY = "Maaf, informasi mengenai topik yang Anda tanyakan belum tersedia dalam dokumen SOP dan kebijakan perusahaan saat ini. Silakan hubungi tim HR untuk informasi lebih lanjut.";
-          if (fullAnswer.includes(_NOT_FOUND)) {
-            fullAnswer = _FRIENDLY;
-            if (streamingBubble) streamingBubble.innerHTML = _FRIENDLY;
+          // Auto-scroll hanya kalau user sudah dekat bawah (≤120px dari bottom)
+          // Kalau user scroll ke atas, biarkan — jangan ganggu
+          const msgs = document.getElementById("messages");
+          if (msgs) {
+            const distFromBottom = msgs.scrollHeight - msgs.scrollTop - msgs.clientHeight;
+            if (distFromBottom <= 120) msgs.scrollTop = msgs.scrollHeight;
           }
+        }
 
-          if (event.answer) {
-            // Non-streaming path (greeting / casual_chat / HR analytics)
-            if (streamingBubble) { streamingBubble.closest(".msg")?.remove(); streamingBubble = null; }
+      } else if (event.type === "table_meta") {
+        // HR analytics: metadata tabel datang duluan — rows menyusul per batch (table_rows)
+        window._pendingTableMeta = event;
+        const _thinkingText = thinkingMessage?.querySelector?.(".thinking-text");
+        if (_thinkingText) _thinkingText.textContent = `Menyusun tabel (${event.total_rows} baris)`;
+        tableColumns = (event.columns || []).map(() => []);
+
+      } else if (event.type === "table_rows") {
+        // Batch rows format kolom: column_data[i] = nilai kolom i mulai dari baris ke-offset
+        if (!tableColumns) tableColumns = event.column_data.map(() => []);
+        event.column_data.forEach((values, i) => {
+          const target = tableColumns[i] || (tableColumns[i] = []);
+          values.forEach((v, j) => { target[event.offset + j] = v; });
+        });
+        const _thinkingText = thinkingMessage?.querySelector?.(".thinking-text");
+        const _total = window._pendingTableMeta?.total_rows;
+        if (_thinkingText && _total) {
+          _thinkingText.textContent = `Menyusun tabel (${Math.min(tableColumns[0]?.length || 0, _total)}/${_total} baris)`;
+        }
 
-            // Greeting → render welcome card, skip normal bubble
-            if (event.message_type === "greeting") {
-              window.CoreApp?._showGreetingCard();
-              return;
-            }
+      } else if (event.type === "stream_clear") {
+        // Backend detected sentinel — wipe any partial text already shown
+        fullAnswer = "";
+        if (streamingBubble) streamingBubble.innerHTML = "";
+
+      } else if (event.type === "done") {
+        // Tabel format kolom (column_data / hasil table_rows) → rows list dict seperti biasa
+        if (event.data?.encoding === "columnar") event.data = _expandTableData(event.data, tableColumns);
+        // Simpan source chunks agar DocPanel bisa tampilkan teks kutipan asli
+        window._lastSourceChunks = event.source_chunks?.length ? event.source_chunks : null;
+        // Persist ke sessionStorage — dua key: session-specific + 'last' sebagai fallback
+        if (window._lastSourceChunks) {
+          const _sid = event.session_id || window.CoreApp?.activeChatId;
+          const _json = JSON.stringify(window._lastSourceChunks);
+          try { sessionStorage.setItem('dp_chunks_last', _json); } catch(e) {}
+          if (_sid) try { sessionStorage.setItem(`dp_chunks_${_sid}`, _json); } catch(e) {}
+        }
+        window.CoreApp?.removeThinkingAnimation();
+
+        // Replace SOP "not found" sentinel with a user-friendly message
+        const _NOT_FOUND = "[DATA_TIDAK_DITEMUKAN_DI_SOP]";
+        const _FRIENDLY = "Maaf, informasi mengenai topik yang Anda tanyakan belum tersedia dalam dokumen SOP dan kebijakan perusahaan saat ini. Silakan hubungi tim HR untuk informasi lebih lanjut.";
+        if (fullAnswer.includes(_NOT_FOUND)) {
+          fullAnswer = _FRIENDLY;
+          if (streamingBubble) streamingBubble.innerHTML = _FRIENDLY;
+        }
 
-            handleBackendResponse({
-              answer: event.answer,
-              session_id: event.session_id,
-              authorized: event.authorized ?? true,
+        if (event.answer) {
+          // Non-streaming path (greeting / casual_chat / HR analytics)
+          if (streamingBubble) { streamingBubble.closest(".msg")?.remove(); streamingBubble = null; }
+
+          // Greeting → render welcome card, skip normal bubble
+          if (event.message_type === "greeting") {
+            window.CoreApp?._showGreetingCard();
+            return;
+          }
+
+          handleBackendResponse({
+            answer: event.answer,
+            session_id: event.session_id,
+            authorized: event.authorized ?? true,
+            message_type: event.message_type,
+            data: event.data,
+            trace_id: event.trace_id,
+            turn_id: event.turn_id,
+            conversation_id: event.conversation_id,
+            visualization_available: event.visualization_available,
+            chart_hints: event.chart_hints,
+            sql_query: event.sql_query,
+            sql_explanation: event.sql_explanation,
+          });
+        } else {
+          // Streaming path: finalize bubble, get msgDiv back
+          const finishedMsgDiv = _finalizeStreamingBubble(streamingBubble, fullAnswer, event.trace_id);
+          streamingBubble = null;
+          if (window.isCallModeActive) {
+            window.CallModeModule?.appendCallTranscript('ai', fullAnswer);
+          }
+          scheduleAutoSpeech(fullAnswer);
+
+          // A+B merge: append analytics table INSIDE the same chat bubble
+          if (event.message_type === "analytics_result" && event.data) {
+            const analyticsPayload = {
               message_type: event.message_type,
               data: event.data,
               trace_id: event.trace_id,
@@ -175,53 +216,30 @@ async function askBackend(text) {
               chart_hints: event.chart_hints,
               sql_query: event.sql_query,
               sql_explanation: event.sql_explanation,
-            });
-          } else {
-            // Streaming path: finalize bubble, get msgDiv back
-            const finishedMsgDiv = _finalizeStreamingBubble(streamingBubble, fullAnswer, event.trace_id);
-            streamingBubble = null;
-            if (window.isCallModeActive) {
-              window.CallModeModule?.appendCallTranscript('ai', fullAnswer);
+            };
+            const merged = _appendAnalyticsToMessage(finishedMsgDiv, analyticsPayload);
+            if (!merged) {
+              // fallback: separate message if renderer unavailable
+              window.CoreApp?.addMessage("bot", "", false, analyticsPayload);
             }
-            scheduleAutoSpeech(fullAnswer);
-
-            // A+B merge: append analytics table INSIDE the same chat bubble
-            if (event.message_type === "analytics_result" && event.data) {
-              const analyticsPayload = {
-                message_type: event.message_type,
-                data: event.data,
-                trace_id: event.trace_id,
-                turn_id: event.turn_id,
-                conversation_id: event.conversation_id,
-                visualization_available: event.visualization_available,
-                chart_hints: event.chart_hints,
-                sql_query: event.sql_query,
-                sql_explanation: event.sql_explanation,
-              };
-              const merged = _appendAnalyticsToMessage(finishedMsgDiv, analyticsPayload);
-              if (!merged) {
-                // fallback: separate message if renderer unavailable
-                window.CoreApp?.addMessage("bot", "", false, analyticsPayload);
-              }
-              if (event.visualization_available && event.turn_id) {
-                window.VisualizationModule?.renderVisualizationOffer(event.conversation_id, event.turn_id);
-              }
+            if (event.visualization_available && event.turn_id) {
+              window.VisualizationModule?.renderVisualizationOffer(event.conversation_id, event.turn_id);
             }
           }
+        }
 
-        } else if (event.type === "error") {
-          window.CoreApp?.removeThinkingAnimation();
-          if (streamingBubble) { streamingBubble.closest(".msg")?.remove(); streamingBubble = null; }
-          if (event.error_code === "rate_limit") {
-            window.CoreApp?._showRateLimitCard();
-          } else {
-            window.CoreApp?.addMessage("bot", `❌ ${event.message}`);
-          }
-
-        } else if (event.type === "cancelled") {
-          _stopAndKeepPartial(streamingBubble, fullAnswer);
-          streamingBubble = null;
+      } else if (event.type === "error") {
+        window.CoreApp?.removeThinkingAnimation();
+        if (streamingBubble) { streamingBubble.closest(".msg")?.remove(); streamingBubble = null; }
+        if (event.error_code === "rate_limit") {
+          window.CoreApp?._showRateLimitCard();
+        } else {
+          window.CoreApp?.addMessage("bot", `❌ ${event.message}`);
         }
+
+      } else if (event.type === "cancelled") {
+        _stopAndKeepPartial(streamingBubble, fullAnswer);
+        streamingBubble = null;
       }
     }
 
@@ -249,6 +267,291 @@ async function askBackend(text) {
   }
 }
 
+/* ================= WEBSOCKET TRANSPORT (/ws/chat) ================= */
+const ChatSocket = (() => {
+  const TERMINAL = new Set(["done", "error", "cancelled"]);
+  const turns = new Map();      // turn_id → { push, fail }
+  const feedbacks = new Map();  // trace_id → resolve
+  let socket = null;
+  let opening = null;
+  let disabledUntil = 0;        // backoff setelah gagal connect → pakai SSE dulu
+
+  function _url() {
+    const base = window.API_URL.replace(/^http/, "ws");
+    const auth = window.DenaiApp?.sintaUserData?.session_id || "";
+    return `${base}/ws/chat${auth ? `?auth=${encodeURIComponent(auth)}` : ""}`;
+  }
+
+  function _connect() {
+    if (socket && socket.readyState === WebSocket.OPEN) return Promise.resolve(socket);
+    if (opening) return opening;
+    opening = new Promise((resolve, reject) => {
+      const ws = new WebSocket(_url());
+      const timer = setTimeout(() => { ws.close(); }, 5000);
+      ws.onopen = () => { clearTimeout(timer); socket = ws; opening = null; resolve(ws); };
+      ws.onclose = () => {
+        clearTimeout(timer);
+        if (opening) { opening = null; reject(new Error("WebSocket gagal tersambung")); }
+        socket = null;
+        for (const turn of turns.values()) turn.fail(new Error("Koneksi WebSocket terputus"));
+        turns.clear();
+        for (const resolveAck of feedbacks.values()) resolveAck(false);
+        feedbacks.clear();
+      };
+      ws.onmessage = (msg) => {
+        let event;
+        try { event = JSON.parse(msg.data); } catch { return; }
+        if (event.type === "feedback_ack") {
+          feedbacks.get(event.trace_id)?.(event.status !== "error");
+          feedbacks.delete(event.trace_id);
+          return;
+        }
+        turns.get(event.turn_id)?.push(event);
+      };
+    });
+    return opening;
+  }
+
+  async function ready() {
+    if (!("WebSocket" in window) || Date.now() < disabledUntil) return false;
+    try {
+      await _connect();
+      return true;
+    } catch (e) {
+      console.warn("⚠️ WebSocket tidak tersedia, fallback ke SSE:", e.message);
+      disabledUntil = Date.now() + 60000;
+      return false;
+    }
+  }
+
+  async function* ask(payload, signal) {
+    const ws = await _connect();
+    const turnId = window.crypto?.randomUUID?.() || `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+    const queue = [];
+    let wake = null;
+    let failure = null;
+
+    turns.set(turnId, {
+      push: (event) => { queue.push(event); wake?.(); },
+      fail: (err) => { failure = err; wake?.(); },
+    });
+    // Stop = pesan cancel eksplisit, pipeline di server berhenti seketika
+    const onAbort = () => {
+      try { ws.send(JSON.stringify({ type: "cancel", turn_id: turnId })); } catch (e) {}
+      failure = new DOMException("Request dibatalkan", "AbortError");
+      wake?.();
+    };
+    signal?.addEventListener("abort", onAbort, { once: true });
+
+    try {
+      ws.send(JSON.stringify({ type: "question", turn_id: turnId, ...payload }));
+      while (true) {
+        while (queue.length) {
+          const event = queue.shift();
+          if (event.type === "ws_error") {
+            if (event.error_code === "rate_limit") throw new Error("Rate Limit: Terlalu banyak permintaan.");
+            throw new Error(event.message);
+          }
+          yield event;
+          if (TERMINAL.has(event.type)) return;
+        }
+        if (failure) throw failure;
+        await new Promise(resolve => { wake = resolve; });
+        wake = null;
+      }
+    } finally {
+      turns.delete(turnId);
+      signal?.removeEventListener("abort", onAbort);
+    }
+  }
+
+  function feedback(body) {
+    // Kirim lewat socket yang sudah terbuka; false → caller pakai POST /feedback
+    if (!socket || socket.readyState !== WebSocket.OPEN || !body?.trace_id) return Promise.resolve(false);
+    return new Promise(resolve => {
+      feedbacks.set(body.trace_id, resolve);
+      try { socket.send(JSON.stringify({ type: "feedback", ...body })); }
+      catch (e) { feedbacks.delete(body.trace_id); resolve(false); }
+    });
+  }
+
+  return { ready, ask, feedback };
+})();
+window.ChatSocket = ChatSocket;
+
+/* ================= STREAM DECODING (SSE JSON / CBOR) ================= */
+const CBOR_STREAM_TYPE = "application/x-denai-cbor-stream";
+
+async function* _readStreamEvents(res) {
+  const reader = res.body.getReader();
+  const isCbor = (res.headers.get("content-type") || "").includes(CBOR_STREAM_TYPE);
+
+  if (isCbor) {
+    // Frame = panjang 4 byte (big-endian) + payload CBOR
+    let buf = new Uint8Array(0);
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      const merged = new Uint8Array(buf.length + value.length);
+      merged.set(buf);
+      merged.set(value, buf.length);
+      buf = merged;
+
+      let offset = 0;
+      while (buf.length - offset >= 4) {
+        const len = new DataView(buf.buffer, buf.byteOffset + offset, 4).getUint32(0);
+        if (buf.length - offset - 4 < len) break; // frame belum lengkap
+        let event = null;
+        try { event = _decodeCbor(buf.subarray(offset + 4, offset + 4 + len)); } catch (e) { console.warn("⚠️ CBOR frame invalid:", e); }
+        offset += 4 + len;
+        if (event) yield event;
+      }
+      buf = buf.slice(offset);
+    }
+    return;
+  }
+
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+
+    buffer += decoder.decode(value, { stream: true });
+    const parts = buffer.split("\n\n");
+    buffer = parts.pop(); // keep incomplete trailing chunk
+
+    for (const part of parts) {
+      const lines = part.split("\n");
+      const dataLine = lines.find(line => line.startsWith("data: "));
+      if (!dataLine) continue;
+      let event;
+      try { event = JSON.parse(dataLine.slice(6)); } catch { continue; }
+      const idLine = lines.find(line => line.startsWith("id: "));
+      if (idLine) event._id = idLine.slice(4).trim();
+      yield event;
+    }
+  }
+}
+
+const STREAM_RESUME_MAX_ATTEMPTS = 3;
+const STREAM_TERMINAL_EVENTS = new Set(["done", "error", "cancelled"]);
+
+async function* _resumableStreamEvents(res, signal, extraHeaders = {}) {
+  // Koneksi putus di tengah jawaban → GET /ask/stream/resume dengan Last-Event-ID:
+  // backend replay event yang terlewat lalu lanjut live (pipeline tidak diulang)
+  let current = res;
+  let lastEventId = null;
+  let attempt = 0;
+  while (true) {
+    let finished = false;
+    let dropError = null;
+    try {
+      for await (const event of _readStreamEvents(current)) {
+        if (event._id) lastEventId = event._id;
+        attempt = 0;
+        if (STREAM_TERMINAL_EVENTS.has(event.type)) finished = true;
+        yield event;
+      }
+    } catch (err) {
+      if (err.name === "AbortError") throw err;
+      dropError = err;
+    }
+    if (finished) return;
+    if (!lastEventId) {
+      if (dropError) throw dropError;
+      return;
+    }
+    current = null;
+    while (!current && attempt < STREAM_RESUME_MAX_ATTEMPTS) {
+      attempt++;
+      console.warn(`🔁 Stream terputus, resume #${attempt} dari ${lastEventId}`);
+      await new Promise(r => setTimeout(r, 400 * attempt));
+      try {
+        const resumed = await fetch(`${window.API_URL}/ask/stream/resume`, {
+          method: "GET",
+          headers: { ...extraHeaders, "Last-Event-ID": lastEventId },
+          signal
+        });
+        if (resumed.ok) current = resumed;
+        else if (resumed.status === 404 || resumed.status === 400) break; // buffer kedaluwarsa
+      } catch (err) {
+        if (err.name === "AbortError") throw err;
+      }
+    }
+    if (!current) throw dropError || new Error("Koneksi terputus dan stream tidak bisa dilanjutkan.");
+  }
+}
+
+function _decodeCbor(bytes) {
+  // Decoder CBOR minimal — pasangan dari dumps_cbor() di backend/utils/sse.py
+  const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+  const utf8 = new TextDecoder();
+  let pos = 0;
+
+  const readLen = (info) => {
+    if (info < 24) return info;
+    if (info === 24) { const v = view.getUint8(pos); pos += 1; return v; }
+    if (info === 25) { const v = view.getUint16(pos); pos += 2; return v; }
+    if (info === 26) { const v = view.getUint32(pos); pos += 4; return v; }
+    if (info === 27) { const v = Number(view.getBigUint64(pos)); pos += 8; return v; }
+    throw new Error(`CBOR: length info ${info} tidak didukung`);
+  };
+
+  const readItem = () => {
+    const head = view.getUint8(pos++);
+    const major = head >> 5;
+    const info = head & 0x1f;
+    switch (major) {
+      case 0: return readLen(info);
+      case 1: return -1 - readLen(info);
+      case 3: {
+        const n = readLen(info);
+        const str = utf8.decode(bytes.subarray(pos, pos + n));
+        pos += n;
+        return str;
+      }
+      case 4: {
+        const n = readLen(info);
+        const arr = new Array(n);
+        for (let i = 0; i < n; i++) arr[i] = readItem();
+        return arr;
+      }
+      case 5: {
+        const n = readLen(info);
+        const obj = {};
+        for (let i = 0; i < n; i++) { const key = readItem(); obj[key] = readItem(); }
+        return obj;
+      }
+      case 7:
+        if (info === 20) return false;
+        if (info === 21) return true;
+        if (info === 22 || info === 23) return null;
+        if (info === 27) { const v = view.getFloat64(pos); pos += 8; return v; }
+    }
+    throw new Error(`CBOR: major type ${major} tidak didukung`);
+  };
+
+  return readItem();
+}
+
+/* ================= COLUMNAR TABLE DECODING ================= */
+// Backend mengirim tabel analytics per kolom (nama kolom tidak diulang per baris).
+// Renderer/visualisasi tetap menerima { columns, rows: [ {kolom: nilai} ] }.
+function _expandTableData(data, streamedColumns) {
+  const columnData = data.rows_streamed ? (streamedColumns || []) : (data.column_data || []);
+  const keys = data.row_keys || data.columns || [];
+  const total = columnData.length ? (data.total_rows ?? columnData[0].length) : 0;
+  const rows = new Array(total);
+  for (let r = 0; r < total; r++) {
+    const row = {};
+    for (let c = 0; c < keys.length; c++) row[keys[c]] = columnData[c]?.[r] ?? null;
+    rows[r] = row;
+  }
+  const { column_data, row_keys, rows_streamed, encoding, ...rest } = data;
+  return { ...rest, rows };
+}
+
 function _createStreamingBubble() {
   const messages = document.getElementById("messages");
   if (!messages) return null;
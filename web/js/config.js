@@ -11,4 +11,12 @@
     // Production: Wajib pakai HTTPS dan domain!
     window.API_URL = 'https://denai.online'; 
   }
+
+  // Encoding stream /ask/stream: 'cbor' (frame biner ringkas) di production,
+  // 'json' (SSE biasa, mudah dibaca di DevTools) saat development
+  window.DENAI_STREAM_ENCODING = isLocal ? 'json' : 'cbor';
+
+  // Transport chat: 'ws' = satu WebSocket persisten per tab (/ws/chat),
+  // otomatis fallback ke SSE (/ask/stream) kalau WebSocket gagal tersambung
+  window.DENAI_CHAT_TRANSPORT = 'ws';
 })();
\ No newline at end of file
@@ -1226,12 +1226,15 @@ async function _submitFeedbackWithComment(traceId, buttonEl) {
   buttonEl.textContent = "Mengirim...";
 
   try {
-    const res = await fetch(`${window.API_URL}/feedback`, {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ trace_id: traceId, score: 0, comment }),
-    });
-    if (!res.ok) throw new Error(`HTTP ${res.status}`);
+    const body = { trace_id: traceId, score: 0, comment };
+    if (!(await window.ChatSocket?.feedback(body))) {
+      const res = await fetch(`${window.API_URL}/feedback`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(body),
+      });
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+    }
     console.log(`✅ Feedback (thumbs-down) sent: trace=${traceId}`);
 
     // Tampilkan konfirmasi
@@ -1267,12 +1270,15 @@ async function submitFeedback(traceId, score, buttonEl) {
   buttonEl.style.opacity = '1';
 
   try {
-    const res = await fetch(`${window.API_URL}/feedback`, {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ trace_id: traceId, score }),
-    });
-    if (!res.ok) throw new Error(`HTTP ${res.status}`);
+    const body = { trace_id: traceId, score };
+    if (!(await window.ChatSocket?.feedback(body))) {
+      const res = await fetch(`${window.API_URL}/feedback`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(body),
+      });
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+    }
     console.log(`✅ Feedback sent: trace=${traceId}, score=${score}`);
   } catch (e) {
     console.error('❌ Failed to send feedback:', e);
@@ -639,22 +639,18 @@ class EnhancedHRAnalyticsRenderer {
     if (sqlQuery === 'undefined') sqlQuery = null;
     if (sqlExplanation === 'undefined') sqlExplanation = null;
 
-    const sections = this._parseSQLExplanation(sqlExplanation);
+    // Penjelasan SQL dibuat on-demand di backend (SQL_EXPLANATION_LAZY) → fetch saat panel dibuka
+    const turnId = responseData.turn_id ||
+                   (responseData.data && responseData.data.turn_id) ||
+                   (responseData.originalData && responseData.originalData.turn_id) || null;
+    const fetchExplanation = !sqlExplanation && sqlQuery && turnId;
 
-    const tujuanHTML = sections.tujuan
+    const explanationHTML = fetchExplanation
       ? `<div class="sql-section">
-           <div class="sql-section-label">Tujuan Bisnis (Untuk HR)</div>
-           <div class="sql-tujuan-text">${sections.tujuan}</div>
+           <div class="sql-section-label">Penjelasan Query</div>
+           <div class="sql-tujuan-text" style="color:#6b7280; font-style:italic;">Menyiapkan penjelasan query...</div>
          </div>`
-      : '';
-
-    const logikaItems = sections.logika ? this._ulToOlHtml(sections.logika) : '';
-    const logikaHTML = logikaItems
-      ? `<div class="sql-section">
-           <div class="sql-section-label">Langkah Logika Query (Non-Teknis)</div>
-           <div class="sql-steps-card">${logikaItems}</div>
-         </div>`
-      : '';
+      : this._renderSQLExplanationSections(sqlExplanation);
 
     const sqlCodeHTML = sqlQuery
       ? `<div class="sql-section">
@@ -689,8 +685,7 @@ class EnhancedHRAnalyticsRenderer {
           </button>
         </div>
         <div class="sql-inspector-body">
-          ${tujuanHTML}
-          ${logikaHTML}
+          <div class="sql-explanation-slot">${explanationHTML}</div>
           ${sqlCodeHTML}
           ${emptyHTML}
         </div>
@@ -714,6 +709,10 @@ class EnhancedHRAnalyticsRenderer {
     const cancelBtn = modal.querySelector('.sql-btn-cancel');
     if (cancelBtn) cancelBtn.addEventListener('click', closeModal);
 
+    if (fetchExplanation) {
+      this._loadSQLExplanation(turnId, responseData, modal.querySelector('.sql-explanation-slot'));
+    }
+
     const copyBtn = modal.querySelector('.sql-btn-copy');
     if (copyBtn && sqlQuery) {
       copyBtn.addEventListener('click', () => {
@@ -727,6 +726,49 @@ class EnhancedHRAnalyticsRenderer {
     }
   }
 
+  _renderSQLExplanationSections(sqlExplanation) {
+    const sections = this._parseSQLExplanation(sqlExplanation);
+
+    const tujuanHTML = sections.tujuan
+      ? `<div class="sql-section">
+           <div class="sql-section-label">Tujuan Bisnis (Untuk HR)</div>
+           <div class="sql-tujuan-text">${sections.tujuan}</div>
+         </div>`
+      : '';
+
+    const logikaItems = sections.logika ? this._ulToOlHtml(sections.logika) : '';
+    const logikaHTML = logikaItems
+      ? `<div class="sql-section">
+           <div class="sql-section-label">Langkah Logika Query (Non-Teknis)</div>
+           <div class="sql-steps-card">${logikaItems}</div>
+         </div>`
+      : '';
+
+    return tujuanHTML + logikaHTML;
+  }
+
+  /**
+   * Fetch penjelasan SQL on-demand (GET /artifacts/{turn_id}/sql-explanation).
+   * Hasil disimpan ke responseData supaya buka ulang panel tidak fetch lagi.
+   */
+  async _loadSQLExplanation(turnId, responseData, slot) {
+    if (!slot) return;
+    try {
+      const headers = typeof _authHeaders === 'function' ? _authHeaders() : { 'Accept': 'application/json' };
+      const res = await fetch(`${window.API_URL}/artifacts/${encodeURIComponent(turnId)}/sql-explanation`, { headers });
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      const body = await res.json();
+      if (!body.sql_explanation) throw new Error('empty explanation');
+      responseData.sql_explanation = body.sql_explanation;
+      if (slot.isConnected) slot.innerHTML = this._renderSQLExplanationSections(body.sql_explanation);
+    } catch (e) {
+      console.warn('⚠️ Penjelasan SQL gagal dimuat:', e);
+      if (slot.isConnected) {
+        slot.innerHTML = `<div style="padding:8px 0; color:#6b7280; font-style:italic; font-size:14px;">Penjelasan query belum tersedia. Tutup dan buka kembali panel ini untuk mencoba lagi.</div>`;
+      }
+    }
+  }
+
   escapeHtml(text) {
     const div = document.createElement('div');
     div.textContent = text;
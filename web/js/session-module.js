@@ -302,87 +302,131 @@ async function scanAndRenderHiddenPayloads(sessionId) {
 
             const decodedJsonStr = decodeURIComponent(encodedPayload);
             const recoveredData = JSON.parse(decodedJsonStr);
-            
-            const chatBubble = span.closest('.msg');
-            if (!chatBubble) continue;
-
-            if (chatBubble.hasAttribute('data-analytics-restored')) {
-                span.remove(); continue;
-            }
-            chatBubble.setAttribute('data-analytics-restored', 'true');
-
-            // 🔥 FIX: Restructure DOM to move data outside bubble
-            let bubbleElement = chatBubble.querySelector('.bubble');
-            let chatColumn = chatBubble.querySelector('.chat-column');
-
-            // If we have a bubble but no chat-column, create the structure
-            if (bubbleElement && !chatColumn) {
-                chatColumn = document.createElement('div');
-                chatColumn.className = 'chat-column';
-                bubbleElement.parentNode.insertBefore(chatColumn, bubbleElement);
-                chatColumn.appendChild(bubbleElement);
-            }
-
-            // Fallback for targeting content
-            const contentBox = chatBubble.querySelector('.msg-content') || bubbleElement || chatBubble;
-            const rawHtml = contentBox.innerHTML;
-            
-            let extractedSql = recoveredData.sql_query;
-            let extractedExp = recoveredData.sql_explanation;
-
-            if (!extractedSql || extractedSql.length < 20) {
-                const sqlMatch = rawHtml.match(/<pre[^>]*>\s*<code[^>]*>([\s\S]*?)<\/code>\s*<\/pre>/i) || 
-                                 rawHtml.match(/```(?:sql)?\s*([\s\S]*?)\s*```/i);
-                if (sqlMatch) extractedSql = sqlMatch[1].replace(/&lt;/g, '<').replace(/&gt;/g, '>').trim();
-            }
-            if (!extractedExp) {
-                const expMatch = rawHtml.match(/Penjelasan Logika:.*?([\s\S]*?)(?:<hr>|---|\*📊|<em|<div id="analytics)/i);
-                if (expMatch) extractedExp = expMatch[1].trim(); 
-            }
-
-            let currentHtml = rawHtml.replace(/<h[1-6][^>]*>.*?COMPLETE QUERY RESULTS.*?<\/h[1-6]>[\s\S]*/i, '');
-            currentHtml = currentHtml.replace(/# 📊 \*\*COMPLETE QUERY RESULTS\*\*[\s\S]*/g, '');
-            currentHtml = currentHtml.replace(/DATA:[\s\S]*/g, ''); 
-            if (currentHtml.replace(/<[^>]*>?/gm, '').trim().length < 5) currentHtml = '';
-
-            const messageId = chatBubble.id ? chatBubble.id.replace('msg-', '') : `rec-${Date.now()}-${index}`;
-            
-            // 1. Update BUBBLE content (Text Only)
-            const textHTML = currentHtml ? `<div style="background: white; padding: 16px 20px; border-radius: 12px; border: 1px solid #e5e7eb; margin-bottom: 12px;">${currentHtml}</div>` : '';
-            contentBox.innerHTML = textHTML;
-            
-            // 2. Create DATA CONTAINER (Sibling to Bubble)
-            const dataContainer = document.createElement('div');
-            dataContainer.id = `analytics-container-${messageId}`;
-            dataContainer.className = 'data-result';
-            
-            if (chatColumn) {
-                chatColumn.appendChild(dataContainer);
-            } else {
-                chatBubble.appendChild(dataContainer); // Fallback
-            }
-
-            if (window.HRAnalyticsRenderer) {
-                const reconstructedResponse = {
-                    answer: "", data: recoveredData,
-                    sql_query: extractedSql || recoveredData.sql_query,
-                    sql_explanation: extractedExp || recoveredData.sql_explanation
-                };
-                window.HRAnalyticsRenderer.render(reconstructedResponse, messageId, dataContainer);
-            }
-
-            if (window.VisualizationModule) {
-                // Register contentBox as viz bubble target so it renders inside the bubble
-                window._hrVizBubbleMap = window._hrVizBubbleMap || {};
-                // FIX: Map to chatColumn so charts render as siblings
-                window._hrVizBubbleMap[messageId] = chatColumn || chatBubble;
-
-                window.VisualizationModule.setAnalyticsData(messageId, recoveredData);
-                window.VisualizationModule.renderVisualizationOffer(sessionId, messageId);
-            }
+            restoreAnalyticsPayload(span, recoveredData, sessionId, index);
         } catch (e) { console.error("❌ Gagal memulihkan payload:", e); }
         if (span.parentNode) span.remove();
     }
+
+    // Pesan baru hanya membawa referensi artifact → tabel/chart di-fetch saat user membukanya
+    const artifactSpans = Array.from(document.querySelectorAll('.denai-artifact'));
+    artifactSpans.forEach((span, index) => renderArtifactOpener(span, sessionId, hiddenSpans.length + index));
+}
+
+function renderArtifactOpener(span, sessionId, index) {
+    const turnId = span.getAttribute('data-artifact');
+    const chatBubble = span.closest('.msg');
+    if (!turnId || !chatBubble || chatBubble.hasAttribute('data-analytics-restored')) {
+        if (span.parentNode) span.remove();
+        return;
+    }
+    if (chatBubble.querySelector('.denai-artifact-open')) return;
+
+    const rows = parseInt(span.getAttribute('data-rows') || '0', 10);
+    const button = document.createElement('button');
+    button.type = 'button';
+    button.className = 'denai-artifact-open';
+    button.style.cssText = 'margin-top: 10px; padding: 6px 14px; border-radius: 8px; border: 1px solid #e5e7eb; background: #f9fafb; color: #374151; font-size: 13px; cursor: pointer;';
+    button.textContent = rows ? `📊 Tampilkan tabel & grafik (${rows} baris)` : '📊 Tampilkan tabel & grafik';
+
+    button.addEventListener('click', async () => {
+        button.disabled = true;
+        button.textContent = '⏳ Memuat data...';
+        try {
+            const res = await fetch(`${window.API_URL}/artifacts/${encodeURIComponent(decodeURIComponent(turnId))}`, { headers: _authHeaders() });
+            if (!res.ok) throw new Error(`HTTP ${res.status}`);
+            const recoveredData = await res.json();
+            button.remove();
+            restoreAnalyticsPayload(span, recoveredData, sessionId, index);
+            if (span.parentNode) span.remove();
+        } catch (e) {
+            console.error("❌ Gagal memuat artifact:", e);
+            button.disabled = false;
+            button.textContent = '⚠️ Gagal memuat data — coba lagi';
+        }
+    });
+
+    const contentBox = chatBubble.querySelector('.msg-content') || chatBubble.querySelector('.bubble') || chatBubble;
+    contentBox.appendChild(button);
+}
+
+function restoreAnalyticsPayload(span, recoveredData, sessionId, index) {
+    const chatBubble = span.closest('.msg');
+    if (!chatBubble) return;
+
+    if (chatBubble.hasAttribute('data-analytics-restored')) {
+        span.remove(); return;
+    }
+    chatBubble.setAttribute('data-analytics-restored', 'true');
+
+    // 🔥 FIX: Restructure DOM to move data outside bubble
+    let bubbleElement = chatBubble.querySelector('.bubble');
+    let chatColumn = chatBubble.querySelector('.chat-column');
+
+    // If we have a bubble but no chat-column, create the structure
+    if (bubbleElement && !chatColumn) {
+        chatColumn = document.createElement('div');
+        chatColumn.className = 'chat-column';
+        bubbleElement.parentNode.insertBefore(chatColumn, bubbleElement);
+        chatColumn.appendChild(bubbleElement);
+    }
+
+    // Fallback for targeting content
+    const contentBox = chatBubble.querySelector('.msg-content') || bubbleElement || chatBubble;
+    const rawHtml = contentBox.innerHTML;
+    
+    let extractedSql = recoveredData.sql_query;
+    let extractedExp = recoveredData.sql_explanation;
+
+    if (!extractedSql || extractedSql.length < 20) {
+        const sqlMatch = rawHtml.match(/<pre[^>]*>\s*<code[^>]*>([\s\S]*?)<\/code>\s*<\/pre>/i) || 
+                         rawHtml.match(/```(?:sql)?\s*([\s\S]*?)\s*```/i);
+        if (sqlMatch) extractedSql = sqlMatch[1].replace(/&lt;/g, '<').replace(/&gt;/g, '>').trim();
+    }
+    if (!extractedExp) {
+        const expMatch = rawHtml.match(/Penjelasan Logika:.*?([\s\S]*?)(?:<hr>|---|\*📊|<em|<div id="analytics)/i);
+        if (expMatch) extractedExp = expMatch[1].trim(); 
+    }
+
+    let currentHtml = rawHtml.replace(/<h[1-6][^>]*>.*?COMPLETE QUERY RESULTS.*?<\/h[1-6]>[\s\S]*/i, '');
+    currentHtml = currentHtml.replace(/# 📊 \*\*COMPLETE QUERY RESULTS\*\*[\s\S]*/g, '');
+    currentHtml = currentHtml.replace(/DATA:[\s\S]*/g, ''); 
+    if (currentHtml.replace(/<[^>]*>?/gm, '').trim().length < 5) currentHtml = '';
+
+    const messageId = chatBubble.id ? chatBubble.id.replace('msg-', '') : `rec-${Date.now()}-${index}`;
+    
+    // 1. Update BUBBLE content (Text Only)
+    const textHTML = currentHtml ? `<div style="background: white; padding: 16px 20px; border-radius: 12px; border: 1px solid #e5e7eb; margin-bottom: 12px;">${currentHtml}</div>` : '';
+    contentBox.innerHTML = textHTML;
+    
+    // 2. Create DATA CONTAINER (Sibling to Bubble)
+    const dataContainer = document.createElement('div');
+    dataContainer.id = `analytics-container-${messageId}`;
+    dataContainer.className = 'data-result';
+    
+    if (chatColumn) {
+        chatColumn.appendChild(dataContainer);
+    } else {
+        chatBubble.appendChild(dataContainer); // Fallback
+    }
+
+    if (window.HRAnalyticsRenderer) {
+        const reconstructedResponse = {
+            answer: "", data: recoveredData,
+            sql_query: extractedSql || recoveredData.sql_query,
+            sql_explanation: extractedExp || recoveredData.sql_explanation
+        };
+        window.HRAnalyticsRenderer.render(reconstructedResponse, messageId, dataContainer);
+    }
+
+    if (window.VisualizationModule) {
+        // Register contentBox as viz bubble target so it renders inside the bubble
+        window._hrVizBubbleMap = window._hrVizBubbleMap || {};
+        // FIX: Map to chatColumn so charts render as siblings
+        window._hrVizBubbleMap[messageId] = chatColumn || chatBubble;
+
+        window.VisualizationModule.setAnalyticsData(messageId, recoveredData);
+        window.VisualizationModule.renderVisualizationOffer(sessionId, messageId);
+    }
 }
 
 async function exportSessionHistory(sessionId, format = 'json') {